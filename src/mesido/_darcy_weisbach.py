@@ -1,13 +1,24 @@
+import logging
 import math
 
-import CoolProp as cP
-
 from mesido.constants import GRAVITATIONAL_CONSTANT
+from mesido.fluid_properties import (
+    FLUID_GRONINGEN_GAS,
+    FLUID_HYDROGEN,
+    FLUID_WATER,
+    fluid_properties,
+)
 from mesido.network_common import NetworkSettings
 
 import numpy as np
 
 
+logger = logging.getLogger("mesido")
+
+# Number of velocity samples used to place the breakpoints of the adaptive linearization
+ADAPTIVE_LINEARIZATION_SAMPLES = 1001
+
+
 def _kinematic_viscosity(temperature, network_type=NetworkSettings.NETWORK_TYPE_HEAT, pressure=0.0):
     """
     The kinematic viscosity is determined as a function of the fluid used.
@@ -21,67 +32,83 @@ def _kinematic_viscosity(temperature, network_type=NetworkSettings.NETWORK_TYPE_
 
     # Kinematic viscosity [m2/s] = Dynamic viscosity [Pa-s] / density [kg/m3]
     if network_type == NetworkSettings.NETWORK_TYPE_HEAT:
-        return cP.CoolProp.PropsSI(
-            "V", "T", 273.15 + temperature, "P", 0.5 * 10**6, "WATER"
-        ) / cP.CoolProp.PropsSI("D", "T", 273.15 + temperature, "P", 0.5 * 10**6, "WATER")
+        return fluid_properties.kinematic_viscosity(273.15 + temperature, 0.5 * 10**6, FLUID_WATER)
     elif network_type == NetworkSettings.NETWORK_TYPE_HYDROGEN:
         pressure = pressure if pressure else 101325
-        return cP.CoolProp.PropsSI(
-            "V", "T", 273.15 + temperature, "P", pressure, "HYDROGEN"
-        ) / cP.CoolProp.PropsSI("D", "T", 273.15 + temperature, "P", pressure, "HYDROGEN")
+        return fluid_properties.kinematic_viscosity(273.15 + temperature, pressure, FLUID_HYDROGEN)
     elif network_type == NetworkSettings.NETWORK_TYPE_GAS:
         pressure = pressure if pressure else 101325
-        return cP.CoolProp.PropsSI(
-            "V",
-            "T",
-            273.15 + temperature,
-            "P",
-            pressure,
-            NetworkSettings.NETWORK_COMPOSITION_GAS,
-        ) / cP.CoolProp.PropsSI(
-            "D",
-            "T",
-            273.15 + temperature,
-            "P",
-            pressure,
-            NetworkSettings.NETWORK_COMPOSITION_GAS,
+        return fluid_properties.kinematic_viscosity(
+            273.15 + temperature, pressure, FLUID_GRONINGEN_GAS
         )
     else:
         raise Exception("Unknown network type for computing dynamic viscosity")
 
 
-def _colebrook_white(reynolds, relative_roughness, friction_factor=0.015):
+def _colebrook_white_array(reynolds, relative_roughness, friction_factor=0.015):
     """
-    This function return the friction factor for turbulent conditions with the Colebrook-White
-    equation.
+    This function returns the friction factors for turbulent conditions with the Colebrook-White
+    equation for arrays of Reynolds numbers and relative roughnesses. The fixed-point iteration is
+    done for all elements at once, elements that have converged are no longer updated.
     """
+    reynolds, relative_roughness = np.broadcast_arrays(
+        np.asarray(reynolds, dtype=float), np.asarray(relative_roughness, dtype=float)
+    )
+    shape = reynolds.shape
+    reynolds = reynolds.ravel()
+    relative_roughness = relative_roughness.ravel()
+
+    friction_factors = np.full(reynolds.shape, friction_factor, dtype=float)
+    active = np.arange(reynolds.size)
+
     for _ in range(1000):
-        friction_factor_old = friction_factor
+        friction_factor_old = friction_factors[active]
+        reynolds_active = reynolds[active]
 
         reynolds_star = (
-            1 / math.sqrt(8.0) * reynolds * math.sqrt(friction_factor) * relative_roughness
+            1
+            / np.sqrt(8.0)
+            * reynolds_active
+            * np.sqrt(friction_factor_old)
+            * relative_roughness[active]
         )
-        friction_factor = (
+        friction_factor_new = (
             1.0
             / (
                 -2.0
-                * math.log10(
-                    2.51 / reynolds / math.sqrt(friction_factor) * (1 + reynolds_star / 3.3)
+                * np.log10(
+                    2.51
+                    / reynolds_active
+                    / np.sqrt(friction_factor_old)
+                    * (1 + reynolds_star / 3.3)
                 )
             )
             ** 2
         )
+        friction_factors[active] = friction_factor_new
 
-        if (
-            abs(friction_factor - friction_factor_old) / max(friction_factor, friction_factor_old)
+        converged = (
+            np.abs(friction_factor_new - friction_factor_old)
+            / np.maximum(friction_factor_new, friction_factor_old)
             < 1e-6
-        ):
-            return friction_factor
+        )
+        active = active[~converged]
+
+        if active.size == 0:
+            return friction_factors.reshape(shape)
     else:
         raise Exception("Colebrook-White did not converge")
 
 
-def friction_factor(
+def _colebrook_white(reynolds, relative_roughness, friction_factor=0.015):
+    """
+    This function return the friction factor for turbulent conditions with the Colebrook-White
+    equation.
+    """
+    return float(_colebrook_white_array(reynolds, relative_roughness, friction_factor))
+
+
+def friction_factor_array(
     velocity,
     diameter,
     wall_roughness,
@@ -90,33 +117,73 @@ def friction_factor(
     pressure=0.0,
 ):
     """
-    Darcy-weisbach friction factor calculation from both laminar and turbulent
-    flow.
+    Darcy-weisbach friction factor calculation from both laminar and turbulent flow, for arrays of
+    velocities, diameters and wall roughnesses. The inputs are broadcast against each other, such
+    that e.g. a column of diameters and a row of velocities results in a 2-D array of friction
+    factors. The temperature and pressure are scalars, as they define the fluid properties.
     """
 
+    velocity, diameter, wall_roughness = np.broadcast_arrays(
+        np.asarray(velocity, dtype=float),
+        np.asarray(diameter, dtype=float),
+        np.asarray(wall_roughness, dtype=float),
+    )
+
+    assert np.all(velocity >= 0)
+
     kinematic_viscosity = _kinematic_viscosity(
         temperature, network_type=network_type, pressure=pressure
     )
-    reynolds = velocity * diameter / kinematic_viscosity
 
-    assert velocity >= 0
+    friction_factors = np.zeros(velocity.shape, dtype=float)
+    flowing = (velocity != 0.0) & (diameter != 0.0)
+    reynolds = np.where(flowing, velocity * diameter / kinematic_viscosity, 0.0)
 
-    if velocity == 0.0 or diameter == 0.0:
-        return 0.0
-    elif reynolds <= 2000.0:
-        friction_factor = 64.0 / reynolds
-    elif reynolds >= 4000.0:
-        friction_factor = _colebrook_white(reynolds, wall_roughness / diameter)
-    else:
-        fac_turb = _colebrook_white(4000.0, wall_roughness / diameter)
+    laminar = flowing & (reynolds <= 2000.0)
+    turbulent = flowing & (reynolds >= 4000.0)
+    transition = flowing & ~laminar & ~turbulent
+
+    friction_factors[laminar] = 64.0 / reynolds[laminar]
+    friction_factors[turbulent] = _colebrook_white_array(
+        reynolds[turbulent], wall_roughness[turbulent] / diameter[turbulent]
+    )
+    if np.any(transition):
+        fac_turb = _colebrook_white_array(4000.0, wall_roughness[transition] / diameter[transition])
         fac_laminar = 64.0 / 2000.0
-        w = (reynolds - 2000.0) / 2000.0
-        friction_factor = w * fac_turb + (1 - w) * fac_laminar
+        w = (reynolds[transition] - 2000.0) / 2000.0
+        friction_factors[transition] = w * fac_turb + (1 - w) * fac_laminar
 
-    return friction_factor
+    return friction_factors
 
 
-def head_loss(
+def friction_factor(
+    velocity,
+    diameter,
+    wall_roughness,
+    temperature,
+    network_type=NetworkSettings.NETWORK_TYPE_HEAT,
+    pressure=0.0,
+):
+    """
+    Darcy-weisbach friction factor calculation from both laminar and turbulent
+    flow.
+    """
+
+    assert velocity >= 0
+
+    return float(
+        friction_factor_array(
+            velocity,
+            diameter,
+            wall_roughness,
+            temperature,
+            network_type=network_type,
+            pressure=pressure,
+        )
+    )
+
+
+def head_loss_array(
     velocity,
     diameter,
     length,
@@ -126,10 +193,18 @@ def head_loss(
     pressure=0.0,
 ):
     """
-    Head loss for a circular pipe of given length.
+    Head loss for circular pipes of given lengths, for arrays of velocities, diameters, lengths and
+    wall roughnesses. See :py:func:`friction_factor_array` for the broadcasting rules.
     """
 
-    f = friction_factor(
+    velocity, diameter, length, wall_roughness = np.broadcast_arrays(
+        np.asarray(velocity, dtype=float),
+        np.asarray(diameter, dtype=float),
+        np.asarray(length, dtype=float),
+        np.asarray(wall_roughness, dtype=float),
+    )
+
+    f = friction_factor_array(
         velocity,
         diameter,
         wall_roughness,
@@ -138,7 +213,99 @@ def head_loss(
         pressure=pressure,
     )
 
-    return length * f / (2 * GRAVITATIONAL_CONSTANT) * velocity**2 / diameter
+    # The friction factor is zero for pipes without diameter, we avoid the division by zero here.
+    safe_diameter = np.where(diameter != 0.0, diameter, 1.0)
+
+    return length * f / (2 * GRAVITATIONAL_CONSTANT) * velocity**2 / safe_diameter
+
+
+def head_loss(
+    velocity,
+    diameter,
+    length,
+    wall_roughness,
+    temperature,
+    network_type=NetworkSettings.NETWORK_TYPE_HEAT,
+    pressure=0.0,
+):
+    """
+    Head loss for a circular pipe of given length.
+    """
+
+    return float(
+        head_loss_array(
+            velocity,
+            diameter,
+            length,
+            wall_roughness,
+            temperature,
+            network_type=network_type,
+            pressure=pressure,
+        )
+    )
+
+
+def _adaptive_breakpoints(x, y, max_relative_error):
+    """
+    Returns the indices of the breakpoints in the sampled curve (x, y), such that the piecewise
+    linear interpolation between them deviates at most max_relative_error * max(abs(y)) from the
+    curve. The segments are placed greedily from x[0] onwards, each segment as long as possible.
+    Note that the deviation of a segment grows with its length for convex curves, like the head
+    loss and hydraulic power, which allows for a bisection on the end of every segment.
+    """
+    tolerance = max_relative_error * np.max(np.abs(y))
+
+    def segment_error(i, j):
+        slope = (y[j] - y[i]) / (x[j] - x[i])
+        return np.max(np.abs(y[i] + slope * (x[i : j + 1] - x[i]) - y[i : j + 1]))
+
+    n = len(x) - 1
+    breakpoints = [0]
+    i = 0
+    while i < n:
+        if segment_error(i, n) <= tolerance:
+            j = n
+        else:
+            lower, upper = i + 1, n
+            while upper - lower > 1:
+                middle = (lower + upper) // 2
+                if segment_error(i, middle) <= tolerance:
+                    lower = middle
+                else:
+                    upper = middle
+            j = lower
+        breakpoints.append(j)
+        i = j
+
+    return np.array(breakpoints)
+
+
+def _linearization_velocity_points(curve, v_max, n_lines, max_relative_error):
+    """
+    Returns the velocities of the breakpoints used to linearize the curve, a function of the
+    velocity. Without a max_relative_error these are n_lines equally spaced segments over
+    [0, v_max]. With a max_relative_error the breakpoints are placed adaptively, such that the
+    deviation of the linear approximation is at most max_relative_error times the value of the
+    curve at v_max, using as few segments as possible. In that case n_lines is the maximum number
+    of segments, if more are needed we fall back to n_lines equally spaced segments.
+    """
+    if max_relative_error is None:
+        return np.linspace(0.0, v_max, n_lines + 1)
+
+    assert max_relative_error > 0.0
+
+    v_samples = np.linspace(0.0, v_max, ADAPTIVE_LINEARIZATION_SAMPLES)
+    breakpoints = _adaptive_breakpoints(v_samples, curve(v_samples), max_relative_error)
+
+    if len(breakpoints) - 1 > n_lines:
+        logger.warning(
+            f"A maximum relative linearization error of {max_relative_error} requires "
+            f"{len(breakpoints) - 1} lines, which is more than the maximum of {n_lines} lines. "
+            f"Using {n_lines} equally spaced lines instead."
+        )
+        return np.linspace(0.0, v_max, n_lines + 1)
+
+    return v_samples[breakpoints]
 
 
 def get_linear_pipe_dh_vs_q_fit(
@@ -150,30 +317,32 @@ def get_linear_pipe_dh_vs_q_fit(
     v_max=2.5,
     network_type=NetworkSettings.NETWORK_TYPE_HEAT,
     pressure=0.0,
+    max_relative_error=None,
 ):
     """
     This function returns a set of coefficients to approximate a head loss curve with linear
     functions in the form of: head loss = b + (a * Q)
+
+    See :py:func:`_linearization_velocity_points` for the placement of the breakpoints, which
+    depends on max_relative_error.
     """
     area = math.pi * diameter**2 / 4
 
-    v_points = np.linspace(0.0, v_max, n_lines + 1)
+    def curve(v):
+        return head_loss_array(
+            v,
+            diameter,
+            length,
+            wall_roughness,
+            temperature,
+            network_type=network_type,
+            pressure=pressure,
+        )
+
+    v_points = _linearization_velocity_points(curve, v_max, n_lines, max_relative_error)
     q_points = v_points * area
 
-    h_points = np.array(
-        [
-            head_loss(
-                v,
-                diameter,
-                length,
-                wall_roughness,
-                temperature,
-                network_type=network_type,
-                pressure=pressure,
-            )
-            for v in v_points
-        ]
-    )
+    h_points = curve(v_points)
 
     a = np.diff(h_points) / np.diff(q_points)
     b = h_points[1:] - a * q_points[1:]
@@ -191,20 +360,22 @@ def get_linear_pipe_power_hydraulic_vs_q_fit(
     v_max=2.5,
     network_type=NetworkSettings.NETWORK_TYPE_HEAT,
     pressure=0.0,
+    max_relative_error=None,
 ):
     """
     power_hydraulic = b + (a * Q)
+
+    See :py:func:`_linearization_velocity_points` for the placement of the breakpoints, which
+    depends on max_relative_error.
     """
     area = math.pi * diameter**2 / 4.0
 
-    v_points = np.linspace(0.0, v_max, n_lines + 1)
-    q_points = v_points * area
-    power_hydraulic_points = np.array(
-        [
+    def curve(v):
+        return (
             rho
             * GRAVITATIONAL_CONSTANT
-            * abs(
-                head_loss(
+            * np.abs(
+                head_loss_array(
                     v,
                     diameter,
                     length,
@@ -216,9 +387,11 @@ def get_linear_pipe_power_hydraulic_vs_q_fit(
             )
             * v
             * area
-            for v in v_points
-        ]
-    )
+        )
+
+    v_points = _linearization_velocity_points(curve, v_max, n_lines, max_relative_error)
+    q_points = v_points * area
+    power_hydraulic_points = curve(v_points)
 
     a = np.diff(power_hydraulic_points) / np.diff(q_points)  # calc gradients for n_line segments
     b = power_hydraulic_points[1:] - a * q_points[1:]
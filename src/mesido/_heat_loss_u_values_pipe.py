@@ -1,5 +1,7 @@
 import math
-from typing import List, Optional, Tuple, Union
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from mesido.pipe_class import PipeClass
 
 import numpy as np
 
@@ -52,16 +54,121 @@ def heat_loss_u_values_pipe(
             raise Exception(
                 "Number of insulation thicknesses should match number of conductivities"
             )
-        insulation_thicknesses = np.array(insulation_thicknesses)
-        conductivities_insulation = np.array(conductivities_insulation)
     else:
-        insulation_thicknesses = np.array([insulation_thicknesses])
-        conductivities_insulation = np.array([conductivities_insulation])
+        insulation_thicknesses = [insulation_thicknesses]
+        conductivities_insulation = [conductivities_insulation]
+
+    u_1, u_2 = heat_loss_u_values_pipe_array(
+        [inner_diameter],
+        [insulation_thicknesses],
+        [conductivities_insulation],
+        conductivity_subsoil=conductivity_subsoil,
+        depth=depth,
+        h_surface=h_surface,
+        pipe_distance=np.nan if pipe_distance is None else pipe_distance,
+        neighbour=neighbour,
+    )
+
+    return float(u_1[0]), float(u_2[0])
+
+
+def _insulation_layers(
+    insulation_thicknesses: Union[np.ndarray, Sequence[Sequence[float]]],
+    conductivities_insulation: Union[np.ndarray, Sequence[Sequence[float]]],
+    n_pipes: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the insulation layers as (n_pipes, n_layers) arrays of the thicknesses and
+    conductivities. Ragged layer stacks are padded with layers of zero thickness, which do not add
+    any heat resistance.
+    """
+
+    def _is_ragged(x):
+        return (
+            not isinstance(x, np.ndarray)
+            and hasattr(x, "__iter__")
+            and any(hasattr(v, "__iter__") for v in x)
+        )
+
+    if _is_ragged(insulation_thicknesses) or _is_ragged(conductivities_insulation):
+        if not len(insulation_thicknesses) == len(conductivities_insulation) == n_pipes:
+            raise Exception("The insulation layers should be given for every pipe")
+
+        n_layers = max(len(np.atleast_1d(t)) for t in insulation_thicknesses)
+        thicknesses = np.zeros((n_pipes, n_layers))
+        conductivities = np.ones((n_pipes, n_layers))
+        for i, (t, c) in enumerate(zip(insulation_thicknesses, conductivities_insulation)):
+            t = np.atleast_1d(np.asarray(t, dtype=float))
+            c = np.atleast_1d(np.asarray(c, dtype=float))
+            if not len(t) == len(c):
+                raise Exception(
+                    "Number of insulation thicknesses should match number of conductivities"
+                )
+            thicknesses[i, : len(t)] = t
+            conductivities[i, : len(c)] = c
+        return thicknesses, conductivities
+
+    thicknesses = np.asarray(insulation_thicknesses, dtype=float)
+    conductivities = np.asarray(conductivities_insulation, dtype=float)
+    if thicknesses.ndim < 2:
+        # A single layer per pipe
+        thicknesses = np.broadcast_to(thicknesses, (n_pipes,))[:, np.newaxis]
+    if conductivities.ndim < 2:
+        conductivities = np.broadcast_to(conductivities, (n_pipes,))[:, np.newaxis]
+    thicknesses, conductivities = np.broadcast_arrays(thicknesses, conductivities)
+
+    # Layers without thickness do not contribute, whatever their (padding) conductivity is
+    conductivities = np.where(thicknesses == 0.0, 1.0, conductivities)
+    return thicknesses, conductivities
+
+
+def heat_loss_u_values_pipe_array(
+    inner_diameters: Union[List[float], np.ndarray],
+    insulation_thicknesses: Union[None, np.ndarray, Sequence[Sequence[float]]] = None,
+    conductivities_insulation: Union[float, np.ndarray, Sequence[Sequence[float]]] = 0.033,
+    conductivity_subsoil: Union[float, np.ndarray] = 2.3,
+    depth: Union[float, np.ndarray] = 1.0,
+    h_surface: Union[float, np.ndarray] = 15.4,
+    pipe_distance: Union[None, float, np.ndarray] = None,
+    neighbour: Union[bool, np.ndarray] = True,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized version of :py:func:`heat_loss_u_values_pipe`, which calculates the U_1 and U_2
+    milp loss values for many pipes at once.
+
+    The insulation can be given as a 1-D array (a single layer per pipe), a 2-D array of shape
+    (number of pipes, number of layers), or as a sequence of layer sequences per pipe, in which
+    case the pipes can have a different number of layers. All other arguments are either scalars
+    or arrays with a value per pipe. A pipe distance of None or NaN means the default of 2 * outer
+    diameter.
+
+    :return: Arrays with the U-values (U_1 / U_2) for milp losses of the pipes [W/(m*K)]
+    """
+
+    diam_inner = np.asarray(inner_diameters, dtype=float).ravel()
+    n_pipes = len(diam_inner)
+
+    if insulation_thicknesses is None:
+        insulation_thicknesses = 0.5 * diam_inner
+
+    thicknesses, conductivities = _insulation_layers(
+        insulation_thicknesses, conductivities_insulation, n_pipes
+    )
+
+    conductivity_subsoil = np.broadcast_to(np.asarray(conductivity_subsoil, dtype=float), n_pipes)
+    depth = np.broadcast_to(np.asarray(depth, dtype=float), n_pipes)
+    neighbour = np.broadcast_to(np.asarray(neighbour, dtype=bool), n_pipes)
+
+    # Outer diameter of every insulation layer, and the diameter inside of it
+    layer_outer_diameters = diam_inner[:, np.newaxis] + 2.0 * np.cumsum(thicknesses, axis=1)
+    layer_inner_diameters = np.hstack((diam_inner[:, np.newaxis], layer_outer_diameters[:, :-1]))
+    diam_outer = layer_outer_diameters[:, -1]
 
-    diam_inner = inner_diameter
-    diam_outer = diam_inner + 2 * sum(insulation_thicknesses)
     if pipe_distance is None:
-        pipe_distance = 2 * diam_outer
+        pipe_distance = 2.0 * diam_outer
+    else:
+        pipe_distance = np.broadcast_to(np.asarray(pipe_distance, dtype=float), n_pipes)
+        pipe_distance = np.where(np.isnan(pipe_distance), 2.0 * diam_outer, pipe_distance)
     depth_center = depth + 0.5 * diam_outer
 
     # NOTE: We neglect the milp resistance due to convection inside the pipe,
@@ -69,38 +176,86 @@ def heat_loss_u_values_pipe(
     # than the resistance of the outer insulation layers.
 
     # Heat resistance of the subsoil
-    r_subsoil = 1 / (2 * math.pi * conductivity_subsoil) * math.log(4.0 * depth_center / diam_outer)
+    r_subsoil = 1 / (2 * math.pi * conductivity_subsoil) * np.log(4.0 * depth_center / diam_outer)
 
     # Heat resistance due to insulation
-    outer_diameters = diam_inner + 2.0 * np.cumsum(insulation_thicknesses)
-    inner_diameters = np.array([inner_diameter, *outer_diameters[:-1]])
-    r_ins = sum(
-        np.log(outer_diameters / inner_diameters) / (2.0 * math.pi * conductivities_insulation)
+    r_ins = np.sum(
+        np.log(layer_outer_diameters / layer_inner_diameters) / (2.0 * math.pi * conductivities),
+        axis=1,
     )
 
     # Heat resistance due to neighboring pipeline
     r_m = (
         1
         / (4 * math.pi * conductivity_subsoil)
-        * math.log(1 + (2 * depth_center / pipe_distance) ** 2)
+        * np.log(1 + (2 * depth_center / pipe_distance) ** 2)
     )
 
-    if neighbour:
-        u_1 = (r_subsoil + r_ins) / ((r_subsoil + r_ins) ** 2 - r_m**2)
-        u_2 = r_m / ((r_subsoil + r_ins) ** 2 - r_m**2)
-    else:
-        u_1 = 1 / (r_subsoil + r_ins)
-        u_2 = 0
+    r_total = r_subsoil + r_ins
+    u_1 = np.where(neighbour, r_total / (r_total**2 - r_m**2), 1 / r_total)
+    u_2 = np.where(neighbour, r_m / (r_total**2 - r_m**2), 0.0)
 
     return u_1, u_2
 
 
+def pipe_u_values(
+    optimization_problem, parameters, pipes: Iterable[str]
+) -> Dict[str, Tuple[float, float]]:
+    """
+    Returns the U-values (U_1 / U_2) of the pipes based on their parameters, computed for all
+    pipes with a single call of :py:func:`heat_loss_u_values_pipe_array`. Parameters that are NaN
+    get the default value of :py:func:`heat_loss_u_values_pipe`.
+    """
+    pipes = list(pipes)
+    if not pipes:
+        return {}
+
+    def _parameter(name, default):
+        values = np.array([parameters[f"{p}.{name}"] for p in pipes], dtype=float)
+        return np.where(np.isnan(values), default, values)
+
+    inner_diameters = np.array([parameters[f"{p}.diameter"] for p in pipes], dtype=float)
+
+    # The insulation can have multiple layers, of which the number can differ per pipe
+    insulation_thicknesses = []
+    conductivities_insulation = []
+    for p, inner_diameter in zip(pipes, inner_diameters):
+        thicknesses = np.atleast_1d(
+            np.asarray(parameters[f"{p}.insulation_thickness"], dtype=float)
+        )
+        conductivities = np.atleast_1d(
+            np.asarray(parameters[f"{p}.conductivity_insulation"], dtype=float)
+        )
+        if np.all(np.isnan(thicknesses)):
+            thicknesses = np.array([0.5 * inner_diameter])
+        if np.all(np.isnan(conductivities)):
+            conductivities = np.full(len(thicknesses), 0.033)
+        if not len(thicknesses) == len(conductivities):
+            raise Exception(
+                f"Number of insulation thicknesses should match number of conductivities for "
+                f"pipe {p}"
+            )
+        insulation_thicknesses.append(thicknesses)
+        conductivities_insulation.append(conductivities)
+
+    u_1, u_2 = heat_loss_u_values_pipe_array(
+        inner_diameters,
+        insulation_thicknesses,
+        conductivities_insulation,
+        conductivity_subsoil=_parameter("conductivity_subsoil", 2.3),
+        depth=_parameter("depth", 1.0),
+        pipe_distance=_parameter("pipe_pair_distance", np.nan),
+        neighbour=[optimization_problem.has_related_pipe(p) for p in pipes],
+    )
+    return {p: (float(u_1[i]), float(u_2[i])) for i, p in enumerate(pipes)}
+
+
 def pipe_heat_loss(
     optimization_problem,
     options,
     parameters,
     p: str,
-    u_values: Optional[Tuple[float, float]] = None,
+    u_values: Optional[Tuple[Union[float, np.ndarray], Union[float, np.ndarray]]] = None,
     temp: float = None,
 ):
     """
@@ -114,6 +269,11 @@ def pipe_heat_loss(
     to, and thus influence, each other. I.e., the supply line loses milp
     that is absorbed by the return line. Note that the term dtemp is
     positive when the pipe is in the supply line and negative otherwise.
+
+    The `u_values` can also be a tuple of U_1 and U_2 arrays, e.g. of all the pipe classes of the
+    pipe, in which case an array with the milp loss for each of them is returned. When no
+    `u_values` are given, they are computed from the parameters of the pipe, see
+    :py:func:`pipe_u_values` to compute those of many pipes at once.
     """
     if options["neglect_pipe_heat_losses"]:
         return 0.0
@@ -121,21 +281,8 @@ def pipe_heat_loss(
     neighbour = optimization_problem.has_related_pipe(p)
 
     if u_values is None:
-        u_kwargs = {
-            "inner_diameter": parameters[f"{p}.diameter"],
-            "insulation_thicknesses": parameters[f"{p}.insulation_thickness"],
-            "conductivities_insulation": parameters[f"{p}.conductivity_insulation"],
-            "conductivity_subsoil": parameters[f"{p}.conductivity_subsoil"],
-            "depth": parameters[f"{p}.depth"],
-            "h_surface": parameters[f"{p}.h_surface"],
-            "pipe_distance": parameters[f"{p}.pipe_pair_distance"],
-        }
-
-        # NaN values mean we use the function default
-        u_kwargs = {k: v for k, v in u_kwargs.items() if not np.all(np.isnan(v))}
-        u_1, u_2 = heat_loss_u_values_pipe(**u_kwargs, neighbour=neighbour)
-    else:
-        u_1, u_2 = u_values
+        u_values = pipe_u_values(optimization_problem, parameters, [p])[p]
+    u_1, u_2 = u_values
 
     length = parameters[f"{p}.length"]
     temperature = parameters[f"{p}.temperature"]
@@ -165,7 +312,26 @@ def pipe_heat_loss(
         + (length * u_2 * dtemp)
     )
 
-    if heat_loss < 0 and temperature > temperature_ground:
+    if np.any(heat_loss < 0) and temperature > temperature_ground:
         raise Exception(f"Heat loss of pipe {p} should be nonnegative.")
 
     return heat_loss
+
+
+def pipe_heat_losses(
+    optimization_problem,
+    options,
+    parameters,
+    p: str,
+    pipe_classes: Iterable[PipeClass],
+    temp: float = None,
+) -> List[float]:
+    """
+    Returns the milp loss of pipe `p` for each of the pipe classes, computed with a single
+    vectorized call of :py:func:`pipe_heat_loss`.
+    """
+    u_values = np.array([c.u_values for c in pipe_classes], dtype=float).reshape(-1, 2)
+    heat_losses = pipe_heat_loss(
+        optimization_problem, options, parameters, p, (u_values[:, 0], u_values[:, 1]), temp
+    )
+    return np.broadcast_to(heat_losses, len(u_values)).tolist()
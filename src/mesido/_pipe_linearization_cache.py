@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, Tuple, Union
+
+import mesido._darcy_weisbach as darcy_weisbach
+from mesido.network_common import NetworkSettings
+
+import numpy as np
+
+
+logger = logging.getLogger("mesido")
+
+# Increase when the way the coefficients are computed changes, such that coefficients stored on
+# disk by an older version are no longer used.
+CACHE_FORMAT_VERSION = 1
+
+COEFFICIENTS = Tuple[np.ndarray, np.ndarray]
+
+
+class PipeLinearizationCache:
+    """
+    Cache for the (a, b) coefficients of the piecewise linear head loss and hydraulic power
+    approximations of pipes. The coefficients only depend on the pipe properties and the
+    linearization settings, so they are keyed on the content of those inputs.
+
+    The cache consists of an in-memory LRU cache, which is shared by all optimization problems in
+    a process, and an optional on-disk store (one file per coefficient set in a folder), such that
+    repeated runs of the same network do not have to redo the linearization.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._memory: "OrderedDict[str, COEFFICIENTS]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def clear(self) -> None:
+        self._memory.clear()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind: str, **kwargs) -> str:
+        """
+        Returns the content hash of the coefficient set `kind` for the given inputs. Floats are
+        represented exactly, such that only bit-identical inputs share a key.
+        """
+        items = [f"version={CACHE_FORMAT_VERSION}", f"kind={kind}"]
+        for name in sorted(kwargs):
+            value = kwargs[name]
+            if isinstance(value, (float, int, np.floating, np.integer)) and not isinstance(
+                value, bool
+            ):
+                value = repr(float(value))
+            else:
+                value = str(value)
+            items.append(f"{name}={value}")
+        return hashlib.sha256(";".join(items).encode("utf-8")).hexdigest()
+
+    def _store_in_memory(self, key: str, coefficients: COEFFICIENTS) -> None:
+        self._memory[key] = coefficients
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _read_from_disk(path: Path) -> Optional[COEFFICIENTS]:
+        try:
+            with np.load(path) as data:
+                return data["a"], data["b"]
+        except (OSError, KeyError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_to_disk(path: Path, coefficients: COEFFICIENTS) -> None:
+        # Write to a temporary file first, such that concurrent runs never read partial files
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, a=coefficients[0], b=coefficients[1])
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write pipe linearization coefficients to {path}: {e}")
+
+    def get(
+        self,
+        key: str,
+        compute: Callable[[], COEFFICIENTS],
+        cache_folder: Optional[Union[str, Path]] = None,
+    ) -> COEFFICIENTS:
+        """
+        Returns the coefficients for the key, computing them with `compute` if they are neither in
+        memory nor in the `cache_folder` (if one is given).
+        """
+        try:
+            coefficients = self._memory[key]
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return coefficients
+        except KeyError:
+            pass
+
+        path = Path(cache_folder) / f"{key}.npz" if cache_folder is not None else None
+
+        coefficients = self._read_from_disk(path) if path is not None else None
+        if coefficients is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            a, b = compute()
+            coefficients = (np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+            if path is not None:
+                self._write_to_disk(path, coefficients)
+
+        # The arrays are shared between all users of the cache, so we do not allow changing them
+        for c in coefficients:
+            c.flags.writeable = False
+
+        self._store_in_memory(key, coefficients)
+        return coefficients
+
+    def get_linear_pipe_dh_vs_q_fit(
+        self,
+        diameter,
+        length,
+        wall_roughness,
+        temperature,
+        n_lines=10,
+        v_max=2.5,
+        network_type=NetworkSettings.NETWORK_TYPE_HEAT,
+        pressure=0.0,
+        max_relative_error=None,
+        cache_folder=None,
+    ) -> COEFFICIENTS:
+        """
+        Cached version of :py:func:`mesido._darcy_weisbach.get_linear_pipe_dh_vs_q_fit`.
+        """
+        kwargs = dict(
+            diameter=diameter,
+            length=length,
+            wall_roughness=wall_roughness,
+            temperature=temperature,
+            n_lines=n_lines,
+            v_max=v_max,
+            network_type=network_type,
+            pressure=pressure,
+            max_relative_error=max_relative_error,
+        )
+        return self.get(
+            self.key("dh_vs_q", **kwargs),
+            lambda: darcy_weisbach.get_linear_pipe_dh_vs_q_fit(**kwargs),
+            cache_folder,
+        )
+
+    def get_linear_pipe_power_hydraulic_vs_q_fit(
+        self,
+        rho,
+        diameter,
+        length,
+        wall_roughness,
+        temperature,
+        n_lines=10,
+        v_max=2.5,
+        network_type=NetworkSettings.NETWORK_TYPE_HEAT,
+        pressure=0.0,
+        max_relative_error=None,
+        cache_folder=None,
+    ) -> COEFFICIENTS:
+        """
+        Cached version of
+        :py:func:`mesido._darcy_weisbach.get_linear_pipe_power_hydraulic_vs_q_fit`.
+        """
+        kwargs = dict(
+            rho=rho,
+            diameter=diameter,
+            length=length,
+            wall_roughness=wall_roughness,
+            temperature=temperature,
+            n_lines=n_lines,
+            v_max=v_max,
+            network_type=network_type,
+            pressure=pressure,
+            max_relative_error=max_relative_error,
+        )
+        return self.get(
+            self.key("power_hydraulic_vs_q", **kwargs),
+            lambda: darcy_weisbach.get_linear_pipe_power_hydraulic_vs_q_fit(**kwargs),
+            cache_folder,
+        )
+
+
+# Process-wide instance, such that e.g. the stages of the grow workflow share the coefficients
+pipe_linearization_cache = PipeLinearizationCache()
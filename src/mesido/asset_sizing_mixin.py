@@ -3,7 +3,7 @@ from typing import List, Set
 
 import casadi as ca
 
-from mesido._heat_loss_u_values_pipe import pipe_heat_loss
+from mesido._heat_loss_u_values_pipe import pipe_heat_loss, pipe_heat_losses, pipe_u_values
 from mesido.base_component_type_mixin import BaseComponentTypeMixin
 from mesido.demand_insulation_class import DemandInsulationClass
 from mesido.head_loss_class import HeadLossOption
@@ -492,6 +492,10 @@ class AssetSizingMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
                         ] = (0.0, 1.0)
 
         set_self_hot_pipes = set(self.hot_pipes)
+        # The U-values of all pipes are computed at once
+        u_values_pipes = pipe_u_values(
+            self, parameters, self.energy_system_components.get("heat_pipe", [])
+        )
         for pipe in self.energy_system_components.get("heat_pipe", []):
             pipe_classes = self.pipe_classes(pipe)
             # cold_pipe = self.hot_to_cold_pipe(pipe)
@@ -602,7 +606,7 @@ class AssetSizingMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
 
             if not pipe_classes or options["neglect_pipe_heat_losses"]:
                 # No pipe class decision to make for this pipe w.r.t. milp loss
-                heat_loss = pipe_heat_loss(self, options, parameters, pipe)
+                heat_loss = pipe_heat_loss(self, options, parameters, pipe, u_values_pipes[pipe])
                 if parameters[f"{pipe}.temperature"] > parameters[f"{pipe}.T_ground"]:
                     lb = 0.0
                 else:
@@ -617,7 +621,11 @@ class AssetSizingMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
                     self._pipe_heat_loss_nominals[heat_loss_var_name] = max(
                         abs(
                             pipe_heat_loss(
-                                self, {"neglect_pipe_heat_losses": False}, parameters, pipe
+                                self,
+                                {"neglect_pipe_heat_losses": False},
+                                parameters,
+                                pipe,
+                                u_values_pipes[pipe],
                             )
                         ),
                         1.0,
@@ -625,7 +633,7 @@ class AssetSizingMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
 
                 for ensemble_member in range(self.ensemble_size):
                     h = self.__heat_pipe_topo_heat_loss_parameters[ensemble_member]
-                    h[f"{pipe}.Heat_loss"] = pipe_heat_loss(self, options, parameters, pipe)
+                    h[f"{pipe}.Heat_loss"] = heat_loss
 
             elif len(pipe_classes) == 1:
                 # No pipe class decision to make for this pipe w.r.t. milp loss
@@ -640,7 +648,13 @@ class AssetSizingMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
                     self._pipe_heat_loss_nominals[heat_loss_var_name] = heat_loss
                 else:
                     self._pipe_heat_loss_nominals[heat_loss_var_name] = max(
-                        pipe_heat_loss(self, {"neglect_pipe_heat_losses": False}, parameters, pipe),
+                        pipe_heat_loss(
+                            self,
+                            {"neglect_pipe_heat_losses": False},
+                            parameters,
+                            pipe,
+                            u_values_pipes[pipe],
+                        ),
                         1.0,
                     )
 
@@ -648,10 +662,7 @@ class AssetSizingMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
                     h = self.__heat_pipe_topo_heat_loss_parameters[ensemble_member]
                     h[f"{pipe}.Heat_loss"] = heat_loss
             else:
-                heat_losses = [
-                    pipe_heat_loss(self, options, parameters, pipe, c.u_values)
-                    for c in pipe_classes
-                ]
+                heat_losses = pipe_heat_losses(self, options, parameters, pipe, pipe_classes)
 
                 self._pipe_heat_losses[pipe] = heat_losses
                 self._pipe_heat_loss_var_bounds[heat_loss_var_name] = (
@@ -665,7 +676,7 @@ class AssetSizingMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
                 for ensemble_member in range(self.ensemble_size):
                     h = self.__heat_pipe_topo_heat_loss_parameters[ensemble_member]
                     h[f"{pipe}.Heat_loss"] = max(
-                        pipe_heat_loss(self, options, parameters, pipe), 1.0
+                        pipe_heat_loss(self, options, parameters, pipe, u_values_pipes[pipe]), 1.0
                     )
 
             # Pipe class variables.
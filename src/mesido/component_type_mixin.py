@@ -24,13 +24,23 @@ class ModelicaComponentTypeMixin(BaseComponentTypeMixin):
     def __init__(self, *args, **kwargs):
         super().__init__(**kwargs)
         self.__hn_component_types = None
+        self.__prepared_problem = kwargs.get("prepared_problem", None)
 
     def pre(self):
         """
         In this function the topology object of the milp network is constructed. Meaning that for
         nodes, busses and storage assets their relevant information on the positive flow direction
-        and connections on the ports is gathered and stored in the topology object.
+        and connections on the ports is gathered and stored in the topology object. When the
+        problem is created with a prepared problem, the topology constructed by an earlier problem
+        with the same model is reused.
         """
+        if self.__prepared_problem is not None:
+            topology = self.__prepared_problem.topology(self.pycml_model())
+            if topology is not None:
+                self.__topology = topology
+                super().pre()
+                return
+
         components = self.energy_system_components
         nodes = components.get("node", [])
         busses = components.get("electricity_node", [])
@@ -450,6 +460,8 @@ class ModelicaComponentTypeMixin(BaseComponentTypeMixin):
             demand_connections,
             source_connections,
         )
+        if self.__prepared_problem is not None:
+            self.__prepared_problem.set_topology(self.pycml_model(), self.__topology)
 
         super().pre()
 
@@ -0,0 +1,308 @@
+import functools
+import logging
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import casadi as ca
+
+from mesido.head_loss_class import HeadLossClass
+
+import numpy as np
+
+import pandas as pd
+
+logger = logging.getLogger("mesido")
+
+# The names of the private constraint builders of the mixins, e.g.
+# _HeatPhysicsMixin__flow_direction_path_constraints. Note that some builders have a typo in their
+# name, e.g. __ates_max_stored_heat_constriants.
+_BUILDER_PATTERN = re.compile(r"\w*(constraints|constriants|constaint)$")
+
+OTHER_ASSET_TYPE = "other"
+
+
+class _BuilderStatistics:
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.constraints = 0
+        self.nonzeros = 0
+        self.per_asset_type: Dict[str, List[int]] = {}
+        self.transcription = None
+
+    def reset_counts(self, transcription: int):
+        self.constraints = 0
+        self.nonzeros = 0
+        self.per_asset_type = {}
+        self.transcription = transcription
+
+
+class ConstraintProfiler:
+    """
+    Opt-in instrumentation of the constraint builders of a problem. Every private constraint
+    builder of the mixins (e.g. HeatPhysicsMixin.__flow_direction_path_constraints) and of the
+    head loss classes is timed, and the number of constraints and nonzeros (in the Jacobian of the
+    constraints) it emits is counted, also per asset type.
+
+    A constraint is attributed to the asset type of the asset of which it contains the most
+    variables, and to "other" when it does not contain variables of an asset. The path
+    constraints are counted for every time step. A builder that is called by another builder
+    (e.g. a helper that builds the constraints of a single asset) is counted as part of the other
+    builder. The counts are those of the last transcription in which the builder was called
+    (e.g. the last priority, or the first one when the transcription is reused for the later
+    priorities), summed over the calls of the builder in that transcription. The builders of the
+    head loss classes are reported per network, under the attribute name of the head loss class
+    (e.g. _hn_head_loss_class for the heat network and _gn_head_loss_class for the gas network).
+
+    A profiler is passed to a problem with the constraint_profiler keyword argument, e.g.:
+
+    profiler = ConstraintProfiler()
+    run_optimization_problem(EndScenarioSizing, constraint_profiler=profiler, **kwargs)
+    print(profiler.format_report())
+
+    Note that counting the nonzeros requires the sparsity of the Jacobian of every builder, which
+    adds to the time to build the problem (but not to the times that are reported).
+    """
+
+    def __init__(self):
+        self.__statistics: Dict[Tuple[str, str], _BuilderStatistics] = {}
+        self.__solver_input_assets_cache = (None, None)
+        self.__depth = 0
+        self.__transcription = 0
+
+    def instrument(self, problem) -> None:
+        """
+        Wraps the constraint builders of the problem, this is done by the PhysicsMixin when the
+        profiler is passed with the constraint_profiler keyword argument.
+
+        :param problem: The problem to instrument.
+        """
+        for cls in type(problem).__mro__:
+            if not cls.__module__.startswith("mesido"):
+                continue
+            prefix = f"_{cls.__name__}__"
+            for name, attribute in vars(cls).items():
+                if callable(attribute) and name.startswith(prefix) and _BUILDER_PATTERN.match(name):
+                    builder = getattr(problem, name)
+                    setattr(
+                        problem,
+                        name,
+                        self.__wrap_builder(problem, cls.__name__, name[len(prefix) :], builder),
+                    )
+
+        # The head loss constraints are built by the head loss classes of the networks. Every
+        # network (e.g. _hn_head_loss_class and _gn_head_loss_class) has its own instance, which
+        # is reported under the name of its attribute.
+        for attribute, value in list(vars(problem).items()):
+            if not isinstance(value, HeadLossClass):
+                continue
+            for name in dir(type(value)):
+                if name.startswith("_") and not name.startswith("__") and "constraints" in name:
+                    builder = getattr(value, name)
+                    setattr(
+                        value,
+                        name,
+                        self.__wrap_builder(problem, attribute, name, builder),
+                    )
+
+        # The problem can be transcribed again for every priority, the counts of a builder are
+        # those of the last transcription in which it was called.
+        problem.transcribe = self.__wrap_transcribe(problem.transcribe)
+
+        # The outer (path) constraints methods tell whether the builders build path constraints
+        for method_name, is_path in [("path_constraints", True), ("constraints", False)]:
+            setattr(
+                problem,
+                method_name,
+                self.__wrap_constraints_method(problem, getattr(problem, method_name), is_path),
+            )
+
+    def __wrap_transcribe(self, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            self.__transcription += 1
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    def __wrap_constraints_method(self, problem, method, is_path):
+        @functools.wraps(method)
+        def wrapper(ensemble_member):
+            problem._constraint_profiler_context = (is_path, ensemble_member)
+            try:
+                return method(ensemble_member)
+            finally:
+                problem._constraint_profiler_context = None
+
+        return wrapper
+
+    def __wrap_builder(self, problem, owner, name, builder):
+        statistics = self.__statistics.setdefault((owner, name), _BuilderStatistics())
+
+        @functools.wraps(builder)
+        def wrapper(*args, **kwargs):
+            # A builder that is called by another builder is part of the other builder
+            if self.__depth > 0:
+                return builder(*args, **kwargs)
+
+            self.__depth += 1
+            timer = time.perf_counter()
+            try:
+                constraints = builder(*args, **kwargs)
+            finally:
+                self.__depth -= 1
+            statistics.time += time.perf_counter() - timer
+            statistics.calls += 1
+
+            context = getattr(problem, "_constraint_profiler_context", None)
+            if statistics.transcription != self.__transcription:
+                statistics.reset_counts(self.__transcription)
+            if context is not None and constraints:
+                try:
+                    self.__count(problem, statistics, constraints, *context)
+                except Exception:
+                    logger.debug(
+                        f"Could not count the constraints of {owner}.{name}", exc_info=True
+                    )
+            return constraints
+
+        return wrapper
+
+    def __count(self, problem, statistics, constraints, is_path, ensemble_member):
+        """
+        Adds the constraints and nonzeros of a call of a builder to the counts of the builder.
+        """
+        expressions = [ca.vec(ca.MX(c[0])) for c in constraints]
+        g = ca.vertcat(*expressions)
+        symbols = ca.symvar(g)
+
+        column_assets = []
+        for symbol in symbols:
+            if symbol.is_symbolic() and symbol.numel() == 1:
+                column_assets.append(_asset_name(symbol.name()))
+            elif ca.is_equal(symbol, problem.solver_input):
+                column_assets.extend(self.__solver_input_assets(problem, ensemble_member))
+            else:
+                column_assets.extend([None] * symbol.numel())
+
+        if symbols:
+            row_pointers, columns = ca.jacobian_sparsity(g, ca.vertcat(*symbols)).get_crs()
+        else:
+            row_pointers, columns = [0] * (g.size1() + 1), []
+
+        asset_types = _asset_types(problem)
+        multiplier = len(problem.times()) if is_path else 1
+
+        per_asset_type = statistics.per_asset_type
+        for row in range(g.size1()):
+            assets = Counter(
+                column_assets[c]
+                for c in columns[row_pointers[row] : row_pointers[row + 1]]
+                if column_assets[c] in asset_types
+            )
+            asset_type = asset_types[assets.most_common(1)[0][0]] if assets else OTHER_ASSET_TYPE
+            counts = per_asset_type.setdefault(asset_type, [0, 0])
+            counts[0] += multiplier
+            counts[1] += (row_pointers[row + 1] - row_pointers[row]) * multiplier
+
+        statistics.constraints += g.size1() * multiplier
+        statistics.nonzeros += len(columns) * multiplier
+
+    def __solver_input_assets(self, problem, ensemble_member) -> List[Optional[str]]:
+        """
+        Returns the asset names of the elements of the vector of all variables of the problem.
+        """
+        key = (id(problem), ensemble_member, problem.solver_input.numel())
+        if self.__solver_input_assets_cache[0] == key:
+            return self.__solver_input_assets_cache[1]
+
+        assets: List[Optional[str]] = [None] * problem.solver_input.numel()
+        indices = problem._CollocatedIntegratedOptimizationProblem__indices_as_lists[
+            ensemble_member
+        ]
+        for variable, variable_indices in indices.items():
+            asset = _asset_name(variable)
+            for i in variable_indices:
+                assets[i] = asset
+        self.__solver_input_assets_cache = (key, assets)
+        return assets
+
+    def report(self) -> pd.DataFrame:
+        """
+        Returns a table with per builder the number of calls, the total time [s], the number of
+        constraints and nonzeros and their share of the total, ranked by time.
+        """
+        rows = [
+            {
+                "mixin": owner,
+                "builder": name,
+                "calls": s.calls,
+                "time": s.time,
+                "constraints": s.constraints,
+                "nonzeros": s.nonzeros,
+            }
+            for (owner, name), s in self.__statistics.items()
+            if s.calls > 0
+        ]
+        report = pd.DataFrame(
+            rows, columns=["mixin", "builder", "calls", "time", "constraints", "nonzeros"]
+        )
+        for column in ["time", "constraints", "nonzeros"]:
+            total = report[column].sum()
+            report[f"{column}_share"] = report[column] / total if total > 0 else np.nan
+        return report.sort_values("time", ascending=False, ignore_index=True)
+
+    def asset_type_report(self) -> pd.DataFrame:
+        """
+        Returns a table with per builder and asset type the number of constraints and nonzeros,
+        ranked by the number of nonzeros.
+        """
+        rows = [
+            {
+                "mixin": owner,
+                "builder": name,
+                "asset_type": asset_type,
+                "constraints": constraints,
+                "nonzeros": nonzeros,
+            }
+            for (owner, name), s in self.__statistics.items()
+            for asset_type, (constraints, nonzeros) in s.per_asset_type.items()
+        ]
+        report = pd.DataFrame(
+            rows, columns=["mixin", "builder", "asset_type", "constraints", "nonzeros"]
+        )
+        return report.sort_values("nonzeros", ascending=False, ignore_index=True)
+
+    def format_report(self, top: Optional[int] = 20) -> str:
+        """
+        Returns the ranked report of the (top) builders as text.
+        """
+        report = self.report()
+        if top is not None:
+            report = report.head(top)
+        names = [f"{row.mixin}.{row.builder}" for row in report.itertuples()]
+        width = max([len("builder"), *(len(name) for name in names)])
+        lines = [
+            f"{'builder':<{width}} {'calls':>6} {'time [s]':>9} {'time':>6} {'constraints':>12} "
+            f"{'nonzeros':>12}"
+        ]
+        for name, row in zip(names, report.itertuples()):
+            lines.append(
+                f"{name:<{width}} {row.calls:>6} {row.time:>9.3f} {row.time_share:>6.1%} "
+                f"{row.constraints:>12} {row.nonzeros:>12}"
+            )
+        return "\n".join(lines)
+
+
+def _asset_name(variable: str) -> str:
+    return re.split(r"\.|__", variable, maxsplit=1)[0]
+
+
+def _asset_types(problem) -> Dict[str, str]:
+    return {
+        asset: asset_type
+        for asset_type, assets in problem.energy_system_components.items()
+        for asset in assets
+    }
@@ -0,0 +1,132 @@
+import dataclasses
+import datetime
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+import esdl
+from esdl.profiles.influxdbprofilemanager import ConnectionSettings
+from esdl.profiles.influxdbprofilemanager import InfluxDBProfileManager
+
+
+# TODO: remove hard-coded database credentials, should probably be read from a settings file
+influx_cred_map = {"wu-profiles.esdl-beta.hesi.energy:443": ("warmingup", "warmingup")}
+
+
+class InfluxDBProfileKey(NamedTuple):
+    """
+    The attributes that determine the data of an InfluxDB profile. Profiles with equal keys share
+    the same time series, such that it only has to be read from the database once.
+    """
+
+    database: str
+    field: str
+    host: str
+    start_date: datetime.datetime
+    end_date: datetime.datetime
+    measurement: str
+    port: int
+
+
+def influxdb_profile_key(profile: esdl.InfluxDBProfile) -> InfluxDBProfileKey:
+    return InfluxDBProfileKey(
+        profile.database,
+        profile.field,
+        profile.host,
+        profile.startDate,
+        profile.endDate,
+        profile.measurement,
+        profile.port,
+    )
+
+
+def influxdb_connection_settings(profile: esdl.InfluxDBProfile) -> ConnectionSettings:
+    """
+    Returns the settings to connect to the database of the profile, with ssl enabled for https
+    hosts or port 443 and the credentials of the host (if known).
+    """
+    profile_host = profile.host
+
+    ssl_setting = False
+    if "https" in profile_host:
+        profile_host = profile_host[8:]
+        ssl_setting = True
+    elif "http" in profile_host:
+        profile_host = profile_host[7:]
+    if profile.port == 443:
+        ssl_setting = True
+    influx_host = "{}:{}".format(profile_host, profile.port)
+
+    if influx_host in influx_cred_map:
+        (username, password) = influx_cred_map[influx_host]
+    else:
+        username = None
+        password = None
+
+    return ConnectionSettings(
+        host=profile.host,
+        port=profile.port,
+        username=username,
+        password=password,
+        database=profile.database,
+        ssl=ssl_setting,
+        verify_ssl=ssl_setting,
+    )
+
+
+class InfluxDBConnectionPool:
+    """
+    Pool of InfluxDB profile managers (and thereby their http sessions) per host and database.
+
+    A profile manager keeps the data of the last loaded profile, so a manager is only used by one
+    thread at a time. Managers are returned to the pool after use, such that the number of
+    connections to a database is bounded by the number of concurrent requests, and such that the
+    connections are reused by subsequent requests instead of being set up for every profile.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple, List[InfluxDBProfileManager]] = defaultdict(list)
+        self.connections_created = 0
+
+    @staticmethod
+    def _key(settings: ConnectionSettings) -> Tuple:
+        settings = dataclasses.replace(
+            settings, host=settings.host.replace("http://", "").replace("https://", "")
+        )
+        return dataclasses.astuple(settings)
+
+    @contextmanager
+    def connection(self, settings: ConnectionSettings) -> Iterator[InfluxDBProfileManager]:
+        key = self._key(settings)
+
+        with self._lock:
+            manager = self._idle[key].pop() if self._idle[key] else None
+
+        if manager is None:
+            # The manager changes the host in the settings, so we give it its own copy
+            manager = InfluxDBProfileManager(dataclasses.replace(settings))
+            with self._lock:
+                self.connections_created += 1
+
+        try:
+            yield manager
+        except BaseException:
+            # Do not reuse a connection that may be in an undefined state
+            manager.influxdb_client.close()
+            raise
+        else:
+            with self._lock:
+                self._idle[key].append(manager)
+
+    def clear(self) -> None:
+        with self._lock:
+            for managers in self._idle.values():
+                for manager in managers:
+                    manager.influxdb_client.close()
+            self._idle.clear()
+
+
+# Process-wide pool, such that e.g. the stages of a workflow reuse the connections
+influxdb_connection_pool = InfluxDBConnectionPool()
@@ -1,17 +1,20 @@
-import json
 import logging
 import math
-import os
-from pathlib import Path
-from typing import Any, Dict, Tuple, Type, Union
-
-import CoolProp as cP
+from typing import Any, Dict, Optional, Tuple, Type, Union
 
 import esdl
 from esdl import TimeUnitEnum, UnitEnum
 
 from mesido.esdl._exceptions import _RetryLaterException
 from mesido.esdl.common import Asset
+from mesido.esdl.connectivity_index import ConnectivityIndex
+from mesido.esdl.edr_pipe_catalogue import EDRPipeCatalogue
+from mesido.fluid_properties import (
+    FLUID_GRONINGEN_GAS,
+    FLUID_HYDROGEN,
+    FLUID_WATER_INCOMPRESSIBLE,
+    fluid_properties,
+)
 from mesido.network_common import NetworkSettings
 from mesido.pycml import Model as _Model
 
@@ -51,22 +54,16 @@ def get_internal_energy(asset_name, carrier):
     temperature = 20.0
 
     if NetworkSettings.NETWORK_TYPE_GAS in carrier.name:
-        internal_energy = cP.CoolProp.PropsSI(
-            "U",
-            "T",
+        internal_energy = fluid_properties.internal_energy(
             273.15 + temperature,
-            "P",
             carrier.pressure * 1.0e5,
-            NetworkSettings.NETWORK_COMPOSITION_GAS,
+            FLUID_GRONINGEN_GAS,
         )
     elif NetworkSettings.NETWORK_TYPE_HYDROGEN in carrier.name:
-        internal_energy = cP.CoolProp.PropsSI(
-            "U",
-            "T",
+        internal_energy = fluid_properties.internal_energy(
             273.15 + temperature,
-            "P",
             carrier.pressure * 1.0e5,
-            str(NetworkSettings.NETWORK_TYPE_HYDROGEN).upper(),
+            FLUID_HYDROGEN,
         )
     else:
         logger.warning(
@@ -83,31 +80,22 @@ def get_density(asset_name, carrier):
     temperature = 20.0
 
     if NetworkSettings.NETWORK_TYPE_GAS in carrier.name:
-        density = cP.CoolProp.PropsSI(
-            "D",
-            "T",
+        density = fluid_properties.density(
             273.15 + temperature,
-            "P",
             carrier.pressure * 1.0e5,
-            NetworkSettings.NETWORK_COMPOSITION_GAS,
+            FLUID_GRONINGEN_GAS,
         )
     elif NetworkSettings.NETWORK_TYPE_HYDROGEN in carrier.name:
-        density = cP.CoolProp.PropsSI(
-            "D",
-            "T",
+        density = fluid_properties.density(
             273.15 + temperature,
-            "P",
             carrier.pressure * 1.0e5,
-            str(NetworkSettings.NETWORK_TYPE_HYDROGEN).upper(),
+            FLUID_HYDROGEN,
         )
     elif NetworkSettings.NETWORK_TYPE_HEAT in carrier.name:
-        density = cP.CoolProp.PropsSI(
-            "D",
-            "T",
+        density = fluid_properties.density(
             273.15 + temperature,
-            "P",
             16.0e5,
-            "INCOMP::Water",
+            FLUID_WATER_INCOMPRESSIBLE,
         )
         return density  # to convert from kg/m3
     else:
@@ -119,7 +107,7 @@ def get_density(asset_name, carrier):
 
 
 class _AssetToComponentBase:
-    # A map of pipe class name to edr asset in _edr_pipes.json
+    # A map of pipe class name to edr asset in the EDRPipeCatalogue (_edr_pipes.json)
     STEEL_S1_PIPE_EDR_ASSETS = {
         "DN20": "Steel-S1-DN-20",
         "DN25": "Steel-S1-DN-25",
@@ -202,10 +190,8 @@ class _AssetToComponentBase:
         self._port_to_q_max = {}
         self._port_to_i_nominal = {}
         self._port_to_i_max = {}
-        self._port_to_esdl_component_type = {}
-        self._edr_pipes = json.load(
-            open(os.path.join(Path(__file__).parent, "_edr_pipes.json"), "r")
-        )
+        self._connectivity_index: Optional[ConnectivityIndex] = None
+        self._edr_pipes = EDRPipeCatalogue.instance()
 
     def convert(self, asset: Asset) -> Tuple[Type[_Model], MODIFIERS]:
         """
@@ -218,30 +204,22 @@ class _AssetToComponentBase:
         dispatch_method_name = f"convert_{self.component_map[asset.asset_type]}"
         return getattr(self, dispatch_method_name)(asset)
 
-    def port_asset_type_connections(self, asset):
+    def set_connectivity_index(self, connectivity_index: ConnectivityIndex) -> None:
         """
-        Here we populate a map between ports and asset types that we need before we can convert
-        the individual assets. This is because for the parsing of some assets we need to know if
-        they are connected to a certain type of asset, like a is disconnectable depending on which
-        asset type it is connected.
+        Here we set the index of how the assets are connected, which we need before we can convert
+        the individual assets. This is because for the parsing of some assets we need to know to
+        which ports and asset types they are connected, e.g. a pipe is disconnectable depending on
+        which asset type it is connected to.
 
         Parameters
         ----------
-        asset : Asset pipe object with it's properties from ESDL
+        connectivity_index : ConnectivityIndex of the assets that are converted
 
         Returns
         -------
         None
         """
-        ports = []
-        if asset.in_ports is not None:
-            ports.extend(asset.in_ports)
-        if asset.out_ports is not None:
-            ports.extend(asset.out_ports)
-        assert len(ports) > 0
-
-        for port in ports:
-            self._port_to_esdl_component_type[port] = asset.asset_type
+        self._connectivity_index = connectivity_index
 
     def _pipe_get_diameter_and_insulation(self, asset: Asset) -> Tuple[float, list, list]:
         """
@@ -300,10 +278,10 @@ class _AssetToComponentBase:
 
         if edr_dn_size:
             # Get insulation and diameter properties from EDR asset with this size.
-            edr_asset = self._edr_pipes[self.STEEL_S1_PIPE_EDR_ASSETS[edr_dn_size]]
-            inner_diameter = edr_asset["inner_diameter"]
-            insulation_thicknesses = edr_asset["insulation_thicknesses"]
-            conductivies_insulation = edr_asset["conductivies_insulation"]
+            edr_class_name = self.STEEL_S1_PIPE_EDR_ASSETS[edr_dn_size]
+            inner_diameter = self._edr_pipes.inner_diameter(edr_class_name)
+            insulation_thicknesses = self._edr_pipes.insulation_thicknesses(edr_class_name)
+            conductivies_insulation = self._edr_pipes.conductivities_insulation(edr_class_name)
         else:
             assert asset.attributes["innerDiameter"]
             inner_diameter = asset.attributes["innerDiameter"]
@@ -347,12 +325,17 @@ class _AssetToComponentBase:
         # functionality on a pipe connected to a heating demand.
         assert asset.asset_type == "Pipe"
         if len(asset.in_ports) == 1 and len(asset.out_ports) == 1:
-            connected_type_in = self._port_to_esdl_component_type.get(
-                asset.in_ports[0].connectedTo[0], None
-            )
-            connected_type_out = self._port_to_esdl_component_type.get(
-                asset.out_ports[0].connectedTo[0], None
-            )
+            connected_assets = [
+                self._connectivity_index.port_asset(
+                    self._connectivity_index.connected_port(asset.in_ports[0])
+                ),
+                self._connectivity_index.port_asset(
+                    self._connectivity_index.connected_port(asset.out_ports[0])
+                ),
+            ]
+            connected_type_in, connected_type_out = [
+                a.asset_type if a is not None else None for a in connected_assets
+            ]
         else:
             raise RuntimeError("Pipe does not have 1 in port and 1 out port")
         # TODO: add other components which can be disabled and thus of which the pipes are allowed
@@ -457,7 +440,7 @@ class _AssetToComponentBase:
     def _get_connected_q_max(self, asset: Asset) -> float:
         if asset.in_ports is not None and asset.asset_type != "Electrolyzer":
             for port in asset.in_ports:
-                connected_port = port.connectedTo[0]
+                connected_port = self._connectivity_index.connected_port(port)
                 q_max = (
                     self._port_to_q_max.get(connected_port, None)
                     if self._port_to_q_max.get(connected_port, False)
@@ -478,7 +461,7 @@ class _AssetToComponentBase:
                     )
         elif asset.out_ports is not None:
             for port in asset.out_ports:
-                connected_port = port.connectedTo[0]
+                connected_port = self._connectivity_index.connected_port(port)
                 q_max = (
                     self._port_to_q_max.get(connected_port, None)
                     if self._port_to_q_max.get(connected_port, False)
@@ -512,7 +495,7 @@ class _AssetToComponentBase:
             and isinstance(asset.in_ports[0].carrier, esdl.ElectricityCommodity)
             and isinstance(asset.out_ports[0].carrier, esdl.ElectricityCommodity)
         ):  # Transformer
-            connected_port = asset.out_ports[0].connectedTo[0]
+            connected_port = self._connectivity_index.connected_port(asset.out_ports[0])
             i_max_out = (
                 self._port_to_i_max.get(connected_port, None)
                 if self._port_to_i_max.get(connected_port, False)
@@ -533,7 +516,7 @@ class _AssetToComponentBase:
                     ]
                 )
             )
-            connected_port = asset.in_ports[0].connectedTo[0]
+            connected_port = self._connectivity_index.connected_port(asset.in_ports[0])
             i_max_in = (
                 self._port_to_i_max.get(connected_port, None)
                 if self._port_to_i_max.get(connected_port, False)
@@ -567,7 +550,7 @@ class _AssetToComponentBase:
                 )
 
         elif asset.in_ports is None:
-            connected_port = asset.out_ports[0].connectedTo[0]
+            connected_port = self._connectivity_index.connected_port(asset.out_ports[0])
             i_max = (
                 self._port_to_i_max.get(connected_port, None)
                 if self._port_to_i_max.get(connected_port, False)
@@ -604,7 +587,7 @@ class _AssetToComponentBase:
         ):
             for port in asset.in_ports:
                 if isinstance(port.carrier, esdl.ElectricityCommodity):
-                    connected_port = port.connectedTo[0]
+                    connected_port = self._connectivity_index.connected_port(port)
                     i_max = (
                         self._port_to_i_max.get(connected_port, None)
                         if self._port_to_i_max.get(connected_port, False)
@@ -660,13 +643,13 @@ class _AssetToComponentBase:
             and isinstance(asset.in_ports[0].carrier, esdl.GasCommodity)
             and isinstance(asset.out_ports[0].carrier, esdl.GasCommodity)
         ):  # Cater for gas substation
-            connected_port = asset.in_ports[0].connectedTo[0]
+            connected_port = self._connectivity_index.connected_port(asset.in_ports[0])
             q_nominal_in = (
                 self._port_to_q_nominal.get(connected_port, None)
                 if self._port_to_q_nominal.get(connected_port, False)
                 else 0.0
             )
-            connected_port = asset.out_ports[0].connectedTo[0]
+            connected_port = self._connectivity_index.connected_port(asset.out_ports[0])
             q_nominal_out = (
                 self._port_to_q_nominal.get(connected_port, None)
                 if self._port_to_q_nominal.get(connected_port, False)
@@ -687,7 +670,7 @@ class _AssetToComponentBase:
                 if isinstance(port.carrier, esdl.GasCommodity) or isinstance(
                     port.carrier, esdl.HeatCommodity
                 ):
-                    connected_port = port.connectedTo[0]
+                    connected_port = self._connectivity_index.connected_port(port)
                     q_nominal = (
                         self._port_to_q_nominal.get(connected_port, None)
                         if self._port_to_q_nominal.get(connected_port, False)
@@ -706,7 +689,7 @@ class _AssetToComponentBase:
                 if isinstance(port.carrier, esdl.GasCommodity) or isinstance(
                     port.carrier, esdl.HeatCommodity
                 ):
-                    connected_port = port.connectedTo[0]
+                    connected_port = self._connectivity_index.connected_port(port)
                     q_nominal = (
                         self._port_to_q_nominal.get(connected_port, None)
                         if self._port_to_q_nominal.get(connected_port, False)
@@ -725,7 +708,7 @@ class _AssetToComponentBase:
                 if isinstance(port.carrier, esdl.GasCommodity) or isinstance(
                     port.carrier, esdl.HeatCommodity
                 ):
-                    connected_port = port.connectedTo[0]
+                    connected_port = self._connectivity_index.connected_port(port)
                     q_nominal = (
                         self._port_to_q_nominal.get(connected_port, None)
                         if self._port_to_q_nominal.get(connected_port, False)
@@ -743,7 +726,7 @@ class _AssetToComponentBase:
             q_nominals = {}
             try:
                 for port in asset.in_ports:
-                    connected_port = asset.in_ports[0].connectedTo[0]
+                    connected_port = self._connectivity_index.connected_port(asset.in_ports[0])
                     if isinstance(port.carrier, esdl.GasCommodity):
                         q_nominals["Q_nominal_gas"] = self._port_to_q_nominal[connected_port]
                         self._port_to_q_nominal[port] = q_nominals["Q_nominal_gas"]
@@ -757,7 +740,7 @@ class _AssetToComponentBase:
                         )
             except KeyError:
                 if isinstance(asset.out_ports[0].carrier, esdl.GasCommodity):
-                    connected_port = asset.out_ports[0].connectedTo[0]
+                    connected_port = self._connectivity_index.connected_port(asset.out_ports[0])
                     q_nominals["Q_nominal"] = (
                         self._port_to_q_nominal.get(connected_port, None)
                         if self._port_to_q_max.get(connected_port, False)
@@ -785,10 +768,10 @@ class _AssetToComponentBase:
                         ):
                             out_port = p2
                     try:
-                        connected_port = p.connectedTo[0]
+                        connected_port = self._connectivity_index.connected_port(p)
                         q_nominal = self._port_to_q_nominal[connected_port]
                     except KeyError:
-                        connected_port = out_port.connectedTo[0]
+                        connected_port = self._connectivity_index.connected_port(out_port)
                         q_nominal = (
                             self._port_to_q_nominal.get(connected_port, None)
                             if self._port_to_q_max.get(connected_port, False)
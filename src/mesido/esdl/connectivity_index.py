@@ -0,0 +1,157 @@
+from typing import Dict, List, NamedTuple, Optional, Type
+
+import esdl
+
+from mesido.esdl.common import Asset
+
+
+class Connection(NamedTuple):
+    """
+    A connection of a port of an asset to a port of another asset.
+
+    port: the port of the asset.
+    connected_port: the port it is connected to.
+    connected_asset: the asset of the connected port, None if that asset is not in the index.
+    """
+
+    port: esdl.Port
+    connected_port: esdl.Port
+    connected_asset: Optional[Asset]
+
+
+class ConnectivityIndex:
+    """
+    Index of the parsed ESDL assets and of how they are connected, such that the asset of a port,
+    the ports connected to a port and the assets connected to an asset can be looked up without
+    walking the energy system. The index is built once when the ESDL is parsed, see
+    BaseESDLParser.get_connectivity_index().
+
+    Ports can be given as ESDL port or as port id. The connected ports of a port are those in its
+    connectedTo, unless they are given in connected_ports (per port id), e.g. for a network from
+    which assets are removed.
+    """
+
+    def __init__(
+        self,
+        assets: Dict[str, Asset],
+        connected_ports: Optional[Dict[str, List[esdl.Port]]] = None,
+    ):
+        connected_ports = connected_ports or {}
+        self._assets_by_id: Dict[str, Asset] = {}
+        self._assets_by_name: Dict[str, Asset] = {}
+        self._ports: Dict[str, esdl.Port] = {}
+        self._port_to_asset: Dict[str, Asset] = {}
+        self._connected_ports: Dict[str, List[esdl.Port]] = {}
+
+        for asset in assets.values():
+            self._assets_by_id[asset.id] = asset
+            self._assets_by_name[asset.name] = asset
+            for port in [*(asset.in_ports or []), *(asset.out_ports or [])]:
+                self._ports[port.id] = port
+                self._port_to_asset[port.id] = asset
+                self._connected_ports[port.id] = list(
+                    connected_ports.get(port.id, port.connectedTo)
+                )
+
+        self._connections: Dict[str, List[Connection]] = {
+            asset.id: [
+                Connection(port, connected_port, self._port_to_asset.get(connected_port.id))
+                for port in [*(asset.in_ports or []), *(asset.out_ports or [])]
+                for connected_port in self._connected_ports[port.id]
+            ]
+            for asset in self._assets_by_id.values()
+        }
+        self._connection_indices: Dict[str, Dict[str, int]] = {}
+        for asset_id, connections in self._connections.items():
+            indices = self._connection_indices[asset_id] = {}
+            for i, c in enumerate(connections):
+                indices.setdefault(c.connected_port.id, i + 1)
+
+    @staticmethod
+    def _port_id(port) -> str:
+        return port if isinstance(port, str) else port.id
+
+    def asset(self, asset_id: str) -> Optional[Asset]:
+        """
+        Returns the asset with the id, or None if there is no such asset.
+        """
+        return self._assets_by_id.get(asset_id)
+
+    def asset_by_name(self, name: str) -> Optional[Asset]:
+        """
+        Returns the asset with the name, or None if there is no such asset.
+        """
+        return self._assets_by_name.get(name)
+
+    def port(self, port_id: str) -> Optional[esdl.Port]:
+        """
+        Returns the port with the id, or None if it is not a port of an asset in the index.
+        """
+        return self._ports.get(port_id)
+
+    def port_asset(self, port) -> Optional[Asset]:
+        """
+        Returns the asset of the port, or None if it is not a port of an asset in the index.
+        """
+        return self._port_to_asset.get(self._port_id(port))
+
+    def connected_ports(self, port) -> List[esdl.Port]:
+        """
+        Returns the ports that are connected to the port.
+        """
+        return self._connected_ports.get(self._port_id(port), [])
+
+    def connected_port(self, port) -> esdl.Port:
+        """
+        Returns the (first) port that is connected to the port, for ports that have a single
+        connection, e.g. the ports of a pipe.
+        """
+        return self.connected_ports(port)[0]
+
+    def connections(
+        self,
+        asset_id: str,
+        commodity: Optional[Type[esdl.Commodity]] = None,
+        asset_type: Optional[str] = None,
+    ) -> List[Connection]:
+        """
+        Returns the connections of the ports of the asset, optionally only those of ports with a
+        carrier of the commodity type (e.g. esdl.HeatCommodity) or to assets of the asset type
+        (e.g. "Pipe").
+        """
+        return [
+            c
+            for c in self._connections.get(asset_id, [])
+            if (commodity is None or isinstance(c.port.carrier, commodity))
+            and (
+                asset_type is None
+                or (c.connected_asset is not None and c.connected_asset.asset_type == asset_type)
+            )
+        ]
+
+    def neighbours(
+        self,
+        asset_id: str,
+        commodity: Optional[Type[esdl.Commodity]] = None,
+        asset_type: Optional[str] = None,
+    ) -> List[Asset]:
+        """
+        Returns the assets that are connected to the asset, in the order of the ports of the asset
+        and without duplicates. The same filters as for connections() can be applied.
+        """
+        neighbours = {}
+        for c in self.connections(asset_id, commodity, asset_type):
+            if c.connected_asset is not None:
+                neighbours.setdefault(c.connected_asset.id, c.connected_asset)
+        return list(neighbours.values())
+
+    def connection_index(self, asset_id: str, port) -> int:
+        """
+        Returns the (1-based) index of the connection to the port among the connections of the
+        asset, which is the index of the connection on the ports of a node or bus.
+        """
+        port_id = self._port_id(port)
+        try:
+            return self._connection_indices[asset_id][port_id]
+        except KeyError:
+            raise KeyError(f"Port {port_id} is not connected to asset {asset_id}")
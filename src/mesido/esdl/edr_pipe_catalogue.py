@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+EDR_PIPES_JSON = os.path.join(Path(__file__).parent, "_edr_pipes.json")
+
+
+class EDRPipeCatalogue:
+    """
+    Read-only catalogue of the EDR pipes in _edr_pipes.json. The numeric properties are stored in
+    arrays indexed by the position of the pipe in the catalogue, the name to index map gives O(1)
+    lookups. The xml strings of the EDR pipes, which are only needed to write the optimized ESDL,
+    are not kept in memory until they are first requested.
+
+    Use :py:meth:`instance` to get the process-wide catalogue, which only loads the file once.
+    """
+
+    __instance: Optional["EDRPipeCatalogue"] = None
+    __instance_lock = threading.Lock()
+
+    def __init__(self, json_path: str = EDR_PIPES_JSON):
+        self._json_path = json_path
+
+        with open(json_path, "r") as f:
+            edr_pipes = json.load(f)
+
+        self.names = tuple(edr_pipes.keys())
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+        def _column(key):
+            column = np.array([edr_pipes[name][key] for name in self.names], dtype=float)
+            column.flags.writeable = False
+            return column
+
+        self.inner_diameters = _column("inner_diameter")
+        self.u_1 = _column("u_1")
+        self.u_2 = _column("u_2")
+        self.investment_costs = _column("investment_costs")
+
+        # Ragged, so we keep these as (immutable) tuples per pipe
+        self._insulation_thicknesses = tuple(
+            tuple(edr_pipes[name]["insulation_thicknesses"]) for name in self.names
+        )
+        self._conductivities_insulation = tuple(
+            tuple(edr_pipes[name]["conductivies_insulation"]) for name in self.names
+        )
+
+        self._xml_strings: Optional[Dict[str, str]] = None
+
+    @classmethod
+    def instance(cls) -> "EDRPipeCatalogue":
+        """
+        Returns the process-wide catalogue, loading it on the first call.
+        """
+        if cls.__instance is None:
+            with cls.__instance_lock:
+                if cls.__instance is None:
+                    cls.__instance = cls()
+        return cls.__instance
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def index(self, name: str) -> int:
+        return self._index[name]
+
+    def inner_diameter(self, name: str) -> float:
+        return float(self.inner_diameters[self._index[name]])
+
+    def u_values(self, name: str) -> tuple:
+        i = self._index[name]
+        return float(self.u_1[i]), float(self.u_2[i])
+
+    def investment_cost(self, name: str) -> float:
+        return float(self.investment_costs[self._index[name]])
+
+    def insulation_thicknesses(self, name: str) -> List[float]:
+        return list(self._insulation_thicknesses[self._index[name]])
+
+    def conductivities_insulation(self, name: str) -> List[float]:
+        return list(self._conductivities_insulation[self._index[name]])
+
+    def xml_string(self, name: str) -> str:
+        """
+        Returns the ESDL xml string of the EDR pipe. All xml strings are read from file on the
+        first call.
+        """
+        if self._xml_strings is None:
+            with open(self._json_path, "r") as f:
+                self._xml_strings = {k: v["xml_string"] for k, v in json.load(f).items()}
+        return self._xml_strings[name]
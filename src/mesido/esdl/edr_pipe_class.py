@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 
-from mesido.esdl.asset_to_component_base import _AssetToComponentBase
+from mesido.esdl.edr_pipe_catalogue import EDRPipeCatalogue
 from mesido.pipe_class import GasPipeClass, PipeClass
 
 
@@ -13,9 +13,15 @@ class EDRPipeClass(PipeClass):
     diameter: inner diameter in meter
     u_1, u_2: insulative properties [W/(m*K)]
     investment cost: investment cost coefficient in Eur/m
+
+    The xml string of the EDR pipe is only retrieved from the catalogue when requested.
     """
 
-    xml_string: str
+    edr_class_name: str
+
+    @property
+    def xml_string(self) -> str:
+        return EDRPipeCatalogue.instance().xml_string(self.edr_class_name)
 
     @classmethod
     def from_edr_class(cls, name: str, edr_class_name: str, maximum_velocity: float):
@@ -32,21 +38,15 @@ class EDRPipeClass(PipeClass):
         -------
         The EDR pipe class
         """
-        if not hasattr(EDRPipeClass, "._edr_pipes"):
-            # TODO: Currently using private API of RTC-Tools Heat Network.
-            # Make this functionality part of public API?
-            EDRPipeClass._edr_pipes = _AssetToComponentBase()._edr_pipes
-
-        edr_class = EDRPipeClass._edr_pipes[edr_class_name]
-        diameter = edr_class["inner_diameter"]
-        u_1 = edr_class["u_1"]
-        u_2 = edr_class["u_2"]
-        investment_costs = edr_class["investment_costs"]
-        xml_string = edr_class["xml_string"]
+        catalogue = EDRPipeCatalogue.instance()
+
+        diameter = catalogue.inner_diameter(edr_class_name)
+        u_values = catalogue.u_values(edr_class_name)
+        investment_costs = catalogue.investment_cost(edr_class_name)
 
         # TODO: utilize max velocity from the edr data as well?
         return EDRPipeClass(
-            name, diameter, maximum_velocity, (u_1, u_2), investment_costs, xml_string
+            name, diameter, maximum_velocity, u_values, investment_costs, edr_class_name
         )
 
 
@@ -59,9 +59,15 @@ class EDRGasPipeClass(GasPipeClass):
     diameter: inner diameter in meter
     u_1, u_2: insulative properties [W/(m*K)]
     investment cost: investment cost coefficient in Eur/m
+
+    The xml string of the EDR pipe is only retrieved from the catalogue when requested.
     """
 
-    xml_string: str
+    edr_class_name: str
+
+    @property
+    def xml_string(self) -> str:
+        return EDRPipeCatalogue.instance().xml_string(self.edr_class_name)
 
     @classmethod
     def from_edr_class(cls, name: str, edr_class_name: str, maximum_velocity: float):
@@ -78,15 +84,10 @@ class EDRGasPipeClass(GasPipeClass):
         -------
         The EDR pipe class
         """
-        if not hasattr(EDRPipeClass, "._edr_pipes"):
-            # TODO: Currently using private API of RTC-Tools Heat Network.
-            # Make this functionality part of public API?
-            EDRPipeClass._edr_pipes = _AssetToComponentBase()._edr_pipes
+        catalogue = EDRPipeCatalogue.instance()
 
-        edr_class = EDRPipeClass._edr_pipes[edr_class_name]
-        diameter = edr_class["inner_diameter"]
-        investment_costs = edr_class["investment_costs"]
-        xml_string = edr_class["xml_string"]
+        diameter = catalogue.inner_diameter(edr_class_name)
+        investment_costs = catalogue.investment_cost(edr_class_name)
 
         # TODO: utilize max velocity from the edr data as well?
-        return EDRGasPipeClass(name, diameter, maximum_velocity, investment_costs, xml_string)
+        return EDRGasPipeClass(name, diameter, maximum_velocity, investment_costs, edr_class_name)
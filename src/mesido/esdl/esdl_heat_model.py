@@ -1,6 +1,6 @@
 import logging
 import math
-from typing import Dict, Tuple, Type, Union
+from typing import Dict, Optional, Tuple, Type, Union
 
 import esdl
 
@@ -11,6 +11,7 @@ from mesido.esdl.asset_to_component_base import (
     get_internal_energy,
 )
 from mesido.esdl.common import Asset
+from mesido.esdl.connectivity_index import ConnectivityIndex
 from mesido.esdl.esdl_model_base import _ESDLModelBase
 from mesido.pycml.component_library.milp import (
     ATES,
@@ -55,6 +56,9 @@ from scipy.optimize import fsolve
 
 logger = logging.getLogger("mesido")
 
+# Pipes shorter than this length [m] are modelled with this length
+MINIMUM_PIPE_LENGTH = 25.0
+
 
 class _ESDLInputException(Exception):
     pass
@@ -503,9 +507,9 @@ class AssetToHeatComponent(_AssetToComponentBase):
                         f"coupled system"
                     )
             if isinstance(x, esdl.esdl.InPort):
-                sum_in += len(x.connectedTo)
+                sum_in += len(self._connectivity_index.connected_ports(x))
             if isinstance(x, esdl.esdl.OutPort):
-                sum_out += len(x.connectedTo)
+                sum_out += len(self._connectivity_index.connected_ports(x))
 
         modifiers = dict(
             n=sum_in + sum_out,
@@ -574,9 +578,7 @@ class AssetToHeatComponent(_AssetToComponentBase):
         """
         assert asset.asset_type == "Pipe"
 
-        length = asset.attributes["length"]
-        if length < 25.0:
-            length = 25.0
+        length = max(asset.attributes["length"], MINIMUM_PIPE_LENGTH)
 
         (
             diameter,
@@ -1661,9 +1663,9 @@ class AssetToHeatComponent(_AssetToComponentBase):
                         f"{asset.name} has multiple carriers mixing which is not allowed. "
                     )
             if isinstance(x, esdl.esdl.InPort):
-                sum_in += len(x.connectedTo)
+                sum_in += len(self._connectivity_index.connected_ports(x))
             if isinstance(x, esdl.esdl.OutPort):
-                sum_out += len(x.connectedTo)
+                sum_out += len(self._connectivity_index.connected_ports(x))
 
         modifiers = dict(voltage_nominal=nominal_voltage, n=sum_in + sum_out)
 
@@ -2525,6 +2527,7 @@ class ESDLHeatModel(_ESDLModelBase):
         assets: Dict[str, Asset],
         name_to_id_map: Dict[str, str],
         converter_class=AssetToHeatComponent,
+        connectivity_index: Optional[ConnectivityIndex] = None,
         **kwargs,
     ):
         super().__init__(None)
@@ -2539,4 +2542,4 @@ class ESDLHeatModel(_ESDLModelBase):
             }
         )
 
-        self._esdl_convert(converter, assets, name_to_id_map, "MILP")
+        self._esdl_convert(converter, assets, name_to_id_map, "MILP", connectivity_index)
@@ -1,5 +1,6 @@
 import base64
 import copy
+import hashlib
 import logging
 import xml.etree.ElementTree as ET  # noqa: N817
 from datetime import timedelta
@@ -13,14 +14,20 @@ from mesido.component_type_mixin import (
 )
 from mesido.esdl.asset_to_component_base import _AssetToComponentBase
 from mesido.esdl.common import Asset
+from mesido.esdl.connectivity_index import ConnectivityIndex
 from mesido.esdl.edr_pipe_class import EDRGasPipeClass, EDRPipeClass
 from mesido.esdl.esdl_heat_model import ESDLHeatModel
 from mesido.esdl.esdl_model_base import _ESDLModelBase
 from mesido.esdl.esdl_parser import ESDLStringParser
 from mesido.esdl.esdl_qth_model import ESDLQTHModel
+from mesido.esdl.esdl_snapshot import ESDLSnapshotCache
+from mesido.esdl.network_reduction import NetworkReduction, reduce_network
+from mesido.esdl.prepared_problem import PreparedProblem
+from mesido.esdl.profile_cache import DEFAULT_PROFILE_CACHE_MAX_SIZE_BYTES, ProfileCache
 from mesido.esdl.profile_parser import BaseProfileReader, InfluxDBProfileReader
 from mesido.physics_mixin import PhysicsMixin
 from mesido.pipe_class import GasPipeClass, PipeClass
+from mesido.pycml.model_cache import ModelCache
 from mesido.pycml.pycml_mixin import PyCMLMixin
 from mesido.qth_not_maintained.qth_mixin import QTHMixin
 
@@ -83,7 +90,25 @@ class ESDLMixin(
         Parameters
         ----------
         args : none
-        kwargs : esdl_string or esdl_file_name must be provided
+        kwargs : the keyword arguments below, of which esdl_string or esdl_file_name must be
+            provided.
+        esdl_string : the ESDL as a (base64 encoded) string.
+        esdl_file_name : the name of the ESDL file in the model folder.
+        profile_cache_folder : optional folder to store the profiles that are read from a
+            database on disk, such that later runs read them from disk instead.
+        profile_cache_max_size_bytes : optional maximum size of the profile cache, 1 GiB by
+            default.
+        prepared_problem : optional PreparedProblem to reuse the parsed ESDL, profiles and model
+            of an earlier problem, e.g. an earlier stage.
+        model_cache_folder : optional folder to store the simplified model on disk, such that
+            later problems of the same ESDL and model options read it from disk instead of
+            simplifying the model again.
+        esdl_snapshot_folder : optional folder (e.g. the model folder) to store a snapshot of the
+            parsed energy system on disk, such that later runs of the same ESDL restore it instead
+            of parsing the XML again.
+        network_reduction : optional bool, when True the heat network is reduced before the
+            model is generated, see reduce_network(). The results of the merged pipes are mapped
+            back to the pipes of the ESDL in the output ESDL.
         """
 
         self.esdl_parser_class: type = kwargs.get("esdl_parser", ESDLStringParser)
@@ -94,23 +119,76 @@ class ESDLMixin(
         if esdl_file_name is not None:
             esdl_path = Path(model_folder) / esdl_file_name
 
-        # TODO: discuss if this is correctly located here and why the reading of profiles is then
-        #  in the read function?
-        esdl_parser = self.esdl_parser_class(esdl_string=esdl_string, esdl_path=esdl_path)
-        esdl_parser.read_esdl()
-        self._esdl_assets: Dict[str, Asset] = esdl_parser.get_assets()
-        self._esdl_carriers: Dict[str, Dict[str, Any]] = esdl_parser.get_carrier_properties()
-        self.__energy_system_handler: esdl.esdl_handler.EnergySystemHandler = esdl_parser.get_esh()
-
         profile_reader_class = kwargs.get("profile_reader", InfluxDBProfileReader)
         input_file_name = kwargs.get("input_timeseries_file", None)
         input_folder = kwargs.get("input_folder")
         input_file_path = None
         if input_file_name is not None:
             input_file_path = Path(input_folder) / input_file_name
-        self.__profile_reader: BaseProfileReader = profile_reader_class(
-            energy_system=self.__energy_system_handler.energy_system, file_path=input_file_path
+
+        # Stages and sequential windows can share a prepared problem, such that the ESDL is only
+        # parsed, and the profiles are only read, by the first problem.
+        self.__prepared_problem: Optional[PreparedProblem] = kwargs.get("prepared_problem", None)
+        source = (
+            self.esdl_parser_class,
+            esdl_string,
+            esdl_path,
+            profile_reader_class,
+            input_file_path,
         )
+        if self.__prepared_problem is not None and self.__prepared_problem.is_prepared:
+            self.__prepared_problem.check_source(source)
+            self._esdl_assets: Dict[str, Asset] = self.__prepared_problem.esdl_assets
+            self._esdl_carriers: Dict[str, Dict[str, Any]] = self.__prepared_problem.esdl_carriers
+            self.__energy_system_handler: esdl.esdl_handler.EnergySystemHandler = (
+                self.__prepared_problem.energy_system_handler
+            )
+            self.__profile_reader: BaseProfileReader = self.__prepared_problem.profile_reader
+            self.__connectivity_index: Optional[ConnectivityIndex] = (
+                self.__prepared_problem.connectivity_index
+            )
+        else:
+            # TODO: discuss if this is correctly located here and why the reading of profiles is
+            #  then in the read function?
+            esdl_parser = self.esdl_parser_class(esdl_string=esdl_string, esdl_path=esdl_path)
+            esdl_snapshot_folder = kwargs.get("esdl_snapshot_folder", None)
+            if esdl_snapshot_folder is not None:
+                esdl_parser.snapshot_cache = ESDLSnapshotCache(esdl_snapshot_folder)
+            esdl_parser.read_esdl()
+            self._esdl_assets = esdl_parser.get_assets()
+            self._esdl_carriers = esdl_parser.get_carrier_properties()
+            self.__energy_system_handler = esdl_parser.get_esh()
+            self.__connectivity_index = esdl_parser.get_connectivity_index()
+
+            self.__profile_reader = profile_reader_class(
+                energy_system=self.__energy_system_handler.energy_system,
+                file_path=input_file_path,
+            )
+            profile_cache_folder = kwargs.get("profile_cache_folder", None)
+            if profile_cache_folder is not None:
+                self.__profile_reader.profile_cache = ProfileCache(
+                    profile_cache_folder,
+                    kwargs.get(
+                        "profile_cache_max_size_bytes", DEFAULT_PROFILE_CACHE_MAX_SIZE_BYTES
+                    ),
+                )
+
+            if self.__prepared_problem is not None:
+                self.__prepared_problem.store(
+                    source,
+                    self._esdl_assets,
+                    self._esdl_carriers,
+                    self.__energy_system_handler,
+                    self.__profile_reader,
+                    self.__connectivity_index,
+                )
+
+        # The reduced network replaces the parsed assets, the prepared problem keeps the parsed ones
+        self.__network_reduction: Optional[NetworkReduction] = None
+        if kwargs.get("network_reduction", False) and isinstance(self, PhysicsMixin):
+            self.__network_reduction = reduce_network(self._esdl_assets, self.__connectivity_index)
+            self._esdl_assets = self.__network_reduction.assets
+            self.__connectivity_index = self.__network_reduction.connectivity_index
 
         # This way we allow users to adjust the parsed ESDL assets
         assets = self.esdl_assets
@@ -118,9 +196,30 @@ class ESDLMixin(
         # Although we work with the names, the FEWS import data uses the component IDs
         self.__timeseries_id_map = {a.id: a.name for a in assets.values()}
         name_to_id_map = {a.name: a.id for a in assets.values()}
+        # The index of the parsed assets only applies when the assets are not adjusted
+        connectivity_index = self.__connectivity_index if assets is self._esdl_assets else None
+
+        self.__esdl_string = esdl_string
+        self.__esdl_path = esdl_path
 
         if isinstance(self, PhysicsMixin):
-            self.__model = ESDLHeatModel(assets, name_to_id_map, **self.esdl_heat_model_options())
+            options = self.esdl_heat_model_options()
+            self.__model_options = (ESDLHeatModel, options)
+            if self.__prepared_problem is not None:
+                self.__model = self.__prepared_problem.model(
+                    (
+                        ESDLHeatModel,
+                        repr(sorted(options.items())),
+                        self.__network_reduction is not None,
+                    ),
+                    lambda: ESDLHeatModel(
+                        assets, name_to_id_map, connectivity_index=connectivity_index, **options
+                    ),
+                )
+            else:
+                self.__model = ESDLHeatModel(
+                    assets, name_to_id_map, connectivity_index=connectivity_index, **options
+                )
         else:
             assert isinstance(self, QTHMixin)
 
@@ -141,7 +240,9 @@ class ESDLMixin(
 
             self.__max_supply_temperature = max(max_global_supply, max_attribute) + 10.0
 
-            self.__model = ESDLQTHModel(assets, **self.esdl_qth_model_options())
+            options = self.esdl_qth_model_options()
+            self.__model_options = (ESDLQTHModel, options)
+            self.__model = ESDLQTHModel(assets, **options)
 
         self._override_pipe_classes = dict()
         self.override_pipe_classes()
@@ -200,6 +301,7 @@ class ESDLMixin(
 
         # We assert the pipe classes are monotonically increasing in size
         assert np.all(np.diff([pc.inner_diameter for pc in pipe_classes]) > 0)
+        pipe_class_index = {pc.name: idx for idx, pc in enumerate(pipe_classes)}
 
         for asset in self.esdl_assets.values():
             if asset.asset_type == "Pipe" and isinstance(
@@ -212,19 +314,13 @@ class ESDLMixin(
                     c.append(no_pipe_class)
 
                     min_size = self.__minimum_pipe_size_name
-                    min_size_idx = [
-                        idx for idx, pipe in enumerate(pipe_classes) if pipe.name == min_size
-                    ]
-                    assert len(min_size_idx) == 1
-                    min_size_idx = min_size_idx[0]
+                    assert min_size in pipe_class_index
+                    min_size_idx = pipe_class_index[min_size]
 
                     max_size = asset.attributes["diameter"].name
 
-                    max_size_idx = [
-                        idx for idx, pipe in enumerate(pipe_classes) if pipe.name == max_size
-                    ]
-                    assert len(max_size_idx) == 1
-                    max_size_idx = max_size_idx[0]
+                    assert max_size in pipe_class_index
+                    max_size_idx = pipe_class_index[max_size]
 
                     if max_size_idx < min_size_idx:
                         logger.warning(
@@ -262,6 +358,7 @@ class ESDLMixin(
 
         # We assert the pipe classes are monotonically increasing in size
         assert np.all(np.diff([pc.inner_diameter for pc in pipe_classes]) > 0)
+        pipe_class_index = {pc.name: idx for idx, pc in enumerate(pipe_classes)}
 
         for asset in self.esdl_assets.values():
             if asset.asset_type == "Pipe" and isinstance(
@@ -274,19 +371,13 @@ class ESDLMixin(
                     c.append(no_pipe_class)
 
                     min_size = self.__minimum_pipe_size_name
-                    min_size_idx = [
-                        idx for idx, pipe in enumerate(pipe_classes) if pipe.name == min_size
-                    ]
-                    assert len(min_size_idx) == 1
-                    min_size_idx = min_size_idx[0]
+                    assert min_size in pipe_class_index
+                    min_size_idx = pipe_class_index[min_size]
 
                     max_size = asset.attributes["diameter"].name
 
-                    max_size_idx = [
-                        idx for idx, pipe in enumerate(pipe_classes) if pipe.name == max_size
-                    ]
-                    assert len(max_size_idx) == 1
-                    max_size_idx = max_size_idx[0]
+                    assert max_size in pipe_class_index
+                    max_size_idx = pipe_class_index[max_size]
 
                     if max_size_idx < min_size_idx:
                         logger.warning(
@@ -313,6 +404,18 @@ class ESDLMixin(
         """
         return self._esdl_assets
 
+    @property
+    def network_reduction(self) -> Optional[NetworkReduction]:
+        """
+        property method to retrieve how the network is reduced, when the network_reduction
+        keyword argument is set.
+
+        Returns
+        -------
+        The NetworkReduction of the esdl assets, or None if the network is not reduced
+        """
+        return self.__network_reduction
+
     @property
     def esdl_carriers(self, type=None) -> Dict[str, Dict[str, Any]]:
         """
@@ -521,6 +624,39 @@ class ESDLMixin(
         """
         return self.__model
 
+    def pycml_model_cache_key(self) -> Optional[str]:
+        """
+        Function to get the key of the pycml model in the model cache, which is used when a
+        model_cache_folder is provided. The key is a hash of the content of the ESDL, the model
+        class and its options, and whether the network is reduced. When a subclass overrides
+        esdl_assets, the problem class is part of the key as well. A subclass that adjusts the
+        assets or the model based on anything else than the ESDL and the model options should
+        override this method.
+
+        Returns
+        -------
+        The key of the model, or None when the ESDL is neither provided as string nor as file.
+        """
+        if self.__esdl_string is not None:
+            esdl_content = self.__esdl_string.encode("utf-8")
+        elif self.__esdl_path is not None:
+            esdl_content = Path(self.__esdl_path).read_bytes()
+        else:
+            return None
+
+        model_class, options = self.__model_options
+        attributes = dict(
+            esdl=hashlib.sha256(esdl_content).hexdigest(),
+            model=model_class.__name__,
+            options=repr(sorted(options.items())),
+            compiler_options=repr(sorted(self.compiler_options().items())),
+        )
+        if self.__network_reduction is not None:
+            attributes["network_reduction"] = True
+        if type(self).esdl_assets is not ESDLMixin.esdl_assets:
+            attributes["problem"] = f"{type(self).__module__}.{type(self).__qualname__}"
+        return ModelCache.key(**attributes)
+
     def read(self) -> None:
         """
         In this read function we read the relevant time-series and write them to the io object for
@@ -1,10 +1,11 @@
 import logging
-from typing import Dict
+from typing import Dict, Optional
 
 import esdl
 from esdl import InPort, OutPort
 
 from mesido.esdl.asset_to_component_base import _AssetToComponentBase
+from mesido.esdl.connectivity_index import ConnectivityIndex
 from mesido.pycml import Model as _Model
 
 logger = logging.getLogger("mesido")
@@ -26,7 +27,12 @@ class _ESDLModelBase(_Model):
     secondary_port_name_convention = "sec"
 
     def _esdl_convert(
-        self, converter: _AssetToComponentBase, assets: Dict, name_to_id_map: Dict, prefix: str
+        self,
+        converter: _AssetToComponentBase,
+        assets: Dict,
+        name_to_id_map: Dict,
+        prefix: str,
+        connectivity_index: Optional[ConnectivityIndex] = None,
     ) -> None:
         """
         In this function we convert the esdl parsed assets and instantiate the pycml objects for
@@ -39,6 +45,8 @@ class _ESDLModelBase(_Model):
         converter : class with the different converter functions for all asset types.
         assets : a dict with all the parsed esdl assets and their attributes
         prefix : prefix for the name of the model type Heat or QTH at the moment
+        connectivity_index : index of how the assets are connected, which is built from the
+            assets when it is not provided
 
         Returns
         -------
@@ -68,8 +76,9 @@ class _ESDLModelBase(_Model):
         # TODO: replace when python 3.8 is no longer supported
         # assets_sorted = assets_transport | assets_other
 
-        for asset in list(assets.values()):
-            converter.port_asset_type_connections(asset)
+        if connectivity_index is None:
+            connectivity_index = ConnectivityIndex(assets)
+        converter.set_connectivity_index(connectivity_index)
 
         for asset in list(assets_sorted.values()):
             pycml_type, modifiers = converter.convert(asset)
@@ -331,13 +340,13 @@ class _ESDLModelBase(_Model):
                     f"multiple connections to a single joint port are allowed"
                 )
             for port in (asset.in_ports[0], asset.out_ports[0]):
-                for connected_to in port.connectedTo.items:
+                for connected_to in connectivity_index.connected_ports(port):
                     conn = (port.id, connected_to.id)
                     # Here we skip the adding of the connection if we already had the reverse
                     # connection. Note that we don't do that for logical links between nodes, as we
                     # need both connections in order to make the topology object in
                     # component_type_mixin.py.
-                    if connected_to.id in list(port_map.keys()) and (
+                    if connected_to.id in port_map and (
                         conn in connections or tuple(reversed(conn)) in connections
                     ):
                         continue
@@ -346,30 +355,17 @@ class _ESDLModelBase(_Model):
                         # connected aasset is of type Pipe. In this case we want to fully connect
                         # the model with head losses and hydraulic power.
                         if (
-                            connected_to.id in list(port_map.keys())
-                            and assets[
-                                name_to_id_map[port_map[connected_to.id].name.split(".")[0]]
-                            ].asset_type
-                            == "Pipe"
+                            connected_to.id in port_map
+                            and connectivity_index.port_asset(connected_to).asset_type == "Pipe"
                         ):
                             self.connect(getattr(component, node_suf)[i], port_map[connected_to.id])
-                        elif connected_to.id not in list(port_map.keys()):
+                        elif connected_to.id not in port_map:
                             # If The asset is not in the
                             # port map means that there is a direct node to node connection with a
                             # logical link. Here we need to do some tricks to recover the correct
                             # port index of the node.
-                            for node in node_assets:
-                                if connected_to.id in [node.in_ports[0].id, node.out_ports[0].id]:
-                                    connected_node_asset = node
-                                    count = 1
-                                    for ct in [
-                                        *list(node.in_ports[0].connectedTo),
-                                        *list(node.out_ports[0].connectedTo),
-                                    ]:
-                                        if ct.id == port.id:
-                                            idx = count
-                                        else:
-                                            count += 1
+                            connected_node_asset = connectivity_index.port_asset(connected_to)
+                            idx = connectivity_index.connection_index(connected_node_asset.id, port)
                             self.connect_logical_links(
                                 getattr(component, node_suf)[i],
                                 getattr(getattr(self, connected_node_asset.name), node_suf)[idx],
@@ -385,28 +381,16 @@ class _ESDLModelBase(_Model):
                     elif isinstance(port.carrier, esdl.ElectricityCommodity):
                         # Same logic as for heat see comments there
                         if (
-                            connected_to.id in list(port_map.keys())
-                            and assets[
-                                name_to_id_map[port_map[connected_to.id].name.split(".")[0]]
-                            ].asset_type
+                            connected_to.id in port_map
+                            and connectivity_index.port_asset(connected_to).asset_type
                             == "ElectricityCable"
                         ):
                             self.connect(
                                 getattr(component, elec_node_suf)[i], port_map[connected_to.id]
                             )
-                        elif connected_to.id not in list(port_map.keys()):
-                            for node in bus_assets:
-                                if connected_to.id in [node.in_ports[0].id, node.out_ports[0].id]:
-                                    connected_node_asset = node
-                                    count = 1
-                                    for ct in [
-                                        *list(node.in_ports[0].connectedTo),
-                                        *list(node.out_ports[0].connectedTo),
-                                    ]:
-                                        if ct.id == port.id:
-                                            idx = count
-                                        else:
-                                            count += 1
+                        elif connected_to.id not in port_map:
+                            connected_node_asset = connectivity_index.port_asset(connected_to)
+                            idx = connectivity_index.connection_index(connected_node_asset.id, port)
                             self.connect_logical_links(
                                 getattr(component, elec_node_suf)[i],
                                 getattr(getattr(self, connected_node_asset.name), elec_node_suf)[
@@ -423,28 +407,15 @@ class _ESDLModelBase(_Model):
                     elif isinstance(port.carrier, esdl.GasCommodity):
                         # Same logic as for heat see comments there
                         if (
-                            connected_to.id in list(port_map.keys())
-                            and assets[
-                                name_to_id_map[port_map[connected_to.id].name.split(".")[0]]
-                            ].asset_type
-                            == "Pipe"
+                            connected_to.id in port_map
+                            and connectivity_index.port_asset(connected_to).asset_type == "Pipe"
                         ):
                             self.connect(
                                 getattr(component, gas_node_suf)[i], port_map[connected_to.id]
                             )
-                        elif connected_to.id not in list(port_map.keys()):
-                            for node in gas_node_assets:
-                                if connected_to.id in [node.in_ports[0].id, node.out_ports[0].id]:
-                                    connected_node_asset = node
-                                    count = 1
-                                    for ct in [
-                                        *list(node.in_ports[0].connectedTo),
-                                        *list(node.out_ports[0].connectedTo),
-                                    ]:
-                                        if ct.id == port.id:
-                                            idx = count
-                                        else:
-                                            count += 1
+                        elif connected_to.id not in port_map:
+                            connected_node_asset = connectivity_index.port_asset(connected_to)
+                            idx = connectivity_index.connection_index(connected_node_asset.id, port)
                             self.connect_logical_links(
                                 getattr(component, gas_node_suf)[i],
                                 getattr(getattr(self, connected_node_asset.name), gas_node_suf)[
@@ -480,7 +451,9 @@ class _ESDLModelBase(_Model):
                 ports.extend(asset.out_ports)
             assert len(ports) > 0
             for port in ports:
-                connected_ports = [p for p in port.connectedTo.items if p.id not in skip_port_ids]
+                connected_ports = [
+                    p for p in connectivity_index.connected_ports(port) if p.id not in skip_port_ids
+                ]
                 if len(connected_ports) != 1:
                     logger.warning(
                         f"{asset.asset_type} '{asset.name}' has multiple connections"
@@ -496,13 +469,8 @@ class _ESDLModelBase(_Model):
                     if (
                         asset.asset_type == "Pipe"
                         or asset.asset_type == "ElectricityCable"
-                        or assets[
-                            name_to_id_map[port_map[connected_to.id].name.split(".")[0]]
-                        ].asset_type
-                        == "Pipe"
-                        or assets[
-                            name_to_id_map[port_map[connected_to.id].name.split(".")[0]]
-                        ].asset_type
+                        or connectivity_index.port_asset(connected_to).asset_type == "Pipe"
+                        or connectivity_index.port_asset(connected_to).asset_type
                         == "ElectricityCable"
                     ):
                         self.connect(port_map[port.id], port_map[connected_to.id])
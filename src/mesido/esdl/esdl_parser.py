@@ -1,10 +1,12 @@
 import base64
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple, Union
 
 import esdl.esdl_handler
 
 from mesido.esdl.common import Asset
+from mesido.esdl.connectivity_index import ConnectivityIndex
+from mesido.esdl.esdl_snapshot import ESDLSnapshotCache
 
 
 class _ESDLInputException(Exception):
@@ -17,12 +19,14 @@ class BaseESDLParser:
             "carriers": dict(),
         }
         self._assets: Dict[str, Asset] = dict()
+        self._connectivity_index: Optional[ConnectivityIndex] = None
         self._energy_system_handler: esdl.esdl_handler.EnergySystemHandler = (
             esdl.esdl_handler.EnergySystemHandler()
         )
         self._energy_system: Optional[esdl.EnergySystem] = None
         self._esdl_string: Optional[str] = None
         self._esdl_path: Optional[Path] = None
+        self.snapshot_cache: Optional[ESDLSnapshotCache] = None
 
     def _load_esdl_model(self) -> None:
         """
@@ -31,8 +35,36 @@ class BaseESDLParser:
         """
         raise NotImplementedError
 
+    def _snapshot_source(self) -> Optional[Tuple[str, Union[str, bytes], Optional[str]]]:
+        """
+        This function can be implemented by the child to support snapshots. It should return the
+        uri of the resource, the content of the ESDL and the name of the snapshot (None to name
+        it by the content hash).
+        """
+        return None
+
+    def _load_energy_system(self) -> None:
+        """
+        Loads the energy system from the snapshot when there is one of the same ESDL, otherwise
+        loads the ESDL model and stores its snapshot.
+        """
+        source = self._snapshot_source() if self.snapshot_cache is not None else None
+        if source is None:
+            self._load_esdl_model()
+            return
+
+        uri, content, name = source
+        key = self.snapshot_cache.key(content)
+        energy_system_handler = self.snapshot_cache.read(key, uri, name)
+        if energy_system_handler is None:
+            self._load_esdl_model()
+            self.snapshot_cache.write(key, self._energy_system, name)
+        else:
+            self._energy_system_handler = energy_system_handler
+            self._energy_system = energy_system_handler.energy_system
+
     def read_esdl(self) -> None:
-        self._load_esdl_model()
+        self._load_energy_system()
         id_to_idnumber_map = {}
 
         for x in self._energy_system.energySystemInformation.carriers.carrier.items:
@@ -142,9 +174,14 @@ class BaseESDLParser:
                     self._global_properties,
                 )
 
+        self._connectivity_index = ConnectivityIndex(self._assets)
+
     def get_assets(self) -> Dict[str, Asset]:
         return self._assets
 
+    def get_connectivity_index(self) -> ConnectivityIndex:
+        return self._connectivity_index
+
     def get_carrier_properties(self) -> Dict:
         return self._global_properties["carriers"]
 
@@ -170,6 +207,9 @@ class ESDLStringParser(BaseESDLParser):
     def _load_esdl_model(self) -> None:
         self._energy_system = self._energy_system_handler.load_from_string(self._esdl_string)
 
+    def _snapshot_source(self) -> Optional[Tuple[str, Union[str, bytes], Optional[str]]]:
+        return "from_string.esdl", self._esdl_string, None
+
 
 class ESDLFileParser(BaseESDLParser):
     def __init__(self, **kwargs):
@@ -184,3 +224,7 @@ class ESDLFileParser(BaseESDLParser):
 
     def _load_esdl_model(self) -> None:
         self._energy_system = self._energy_system_handler.load_file(str(self._esdl_path))
+
+    def _snapshot_source(self) -> Optional[Tuple[str, Union[str, bytes], Optional[str]]]:
+        esdl_path = Path(self._esdl_path)
+        return str(esdl_path), esdl_path.read_bytes(), esdl_path.name
@@ -0,0 +1,215 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+import esdl.esdl_handler
+
+from mesido import __version__
+
+from pyecore.ecore import EEnum
+from pyecore.resources import URI, global_registry
+
+
+logger = logging.getLogger("mesido")
+
+# Increase when the way the energy systems are stored changes, such that snapshots stored by an
+# older version are no longer used.
+SNAPSHOT_FORMAT_VERSION = 1
+
+SNAPSHOT_FILE_SUFFIX = ".snapshot"
+
+
+def _encode(energy_system: esdl.EnergySystem) -> Dict[str, Any]:
+    """
+    Returns the energy system as plain data: per object the index of its class, its attribute
+    values and its references as indices of the referenced objects. The objects are in the order
+    of eAllContents(), such that the containment order is kept.
+    """
+    objects = [energy_system, *energy_system.eAllContents()]
+    object_indices = {id(o): i for i, o in enumerate(objects)}
+    class_indices: Dict[Tuple[str, str], int] = {}
+    encoded = []
+    for o in objects:
+        eclass = o.eClass
+        class_index = class_indices.setdefault(
+            (eclass.ePackage.nsURI, eclass.name), len(class_indices)
+        )
+        attributes = []
+        references = []
+        for feature in o._isset:
+            if feature.derived or feature.transient:
+                continue
+            value = o.__getattribute__(feature._name)
+            if feature.is_attribute:
+                if isinstance(feature._eType, EEnum):
+                    value = [v.name for v in value] if feature.many else value.name
+                elif feature.many:
+                    value = list(value)
+                attributes.append((feature._name, value))
+            elif feature.many:
+                # Raises a KeyError for references to objects outside the energy system
+                references.append((feature._name, [object_indices[id(v)] for v in value]))
+            else:
+                references.append(
+                    (feature._name, None if value is None else object_indices[id(value)])
+                )
+        encoded.append((class_index, attributes, references))
+
+    return {
+        "classes": sorted(class_indices, key=class_indices.get),
+        "objects": encoded,
+    }
+
+
+def _decode(data: Dict[str, Any], uri: str) -> esdl.esdl_handler.EnergySystemHandler:
+    """
+    Returns an energy system handler with the energy system of the encoded data, in a new XML
+    resource such that it can be written to ESDL as if it was read from ESDL.
+    """
+    classes = [global_registry[ns_uri].getEClassifier(name) for ns_uri, name in data["classes"]]
+    features = [{f._name: f for f in c.eClass.eAllStructuralFeatures()} for c in classes]
+    objects = [classes[class_index]() for class_index, _, _ in data["objects"]]
+
+    energy_system_handler = esdl.esdl_handler.EnergySystemHandler()
+    resource = energy_system_handler.rset.create_resource(URI(uri))
+    energy_system = objects[0]
+    energy_system._eresource = resource
+    resource.contents.append(energy_system)
+
+    for o, (class_index, attributes, _) in zip(objects, data["objects"]):
+        for name, value in attributes:
+            feature = features[class_index][name]
+            if isinstance(feature._eType, EEnum):
+                from_string = feature._eType.from_string
+                value = [from_string(v) for v in value] if feature.many else from_string(value)
+            if feature.many:
+                o.__getattribute__(name).extend(value)
+            else:
+                o.__setattr__(name, value)
+            if feature.iD:
+                resource.uuid_dict[value] = o
+
+    for o, (class_index, _, references) in zip(objects, data["objects"]):
+        for name, value in references:
+            feature = features[class_index][name]
+            # Both sides of references with an opposite are stored, so they are restored without
+            # updating the opposite, which keeps the order of e.g. the connectedTo of the ports.
+            update_opposite = feature.eOpposite is None
+            if feature.many:
+                collection = o.__getattribute__(name)
+                for i in value:
+                    collection.append(objects[i], update_opposite)
+            else:
+                o.__getattribute__(name)
+                o.__dict__[name]._set(None if value is None else objects[value], update_opposite)
+
+    energy_system_handler.resource = resource
+    energy_system_handler.energy_system = energy_system
+    return energy_system_handler
+
+
+class ESDLSnapshotCache:
+    """
+    Persistent on-disk cache of parsed ESDL energy systems, such that repeated runs of the same
+    ESDL do not have to deserialize the XML again.
+
+    A snapshot is a pickle of the objects of the energy system, with per object its class, its
+    attribute values and its references as indices of other objects. Restoring a snapshot creates
+    the objects directly, instead of decoding the XML elements and attribute strings and resolving
+    the references by id. The snapshot holds the content hash of the ESDL, and is rebuilt when the
+    ESDL changes.
+
+    The snapshot of an ESDL file is stored as "<file name>.snapshot" in the folder, e.g. next to
+    the ESDL when the folder is the model folder. The snapshot of an ESDL string is named by its
+    content hash.
+
+    A snapshot cache is used by a problem when the esdl_snapshot_folder keyword argument is
+    provided.
+    """
+
+    def __init__(self, folder: Union[str, Path]):
+        self.folder = Path(folder)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(content: Union[str, bytes]) -> str:
+        """
+        Returns the content hash of the ESDL, which also includes the versions of mesido, pyecore
+        and pyesdl.
+        """
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        items = [
+            f"version={SNAPSHOT_FORMAT_VERSION}",
+            f"mesido={__version__}",
+            f"pyecore={version('pyecore')}",
+            f"pyesdl={version('pyesdl')}",
+        ]
+        h = hashlib.sha256(";".join(items).encode("utf-8"))
+        h.update(content)
+        return h.hexdigest()
+
+    def _path(self, key: str, name: Optional[str]) -> Path:
+        return self.folder / f"{name if name is not None else key}{SNAPSHOT_FILE_SUFFIX}"
+
+    def read(
+        self, key: str, uri: str, name: Optional[str] = None
+    ) -> Optional[esdl.esdl_handler.EnergySystemHandler]:
+        """
+        Returns an energy system handler with the energy system stored for the key, or None if it
+        is not in the cache or the snapshot is of another version of the ESDL.
+        """
+        path = self._path(key, name)
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+            if snapshot["key"] != key:
+                raise ValueError("the snapshot is of another version of the ESDL")
+            energy_system_handler = _decode(snapshot, uri)
+        except Exception as e:
+            # Missing, outdated or incompatible snapshots are rebuilt
+            if path.exists():
+                logger.debug(f"Could not read the ESDL snapshot {path}: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return energy_system_handler
+
+    def write(self, key: str, energy_system: esdl.EnergySystem, name: Optional[str] = None) -> None:
+        """
+        Stores the snapshot of the energy system for the key.
+        """
+        path = self._path(key, name)
+        # Write to a temporary file first, such that concurrent runs never read partial files
+        try:
+            snapshot = {"key": key, **_encode(energy_system)}
+            self.folder.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except Exception as e:
+            logger.warning(f"Could not write the ESDL snapshot {path}: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            if self.folder.exists():
+                for path in self.folder.glob(f"*{SNAPSHOT_FILE_SUFFIX}"):
+                    path.unlink(missing_ok=True)
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,496 @@
+import dataclasses
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import esdl
+
+from mesido.esdl.common import Asset
+from mesido.esdl.connectivity_index import ConnectivityIndex
+from mesido.esdl.esdl_heat_model import MINIMUM_PIPE_LENGTH
+
+import numpy as np
+
+
+logger = logging.getLogger("mesido")
+
+NODE_ASSET_TYPES = {"Joint", "Bus"}
+CONNECTION_ASSET_TYPES = {"Pipe", "ElectricityCable"}
+
+# Attributes of a pipe that may differ between the segments of a merged pipe
+SEGMENT_ATTRIBUTES = {"id", "name", "shortName", "description", "length", "port", "geometry"}
+
+# The results of a merged pipe that are interpolated between its inlet and outlet (by the length
+# up to the inlet or outlet of a segment), or that are divided over the segments by their length.
+# All other results of a merged pipe, e.g. the flow and the pipe class, apply to every segment.
+INLET_VARIABLES = {".HeatIn.Heat", ".Heat_flow", ".HeatIn.H", ".HeatIn.Hydraulic_power"}
+OUTLET_VARIABLES = {".HeatOut.Heat", ".HeatOut.H", ".HeatOut.Hydraulic_power"}
+LENGTH_PROPORTIONAL_VARIABLES = {
+    ".dH",
+    ".Hydraulic_power",
+    ".__head_loss",
+    "__hn_heat_loss",
+    "__annualized_capex",
+    "__investment_cost",
+    "__installation_cost",
+    "__fixed_operational_cost",
+    "__variable_operational_cost",
+}
+
+
+class NetworkReduction:
+    """
+    The result of reduce_network(): the reduced assets and how they map to the assets of the
+    ESDL, such that the results of a problem of the reduced assets can be mapped back.
+
+    assets: dict with the assets of the reduced network, by id.
+    connectivity_index: ConnectivityIndex of the reduced network.
+    merged_pipes: dict with per merged pipe the names of its segments, in the direction of the
+        pipes. The merged pipe has the id and name of one of its segments.
+    collapsed_nodes: dict with per removed pass-through joint the name of the merged pipe.
+    pruned_assets: list with the names of the removed assets that cannot reach a demand.
+    """
+
+    def __init__(
+        self,
+        assets: Dict[str, Asset],
+        connectivity_index: ConnectivityIndex,
+        merged_pipes: Dict[str, List[str]],
+        collapsed_nodes: Dict[str, str],
+        pruned_assets: List[str],
+        segment_lengths: Dict[str, float],
+    ):
+        self.assets = assets
+        self.connectivity_index = connectivity_index
+        self.merged_pipes = merged_pipes
+        self.collapsed_nodes = collapsed_nodes
+        self.pruned_assets = pruned_assets
+        self._segment_lengths = segment_lengths
+        self._segment_to_pipe = {s: p for p, segments in merged_pipes.items() for s in segments}
+
+    def segments(self, name: str) -> List[str]:
+        """
+        Returns the names of the segments of a merged pipe, or the name itself for other assets.
+        """
+        return self.merged_pipes.get(name, [name])
+
+    def reduced_name(self, name: str) -> Optional[str]:
+        """
+        Returns the name of the asset of the reduced network that holds the asset of the ESDL, or
+        None if the asset is pruned.
+        """
+        if name in self._segment_to_pipe:
+            return self._segment_to_pipe[name]
+        if name in self.collapsed_nodes:
+            return self.collapsed_nodes[name]
+        if name in self.pruned_assets:
+            return None
+        return name
+
+    def expand_results(self, results, alias_relation=None) -> Dict[str, Any]:
+        """
+        Returns the results of the segments of the merged pipes, computed from the results of the
+        merged pipes, e.g. "<segment>.HeatOut.Heat" from "<merged pipe>.HeatIn.Heat" and
+        "<merged pipe>.HeatOut.Heat". The results of the other assets are not included.
+
+        Parameters
+        ----------
+        results : the results of the problem, e.g. from extract_results().
+        alias_relation : the alias relation of the problem, such that the results are also
+            expanded for the aliases of the variables, e.g. "<merged pipe>.Q".
+
+        Returns
+        -------
+        Dict with the results of the segments.
+        """
+        expanded = {}
+        if not self.merged_pipes:
+            return expanded
+
+        variables = list(results.keys())
+        if alias_relation is not None:
+            variables = [
+                alias
+                for variable in variables
+                for alias in alias_relation.aliases(variable)
+                if not alias.startswith("-")
+            ]
+
+        for variable in variables:
+            pipe, suffix = _split_variable(variable)
+            if pipe not in self.merged_pipes:
+                continue
+            value = results[variable]
+            if suffix in INLET_VARIABLES or suffix in OUTLET_VARIABLES:
+                if suffix in INLET_VARIABLES:
+                    inlet_suffix = suffix
+                    outlet_suffix = suffix.replace("HeatIn.", "HeatOut.").replace(
+                        ".Heat_flow", ".HeatOut.Heat"
+                    )
+                else:
+                    inlet_suffix = suffix.replace("HeatOut.", "HeatIn.")
+                    outlet_suffix = suffix
+                try:
+                    inlet = np.asarray(results[f"{pipe}{inlet_suffix}"])
+                    outlet = np.asarray(results[f"{pipe}{outlet_suffix}"])
+                except KeyError:
+                    continue
+            fractions = self._length_fractions(pipe)
+            start = 0.0
+            for segment, fraction in zip(self.merged_pipes[pipe], fractions):
+                end = start + fraction
+                if suffix in INLET_VARIABLES:
+                    expanded[f"{segment}{suffix}"] = inlet + start * (outlet - inlet)
+                elif suffix in OUTLET_VARIABLES:
+                    expanded[f"{segment}{suffix}"] = inlet + end * (outlet - inlet)
+                elif suffix in LENGTH_PROPORTIONAL_VARIABLES:
+                    expanded[f"{segment}{suffix}"] = fraction * np.asarray(value)
+                else:
+                    expanded[f"{segment}{suffix}"] = value
+                start = end
+
+        return expanded
+
+    def _length_fractions(self, pipe: str) -> List[float]:
+        lengths = [self._segment_lengths[s] for s in self.merged_pipes[pipe]]
+        total = sum(lengths)
+        return [length / total for length in lengths]
+
+
+def _split_variable(variable: str) -> Tuple[str, str]:
+    """
+    Returns the asset name and the rest of the variable name, e.g. ("Pipe1", ".HeatIn.Heat") or
+    ("Pipe1", "__hn_diameter").
+    """
+    indices = [i for i in (variable.find("."), variable.find("__")) if i > 0]
+    if not indices:
+        return variable, ""
+    i = min(indices)
+    return variable[:i], variable[i:]
+
+
+def _esdl_signature(obj, nested: bool = False) -> Tuple:
+    """
+    Returns the values of the attributes of the ESDL object and of the objects it contains,
+    without their ids and names, such that equal signatures give the same model.
+    """
+    items = [obj.eClass.name]
+    for feature in obj.eClass.eAllStructuralFeatures():
+        if feature.derived or feature.transient:
+            continue
+        name = feature.name
+        if name in ("id", "name") or (not nested and name in SEGMENT_ATTRIBUTES):
+            continue
+        value = obj.eGet(feature)
+        values = list(value) if feature.many else [value]
+        if feature.is_attribute:
+            items.append((name, tuple(str(v) for v in values)))
+        elif feature.containment:
+            items.append(
+                (name, tuple(None if v is None else _esdl_signature(v, True) for v in values))
+            )
+        elif nested and not (feature.eOpposite is not None and feature.eOpposite.containment):
+            # References to other objects, except the reference to the container
+            items.append((name, tuple(getattr(v, "id", None) for v in values)))
+    return tuple(items)
+
+
+def _has_installation_cost(asset: Asset) -> bool:
+    cost_information = asset.attributes["costInformation"]
+    if cost_information is None or cost_information.installationCosts is None:
+        return False
+    return bool(cost_information.installationCosts.value)
+
+
+def _has_costs(asset: Asset) -> bool:
+    cost_information = asset.attributes["costInformation"]
+    if cost_information is None:
+        return False
+    return any(
+        getattr(cost_information.eGet(feature), "value", None)
+        for feature in cost_information.eClass.eAllStructuralFeatures()
+    )
+
+
+def _is_fixed(asset: Asset) -> bool:
+    """
+    Returns whether the asset must be kept in the reduced network, because it is placed with costs
+    regardless of whether it can reach a demand.
+    """
+    return asset.attributes["state"].name == "ENABLED" and _has_costs(asset)
+
+
+def _is_return_pipe(name: str) -> bool:
+    return name.endswith("_ret")
+
+
+def _prune(
+    assets: Dict[str, Asset], index: ConnectivityIndex
+) -> Tuple[Set[str], Dict[str, List[esdl.Port]]]:
+    """
+    Returns the ids of the assets that cannot reach a demand, and the connected ports of the
+    ports of the other assets that are connected to them. Enabled assets with costs are kept,
+    together with the assets that connect them to the rest of the network, such that their costs
+    remain part of the objective and the KPIs.
+    """
+    pruned = set()
+    fixed = {a for a, asset in assets.items() if _is_fixed(asset)}
+    # A supply pipe and its return pipe are kept together
+    fixed_names = {assets[a].name for a in fixed}
+    fixed.update(
+        a
+        for a, asset in assets.items()
+        if asset.asset_type in CONNECTION_ASSET_TYPES
+        and (asset.name[: -len("_ret")] if _is_return_pipe(asset.name) else f"{asset.name}_ret")
+        in fixed_names
+    )
+
+    # Connected parts of the network without demands (or storage)
+    seen = set()
+    for asset_id in assets:
+        if asset_id in seen:
+            continue
+        part = []
+        stack = [asset_id]
+        seen.add(asset_id)
+        while stack:
+            a = stack.pop()
+            part.append(a)
+            for neighbour in index.neighbours(a):
+                if neighbour.id in assets and neighbour.id not in seen:
+                    seen.add(neighbour.id)
+                    stack.append(neighbour.id)
+        if not any(
+            issubclass(getattr(esdl, assets[a].asset_type), (esdl.Consumer, esdl.Storage))
+            or a in fixed
+            for a in part
+        ):
+            pruned.update(part)
+
+    # Dead ends: nodes with a single connection, and the pipes and cables to them, except for the
+    # fixed assets and the nodes they end at
+    def connected_assets(port):
+        return [
+            index.port_asset(p).id
+            for p in index.connected_ports(port)
+            if index.port_asset(p) is not None and index.port_asset(p).id not in pruned
+        ]
+
+    def n_connections(port):
+        return len(connected_assets(port))
+
+    changed = True
+    while changed:
+        changed = False
+        for asset in assets.values():
+            if asset.id in pruned or asset.id in fixed:
+                continue
+            ports = [*(asset.in_ports or []), *(asset.out_ports or [])]
+            neighbours = [a for p in ports for a in connected_assets(p)]
+            if (
+                asset.asset_type in NODE_ASSET_TYPES
+                and len(neighbours) <= 1
+                and not any(a in fixed for a in neighbours)
+            ) or (
+                asset.asset_type in CONNECTION_ASSET_TYPES
+                and any(n_connections(p) == 0 for p in ports)
+            ):
+                pruned.add(asset.id)
+                changed = True
+
+    connected_ports = {}
+    pruned_port_ids = {
+        p.id for a in pruned for p in [*(assets[a].in_ports or []), *(assets[a].out_ports or [])]
+    }
+    for asset_id, asset in assets.items():
+        if asset_id in pruned:
+            continue
+        for port in [*(asset.in_ports or []), *(asset.out_ports or [])]:
+            ports = index.connected_ports(port)
+            if any(p.id in pruned_port_ids for p in ports):
+                connected_ports[port.id] = [p for p in ports if p.id not in pruned_port_ids]
+    return pruned, connected_ports
+
+
+def _series_chains(
+    assets: Dict[str, Asset], index: ConnectivityIndex
+) -> Tuple[List[List[Asset]], Dict[Tuple[str, str], Asset]]:
+    """
+    Returns the chains of heat pipes in series that can be merged, in the direction of the pipes,
+    and per pair of consecutive pipes the pass-through joint between them (if any).
+    """
+
+    def is_candidate(asset):
+        if (
+            asset.asset_type != "Pipe"
+            or len(asset.in_ports) != 1
+            or len(asset.out_ports) != 1
+            or not isinstance(asset.in_ports[0].carrier, esdl.HeatCommodity)
+            or _has_installation_cost(asset)
+        ):
+            return False
+        # Pipes that are connected to other assets than pipes and joints can be disconnectable,
+        # which depends on the pipe itself and not on the chain.
+        return all(
+            c.connected_asset is not None and c.connected_asset.asset_type in {"Pipe", "Joint"}
+            for c in index.connections(asset.id)
+        )
+
+    signatures = {}
+
+    def signature(asset):
+        if asset.id not in signatures:
+            esdl_asset = asset.in_ports[0].energyasset
+            signatures[asset.id] = (
+                _is_return_pipe(asset.name),
+                asset.in_ports[0].carrier.id,
+                asset.out_ports[0].carrier.id,
+                _esdl_signature(esdl_asset),
+            )
+        return signatures[asset.id]
+
+    next_pipe = {}
+    joints = {}
+    for asset in assets.values():
+        if not is_candidate(asset):
+            continue
+        out_port = asset.out_ports[0]
+        connected = index.connected_ports(out_port)
+        if len(connected) != 1:
+            continue
+        downstream = index.port_asset(connected[0])
+        joint = None
+        if downstream.asset_type == "Joint":
+            joint = downstream
+            if (
+                len(index.connections(joint.id)) != 2
+                or connected[0] is not joint.in_ports[0]
+                or len(index.connected_ports(joint.out_ports[0])) != 1
+            ):
+                continue
+            connected = index.connected_ports(joint.out_ports[0])
+            downstream = index.port_asset(connected[0])
+        if (
+            downstream is None
+            or downstream.id == asset.id
+            or not is_candidate(downstream)
+            or connected[0] is not downstream.in_ports[0]
+            or len(index.connected_ports(downstream.in_ports[0])) != 1
+            or signature(asset) != signature(downstream)
+        ):
+            continue
+        next_pipe[asset.id] = downstream
+        if joint is not None:
+            joints[(asset.id, downstream.id)] = joint
+
+    has_previous = {a.id for a in next_pipe.values()}
+    chains = []
+    for asset_id in next_pipe:
+        if asset_id in has_previous:
+            continue
+        chain = [assets[asset_id]]
+        while chain[-1].id in next_pipe:
+            chain.append(next_pipe[chain[-1].id])
+        chains.append(chain)
+    return chains, joints
+
+
+def reduce_network(
+    assets: Dict[str, Asset], connectivity_index: Optional[ConnectivityIndex] = None
+) -> NetworkReduction:
+    """
+    Reduces the network of the assets before the model is generated, without changing the
+    optimal results:
+
+    - Assets that cannot reach a demand are removed, i.e. the parts of the network without demand
+      or storage, and dead-end joints with the pipes to them. Enabled assets with costs are
+      kept, as they are placed regardless, and so are the assets that connect them.
+    - Heat pipes in series, either connected directly or via a joint without other connections,
+      are merged into one pipe when they have the same properties (diameter, insulation, carrier,
+      state, costs). The length of the merged pipe is the sum of the (modelled) lengths of the
+      segments, such that heat losses, head losses and costs are the same. The joints between
+      the segments are removed. A supply pipe and its return pipe ("<name>_ret") are only merged
+      when the return segments are the return pipes of the supply segments.
+
+    The assets are not modified, the merged pipes are new assets.
+
+    Parameters
+    ----------
+    assets : dict with the assets by id, as parsed from the ESDL.
+    connectivity_index : ConnectivityIndex of the assets, built when not provided.
+
+    Returns
+    -------
+    NetworkReduction with the reduced assets and how to map them back to the assets of the ESDL.
+    """
+    if connectivity_index is None:
+        connectivity_index = ConnectivityIndex(assets)
+
+    pruned, connected_ports = _prune(assets, connectivity_index)
+    remaining = {k: v for k, v in assets.items() if k not in pruned}
+    index = ConnectivityIndex(remaining, connected_ports)
+
+    chains, joints = _series_chains(remaining, index)
+    chains_by_name = {tuple(a.name for a in chain): chain for chain in chains}
+    pipe_names = {a.name for a in remaining.values() if a.asset_type == "Pipe"}
+    chain_of_pipe = {a.name: names for names in chains_by_name for a in chains_by_name[names]}
+
+    merges = []
+    for names, chain in chains_by_name.items():
+        if _is_return_pipe(names[0]):
+            bases = [n[: -len("_ret")] for n in names]
+            if not any(b in pipe_names for b in bases):
+                merges.append((chain, names[0]))
+            continue
+        partners = [f"{n}_ret" for n in names]
+        if not any(p in pipe_names for p in partners):
+            merges.append((chain, names[0]))
+            continue
+        return_names = chain_of_pipe.get(partners[0])
+        if return_names is not None and set(return_names) == set(partners):
+            merges.append((chain, names[0]))
+            merges.append((chains_by_name[return_names], partners[0]))
+
+    replaced = {}
+    removed = set()
+    merged_pipes = {}
+    collapsed_nodes = {}
+    segment_lengths = {}
+    for chain, name in merges:
+        named = next(a for a in chain if a.name == name)
+        lengths = [max(a.attributes["length"], MINIMUM_PIPE_LENGTH) for a in chain]
+        in_port = chain[0].in_ports[0]
+        out_port = chain[-1].out_ports[0]
+        attributes = dict(named.attributes)
+        attributes["length"] = sum(lengths)
+        attributes["port"] = [in_port, out_port]
+        removed.update(a.id for a in chain)
+        replaced[named.id] = dataclasses.replace(
+            named, in_ports=[in_port], out_ports=[out_port], attributes=attributes
+        )
+        merged_pipes[name] = [a.name for a in chain]
+        segment_lengths.update({a.name: length for a, length in zip(chain, lengths)})
+        for upstream, downstream in zip(chain, chain[1:]):
+            joint = joints.get((upstream.id, downstream.id))
+            if joint is not None:
+                removed.add(joint.id)
+                collapsed_nodes[joint.name] = name
+    reduced = {
+        k: replaced.get(k, v) for k, v in remaining.items() if k not in removed or k in replaced
+    }
+
+    pruned_assets = [assets[a].name for a in pruned]
+    if pruned or merged_pipes:
+        logger.info(
+            f"Network reduction: merged {sum(len(s) for s in merged_pipes.values())} pipes into "
+            f"{len(merged_pipes)}, removed {len(collapsed_nodes)} pass-through joints and "
+            f"{len(pruned_assets)} assets that cannot reach a demand"
+        )
+
+    return NetworkReduction(
+        reduced,
+        ConnectivityIndex(reduced, connected_ports),
+        merged_pipes,
+        collapsed_nodes,
+        pruned_assets,
+        segment_lengths,
+    )
@@ -0,0 +1,124 @@
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import esdl.esdl_handler
+
+from mesido.esdl.common import Asset
+from mesido.esdl.connectivity_index import ConnectivityIndex
+from mesido.esdl.esdl_model_base import _ESDLModelBase
+from mesido.esdl.profile_parser import BaseProfileReader
+from mesido.topology import Topology
+
+
+class PreparedProblem:
+    """
+    This class holds the parts of an ESDL based optimization problem that are expensive to create
+    and that do not change between the stages of a staged optimization or the windows of a
+    sequential simulation: the parsed ESDL (assets, carriers and energy system handler), the
+    profile reader with the profiles it has read, the pycml model and the topology.
+
+    The first problem that is created with a prepared problem fills it, the problems that are
+    created with the same prepared problem afterwards take these parts from it instead of parsing
+    the ESDL, reading the profiles from file or database and building the model again. A prepared
+    problem is passed to a problem with the prepared_problem keyword argument, e.g.:
+
+    prepared_problem = PreparedProblem()
+    for stage in [1, 2]:
+        run_optimization_problem(
+            EndScenarioSizingStaged, stage=stage, prepared_problem=prepared_problem, **kwargs
+        )
+
+    Note that the problems share the ESDL objects, so changes made to the energy system by one
+    problem, e.g. writing the optimized ESDL in its post(), are visible to the problems that are
+    created after it.
+    """
+
+    def __init__(self):
+        self._source: Optional[Tuple] = None
+        self.esdl_assets: Optional[Dict[str, Asset]] = None
+        self.esdl_carriers: Optional[Dict[str, Dict[str, Any]]] = None
+        self.connectivity_index: Optional[ConnectivityIndex] = None
+        self.energy_system_handler: Optional[esdl.esdl_handler.EnergySystemHandler] = None
+        self.profile_reader: Optional[BaseProfileReader] = None
+        self.__models: Dict[Hashable, _ESDLModelBase] = {}
+        self.__topologies: Dict[int, Topology] = {}
+
+    @property
+    def is_prepared(self) -> bool:
+        """
+        Returns True when the ESDL and the profile reader have been stored in the prepared problem.
+        """
+        return self._source is not None
+
+    def check_source(self, source: Tuple) -> None:
+        """
+        Checks that a problem uses the same ESDL and profile input as the problem that filled the
+        prepared problem.
+
+        Parameters
+        ----------
+        source : Tuple with the parser and profile reader classes and their inputs.
+        """
+        if self._source != source:
+            raise ValueError(
+                "The prepared problem was created with a different ESDL or profile input"
+            )
+
+    def store(
+        self,
+        source: Tuple,
+        esdl_assets: Dict[str, Asset],
+        esdl_carriers: Dict[str, Dict[str, Any]],
+        energy_system_handler: esdl.esdl_handler.EnergySystemHandler,
+        profile_reader: BaseProfileReader,
+        connectivity_index: Optional[ConnectivityIndex] = None,
+    ) -> None:
+        """
+        Stores the parsed ESDL and the profile reader of the first problem.
+
+        Parameters
+        ----------
+        source : Tuple with the parser and profile reader classes and their inputs.
+        esdl_assets : Dict with the parsed ESDL assets.
+        esdl_carriers : Dict with the carrier properties.
+        energy_system_handler : The energy system handler of the parsed ESDL.
+        profile_reader : The profile reader, which keeps the profiles once they are read.
+        connectivity_index : The index of how the parsed ESDL assets are connected.
+        """
+        self._source = source
+        self.esdl_assets = esdl_assets
+        self.esdl_carriers = esdl_carriers
+        self.energy_system_handler = energy_system_handler
+        self.profile_reader = profile_reader
+        self.connectivity_index = connectivity_index
+
+    def model(self, key: Hashable, build: Callable[[], _ESDLModelBase]) -> _ESDLModelBase:
+        """
+        Returns the pycml model for the key, the model is built when it is requested for the
+        first time.
+
+        Parameters
+        ----------
+        key : Hashable that identifies the model, e.g. the model class and options.
+        build : Function that builds the model.
+
+        Returns
+        -------
+        The pycml model.
+        """
+        try:
+            return self.__models[key]
+        except KeyError:
+            model = self.__models[key] = build()
+            return model
+
+    def topology(self, model: _ESDLModelBase) -> Optional[Topology]:
+        """
+        Returns the topology that was constructed for the model, or None if there is none yet.
+        """
+        return self.__topologies.get(id(model))
+
+    def set_topology(self, model: _ESDLModelBase, topology: Topology) -> None:
+        """
+        Stores the topology that was constructed for the model.
+        """
+        self.__topologies[id(model)] = topology
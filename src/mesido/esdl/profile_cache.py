@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import numpy as np
+
+import pandas as pd
+
+
+logger = logging.getLogger("mesido")
+
+# Increase when the way the profiles are stored changes, such that profiles stored by an older
+# version are no longer used.
+CACHE_FORMAT_VERSION = 1
+
+PROFILE_FILE_SUFFIX = ".profile.npz"
+
+DEFAULT_PROFILE_CACHE_MAX_SIZE_BYTES = 1024**3
+
+
+class ProfileCache:
+    """
+    Persistent on-disk cache of profile time series, such that repeated runs (e.g. the stages of
+    a workflow, or a batch of runs of the same ESDL) do not have to read the same profiles from
+    the database again.
+
+    Every profile is stored in its own file, named by the hash of the attributes that determine
+    its data (for InfluxDB profiles e.g. the host, database, measurement, field and the start and
+    end date). The files are compressed numpy archives of the UTC timestamps and the values.
+
+    When the total size of the stored profiles exceeds `max_size_bytes`, the least recently used
+    profiles are removed. The modification time of a file is used as its last access time.
+    """
+
+    def __init__(
+        self,
+        folder: Union[str, Path],
+        max_size_bytes: int = DEFAULT_PROFILE_CACHE_MAX_SIZE_BYTES,
+    ):
+        self.folder = Path(folder)
+        self.max_size_bytes = max_size_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(**kwargs) -> str:
+        """
+        Returns the content hash of the profile attributes.
+        """
+        items = [f"version={CACHE_FORMAT_VERSION}"]
+        for name in sorted(kwargs):
+            value = kwargs[name]
+            if hasattr(value, "isoformat"):
+                value = value.isoformat()
+            items.append(f"{name}={value}")
+        return hashlib.sha256(";".join(items).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.folder / f"{key}{PROFILE_FILE_SUFFIX}"
+
+    def read(self, key: str) -> Optional[pd.Series]:
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                index = pd.DatetimeIndex(data["index"].astype("datetime64[ns]"))
+                if bool(data["tz_aware"]):
+                    index = index.tz_localize("UTC")
+                series = pd.Series(data=data["values"], index=index)
+        except (OSError, KeyError, ValueError):
+            return None
+
+        try:
+            # Mark as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return series
+
+    def write(self, key: str, series: pd.Series) -> None:
+        index = pd.DatetimeIndex(series.index)
+        tz_aware = index.tz is not None
+        if tz_aware:
+            index = index.tz_convert("UTC").tz_localize(None)
+
+        path = self._path(key)
+        # Write to a temporary file first, such that concurrent runs never read partial files
+        try:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    index=index.values.astype(np.int64),
+                    values=series.to_numpy(dtype=float),
+                    tz_aware=tz_aware,
+                )
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write profile to the cache {path}: {e}")
+            return
+
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            try:
+                entries = [
+                    (e.stat().st_mtime, e.stat().st_size, e.path)
+                    for e in os.scandir(self.folder)
+                    if e.name.endswith(PROFILE_FILE_SUFFIX)
+                ]
+            except OSError:
+                return
+
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total_size -= size
+                except OSError:
+                    pass
+
+    def get(self, key: str, load: Callable[[], pd.Series]) -> pd.Series:
+        """
+        Returns the profile for the key from the cache, or loads it with `load` and stores it in
+        the cache if it is not there yet.
+        """
+        series = self.read(key)
+        if series is not None:
+            with self._lock:
+                self.hits += 1
+            return series
+
+        with self._lock:
+            self.misses += 1
+        series = load()
+        self.write(key, series)
+        return series
+
+    def clear(self) -> None:
+        with self._lock:
+            if self.folder.exists():
+                for path in self.folder.glob(f"*{PROFILE_FILE_SUFFIX}"):
+                    path.unlink()
+            self.hits = 0
+            self.misses = 0
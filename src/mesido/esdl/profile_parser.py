@@ -1,15 +1,22 @@
 import datetime
+import hashlib
 import logging
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, Set
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
 
 import esdl
-from esdl.profiles.influxdbprofilemanager import ConnectionSettings
-from esdl.profiles.influxdbprofilemanager import InfluxDBProfileManager
 from esdl.units.conversion import ENERGY_IN_J, POWER_IN_W, convert_to_unit
 
+from mesido.esdl._influxdb_profile_fetching import (
+    InfluxDBProfileKey,
+    influxdb_connection_pool,
+    influxdb_connection_settings,
+    influxdb_profile_key,
+)
 from mesido.esdl.common import Asset
+from mesido.esdl.profile_cache import ProfileCache
 
 import numpy as np
 
@@ -21,13 +28,48 @@ from rtctools.data.storage import DataStore
 
 logger = logging.getLogger()
 
-influx_cred_map = {"wu-profiles.esdl-beta.hesi.energy:443": ("warmingup", "warmingup")}
-
 
 class _ProfileParserException(Exception):
     pass
 
 
+class _SharedProfileStore:
+    """
+    Store of the profile arrays of all ensemble members, in which identical profiles are only
+    stored once. The arrays are read-only, such that they can be shared between the ensemble
+    members and passed to the DataStore without copying. Code that wants to change a profile
+    should make a copy of it first.
+    """
+
+    def __init__(self):
+        self._arrays: Dict[Tuple[Tuple[int, ...], bytes], np.ndarray] = {}
+        self._shared_ids: Set[int] = set()
+
+    def share(self, values: Union[np.ndarray, pd.Series, List[float]]) -> np.ndarray:
+        """
+        Returns the read-only shared array with the same content as `values`.
+        """
+        if id(values) in self._shared_ids:
+            return values
+
+        values = np.asarray(values, dtype=float)
+        key = (values.shape, hashlib.sha1(values.tobytes()).digest())
+        try:
+            return self._arrays[key]
+        except KeyError:
+            pass
+
+        # Our own copy, such that changes to the original values do not change the profile
+        shared = np.array(values, dtype=float)
+        shared.flags.writeable = False
+        self._arrays[key] = shared
+        self._shared_ids.add(id(shared))
+        return shared
+
+    def __len__(self) -> int:
+        return len(self._arrays)
+
+
 class BaseProfileReader:
     component_type_to_var_name_map: dict = {
         "cold_demand": ".target_cold_demand",
@@ -43,6 +85,7 @@ class BaseProfileReader:
 
     def __init__(self, energy_system: esdl.EnergySystem, file_path: Optional[Path]):
         self._profiles: Dict[int, Dict[str, np.ndarray]] = defaultdict(dict)
+        self._shared_profiles = _SharedProfileStore()
         self._energy_system: esdl.EnergySystem = energy_system
         self._file_path: Optional[Path] = file_path
         self._reference_datetimes: Optional[pd.DatetimeIndex] = None
@@ -51,6 +94,11 @@ class BaseProfileReader:
             "cold_demand.power": {},  # error type, cold demand name, error message
             "heat_demand.type": {},  # error type, heat demand name, error message
         }
+        # Optional on-disk cache, which is checked before reading profiles from their source
+        self.profile_cache: Optional[ProfileCache] = None
+        # The ensemble size for which the profiles were loaded, a reader that is reused (see
+        # PreparedProblem) does not load them again.
+        self._loaded_ensemble_size: Optional[int] = None
 
     def read_profiles(
         self,
@@ -88,12 +136,14 @@ class BaseProfileReader:
         -------
         None
         """
-        self._load_profiles_from_source(
-            energy_system_components=energy_system_components,
-            esdl_asset_id_to_name_map=esdl_asset_id_to_name_map,
-            carrier_properties=carrier_properties,
-            ensemble_size=ensemble_size,
-        )
+        if self._loaded_ensemble_size != ensemble_size:
+            self._load_profiles_from_source(
+                energy_system_components=energy_system_components,
+                esdl_asset_id_to_name_map=esdl_asset_id_to_name_map,
+                carrier_properties=carrier_properties,
+                ensemble_size=ensemble_size,
+            )
+            self._loaded_ensemble_size = ensemble_size
 
         try:
             io.reference_datetime = self._reference_datetimes[0]
@@ -114,7 +164,7 @@ class BaseProfileReader:
                         "power"
                     ]
                     if profile is not None:
-                        values = profile
+                        values = self._shared_profiles.share(profile)
                     else:
                         if "heat_demand" not in component_type:
                             # We don't set a default profile for source targets
@@ -123,7 +173,9 @@ class BaseProfileReader:
                             f"No profile provided for {component=} and "
                             f"{ensemble_member=}, using the assets power value instead"
                         )
-                        values = np.array([asset_power] * len(self._reference_datetimes))
+                        values = self._shared_profiles.share(
+                            np.full(len(self._reference_datetimes), asset_power)
+                        )
 
                     io.set_timeseries(
                         variable=component + var_name,
@@ -156,11 +208,30 @@ class BaseProfileReader:
                     io.set_timeseries(
                         variable=carrier_name + self.carrier_profile_var_name,
                         datetimes=self._reference_datetimes,
-                        values=profile,
+                        values=self._shared_profiles.share(profile),
                         ensemble_member=ensemble_member,
                     )
         return self._asset_potential_errors_identified
 
+    def _get_cached_profile(self, load: Callable[[], pd.Series], **attributes) -> pd.Series:
+        """
+        Returns the profile identified by the attributes from the profile cache, if a cache is
+        set. Otherwise, or if the profile is not in the cache yet, the profile is loaded with the
+        `load` function.
+
+        Parameters
+        ----------
+        load : Function that loads the profile from its source, e.g. a database
+        attributes : The attributes that uniquely determine the data of the profile
+
+        Returns
+        -------
+        A pandas Series of the profile.
+        """
+        if self.profile_cache is None:
+            return load()
+        return self.profile_cache.get(ProfileCache.key(**attributes), load)
+
     def _load_profiles_from_source(
         self,
         energy_system_components: Dict[str, Set[str]],
@@ -172,7 +243,9 @@ class BaseProfileReader:
         This function must be implemented by the child. It must load the available
         profiles for demands and sources from the correct source and saves them in the _profiles
         attribute. It must also set the _reference_datetime_index attribute to the correct
-        index to be used in the DataStore when loading the profiles
+        index to be used in the DataStore when loading the profiles. Profiles that are the same
+        for all ensemble members should be shared between them, preferably as the read-only
+        arrays returned by _shared_profiles.share().
 
         Parameters
         ----------
@@ -203,9 +276,8 @@ class InfluxDBProfileReader(BaseProfileReader):
         esdl.esdl.GasProducer: ".maximum_gas_source",
     }
 
-    def __init__(self, energy_system: esdl.EnergySystem, file_path: Optional[Path]):
-        super().__init__(energy_system=energy_system, file_path=file_path)
-        self._df = pd.DataFrame()
+    # Maximum number of profiles that are read from the database at the same time
+    max_concurrent_requests: int = 8
 
     def _load_profiles_from_source(
         self,
@@ -218,72 +290,43 @@ class InfluxDBProfileReader(BaseProfileReader):
         logger.info("Reading profiles from InfluxDB")
         self._reference_datetimes = None
 
-        # Get list of unique profiles and associated series based on specific profile attributes
-        unique_profiles = []
-        unique_profiles_attributes = []  # a list containning lists of attributes
-        unique_series = []
-        for profile in [
+        influxdb_profiles = [
             x for x in self._energy_system.eAllContents() if isinstance(x, esdl.InfluxDBProfile)
-        ]:
-            if [
-                profile.database,
-                profile.field,
-                profile.host,
-                profile.startDate,
-                profile.endDate,
-                profile.measurement,
-                profile.port,
-            ] not in unique_profiles_attributes:
-                unique_profiles_attributes.append(
-                    [
-                        profile.database,
-                        profile.field,
-                        profile.host,
-                        profile.startDate,
-                        profile.endDate,
-                        profile.measurement,
-                        profile.port,
-                    ]
-                )
-                unique_profiles.append(profile)
+        ]
+
+        # Get the unique profiles based on specific profile attributes, such that every time
+        # series is only read once from the database
+        unique_profiles: Dict[InfluxDBProfileKey, esdl.InfluxDBProfile] = {}
+        for profile in influxdb_profiles:
+            unique_profiles.setdefault(influxdb_profile_key(profile), profile)
+
+        unique_series = dict(
+            zip(
+                unique_profiles.keys(),
+                self._load_profile_timeseries_concurrently(list(unique_profiles.values())),
+            )
+        )
 
-                unique_series.append(
-                    self._load_profile_timeseries_from_database(profile=unique_profiles[-1])
-                )
-                self._check_profile_time_series(
-                    profile_time_series=unique_series[-1], profile=unique_profiles[-1]
-                )
-                if self._reference_datetimes is None:
-                    # TODO: since the previous function ensures it's a date time index, I'm not sure
-                    #  how to get rid of this type checking warning
-                    self._reference_datetimes = unique_series[-1].index
-                else:
-                    if not all(unique_series[-1].index == self._reference_datetimes):
-                        raise RuntimeError(
-                            f"Obtained a profile for asset {profile.field} with a "
-                            f"timeseries index that doesn't match the timeseries of "
-                            f"other assets. Please ensure that the profile that is "
-                            f"specified to be loaded for each asset covers exactly the "
-                            f"same timeseries. "
-                        )
+        for key, profile in unique_profiles.items():
+            self._check_profile_time_series(profile_time_series=unique_series[key], profile=profile)
+            if self._reference_datetimes is None:
+                # TODO: since the previous function ensures it's a date time index, I'm not sure
+                #  how to get rid of this type checking warning
+                self._reference_datetimes = unique_series[key].index
+            else:
+                if not all(unique_series[key].index == self._reference_datetimes):
+                    raise RuntimeError(
+                        f"Obtained a profile for asset {profile.field} with a "
+                        f"timeseries index that doesn't match the timeseries of "
+                        f"other assets. Please ensure that the profile that is "
+                        f"specified to be loaded for each asset covers exactly the "
+                        f"same timeseries. "
+                    )
         # Loop trough all the requried profiles in the energy system and assign the profile data:
         # - series: use the unique series data, without reading from the database again
         # - other profile info: get it from the specific profile
-        for profile in [
-            x for x in self._energy_system.eAllContents() if isinstance(x, esdl.InfluxDBProfile)
-        ]:
-            index_of_unique_profile = unique_profiles_attributes.index(
-                [
-                    profile.database,
-                    profile.field,
-                    profile.host,
-                    profile.startDate,
-                    profile.endDate,
-                    profile.measurement,
-                    profile.port,
-                ]
-            )
-            series = unique_series[index_of_unique_profile]
+        for profile in influxdb_profiles:
+            series = unique_series[influxdb_profile_key(profile)]
             self._check_profile_time_series(profile_time_series=series, profile=profile)
             converted_dataframe = self._convert_profile_to_correct_unit(
                 profile_time_series=series, profile=profile
@@ -318,16 +361,52 @@ class InfluxDBProfileReader(BaseProfileReader):
                     f"Got a profile for a {container}. Currently only profiles "
                     f"for assets and commodities are supported"
                 )
-            profiles[var_base_name + variable_suffix] = converted_dataframe * profile.multiplier
+            profiles[var_base_name + variable_suffix] = self._shared_profiles.share(
+                converted_dataframe * profile.multiplier
+            )
 
+        # The ensemble members share the same profile arrays
         for idx in range(ensemble_size):
             self._profiles[idx] = profiles.copy()
 
-    # @staticmethod
+    def _load_profile_timeseries_concurrently(
+        self, profiles: List[esdl.InfluxDBProfile]
+    ) -> List[pd.Series]:
+        """
+        Function to load the time series of multiple profiles, using at most
+        max_concurrent_requests threads that each read a profile from the database.
+
+        Parameters
+        ----------
+        profiles : The InfluxDBProfiles for which the time series should be read
+
+        Returns
+        -------
+        A list with a pandas Series for every profile, in the same order as the profiles.
+        """
+        n_workers = min(self.max_concurrent_requests, len(profiles))
+        if n_workers <= 1:
+            return [self._load_profile_timeseries(profile) for profile in profiles]
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            return list(executor.map(self._load_profile_timeseries, profiles))
+
+    def _load_profile_timeseries(self, profile: esdl.InfluxDBProfile) -> pd.Series:
+        """
+        Function to load the time series of a profile from the profile cache, or from the
+        database if it is not in the cache.
+        """
+        return self._get_cached_profile(
+            lambda: self._load_profile_timeseries_from_database(profile),
+            source="influxdb",
+            **influxdb_profile_key(profile)._asdict(),
+        )
+
     def _load_profile_timeseries_from_database(self, profile: esdl.InfluxDBProfile) -> pd.Series:
         """
         Function to load the profiles from an InfluxDB. Returns a timeseries with the data for
-        the asset.
+        the asset. The connections to the database are taken from a pool, such that they are
+        reused for all profiles of the same host and database.
 
         Parameters
         ----------
@@ -337,65 +416,35 @@ class InfluxDBProfileReader(BaseProfileReader):
         -------
         A pandas Series of the profile for the asset.
         """
-        if profile.id in self._df:
-            return self._df[profile.id]
-
-        profile_host = profile.host
-
-        ssl_setting = False
-        if "https" in profile_host:
-            profile_host = profile_host[8:]
-            ssl_setting = True
-        elif "http" in profile_host:
-            profile_host = profile_host[7:]
-        if profile.port == 443:
-            ssl_setting = True
-        influx_host = "{}:{}".format(profile_host, profile.port)
-
-        # TODO: remove hard-coded database credentials, should probably be read from a settings file
-        if influx_host in influx_cred_map:
-            (username, password) = influx_cred_map[influx_host]
-        else:
-            username = None
-            password = None
-
-        conn_settings = ConnectionSettings(
-            host=profile.host,
-            port=profile.port,
-            username=username,
-            password=password,
-            database=profile.database,
-            ssl=ssl_setting,
-            verify_ssl=ssl_setting,
-        )
-        time_series_data = InfluxDBProfileManager(conn_settings)
+        conn_settings = influxdb_connection_settings(profile)
 
-        time_series_data.load_influxdb(
-            profile.measurement,
-            [profile.field],
-            profile.startDate,
-            profile.endDate,
-        )
+        with influxdb_connection_pool.connection(conn_settings) as time_series_data:
+            time_series_data.load_influxdb(
+                profile.measurement,
+                [profile.field],
+                profile.startDate,
+                profile.endDate,
+            )
+            profile_data_list = time_series_data.profile_data_list
 
-        for x in time_series_data.profile_data_list:
+        for x in profile_data_list:
             if len(x) != 2:
                 raise RuntimeError(
                     "InfluxDB profile currently only supports parsing exactly one "
                     "profile for each asset"
                 )
 
-        if not time_series_data.profile_data_list[0][0].tzinfo:
+        if not profile_data_list[0][0].tzinfo:
             index = pd.DatetimeIndex(
-                data=[x[0] for x in time_series_data.profile_data_list],
+                data=[x[0] for x in profile_data_list],
                 tz=datetime.timezone.utc,
             )
             logger.warning("No timezone specified for the input profile: default UTC has been used")
         else:
-            index = pd.DatetimeIndex(data=[x[0] for x in time_series_data.profile_data_list])
+            index = pd.DatetimeIndex(data=[x[0] for x in profile_data_list])
 
-        data = [x[1] for x in time_series_data.profile_data_list]
+        data = [x[1] for x in profile_data_list]
         series = pd.Series(data=data, index=index)
-        self._df[profile.id] = series
 
         return series
 
@@ -491,6 +540,17 @@ class InfluxDBProfileReader(BaseProfileReader):
 
 
 class ProfileReaderFromFile(BaseProfileReader):
+    # Readers for the supported tabular file formats. Note that Parquet and Feather files require
+    # pyarrow (or fastparquet for Parquet) to be installed.
+    _table_readers = {
+        ".csv": pd.read_csv,
+        ".parquet": pd.read_parquet,
+        ".feather": pd.read_feather,
+    }
+
+    # Supported formats of the date time strings, which are tried in this order
+    _datetime_formats = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d-%m-%Y %H:%M"]
+
     def __init__(self, energy_system: esdl.EnergySystem, file_path: Path):
         super().__init__(energy_system=energy_system, file_path=file_path)
 
@@ -509,8 +569,9 @@ class ProfileReaderFromFile(BaseProfileReader):
                 energy_system_components=energy_system_components,
                 esdl_asset_id_to_name_map=esdl_asset_id_to_name_map,
             )
-        elif self._file_path.suffix == ".csv":
-            self._load_csv(
+        elif self._file_path.suffix in self._table_readers:
+            self._load_table(
+                data=self._table_readers[self._file_path.suffix](self._file_path),
                 energy_system_components=energy_system_components,
                 carrier_properties=carrier_properties,
                 ensemble_size=ensemble_size,
@@ -520,62 +581,74 @@ class ProfileReaderFromFile(BaseProfileReader):
                 f"Unsupported profile file extension " f"{self._file_path.suffix}"
             )
 
-    def _load_csv(
+    @classmethod
+    def _parse_datetimes(cls, datetimes: pd.Series) -> pd.DatetimeIndex:
+        """
+        Parses the DateTime column of a profile table to a UTC DatetimeIndex. The column can
+        either contain strings in one of the supported formats, or datetimes (e.g. in Parquet
+        files).
+        """
+        if pd.api.types.is_datetime64_any_dtype(datetimes):
+            index = pd.DatetimeIndex(datetimes)
+            if index.tz is None:
+                return index.tz_localize(datetime.timezone.utc)
+            return index.tz_convert(datetime.timezone.utc)
+
+        datetimes = datetimes.astype(str).str.replace("Z", "", regex=False)
+        for datetime_format in cls._datetime_formats:
+            try:
+                index = pd.DatetimeIndex(
+                    pd.to_datetime(datetimes, format=datetime_format, exact=True)
+                )
+            except ValueError:
+                continue
+            if index.tz is None:
+                return index.tz_localize(datetime.timezone.utc)
+            return index.tz_convert(datetime.timezone.utc)
+
+        raise _ProfileParserException("Date time string is not in a supported format")
+
+    def _load_table(
         self,
+        data: pd.DataFrame,
         energy_system_components: Dict[str, Set[str]],
         carrier_properties: Dict[str, Dict],
         ensemble_size: int,
     ) -> None:
-        data = pd.read_csv(self._file_path)
-        try:
-            timeseries_import_times = [
-                datetime.datetime.strptime(entry.replace("Z", ""), "%Y-%m-%d %H:%M:%S").replace(
-                    tzinfo=datetime.timezone.utc
-                )
-                for entry in data["DateTime"].to_numpy()
-            ]
-        except ValueError:
-            try:
-                timeseries_import_times = [
-                    datetime.datetime.strptime(entry.replace("Z", ""), "%Y-%m-%dT%H:%M:%S").replace(
-                        tzinfo=datetime.timezone.utc
-                    )
-                    for entry in data["DateTime"].to_numpy()
-                ]
-            except ValueError:
-                try:
-                    timeseries_import_times = [
-                        datetime.datetime.strptime(
-                            entry.replace("Z", ""), "%d-%m-%Y %H:%M"
-                        ).replace(tzinfo=datetime.timezone.utc)
-                        for entry in data["DateTime"].to_numpy()
-                    ]
-                except ValueError:
-                    raise _ProfileParserException("Date time string is not in a supported format")
+        """
+        Loads the profiles from a table with a DateTime column and a column per asset (named by
+        the asset name without spaces) or carrier (named by the carrier name).
+        """
+        timeseries_import_times = self._parse_datetimes(data["DateTime"])
 
         logger.warning("Timezone specification not supported yet: default UTC has been used")
 
-        self._reference_datetimes = timeseries_import_times
+        self._reference_datetimes = timeseries_import_times.to_pydatetime().tolist()
+
+        # Map the profile variables to their columns, and convert all those columns in one pass
+        variable_to_column = {}
+        for component_type, var_name in self.component_type_to_var_name_map.items():
+            for component_name in energy_system_components.get(component_type, []):
+                column = component_name.replace(" ", "")
+                if column in data.columns:
+                    variable_to_column[component_name + var_name] = column
+        for properties in carrier_properties.values():
+            carrier_name = properties.get("name")
+            if carrier_name in data.columns:
+                variable_to_column[carrier_name + self.carrier_profile_var_name] = carrier_name
+
+        columns = list(dict.fromkeys(variable_to_column.values()))
+        values = data[columns].to_numpy(dtype=float).T
+        column_values = {
+            column: self._shared_profiles.share(v) for column, v in zip(columns, values)
+        }
 
+        # The ensemble members share the same profile arrays
+        profiles = {
+            variable: column_values[column] for variable, column in variable_to_column.items()
+        }
         for ensemble_member in range(ensemble_size):
-            for component_type, var_name in self.component_type_to_var_name_map.items():
-                for component_name in energy_system_components.get(component_type, []):
-                    try:
-                        values = data[f"{component_name.replace(' ', '')}"].to_numpy()
-                    except KeyError:
-                        pass
-                    else:
-                        self._profiles[ensemble_member][component_name + var_name] = values
-            for properties in carrier_properties.values():
-                carrier_name = properties.get("name")
-                try:
-                    values = data[carrier_name].to_numpy()
-                except KeyError:
-                    pass
-                else:
-                    self._profiles[ensemble_member][
-                        carrier_name + self.carrier_profile_var_name
-                    ] = values
+            self._profiles[ensemble_member].update(profiles)
 
     def _load_xml(self, energy_system_components, esdl_asset_id_to_name_map):
         timeseries_import_basename = self._file_path.stem
@@ -607,7 +680,7 @@ class ProfileReaderFromFile(BaseProfileReader):
         # Offer input timeseries to IOMixin
         for ensemble_member in range(data.ensemble_size):
             for variable, values in data.items(ensemble_member):
-                self._profiles[ensemble_member][variable] = values
+                self._profiles[ensemble_member][variable] = self._shared_profiles.share(values)
 
 
 class _ESDLInputDataConfig:
@@ -0,0 +1,182 @@
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+import CoolProp as cP
+
+from mesido.network_common import NetworkSettings
+
+import numpy as np
+
+
+logger = logging.getLogger("mesido")
+
+
+FLUID_WATER = "WATER"
+FLUID_WATER_INCOMPRESSIBLE = "INCOMP::Water"
+FLUID_HYDROGEN = str(NetworkSettings.NETWORK_TYPE_HYDROGEN).upper()
+FLUID_GRONINGEN_GAS = str(NetworkSettings.NETWORK_COMPOSITION_GAS)
+
+# Default grid ranges, temperatures in [K] and pressures in [Pa], for the fluids used in the
+# different network types. Note that building a grid for the Groningen gas mixture is relatively
+# expensive, as every CoolProp call for the mixture takes in the order of 0.1s.
+DEFAULT_GRIDS = {
+    FLUID_WATER: (
+        273.15 + np.arange(0.0, 152.5, 2.5),
+        np.array([0.5e6]),
+        ("V", "D"),
+    ),
+    FLUID_WATER_INCOMPRESSIBLE: (
+        273.15 + np.arange(0.0, 152.5, 2.5),
+        np.array([16.0e5]),
+        ("D",),
+    ),
+    FLUID_HYDROGEN: (
+        273.15 + np.arange(-10.0, 55.0, 5.0),
+        np.array([1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0, 100.0]) * 1.0e5,
+        ("V", "D", "U"),
+    ),
+    FLUID_GRONINGEN_GAS: (
+        273.15 + np.arange(-10.0, 55.0, 5.0),
+        np.array([1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0, 100.0]) * 1.0e5,
+        ("V", "D", "U"),
+    ),
+}
+
+
+class FluidPropertyGrid:
+    """
+    Table of a single fluid property on a (temperature, pressure) grid, which is evaluated with
+    bilinear interpolation. An axis with only one value is not interpolated, meaning that the
+    grid only covers that exact temperature or pressure.
+    """
+
+    def __init__(self, temperatures: np.ndarray, pressures: np.ndarray, values: np.ndarray):
+        self.temperatures = np.asarray(temperatures, dtype=float)
+        self.pressures = np.asarray(pressures, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+
+        assert self.values.shape == (len(self.temperatures), len(self.pressures))
+        assert np.all(np.diff(self.temperatures) > 0.0)
+        assert np.all(np.diff(self.pressures) > 0.0)
+
+    def contains(self, temperature: float, pressure: float) -> bool:
+        return (
+            self.temperatures[0] <= temperature <= self.temperatures[-1]
+            and self.pressures[0] <= pressure <= self.pressures[-1]
+        )
+
+    @staticmethod
+    def _weights(axis: np.ndarray, x: float) -> Tuple[int, int, float]:
+        if len(axis) == 1:
+            return 0, 0, 0.0
+        i = int(np.clip(np.searchsorted(axis, x, side="right") - 1, 0, len(axis) - 2))
+        w = (x - axis[i]) / (axis[i + 1] - axis[i])
+        return i, i + 1, w
+
+    def __call__(self, temperature: float, pressure: float) -> float:
+        i0, i1, wt = self._weights(self.temperatures, temperature)
+        j0, j1, wp = self._weights(self.pressures, pressure)
+
+        v = self.values
+        return float(
+            (1.0 - wt) * (1.0 - wp) * v[i0, j0]
+            + wt * (1.0 - wp) * v[i1, j0]
+            + (1.0 - wt) * wp * v[i0, j1]
+            + wt * wp * v[i1, j1]
+        )
+
+
+class FluidPropertyService:
+    """
+    Memoized access to the CoolProp fluid properties used in MESIDO. Every distinct
+    (property, temperature, pressure, fluid) combination is only computed once by CoolProp.
+
+    Optionally, interpolation grids can be added per fluid and property with :py:meth:`add_grid`
+    or :py:meth:`add_default_grids`. Lookups that fall within a grid are then interpolated
+    instead of calling CoolProp. Lookups outside of the grid fall back to the memoized CoolProp
+    call.
+
+    Temperatures are in [K] and pressures in [Pa], just like for CoolProp.
+    """
+
+    def __init__(self):
+        self._cache: Dict[Tuple[str, float, float, str], float] = {}
+        self._grids: Dict[Tuple[str, str], FluidPropertyGrid] = {}
+        self.coolprop_calls = 0
+        self.cache_hits = 0
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._grids.clear()
+        self.coolprop_calls = 0
+        self.cache_hits = 0
+
+    def _coolprop(self, output: str, temperature: float, pressure: float, fluid: str) -> float:
+        key = (output, float(temperature), float(pressure), fluid)
+        try:
+            value = self._cache[key]
+            self.cache_hits += 1
+        except KeyError:
+            value = cP.CoolProp.PropsSI(output, "T", temperature, "P", pressure, fluid)
+            self._cache[key] = value
+            self.coolprop_calls += 1
+        return value
+
+    def props_si(self, output: str, temperature: float, pressure: float, fluid: str) -> float:
+        """
+        Returns the fluid property `output` (CoolProp naming, e.g. "D" for density) at the given
+        temperature and pressure.
+        """
+        grid = self._grids.get((fluid, output))
+        if grid is not None and grid.contains(temperature, pressure):
+            return grid(temperature, pressure)
+        return self._coolprop(output, temperature, pressure, fluid)
+
+    def density(self, temperature: float, pressure: float, fluid: str) -> float:
+        return self.props_si("D", temperature, pressure, fluid)
+
+    def internal_energy(self, temperature: float, pressure: float, fluid: str) -> float:
+        return self.props_si("U", temperature, pressure, fluid)
+
+    def kinematic_viscosity(self, temperature: float, pressure: float, fluid: str) -> float:
+        # Kinematic viscosity [m2/s] = Dynamic viscosity [Pa-s] / density [kg/m3]
+        return self.props_si("V", temperature, pressure, fluid) / self.props_si(
+            "D", temperature, pressure, fluid
+        )
+
+    def add_grid(
+        self,
+        fluid: str,
+        temperatures: Iterable[float],
+        pressures: Iterable[float],
+        outputs: Iterable[str] = ("V", "D", "U"),
+    ) -> None:
+        """
+        Precomputes the properties `outputs` of the fluid on the grid spanned by `temperatures`
+        and `pressures`, such that later lookups within the grid are interpolated.
+        """
+        temperatures = np.asarray(temperatures, dtype=float)
+        pressures = np.asarray(pressures, dtype=float)
+
+        for output in outputs:
+            values = np.array(
+                [[self._coolprop(output, t, p, fluid) for p in pressures] for t in temperatures]
+            )
+            self._grids[(fluid, output)] = FluidPropertyGrid(temperatures, pressures, values)
+
+    def add_default_grids(self, fluids: Optional[Iterable[str]] = None) -> None:
+        """
+        Adds the interpolation grids of :py:data:`DEFAULT_GRIDS` for the given fluids, or for all
+        fluids in there if `fluids` is None.
+        """
+        if fluids is None:
+            fluids = DEFAULT_GRIDS.keys()
+
+        for fluid in fluids:
+            temperatures, pressures, outputs = DEFAULT_GRIDS[fluid]
+            logger.info(f"Building fluid property grid for {fluid}")
+            self.add_grid(fluid, temperatures, pressures, outputs)
+
+
+# Process-wide instance, used by the ESDL conversion and the Darcy-Weisbach head loss functions.
+fluid_properties = FluidPropertyService()
@@ -90,6 +90,11 @@ class GasPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationPr
         The ``n_linearization_lines`` is the number of lines used when a curve is approximated by
         multiple linear lines.
 
+        When ``linearization_max_relative_error`` is set, the breakpoints of the linear lines are
+        no longer equally spaced, but placed per pipe such that the deviation from the
+        Darcy-Weisbach curve is at most this fraction of the value at the maximum velocity. This
+        typically needs less lines than ``n_linearization_lines``, which is then the maximum.
+
         The ``pipe_minimum_pressure`` is the global minimum pressured allowed
         in the network. Similarly, ``pipe_maximum_pressure`` is the maximum
         one.
@@ -101,6 +106,7 @@ class GasPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationPr
             "head_loss_option": HeadLossOption.LINEARIZED_ONE_LINE_EQUALITY,
             "minimize_head_losses": False,
             "n_linearization_lines": 5,
+            "linearization_max_relative_error": None,
             "pipe_minimum_pressure": -np.inf,
             "pipe_maximum_pressure": np.inf,
         }
@@ -218,8 +224,7 @@ class GasPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationPr
                 and initialized_vars[10] != {}
             ):  # Variables needed to indicate if a linear line segment is active
                 self._gas_pipe_linear_line_segment_map[pipe_name] = {}
-                for ii_line in range(self.gas_network_settings["n_linearization_lines"] * 2):
-                    pipe_linear_line_segment_var_name = initialized_vars[8][ii_line]
+                for ii_line, pipe_linear_line_segment_var_name in initialized_vars[8].items():
                     self._gas_pipe_linear_line_segment_map[pipe_name][
                         ii_line
                     ] = pipe_linear_line_segment_var_name
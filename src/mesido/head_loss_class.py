@@ -6,6 +6,7 @@ from typing import List, Optional, Tuple, Type, Union
 import casadi as ca
 
 import mesido._darcy_weisbach as darcy_weisbach
+from mesido._pipe_linearization_cache import pipe_linearization_cache
 from mesido.constants import GRAVITATIONAL_CONSTANT
 from mesido.network_common import NetworkSettings
 from mesido.pipe_class import PipeClass
@@ -279,6 +280,9 @@ class HeadLossClass:
         | ``estimated_velocity``         | ``float`` | ``1.0`` m/s (CQ2_* &              |
         |                                |           |LINEARIZED_ONE_LINE_EQUALITY)      |
         +--------------------------------+-----------+-----------------------------------+
+        | ``pipe_linearization_cache_``  | ``str``   | ``None``                          |
+        | ``folder``                     |           |                                   |
+        +--------------------------------+-----------+-----------------------------------+
 
         The ``minimum_pressure_far_point`` gives the minimum pressure
         requirement at any demand node, which means that the pressure at the
@@ -286,6 +290,11 @@ class HeadLossClass:
 
         The ``wall_roughness`` of the pipes plays a role in determining the
         resistance of the pipes.
+
+        The linearization coefficients of the head loss and hydraulic power are cached in memory
+        for all problems in the same process. With ``pipe_linearization_cache_folder`` set to a
+        folder, e.g. next to the model folder, they are also stored on disk such that repeated runs
+        of the same network skip the linearization.
         """
 
         options = {}
@@ -293,6 +302,7 @@ class HeadLossClass:
         options["minimum_pressure_far_point"] = 1.0
         options["wall_roughness"] = 2e-4
         options["estimated_velocity"] = 1.0
+        options["pipe_linearization_cache_folder"] = None
 
         return options
 
@@ -409,13 +419,16 @@ class HeadLossClass:
                 # We need to creat linear line segments for the - and + volumetric flow rate
                 # possibilites. Line number 1, 2, N for the - & + side is created
                 discharge_type = ["neg_discharge", "pos_discharge"]
-                for ii_line in range(network_settings["n_linearization_lines"] * 2):
-                    if ii_line < network_settings["n_linearization_lines"]:
+                n_lines = self.__pipe_max_linearization_lines(
+                    pipe_name, optimization_problem, options, network_settings, parameters
+                )
+                for ii_line in range(n_lines * 2):
+                    if ii_line < n_lines:
                         dtype = discharge_type[0]
                         line_number = ii_line + 1
                     else:
                         dtype = discharge_type[1]
-                        line_number = ii_line + 1 - network_settings["n_linearization_lines"]
+                        line_number = ii_line + 1 - n_lines
 
                     # start line segment numbering from 1 up to "n_linearization_lines"
                     pipe_linear_line_segment_var_name = (
@@ -490,12 +503,109 @@ class HeadLossClass:
             ),
         )
 
+    def __pipe_max_linearization_lines(
+        self, pipe: str, optimization_problem, options, network_settings, parameters
+    ) -> int:
+        """
+        This function returns the number of lines of the head loss linearization of the pipe. With
+        the adaptive linearization (``linearization_max_relative_error``) the number of lines can
+        differ per pipe and per pipe class, in which case the maximum over the pipe classes of the
+        pipe is returned.
+        """
+        n_lines = len(
+            self._hn_pipe_linear_head_loss_coefficients(
+                pipe, optimization_problem, options, network_settings, parameters
+            )[0]
+        )
+        if network_settings.get("linearization_max_relative_error") is None:
+            return n_lines
+
+        # The pipe classes are only available when the problem includes the AssetSizingMixin
+        if self.network_settings["network_type"] == NetworkSettings.NETWORK_TYPE_HEAT:
+            pipe_classes = getattr(optimization_problem, "pipe_classes", None)
+        else:
+            pipe_classes = getattr(optimization_problem, "gas_pipe_classes", None)
+        for pipe_class in pipe_classes(pipe) if pipe_classes is not None else []:
+            if pipe_class.inner_diameter == 0.0:
+                continue
+            a, _ = self._hn_pipe_linear_head_loss_coefficients(
+                pipe,
+                optimization_problem,
+                options,
+                network_settings,
+                parameters,
+                pipe_class=pipe_class,
+            )
+            n_lines = max(n_lines, len(a))
+        return n_lines
+
     def _hn_pipe_nominal_discharge(self, energy_system_options, parameters, pipe: str) -> float:
         """
         This function returns the nominal volumetric flow (m^3/s) through the pipe.
         """
         return parameters[f"{pipe}.area"] * energy_system_options["estimated_velocity"]
 
+    def _hn_pipe_temperature(self, pipe: str, optimization_problem, parameters) -> float:
+        """
+        This function returns the temperature used to compute the fluid properties for the head
+        loss of the pipe. This is the lowest temperature the carrier of the pipe can have.
+        """
+        try:
+            # Only heat networks have a temperature attribute in the pipes, otherwise we will use
+            # a default temperature for gas networks
+            temperature = parameters[f"{pipe}.temperature"]
+            for _id, attr in optimization_problem.temperature_carriers().items():
+                if (
+                    parameters[f"{pipe}.carrier_id"] == attr["id_number_mapping"]
+                    and len(
+                        optimization_problem.temperature_regimes(parameters[f"{pipe}.carrier_id"])
+                    )
+                    > 0
+                ):
+                    temperature = min(
+                        optimization_problem.temperature_regimes(parameters[f"{pipe}.carrier_id"])
+                    )
+        except KeyError:
+            # A default temperature of 20 degrees celcius is used for gas networks.
+            temperature = 20.0
+
+        return temperature
+
+    def _hn_pipe_linear_head_loss_coefficients(
+        self,
+        pipe: str,
+        optimization_problem,
+        energy_system_options,
+        network_settings,
+        parameters,
+        pipe_class: Optional[PipeClass] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        This function returns the coefficients (a, b) of the linear lines, head loss = b + a * Q,
+        approximating the head loss of the pipe for positive discharges. The number of lines is
+        ``n_linearization_lines``, or less when the breakpoints are placed adaptively to meet the
+        ``linearization_max_relative_error`` network setting.
+        """
+        if pipe_class is not None:
+            diameter = pipe_class.inner_diameter
+            maximum_velocity = pipe_class.maximum_velocity
+        else:
+            diameter = parameters[f"{pipe}.diameter"]
+            maximum_velocity = network_settings["maximum_velocity"]
+
+        return pipe_linearization_cache.get_linear_pipe_dh_vs_q_fit(
+            diameter,
+            parameters[f"{pipe}.length"],
+            energy_system_options["wall_roughness"],
+            temperature=self._hn_pipe_temperature(pipe, optimization_problem, parameters),
+            n_lines=network_settings["n_linearization_lines"],
+            v_max=maximum_velocity,
+            network_type=self.network_settings["network_type"],
+            pressure=parameters[f"{pipe}.pressure"],
+            max_relative_error=network_settings.get("linearization_max_relative_error"),
+            cache_folder=energy_system_options["pipe_linearization_cache_folder"],
+        )
+
     def _hn_pipe_head_loss(
         self,
         pipe: str,
@@ -588,24 +698,7 @@ class HeadLossClass:
             area = parameters[f"{pipe}.area"]
             maximum_velocity = network_settings["maximum_velocity"]
 
-        try:
-            # Only heat networks have a temperature attribute in the pipes, otherwise we will use
-            # a default temperature for gas networks
-            temperature = parameters[f"{pipe}.temperature"]
-            for _id, attr in optimization_problem.temperature_carriers().items():
-                if (
-                    parameters[f"{pipe}.carrier_id"] == attr["id_number_mapping"]
-                    and len(
-                        optimization_problem.temperature_regimes(parameters[f"{pipe}.carrier_id"])
-                    )
-                    > 0
-                ):
-                    temperature = min(
-                        optimization_problem.temperature_regimes(parameters[f"{pipe}.carrier_id"])
-                    )
-        except KeyError:
-            # A default temperature of 20 degrees celcius is used for gas networks.
-            temperature = 20.0
+        temperature = self._hn_pipe_temperature(pipe, optimization_problem, parameters)
 
         try:
             has_control_valve = parameters[f"{pipe}.has_control_valve"]
@@ -718,20 +811,26 @@ class HeadLossClass:
             head_loss_option == HeadLossOption.LINEARIZED_N_LINES_WEAK_INEQUALITY
             or head_loss_option == HeadLossOption.LINEARIZED_N_LINES_EQUALITY
         ):
-            n_linear_lines = network_settings["n_linearization_lines"]
             n_timesteps = len(optimization_problem.times())
 
-            a, b = darcy_weisbach.get_linear_pipe_dh_vs_q_fit(
-                diameter,
-                length,
-                wall_roughness,
-                temperature=temperature,
-                n_lines=n_linear_lines,
-                v_max=maximum_velocity,
-                network_type=self.network_settings["network_type"],
-                pressure=parameters[f"{pipe}.pressure"],
+            a, b = self._hn_pipe_linear_head_loss_coefficients(
+                pipe,
+                optimization_problem,
+                energy_system_options,
+                network_settings,
+                parameters,
+                pipe_class=pipe_class,
             )
 
+            if symbolic and head_loss_option == HeadLossOption.LINEARIZED_N_LINES_EQUALITY:
+                # With the adaptive linearization a pipe class can have fewer lines than the
+                # pipe has line segments (see __pipe_max_linearization_lines). Its last line is
+                # repeated for the remaining line segments, such that these segments are
+                # equivalent to the last line.
+                n_lines = len(self._pipe_linear_line_segment_map[pipe]) // 2
+                a = np.pad(a, (0, n_lines - len(a)), mode="edge")
+                b = np.pad(b, (0, n_lines - len(b)), mode="edge")
+
             # The function above only gives result in the positive quadrant
             # (positive head loss, positive discharge). We also need a
             # positive head loss for _negative_ discharges.
@@ -1068,7 +1167,7 @@ class HeadLossClass:
             or HeadLossOption.LINEARIZED_N_LINES_EQUALITY
         ):
             n_lines = network_settings["n_linearization_lines"]
-            a_coef, b_coef = darcy_weisbach.get_linear_pipe_power_hydraulic_vs_q_fit(
+            a_coef, b_coef = pipe_linearization_cache.get_linear_pipe_power_hydraulic_vs_q_fit(
                 rho,
                 diameter,
                 length,
@@ -1078,6 +1177,8 @@ class HeadLossClass:
                 v_max=maximum_velocity,
                 network_type=self.network_settings["network_type"],
                 pressure=parameters[f"{pipe}.pressure"],
+                max_relative_error=network_settings.get("linearization_max_relative_error"),
+                cache_folder=energy_system_options["pipe_linearization_cache_folder"],
             )
             discharge_vec = ca.repmat(discharge, len(a_coef))
             hydraulic_power_linearized_vec = a_coef * discharge_vec + b_coef
@@ -4,7 +4,7 @@ from typing import List
 
 import casadi as ca
 
-from mesido._heat_loss_u_values_pipe import pipe_heat_loss
+from mesido._heat_loss_u_values_pipe import pipe_heat_loss, pipe_heat_losses, pipe_u_values
 from mesido.base_component_type_mixin import BaseComponentTypeMixin
 from mesido.demand_insulation_class import DemandInsulationClass
 from mesido.head_loss_class import HeadLossClass, HeadLossOption
@@ -93,6 +93,11 @@ class HeatPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
         The ``n_linearization_lines`` is the number of lines used when a curve is approximated by
         multiple linear lines.
 
+        When ``linearization_max_relative_error`` is set, the breakpoints of the linear lines are
+        no longer equally spaced, but placed per pipe such that the deviation from the
+        Darcy-Weisbach curve is at most this fraction of the value at the maximum velocity. This
+        typically needs less lines than ``n_linearization_lines``, which is then the maximum.
+
         The ``pipe_minimum_pressure`` is the global minimum pressured allowed
         in the network. Similarly, ``pipe_maximum_pressure`` is the maximum
         one.
@@ -104,6 +109,7 @@ class HeatPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
             "head_loss_option": HeadLossOption.LINEARIZED_ONE_LINE_EQUALITY,
             "minimize_head_losses": False,
             "n_linearization_lines": 5,
+            "linearization_max_relative_error": None,
             "pipe_minimum_pressure": -np.inf,
             "pipe_maximum_pressure": np.inf,
         }
@@ -284,8 +290,7 @@ class HeatPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
                 and initialized_vars[10] != {}
             ):
                 self._pipe_linear_line_segment_map[pipe_name] = {}
-                for ii_line in range(self.heat_network_settings["n_linearization_lines"] * 2):
-                    pipe_linear_line_segment_var_name = initialized_vars[8][ii_line]
+                for ii_line, pipe_linear_line_segment_var_name in initialized_vars[8].items():
                     self._pipe_linear_line_segment_map[pipe_name][
                         ii_line
                     ] = pipe_linear_line_segment_var_name
@@ -464,6 +469,11 @@ class HeatPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
         for _ in range(self.ensemble_size):
             self.__pipe_heat_loss_parameters.append({})
 
+        # The U-values of all pipes are computed at once
+        u_values = pipe_u_values(
+            self, parameters, self.energy_system_components.get("heat_pipe", [])
+        )
+
         for pipe in self.energy_system_components.get("heat_pipe", []):
             # For similar reasons as for the diameter, we always make a heat
             # loss symbol, even if the heat loss is fixed. Note that we also
@@ -484,7 +494,13 @@ class HeatPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
                     0.0,
                 )
                 self._pipe_heat_loss_nominals[heat_loss_var_name] = max(
-                    pipe_heat_loss(self, {"neglect_pipe_heat_losses": False}, parameters, pipe),
+                    pipe_heat_loss(
+                        self,
+                        {"neglect_pipe_heat_losses": False},
+                        parameters,
+                        pipe,
+                        u_values[pipe],
+                    ),
                     1.0,
                 )
 
@@ -493,7 +509,7 @@ class HeatPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
                     h[f"{pipe}.Heat_loss"] = 0.0
 
             else:
-                heat_loss = pipe_heat_loss(self, options, parameters, pipe)
+                heat_loss = pipe_heat_loss(self, options, parameters, pipe, u_values[pipe])
                 if parameters[f"{pipe}.temperature"] > parameters[f"{pipe}.T_ground"]:
                     lb = 0.0
                 else:
@@ -2953,6 +2969,12 @@ class HeatPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
         """
         constraints = []
 
+        options = self.energy_system_options()
+        parameters = self.parameters(ensemble_member)
+        u_values = pipe_u_values(
+            self, parameters, self.energy_system_components.get("heat_pipe", [])
+        )
+
         for p in self.energy_system_components.get("heat_pipe", []):
             pipe_classes = []
 
@@ -2979,12 +3001,7 @@ class HeatPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
                         ((heat_loss_sym - heat_loss_expr) / constraint_nominal, 0.0, 0.0)
                     )
                 except KeyError:
-                    heat_loss = pipe_heat_loss(
-                        self,
-                        self.energy_system_options(),
-                        self.parameters(ensemble_member),
-                        p,
-                    )
+                    heat_loss = pipe_heat_loss(self, options, parameters, p, u_values[p])
                     constraints.append(
                         (
                             (heat_loss_sym - heat_loss) / constraint_nominal,
@@ -2998,11 +3015,7 @@ class HeatPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
                     temperature_is_selected = self.state_vector(f"{carrier}_{temperature}")
                     if len(pipe_classes) == 0:
                         heat_loss = pipe_heat_loss(
-                            self,
-                            self.energy_system_options(),
-                            self.parameters(ensemble_member),
-                            p,
-                            temp=temperature,
+                            self, options, parameters, p, u_values[p], temp=temperature
                         )
                         big_m = 2.0 * heat_loss
                         constraints.append(
@@ -3030,17 +3043,14 @@ class HeatPhysicsMixin(BaseComponentTypeMixin, CollocatedIntegratedOptimizationP
                             )
                         )
                     else:
-                        heat_losses = [
-                            pipe_heat_loss(
-                                self,
-                                self.energy_system_options(),
-                                self.parameters(ensemble_member),
-                                p,
-                                u_values=c.u_values,
-                                temp=temperature,
-                            )
-                            for c in pipe_classes
-                        ]
+                        heat_losses = pipe_heat_losses(
+                            self,
+                            options,
+                            parameters,
+                            p,
+                            pipe_classes,
+                            temp=temperature,
+                        )
                         count = 0
                         big_m = 2.0 * max(heat_losses)
                         for pc_var_name in pipe_classes.values():
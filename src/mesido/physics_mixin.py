@@ -55,6 +55,10 @@ class PhysicsMixin(
 
         super().__init__(*args, **kwargs)
 
+        # Opt-in timing and counting of the constraint builders, see ConstraintProfiler
+        if kwargs.get("constraint_profiler") is not None:
+            kwargs["constraint_profiler"].instrument(self)
+
     def energy_system_options(self):
         r"""
         Returns a dictionary of milp network specific options.
@@ -54,19 +54,19 @@ MATHEMATICAL_OPERATORS = [
 ]
 
 
-class BaseVariable(_Variable):
-    _attr_set = {"value", "start", "min", "max", "nominal", "fixed"}
+def _symbol_operator(attr):
+    # Operands that are variables are replaced by their symbol, such that CasADi does not have to
+    # find out how to convert them, which is slower than the operation itself.
+    def _f(self, *args, **kwargs):
+        args = [a.symbol if isinstance(a, BaseVariable) else a for a in args]
+        return getattr(self.symbol, attr)(*args, **kwargs)
 
-    def __new__(cls, *args, **kwargs):
-        if not hasattr(cls, MATHEMATICAL_OPERATORS[0]):
-            for attr in MATHEMATICAL_OPERATORS:
+    _f.__name__ = attr
+    return _f
 
-                def _f(self, *args, attr=attr, **kwargs):
-                    return getattr(self.symbol, attr)(*args, **kwargs)
 
-                setattr(cls, attr, _f)
-
-        return super().__new__(cls)
+class BaseVariable(_Variable):
+    _attr_set = {"value", "start", "min", "max", "nominal", "fixed"}
 
     def __init__(self, name, dimensions=None, **kwargs):
         update_attrs = {}
@@ -95,6 +95,12 @@ class BaseVariable(_Variable):
         return self.symbol.__getitem__(key)
 
 
+# The operators are set after the class is created, such that defining __eq__ does not make the
+# variables unhashable.
+for _attr in MATHEMATICAL_OPERATORS:
+    setattr(BaseVariable, _attr, _symbol_operator(_attr))
+
+
 class Variable(BaseVariable):
     def der(self):
         try:
@@ -181,7 +187,7 @@ class Model:
         self.__prefix = "" if name is None else f"{self.name}."
 
         if Model._skip_variables is None:
-            Model._skip_variables = dir(self)
+            Model._skip_variables = frozenset(dir(self))
 
     def add_variable(self, type_, var_name, *dimensions, **kwargs):
         if var_name in self._variables:
@@ -235,13 +241,14 @@ class Model:
         Return:
         None
         """
-        if not a.variables.keys() == b.variables.keys():
+        a_variables, b_variables = a._variables, b._variables
+        if not a_variables.keys() == b_variables.keys():
             raise Exception(
                 f"Cannot connect port {a} of type {type(a)} to port {b} "
                 f"of type {type(b)} as they have different variables."
             )
 
-        self._equations.extend([a.variables[k] - b.variables[k] for k in a.variables.keys()])
+        self._equations.extend([a_variables[k] - b_variables[k] for k in a_variables.keys()])
 
     def connect_logical_links(self, a: "Connector", b: "Connector"):
         """
@@ -258,7 +265,8 @@ class Model:
         Return:
         None
         """
-        if not a.variables.keys() == b.variables.keys():
+        a_variables, b_variables = a._variables, b._variables
+        if not a_variables.keys() == b_variables.keys():
             raise Exception(
                 f"Cannot connect port {a} of type {type(a)} to port {b} "
                 f"of type {type(b)} as they have different variables."
@@ -266,8 +274,8 @@ class Model:
 
         self._equations.extend(
             [
-                a.variables[k] - b.variables[k]
-                for k in a.variables.keys()
+                a_variables[k] - b_variables[k]
+                for k in a_variables.keys()
                 if (k != "H" and k != "Hydraulic_power" and k != "V")
             ]
         )
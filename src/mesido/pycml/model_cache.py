@@ -0,0 +1,130 @@
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+import casadi as ca
+
+from mesido import __version__
+
+import pymoca
+from pymoca.backends.casadi.api import load_model, save_model
+from pymoca.backends.casadi.model import Model as _Model
+
+
+logger = logging.getLogger("mesido")
+
+# Increase when the way the models are stored changes, such that models stored by an older
+# version are no longer used.
+CACHE_FORMAT_VERSION = 1
+
+MODEL_NAME = "model"
+PARAMETERS_FILE_NAME = "parameters.pickle"
+
+
+class ModelCache:
+    """
+    Persistent on-disk cache of simplified pymoca models, such that problems that are built from
+    the same model (e.g. the stages of a workflow, the windows of a sequential simulation, or a
+    batch of runs of the same ESDL) do not have to flatten and simplify the pycml model again.
+
+    Every model is stored in its own folder, named by the hash of what determines the model (for
+    ESDL based problems the content of the ESDL, the model options and the mesido version). The
+    folder holds the pymoca cache of the model, i.e. the serialized CasADi residual functions and
+    the variable metadata, and the numeric parameters of the flattened pycml model.
+
+    A model cache is used by a problem when the model_cache_folder keyword argument is provided.
+    """
+
+    def __init__(self, folder: Union[str, Path]):
+        self.folder = Path(folder)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(**kwargs) -> str:
+        """
+        Returns the content hash of the attributes that determine the model, which also includes
+        the versions of mesido, pymoca and CasADi.
+        """
+        items = [
+            f"version={CACHE_FORMAT_VERSION}",
+            f"mesido={__version__}",
+            f"pymoca={pymoca.__version__}",
+            f"casadi={ca.__version__}",
+        ]
+        for name in sorted(kwargs):
+            items.append(f"{name}={kwargs[name]}")
+        return hashlib.sha256(";".join(items).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.folder / key
+
+    def read(
+        self, key: str, compiler_options: Dict[str, Any]
+    ) -> Optional[Tuple[_Model, Dict[str, Any]]]:
+        """
+        Returns the simplified pymoca model and the numeric parameters stored for the key, or None
+        if they are not in the cache.
+        """
+        path = self._path(key)
+        try:
+            with open(path / PARAMETERS_FILE_NAME, "rb") as f:
+                numeric_parameters = pickle.load(f)
+            model = load_model(str(path), MODEL_NAME, compiler_options)
+        except Exception as e:
+            # Missing, incomplete or incompatible cache entries are rebuilt
+            if path.exists():
+                logger.debug(f"Could not read model from the cache {path}: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return model, numeric_parameters
+
+    def write(
+        self,
+        key: str,
+        model: _Model,
+        numeric_parameters: Dict[str, Any],
+        compiler_options: Dict[str, Any],
+    ) -> None:
+        """
+        Stores the simplified pymoca model and the numeric parameters for the key.
+        """
+        path = self._path(key)
+        # Write to a temporary folder first, such that concurrent runs never read partial models
+        try:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            tmp_path = tempfile.mkdtemp(dir=self.folder, suffix=".tmp")
+            try:
+                save_model(tmp_path, MODEL_NAME, model, compiler_options)
+                with open(Path(tmp_path) / PARAMETERS_FILE_NAME, "wb") as f:
+                    pickle.dump(numeric_parameters, f, protocol=pickle.HIGHEST_PROTOCOL)
+                try:
+                    os.replace(tmp_path, path)
+                except OSError:
+                    # Another run stored the same model first
+                    if not path.exists():
+                        raise
+            finally:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        except Exception as e:
+            logger.warning(f"Could not write model to the cache {path}: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            if self.folder.exists():
+                for path in self.folder.iterdir():
+                    if path.is_dir():
+                        shutil.rmtree(path, ignore_errors=True)
+            self.hits = 0
+            self.misses = 0
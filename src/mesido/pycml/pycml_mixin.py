@@ -1,7 +1,7 @@
 import itertools
 import logging
 from abc import abstractmethod
-from typing import Dict, Union
+from typing import Any, Dict, Optional, Tuple, Union
 
 import casadi as ca
 
@@ -13,6 +13,7 @@ from rtctools._internal.caching import cached
 from rtctools.optimization.optimization_problem import OptimizationProblem
 
 from . import ConstantInput, ControlInput, Model, SymbolicParameter, Variable
+from .model_cache import ModelCache
 
 
 logger = logging.getLogger("mesido")
@@ -22,42 +23,34 @@ class PyCMLMixin(OptimizationProblem):
     def __init__(self, *args, **kwargs):
         logger.debug("Using pymoca {}.".format(pymoca.__version__))
 
-        pycml_model = self.pycml_model()
-
-        self.__flattened_model = pycml_model.flatten()
-
-        self.__pymoca_model = _Model()
-        for v in self.__flattened_model.variables.values():
-            if isinstance(v, SymbolicParameter):
-                self.__pymoca_model.parameters.append(v)
-            elif isinstance(v, (ControlInput, ConstantInput)):
-                self.__pymoca_model.inputs.append(v)
-            elif isinstance(v, Variable) and v.has_derivative:
-                self.__pymoca_model.states.append(v)
-                self.__pymoca_model.der_states.append(v.der())
-            else:
-                self.__pymoca_model.alg_states.append(v)
-
-        self.__pymoca_model.equations = self.__flattened_model.equations
-        self.__pymoca_model.initial_equations = self.__flattened_model.initial_equations
-        self.__pymoca_model.simplify(self.compiler_options())
-
-        if (
-            len(self.__flattened_model.inequalities) > 0
-            or len(self.__flattened_model.initial_inequalities) > 0
-        ):
-            raise NotImplementedError("Inequalities are not supported yet")
+        self.__model_cache: Optional[ModelCache] = None
+        model_cache_folder = kwargs.get("model_cache_folder", None)
+        if model_cache_folder is not None:
+            self.__model_cache = ModelCache(model_cache_folder)
+
+        cache_key = self.pycml_model_cache_key() if self.__model_cache is not None else None
+        # Note that the mtime check of pymoca is for Modelica files, our cache key includes the
+        # content the model is built from instead.
+        cache_compiler_options = {**self.compiler_options(), "mtime_check": False}
+        cached_model = None
+        if cache_key is not None:
+            cached_model = self.__model_cache.read(cache_key, cache_compiler_options)
+
+        if cached_model is not None:
+            self.__pymoca_model, numeric_parameters = cached_model
+        else:
+            self.__pymoca_model, numeric_parameters = self.__build_pymoca_model()
+            if cache_key is not None:
+                self.__model_cache.write(
+                    cache_key, self.__pymoca_model, numeric_parameters, cache_compiler_options
+                )
 
         # Note that we do not pass the numeric parameters to the Pymoca model
         # in their entirety. That way we can avoid making useless Variable
         # instances, as the parameters do not appear in any equations anyway.
-        self.__parameters = {
-            k: v
-            for k, v in self.__flattened_model.numeric_parameters.items()
-            if not isinstance(v, str)
-        }
+        self.__parameters = {k: v for k, v in numeric_parameters.items() if not isinstance(v, str)}
         self.__string_parameters = {
-            k: v for k, v in self.__flattened_model.numeric_parameters.items() if isinstance(v, str)
+            k: v for k, v in numeric_parameters.items() if isinstance(v, str)
         }
 
         # Extract the CasADi MX variables used in the model
@@ -113,6 +106,35 @@ class PyCMLMixin(OptimizationProblem):
 
         super().__init__(*args, **kwargs)
 
+    def __build_pymoca_model(self) -> Tuple[_Model, Dict[str, Any]]:
+        """
+        Flattens the pycml model and simplifies it with pymoca.
+
+        :returns: The simplified pymoca model and the numeric parameters of the flattened model.
+        """
+        flattened_model = self.pycml_model().flatten()
+
+        pymoca_model = _Model()
+        for v in flattened_model.variables.values():
+            if isinstance(v, SymbolicParameter):
+                pymoca_model.parameters.append(v)
+            elif isinstance(v, (ControlInput, ConstantInput)):
+                pymoca_model.inputs.append(v)
+            elif isinstance(v, Variable) and v.has_derivative:
+                pymoca_model.states.append(v)
+                pymoca_model.der_states.append(v.der())
+            else:
+                pymoca_model.alg_states.append(v)
+
+        pymoca_model.equations = flattened_model.equations
+        pymoca_model.initial_equations = flattened_model.initial_equations
+        pymoca_model.simplify(self.compiler_options())
+
+        if len(flattened_model.inequalities) > 0 or len(flattened_model.initial_inequalities) > 0:
+            raise NotImplementedError("Inequalities are not supported yet")
+
+        return pymoca_model, flattened_model.numeric_parameters
+
     @cached
     def compiler_options(self) -> Dict[str, Union[str, bool]]:
         """
@@ -207,6 +229,16 @@ class PyCMLMixin(OptimizationProblem):
         except KeyError:
             return super().variable_nominal(variable)
 
+    def pycml_model_cache_key(self) -> Optional[str]:
+        """
+        Subclasses can return a key that identifies the pycml model, e.g. a hash of the input it
+        is built from, such that the simplified model can be stored in and read from the model
+        cache (see ModelCache). The key must change whenever the model changes.
+
+        :returns: The key of the model, or None if the model is not to be cached.
+        """
+        return None
+
     @abstractmethod
     def pycml_model(self) -> Model:
         raise NotImplementedError
@@ -0,0 +1,450 @@
+"""
+Runs a batch of GROW workflow scenarios, e.g. EndScenarioSizing variants over several ESDLs,
+cost assumptions and solver settings, in parallel processes.
+
+The scenarios are described in a JSON manifest:
+
+{
+    "output_folder": "batch_output",
+    "max_workers": 4,
+    "total_threads": 16,
+    "timeout": 3600,
+    "defaults": {"workflow": "EndScenarioSizingStaged", "solver": "highs"},
+    "scenarios": [
+        {"name": "base", "esdl_file": "model/base.esdl", "input_timeseries_file": "input/a.csv"},
+        {"name": "gap", "esdl_file": "model/base.esdl", "solver_options": {"mip_rel_gap": 0.05}}
+    ]
+}
+
+Relative paths are relative to the folder of the manifest. Every scenario runs in its own process
+with its own output folder (output_folder/name), in which a copy of the ESDL is placed such that
+the optimized ESDL is written next to it. A scenario that does not finish within its timeout is
+terminated. The solver threads are divided over the workers, such that at most total_threads
+solver threads run at the same time. The objective values, priority statistics and KPIs of all
+scenarios are collected in output_folder/summary.csv, the telemetry of every scenario is written to
+telemetry.jsonl in its output folder.
+
+Usage: python -m mesido.workflows.batch_runner manifest.json [--max-workers N] [...]
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import time
+import traceback
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from mesido.esdl.esdl_parser import ESDLFileParser
+from mesido.esdl.profile_parser import InfluxDBProfileReader, ProfileReaderFromFile
+from mesido.workflows import grow_workflow
+from mesido.workflows.grow_workflow import SolverCPLEX, SolverGurobi, SolverHIGHS
+from mesido.workflows.utils.telemetry import Telemetry
+
+import pandas as pd
+
+logger = logging.getLogger("mesido")
+
+
+SOLVER_CLASSES = {"highs": SolverHIGHS, "gurobi": SolverGurobi, "cplex": SolverCPLEX}
+
+# The option that sets the number of threads of every solver
+SOLVER_THREADS_OPTION = {"highs": "threads", "gurobi": "threads", "cplex": "CPX_PARAM_THREADS"}
+
+SUMMARY_FILE_NAME = "summary.csv"
+TELEMETRY_FILE_NAME = "telemetry.jsonl"
+
+
+@dataclass
+class BatchScenario:
+    """
+    Dataclass for a scenario of a batch run.
+
+    name: unique name of the scenario, also the name of its output folder.
+    esdl_file: path of the ESDL file.
+    input_timeseries_file: path of the file with the profiles, if None the profiles are read from
+        the database specified in the ESDL.
+    workflow: name of the problem class in mesido.workflows.grow_workflow.
+    solver: one of "highs", "gurobi" and "cplex".
+    staged: whether the sizing is staged, see run_end_scenario_sizing.
+    solver_options: options that are passed to the solver, e.g. {"mip_rel_gap": 0.05}.
+    problem_kwargs: additional keyword arguments of the problem.
+    timeout: maximum run time in seconds, None for no limit.
+    """
+
+    name: str
+    esdl_file: Path
+    input_timeseries_file: Optional[Path] = None
+    workflow: str = "EndScenarioSizingStaged"
+    solver: str = "highs"
+    staged: bool = True
+    solver_options: Dict[str, Any] = field(default_factory=dict)
+    problem_kwargs: Dict[str, Any] = field(default_factory=dict)
+    timeout: Optional[float] = None
+
+
+@dataclass
+class BatchResult:
+    """
+    Dataclass for the result of a scenario of a batch run.
+
+    name: name of the scenario.
+    status: "success", "failed" (also when the solver did not succeed) or "timeout".
+    run_time: wall clock time in seconds.
+    output_folder: output folder of the scenario.
+    objective_value: objective value of the last priority.
+    priorities_output: (priority, time taken, success, objective value, return status) per solved
+        priority, of all stages.
+    kpis: the KPIs that were added to the optimized ESDL.
+    error: the error message of a failed scenario.
+    """
+
+    name: str
+    status: str
+    run_time: float
+    output_folder: Path
+    objective_value: Optional[float] = None
+    priorities_output: List[Tuple] = field(default_factory=list)
+    kpis: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class _BatchSolverOptions:
+    """
+    Applies the solver options of a batch scenario on top of the options of the solver class.
+    """
+
+    _batch_solver_options: Dict[str, Any] = {}
+
+    def solver_options(self):
+        options = super().solver_options()
+        solver = options["solver"]
+        if options.get(solver) is None:
+            options[solver] = {}
+        options[solver].update(self._batch_solver_options)
+        return options
+
+
+def read_manifest(manifest_path: Union[str, Path]) -> Tuple[List[BatchScenario], Dict[str, Any]]:
+    """
+    Reads the scenarios and the batch settings (output_folder, max_workers, total_threads and
+    timeout) from a JSON manifest.
+
+    Returns
+    -------
+    A list of the scenarios and a dict with the batch settings.
+    """
+    manifest_path = Path(manifest_path)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    folder = manifest_path.parent
+
+    scenario_fields = {f.name for f in fields(BatchScenario)}
+    defaults = manifest.get("defaults", {})
+    scenarios = []
+    for entry in manifest["scenarios"]:
+        entry = {**defaults, **entry}
+        unknown = set(entry) - scenario_fields
+        if unknown:
+            raise ValueError(f"Unknown fields {sorted(unknown)} for scenario {entry.get('name')}")
+        for path_field in ["esdl_file", "input_timeseries_file"]:
+            if entry.get(path_field) is not None:
+                entry[path_field] = folder / entry[path_field]
+        scenarios.append(BatchScenario(**entry))
+
+    settings = {
+        k: manifest[k]
+        for k in ["output_folder", "max_workers", "total_threads", "timeout"]
+        if k in manifest
+    }
+    if "output_folder" in settings:
+        settings["output_folder"] = folder / settings["output_folder"]
+    return scenarios, settings
+
+
+def _collect_kpis(solution) -> Dict[str, float]:
+    """
+    Returns the KPIs of the top level area of the optimized ESDL, with the label of the items of
+    a distribution KPI appended to the name of the KPI.
+    """
+    kpis = {}
+    area_kpis = solution.get_energy_system_copy().instance[0].area.KPIs
+    if area_kpis is None:
+        return kpis
+    for kpi in area_kpis.kpi:
+        if hasattr(kpi, "distribution"):
+            for item in kpi.distribution.stringItem:
+                kpis[f"{kpi.name}: {item.label}"] = item.value
+        else:
+            kpis[kpi.name] = kpi.value
+    return kpis
+
+
+def _run_scenario(scenario: BatchScenario, output_folder: Path, threads: Optional[int]):
+    """
+    Runs a single scenario, this function is executed in the worker process.
+    """
+    output_folder.mkdir(parents=True, exist_ok=True)
+    # The optimized ESDL is written next to the input ESDL, so we work on a copy
+    esdl_file = Path(shutil.copy(scenario.esdl_file, output_folder))
+
+    solver = scenario.solver.lower()
+    solver_options = dict(scenario.solver_options)
+    if threads is not None:
+        solver_options.setdefault(SOLVER_THREADS_OPTION[solver], threads)
+    solver_class = type(
+        f"Batch{SOLVER_CLASSES[solver].__name__}",
+        (_BatchSolverOptions, SOLVER_CLASSES[solver]),
+        {"_batch_solver_options": solver_options},
+    )
+
+    kwargs = dict(
+        model_folder=output_folder,
+        output_folder=output_folder,
+        esdl_file_name=esdl_file.name,
+        esdl_parser=ESDLFileParser,
+    )
+    if scenario.input_timeseries_file is not None:
+        kwargs.update(
+            input_folder=Path(scenario.input_timeseries_file).parent,
+            input_timeseries_file=Path(scenario.input_timeseries_file).name,
+            profile_reader=ProfileReaderFromFile,
+        )
+    else:
+        kwargs.update(input_folder=output_folder, profile_reader=InfluxDBProfileReader)
+    kwargs.update(scenario.problem_kwargs)
+    kwargs.setdefault(
+        "telemetry",
+        Telemetry(path=output_folder / TELEMETRY_FILE_NAME, labels={"scenario": scenario.name}),
+    )
+
+    return grow_workflow.run_end_scenario_sizing(
+        getattr(grow_workflow, scenario.workflow),
+        solver_class=solver_class,
+        staged_pipe_optimization=scenario.staged,
+        **kwargs,
+    )
+
+
+def _batch_worker(
+    scenario: BatchScenario,
+    output_folder: Path,
+    threads: Optional[int],
+    connection: multiprocessing.connection.Connection,
+) -> None:
+    """
+    Entry point of the worker process, sends the BatchResult of the scenario to the connection.
+    Also a call to exit() in the workflow results in a failed scenario instead of ending the batch.
+    """
+    handler = logging.FileHandler(output_folder / "log.txt")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.INFO)
+
+    start_time = time.time()
+    result = BatchResult(scenario.name, "failed", 0.0, output_folder)
+    try:
+        solution = _run_scenario(scenario, output_folder, threads)
+        result.objective_value = float(solution.objective_value)
+        result.priorities_output = [
+            (priority, time_taken, success, objective_value, stats.get("return_status"))
+            for priority, time_taken, success, objective_value, stats in solution._priorities_output
+        ]
+        result.kpis = _collect_kpis(solution)
+        if all(success for _, _, success, _, _ in result.priorities_output):
+            result.status = "success"
+        else:
+            result.error = "The solver did not succeed for all priorities"
+    except SystemExit as e:
+        result.error = f"The workflow exited with code {e.code}, see the log for details"
+    except Exception:
+        result.error = traceback.format_exc()
+        logger.error(result.error)
+    result.run_time = time.time() - start_time
+    connection.send(result)
+    connection.close()
+
+
+def run_batch(
+    scenarios: List[BatchScenario],
+    output_folder: Union[str, Path],
+    max_workers: Optional[int] = None,
+    total_threads: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> List[BatchResult]:
+    """
+    Runs the scenarios in parallel processes and writes the summary table to the output folder.
+
+    Parameters
+    ----------
+    scenarios : The scenarios to run, their names must be unique.
+    output_folder : Folder in which every scenario gets an output folder.
+    max_workers : Maximum number of scenarios that run at the same time, by default the number of
+        CPUs.
+    total_threads : Maximum total number of solver threads, which are divided equally over the
+        workers. By default the solvers choose their own number of threads.
+    timeout : Default maximum run time in seconds of a scenario without a timeout.
+
+    Returns
+    -------
+    The results of the scenarios, in the order of the scenarios.
+    """
+    names = [s.name for s in scenarios]
+    if len(set(names)) != len(names):
+        raise ValueError("The names of the scenarios in a batch must be unique")
+
+    output_folder = Path(output_folder)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    threads = None
+    if total_threads is not None:
+        max_workers = max(1, min(max_workers, total_threads))
+        threads = max(1, total_threads // max_workers)
+
+    # Spawn fresh processes, the solvers and the logging do not mix well with forking
+    context = multiprocessing.get_context("spawn")
+    pending = list(scenarios)
+    running = {}
+    results = {}
+
+    while pending or running:
+        while pending and len(running) < max_workers:
+            scenario = pending.pop(0)
+            scenario_folder = output_folder / scenario.name
+            scenario_folder.mkdir(parents=True, exist_ok=True)
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_batch_worker,
+                args=(scenario, scenario_folder, threads, sender),
+                name=f"mesido-batch-{scenario.name}",
+            )
+            process.start()
+            sender.close()
+            logger.info(f"Started scenario {scenario.name}")
+            running[scenario.name] = (process, receiver, time.time(), scenario)
+
+        multiprocessing.connection.wait(
+            [r for _, r, _, _ in running.values()]
+            + [p.sentinel for p, _, _, _ in running.values()],
+            timeout=1.0,
+        )
+
+        for name, (process, receiver, start_time, scenario) in list(running.items()):
+            scenario_timeout = scenario.timeout if scenario.timeout is not None else timeout
+            result = None
+            if receiver.poll():
+                try:
+                    result = receiver.recv()
+                except EOFError:
+                    result = None
+                process.join(timeout=10.0)
+                if result is None:
+                    result = BatchResult(
+                        name,
+                        "failed",
+                        time.time() - start_time,
+                        output_folder / name,
+                        error=f"The process ended with exit code {process.exitcode}",
+                    )
+            elif not process.is_alive():
+                result = BatchResult(
+                    name,
+                    "failed",
+                    time.time() - start_time,
+                    output_folder / name,
+                    error=f"The process ended with exit code {process.exitcode}",
+                )
+            elif scenario_timeout is not None and time.time() - start_time > scenario_timeout:
+                process.terminate()
+                process.join()
+                result = BatchResult(
+                    name,
+                    "timeout",
+                    time.time() - start_time,
+                    output_folder / name,
+                    error=f"The scenario did not finish within {scenario_timeout} s",
+                )
+            if result is not None:
+                receiver.close()
+                del running[name]
+                results[name] = result
+                logger.info(f"Scenario {name} finished with status {result.status}")
+
+    ordered_results = [results[name] for name in names]
+    summary_table(ordered_results).to_csv(output_folder / SUMMARY_FILE_NAME, index=False)
+    return ordered_results
+
+
+def summary_table(results: List[BatchResult]) -> pd.DataFrame:
+    """
+    Returns a table with a row per scenario with the status, the run time, the objective value,
+    the statistics of every solved priority and the KPIs.
+    """
+    rows = []
+    for result in results:
+        row = {
+            "name": result.name,
+            "status": result.status,
+            "run_time": result.run_time,
+            "objective_value": result.objective_value,
+            "error": result.error,
+        }
+        for i, (priority, time_taken, success, objective_value, return_status) in enumerate(
+            result.priorities_output, start=1
+        ):
+            row[f"solve_{i}_priority"] = priority
+            row[f"solve_{i}_time"] = time_taken
+            row[f"solve_{i}_success"] = success
+            row[f"solve_{i}_objective_value"] = objective_value
+            row[f"solve_{i}_return_status"] = return_status
+        row.update(result.kpis)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run a batch of GROW workflow scenarios")
+    parser.add_argument("manifest", type=Path, help="JSON manifest with the scenarios")
+    parser.add_argument("--output-folder", type=Path, default=None, dest="output_folder")
+    parser.add_argument("--max-workers", type=int, default=None, dest="max_workers")
+    parser.add_argument("--total-threads", type=int, default=None, dest="total_threads")
+    parser.add_argument(
+        "--timeout", type=float, default=None, help="Default timeout per scenario in seconds"
+    )
+    parser.add_argument(
+        "-l",
+        "--log",
+        default="INFO",
+        dest="log_level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        help="Set the logging level (default: %(default)s)",
+    )
+    arguments = parser.parse_args(argv)
+
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)s %(message)s",
+        level=logging.getLevelName(arguments.log_level),
+    )
+
+    scenarios, settings = read_manifest(arguments.manifest)
+    for k in ["output_folder", "max_workers", "total_threads", "timeout"]:
+        if getattr(arguments, k) is not None:
+            settings[k] = getattr(arguments, k)
+    settings.setdefault("output_folder", arguments.manifest.parent / "batch_output")
+
+    results = run_batch(scenarios, **settings)
+
+    n_success = sum(r.status == "success" for r in results)
+    logger.info(
+        f"{n_success} of {len(results)} scenarios succeeded, see "
+        f"{Path(settings['output_folder']) / SUMMARY_FILE_NAME}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,34 @@
+import hashlib
 import locale
 import logging
 import os
 import sys
 import time
-from typing import Dict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import casadi as ca
 
 from mesido.esdl.esdl_additional_vars_mixin import ESDLAdditionalVarsMixin
 from mesido.esdl.esdl_mixin import ESDLMixin
+from mesido.esdl.prepared_problem import PreparedProblem
 from mesido.head_loss_class import HeadLossOption
 from mesido.techno_economic_mixin import TechnoEconomicMixin
 from mesido.workflows.goals.minimize_tco_goal import MinimizeTCO
 from mesido.workflows.io.write_output import ScenarioOutput
-from mesido.workflows.utils.adapt_profiles import (
-    adapt_hourly_year_profile_to_day_averaged_with_hourly_peak_day,
-)
+from mesido.workflows.utils.adapt_profiles import adapt_profiles_to_time_aggregation
 from mesido.workflows.utils.helpers import main_decorator, run_optimization_problem_solver
+from mesido.workflows.utils.model_size import model_size_report
+from mesido.workflows.utils.staging import (
+    Stage,
+    StageResult,
+    default_stages,
+    load_stage_result,
+    save_stage_result,
+    stage_fingerprint,
+)
+from mesido.workflows.utils.telemetry import TelemetryMixin
+from mesido.workflows.utils.time_aggregation import PeakDayAggregation
 
 import numpy as np
 
@@ -30,6 +44,7 @@ from rtctools.optimization.single_pass_goal_programming_mixin import (
     CachingQPSol,
     SinglePassGoalProgrammingMixin,
 )
+from rtctools.optimization.timeseries import Timeseries
 
 
 DB_HOST = "172.17.0.2"
@@ -71,6 +86,14 @@ class TargetHeatGoal(Goal):
 
 
 class SolverHIGHS:
+    """
+    Note that the CasADi interface to HiGHS does not pass the initial guess (x0) to HiGHS, so a
+    MIP start (see SettingsStaged) is not used by HiGHS.
+    """
+
+    # Whether the solver uses the initial guess (x0) as MIP start
+    _solver_uses_mip_start = False
+
     def solver_options(self):
         options = super().solver_options()
         options["casadi_solver"] = self._qpsol
@@ -91,6 +114,13 @@ class SolverHIGHS:
 
 
 class SolverGurobi:
+    """
+    The CasADi interface to Gurobi passes the initial guess (x0) as the Start attribute of the
+    variables, which Gurobi uses as a MIP start (see SettingsStaged).
+    """
+
+    _solver_uses_mip_start = True
+
     def solver_options(self):
         options = super().solver_options()
         options["casadi_solver"] = self._qpsol
@@ -111,6 +141,14 @@ class SolverGurobi:
 
 
 class SolverCPLEX:
+    """
+    The CasADi interface to CPLEX uses the initial guess (x0) of the integer variables as a MIP
+    start when the mip_start option is set, which is done when a MIP start is passed (see
+    SettingsStaged).
+    """
+
+    _solver_uses_mip_start = True
+
     def solver_options(self):
         options = super().solver_options()
         options["casadi_solver"] = self._qpsol
@@ -122,6 +160,9 @@ class SolverCPLEX:
             else:
                 cplex_options["CPX_PARAM_EPGAP"] = 0.02
         cplex_options["CPX_PARAM_EPGAP"] = 0.02
+        if getattr(self, "_mip_start", None) is not None:
+            # Use the initial guess (x0) for the integer variables as a MIP start
+            options["mip_start"] = True
 
         options["highs"] = None
 
@@ -133,6 +174,7 @@ class EndScenarioSizing(
     ScenarioOutput,
     ESDLAdditionalVarsMixin,
     TechnoEconomicMixin,
+    TelemetryMixin,
     LinearizedOrderGoalProgrammingMixin,
     SinglePassGoalProgrammingMixin,
     ESDLMixin,
@@ -163,6 +205,11 @@ class EndScenarioSizing(
 
         self.__indx_max_peak = None
         self.__day_steps = 5
+        # Strategy to aggregate the hourly profiles to fewer time steps, see
+        # mesido.workflows.utils.time_aggregation
+        self._time_aggregation = kwargs.get(
+            "time_aggregation", PeakDayAggregation(day_steps=self.__day_steps)
+        )
 
         # self._override_pipe_classes = {}
 
@@ -186,7 +233,9 @@ class EndScenarioSizing(
     def parameters(self, ensemble_member):
         parameters = super().parameters(ensemble_member)
         parameters["peak_day_index"] = self.__indx_max_peak
-        parameters["time_step_days"] = self.__day_steps
+        # The length of the averaged time steps is only fixed with the PeakDayAggregation
+        if isinstance(self._time_aggregation, PeakDayAggregation):
+            parameters["time_step_days"] = self._time_aggregation.day_steps
         parameters["number_of_years"] = self._number_of_years
         return parameters
 
@@ -197,8 +246,9 @@ class EndScenarioSizing(
 
     def read(self):
         """
-        Reads the yearly profile with hourly time steps and adapt to a daily averaged profile
-        except for the day with the peak demand.
+        Reads the yearly profile with hourly time steps and adapt it to the time steps of the
+        time aggregation, by default a daily averaged profile except for the day with the peak
+        demand.
         """
         super().read()
 
@@ -229,10 +279,11 @@ class EndScenarioSizing(
         # end error checking
 
         (
-            self.__indx_max_peak,
+            peak_day_indices,
             self.__heat_demand_nominal,
             _,
-        ) = adapt_hourly_year_profile_to_day_averaged_with_hourly_peak_day(self, self.__day_steps)
+        ) = adapt_profiles_to_time_aggregation(self, self._time_aggregation)
+        self.__indx_max_peak = peak_day_indices[0] if peak_day_indices else None
 
         logger.info("HeatProblem read")
 
@@ -491,15 +542,30 @@ class EndScenarioSizingHeadLossDiscounted(EndScenarioSizingHeadLoss, EndScenario
 class SettingsStaged:
     """
     Additional settings to be used when a staged approach should be implemented.
-    Staged approach currently entails 2 stages:
+    Staged approach by default entails 2 stages:
     1. optimisation without heat losses and thus a much smaller MIPgap (in solver options) is used
     to ensure the bounds set for the second stage are not limiting the optimal solution
     2. optimisation including heat losses with updated boolean bounds (smaller range) of asset
     sizes and flow directions.
+    More stages can be configured in run_end_scenario_sizing, in which case neglect_heat_losses
+    sets which stages neglect the heat losses (by default only the first stage).
+
+    The results of the previous stage can be passed to a stage as mip_start. They are then used as
+    the initial guess of the first priority of the stage, which Gurobi and CPLEX use as a MIP
+    start. The later priorities start from the solution of the previous priority as usual. When
+    the solver uses the MIP start, _mip_start_statistics records whether the initial guess (x0) of
+    the first priority satisfies the bounds and constraints of the transcribed problem, and the
+    maximum violation. This is checked before the priority is solved, so also when it fails.
+    Whether the solver actually used the MIP start is reported in the solver log.
     """
 
     _stage = 0  # current stage that is being used
     _total_stages = 0  # total number of stages to be used
+    _neglect_heat_losses = False  # whether the pipe heat losses are neglected in the current stage
+    _solver_uses_mip_start = False  # whether the solver uses the initial guess as MIP start
+
+    # Absolute tolerance on the scaled bounds and constraints for a feasible initial guess
+    _mip_start_feasibility_tolerance = 1.0e-6
 
     def __init__(
         self,
@@ -507,6 +573,8 @@ class SettingsStaged:
         total_stages=None,
         boolean_bounds: list = None,
         priorities_output: list = None,
+        mip_start: Dict[str, np.ndarray] = None,
+        neglect_heat_losses: bool = None,
         *args,
         **kwargs,
     ):
@@ -515,18 +583,26 @@ class SettingsStaged:
         self._stage = stage
         self._total_stages = total_stages
         self.__boolean_bounds = boolean_bounds
+        if neglect_heat_losses is None:
+            neglect_heat_losses = self._stage == 1
+        self._neglect_heat_losses = neglect_heat_losses
+        self._mip_start = mip_start
+        # (priority, x0 feasible, maximum violation) of the MIP start of the first priority
+        self._mip_start_statistics = None
+        self.__first_priority = None
+        self.__priority = None
 
-        if self._stage == 1:
+        if self._neglect_heat_losses:
             self.heat_network_settings["minimum_velocity"] = 0.0
             self.heat_network_settings["head_loss_option"] = HeadLossOption.NO_HEADLOSS
             self.heat_network_settings["minimize_head_losses"] = False
 
-        if self._stage == 2 and priorities_output:
+        if priorities_output:
             self._priorities_output = priorities_output
 
     def energy_system_options(self):
         options = super().energy_system_options()
-        if self._stage == 1:
+        if self._neglect_heat_losses:
             options["neglect_pipe_heat_losses"] = True
             self.heat_network_settings["minimum_velocity"] = 0.0
 
@@ -535,11 +611,69 @@ class SettingsStaged:
     def bounds(self):
         bounds = super().bounds()
 
-        if self._stage == 2:
+        if self.__boolean_bounds:
             bounds.update(self.__boolean_bounds)
 
         return bounds
 
+    def __is_mip_start_priority(self):
+        return self._mip_start is not None and self.__priority == self.__first_priority
+
+    def priority_started(self, priority):
+        if self.__first_priority is None:
+            self.__first_priority = priority
+        self.__priority = priority
+
+        super().priority_started(priority)
+
+    def seed(self, ensemble_member):
+        seed = super().seed(ensemble_member)
+
+        if self.__is_mip_start_priority():
+            times = self.times()
+            extra_variables = {v.name() for v in self.extra_variables}
+            for variable, values in self._mip_start.items():
+                if variable in extra_variables:
+                    seed[variable] = values
+                elif len(values) == len(times):
+                    seed[variable] = Timeseries(times, values)
+
+        return seed
+
+    def transcribe(self):
+        discrete, lbx, ubx, lbg, ubg, x0, nlp = super().transcribe()
+
+        if (
+            self.__is_mip_start_priority()
+            and self._solver_uses_mip_start
+            and self._mip_start_statistics is None
+        ):
+            self.__check_mip_start(lbx, ubx, lbg, ubg, x0, nlp)
+
+        return discrete, lbx, ubx, lbg, ubg, x0, nlp
+
+    def __check_mip_start(self, lbx, ubx, lbg, ubg, x0, nlp):
+        """
+        Checks whether the MIP start (x0) of the first priority satisfies the bounds and
+        constraints of the transcribed problem, before the priority is solved.
+        """
+        x0 = np.array(x0, dtype=float).ravel()
+        g0 = np.array(ca.Function("g", [nlp["x"]], [nlp["g"]])(x0)).ravel()
+        lbx = np.array(lbx, dtype=float).ravel()
+        ubx = np.array(ubx, dtype=float).ravel()
+        lbg = np.array(ca.veccat(*lbg)).ravel()
+        ubg = np.array(ca.veccat(*ubg)).ravel()
+
+        violation = np.concatenate([lbx - x0, x0 - ubx, lbg - g0, g0 - ubg])
+        max_violation = max(float(np.max(violation, initial=0.0)), 0.0)
+        feasible = max_violation <= self._mip_start_feasibility_tolerance
+        self._mip_start_statistics = (self.__priority, feasible, max_violation)
+
+        logger.info(
+            f"MIP start of priority {self.__priority}: x0 "
+            f"{'feasible' if feasible else 'infeasible'}, maximum violation {max_violation:.3g}"
+        )
+
 
 class EndScenarioSizingStaged(SettingsStaged, EndScenarioSizing):
     pass
@@ -593,16 +727,102 @@ def run_end_scenario_sizing_no_heat_losses(
         total_stages=1,
         **kwargs,
     )
+    if kwargs.get("telemetry") is not None:
+        kwargs["telemetry"].record_solution("stage", solution, time.time() - start_time, stage=1)
 
     print("Execution time: " + time.strftime("%M:%S", time.gmtime(time.time() - start_time)))
 
     return solution
 
 
+def _esdl_content(kwargs: Dict[str, Any]) -> Optional[Union[str, bytes]]:
+    """
+    Returns the content of the ESDL that is passed to a problem with the esdl_string or
+    esdl_file_name keyword argument, or None when it can not be read.
+    """
+    if kwargs.get("esdl_string") is not None:
+        return kwargs["esdl_string"]
+    if kwargs.get("esdl_file_name") is not None:
+        model_folder = kwargs.get("model_folder") or Path(kwargs.get("base_folder", "..")) / "model"
+        esdl_path = Path(model_folder) / kwargs["esdl_file_name"]
+        if esdl_path.exists():
+            return esdl_path.read_bytes()
+    return None
+
+
+# The keyword arguments of the problems that do not change the result of a stage, or of which the
+# content is part of the fingerprint of a stage instead of the argument itself.
+_NOT_FINGERPRINTED_KWARGS = {
+    "base_folder",
+    "model_folder",
+    "input_folder",
+    "output_folder",
+    "esdl_string",
+    "esdl_file_name",
+    "input_timeseries_file",
+    "prepared_problem",
+    "telemetry",
+    "constraint_profiler",
+    "profile_cache_folder",
+    "profile_cache_max_size_bytes",
+    "model_cache_folder",
+    "esdl_snapshot_folder",
+    "write_result_db_profiles",
+    "influxdb_host",
+    "influxdb_port",
+    "influxdb_username",
+    "influxdb_password",
+    "influxdb_ssl",
+    "influxdb_verify_ssl",
+}
+
+
+def _stage_fingerprint_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the attributes of the keyword arguments of the problems that determine the result of
+    a stage, with the content of the ESDL and of the input timeseries file instead of their
+    names. The profiles in a database are identified by their references in the ESDL, as in the
+    profile cache.
+
+    A ValueError is raised when the content of the ESDL or of the input timeseries file cannot be
+    read, e.g. when the ESDL is passed with a runinfo file.
+    """
+    esdl_content = _esdl_content(kwargs)
+    if esdl_content is None:
+        raise ValueError("The ESDL is neither passed as string nor as file")
+    attributes = {k: v for k, v in kwargs.items() if k not in _NOT_FINGERPRINTED_KWARGS}
+    attributes["esdl_content"] = esdl_content
+    if kwargs.get("input_timeseries_file") is not None:
+        input_folder = kwargs.get("input_folder") or Path(kwargs.get("base_folder", "..")) / "input"
+        input_path = Path(input_folder) / kwargs["input_timeseries_file"]
+        if not input_path.exists():
+            raise ValueError(f"The input timeseries file {input_path} cannot be read")
+        attributes["input_timeseries"] = hashlib.sha256(input_path.read_bytes()).hexdigest()
+    return attributes
+
+
+def _use_mip_start(problem_class, solver_class, use_mip_start: Optional[bool]) -> bool:
+    """
+    Returns whether the solution of the previous stage is passed as MIP start, which by default
+    is only done when the solver uses it.
+    """
+    uses_mip_start = getattr(
+        solver_class if solver_class is not None else problem_class, "_solver_uses_mip_start", False
+    )
+    if use_mip_start and not uses_mip_start:
+        logger.warning("The solver does not use a MIP start, the previous stage is not passed")
+        return False
+    return uses_mip_start if use_mip_start is None else use_mip_start
+
+
 def run_end_scenario_sizing(
     end_scenario_problem_class,
     solver_class=None,
     staged_pipe_optimization=True,
+    use_mip_start: Optional[bool] = None,
+    stages: Optional[List[Stage]] = None,
+    stage_results_folder: Optional[Union[str, Path]] = None,
+    dry_run: bool = False,
     **kwargs,
 ):
     """
@@ -615,121 +835,192 @@ def run_end_scenario_sizing(
     much faster as it avoids inequality big_m constraints for the milp to discharge on pipes. The
     one size up possibility is to avoid infeasibilities in compensating for the milp losses.
 
+    The stages can be configured with a list of Stage objects (see
+    mesido.workflows.utils.staging), e.g. to add a final stage with head losses. Every stage has
+    its own policies to tighten its bounds based on the solution of the previous stage. When a
+    stage_results_folder is given, the result of every stage but the last is persisted in it, and
+    stages of which the result was persisted before are not solved again. This allows to resume
+    after a failure in a later stage. A persisted result is only used when it belongs to the same
+    run, i.e. the same ESDL, input timeseries, problem and solver class, stages, problem options
+    (e.g. the time aggregation) and mesido version, otherwise the stage is solved again and its
+    result is overwritten. When the run cannot be identified, e.g. with an option that cannot be
+    described, the results are not persisted.
+
+    The stages share a PreparedProblem, such that the ESDL is parsed and the profiles are read
+    only once. A prepared problem can also be passed as the prepared_problem keyword argument, or
+    None to disable the sharing.
+
+    When a Telemetry object (see mesido.workflows.utils.telemetry) is passed as the telemetry
+    keyword argument, the wall time of every stage and the statistics of every priority are
+    recorded in it.
+
     Parameters
     ----------
     end_scenario_problem_class : The end scenario problem class.
     solver_class: The solver and its settings to be used to solve the problem.
     staged_pipe_optimization : Boolean to toggle between the staged or non-staged approach
+    use_mip_start : Boolean to pass the solution of a stage as MIP start to the next stage, by
+        default only when the solver uses it (Gurobi and CPLEX, not HiGHS)
+    stages : The stages, by default first without heat losses and then with heat losses
+    stage_results_folder : Folder in which the results of the stages are persisted
+    dry_run : Boolean to only build the problem of every stage and report its size (see
+        mesido.workflows.utils.model_size) instead of solving the stages
 
     Returns
     -------
-
+    The solution of the last stage, or a list with the ModelSizeReport of every stage for a dry
+    run.
     """
     import time
 
-    boolean_bounds = {}
-    priorities_output = []
+    kwargs.setdefault("prepared_problem", PreparedProblem())
+    telemetry = kwargs.get("telemetry")
 
     start_time = time.time()
-    if staged_pipe_optimization and issubclass(end_scenario_problem_class, SettingsStaged):
+    if dry_run:
+        if not (
+            staged_pipe_optimization and issubclass(end_scenario_problem_class, SettingsStaged)
+        ):
+            return [
+                model_size_report(
+                    end_scenario_problem_class,
+                    solver_class=solver_class,
+                    stage=2,
+                    total_stages=2,
+                    **kwargs,
+                )
+            ]
+        stages = default_stages() if stages is None else stages
+        # Note that the bounds of a stage that are derived from the previous stage do not
+        # change the size of the problem.
+        return [
+            model_size_report(
+                stage.problem_class or end_scenario_problem_class,
+                solver_class=solver_class,
+                stage=stage_number,
+                total_stages=len(stages),
+                neglect_heat_losses=stage.neglect_heat_losses,
+                **kwargs,
+            )
+            for stage_number, stage in enumerate(stages, start=1)
+        ]
+
+    if not (staged_pipe_optimization and issubclass(end_scenario_problem_class, SettingsStaged)):
         solution = run_optimization_problem_solver(
             end_scenario_problem_class,
             solver_class=solver_class,
-            stage=1,
+            stage=2,
             total_stages=2,
+            boolean_bounds={},
+            priorities_output=[],
+            mip_start=None,
+            **kwargs,
+        )
+        if telemetry is not None:
+            telemetry.record_solution("stage", solution, time.time() - start_time, stage=2)
+        print("Execution time: " + time.strftime("%M:%S", time.gmtime(time.time() - start_time)))
+        return solution
+
+    if stages is None:
+        stages = default_stages()
+    total_stages = len(stages)
+
+    fingerprint_kwargs = {}
+    if stage_results_folder is not None:
+        try:
+            fingerprint_kwargs = _stage_fingerprint_kwargs(kwargs)
+            stage_fingerprint(stages, 1, end_scenario_problem_class, **fingerprint_kwargs)
+        except ValueError as e:
+            logger.warning(f"The results of the stages are not persisted: {e}")
+            stage_results_folder = None
+
+    previous = None
+    for stage_number, stage in enumerate(stages, start=1):
+        is_last_stage = stage_number == total_stages
+
+        fingerprint = None
+        if not is_last_stage and stage_results_folder is not None:
+            fingerprint = stage_fingerprint(
+                stages,
+                stage_number,
+                end_scenario_problem_class,
+                solver_class=solver_class,
+                use_mip_start=use_mip_start,
+                **fingerprint_kwargs,
+            )
+            stage_result = load_stage_result(stage_results_folder, stage_number, fingerprint)
+            if stage_result is not None:
+                logger.info(f"Using the persisted result of stage {stage_number}")
+                previous = stage_result
+                continue
+
+        stage_problem_class = stage.problem_class or end_scenario_problem_class
+        stage_mip_start = previous is not None and _use_mip_start(
+            stage_problem_class, solver_class, use_mip_start
+        )
+
+        stage_start_time = time.time()
+        solution = run_optimization_problem_solver(
+            stage_problem_class,
+            solver_class=solver_class,
+            stage=stage_number,
+            total_stages=total_stages,
+            neglect_heat_losses=stage.neglect_heat_losses,
+            boolean_bounds=previous.next_bounds if previous is not None else {},
+            priorities_output=previous.priorities_output if previous is not None else [],
+            mip_start=previous.results if stage_mip_start else None,
             **kwargs,
         )
+        if telemetry is not None:
+            telemetry.record_solution(
+                "stage", solution, time.time() - stage_start_time, stage=stage_number
+            )
+
+        if solution._mip_start_statistics is not None:
+            priority, feasible, max_violation = solution._mip_start_statistics
+            logger.info(
+                f"MIP start of priority {priority} of stage {stage_number} (the stage "
+                f"{stage_number - 1} solution): x0 {'feasible' if feasible else 'infeasible'}, "
+                f"maximum violation {max_violation:.3g}"
+            )
+
+        if is_last_stage:
+            break
+
         # Error checking
         solver_success, _ = solution.solver_success(solution.solver_stats, False)
         if not solver_success:
             if (
                 solution.solver_stats["return_status"] == "Time limit reached"
                 and solution.objective_value > 1e-6
-                and solution._stage == 1
             ):
-                logger.error("Optimization maximum allowed time limit reached for stage_1, goal_1")
+                logger.error(
+                    f"Optimization maximum allowed time limit reached for stage_{stage_number}, "
+                    "goal_1"
+                )
                 exit(1)
             else:
-                logger.error("Unsuccessful: unexpected error for stage_1, goal_1")
+                logger.error(f"Unsuccessful: unexpected error for stage_{stage_number}, goal_1")
                 exit(1)
 
         results = solution.extract_results()
-        parameters = solution.parameters(0)
-        bounds = solution.bounds()
-
-        # We give bounds for stage 2 by allowing one DN sizes larger than what was found in the
-        # stage 1 optimization.
-        pc_map = solution.get_pipe_class_map()
-        for pipe_classes in pc_map.values():
-            v_prev = 0.0
-            first_pipe_class = True
-            for var_name in pipe_classes.values():
-                v = results[var_name][0]
-                if first_pipe_class and abs(v) == 1.0:
-                    boolean_bounds[var_name] = (abs(v), abs(v))
-                elif abs(v) == 1.0:
-                    boolean_bounds[var_name] = (0.0, abs(v))
-                elif v_prev == 1.0:
-                    boolean_bounds[var_name] = (0.0, 1.0)
-                else:
-                    boolean_bounds[var_name] = (abs(v), abs(v))
-                v_prev = v
-                first_pipe_class = False
-
-        for asset in [
-            *solution.energy_system_components.get("heat_source", []),
-            *solution.energy_system_components.get("heat_buffer", []),
-        ]:
-            var_name = f"{asset}_aggregation_count"
-            round_lb = round(results[var_name][0])
-            ub = solution.bounds()[var_name][1]
-            if round_lb >= 1 and (round_lb <= ub):
-                boolean_bounds[var_name] = (round_lb, ub)
-            elif round_lb > ub:
-                logger.error(
-                    f"{var_name}: The lower bound value {round_lb} > the upper bound {ub} value"
-                )
-                exit(1)
 
-        t = solution.times()
-        from rtctools.optimization.timeseries import Timeseries
-
-        for p in solution.energy_system_components.get("heat_pipe", []):
-            if p in solution.hot_pipes and parameters[f"{p}.area"] > 0.0:
-                lb = []
-                ub = []
-                bounds_pipe = bounds[f"{p}__flow_direct_var"]
-                for i in range(len(t)):
-                    r = results[f"{p}__flow_direct_var"][i]
-                    # bound to roughly represent 4km of milp losses in pipes
-                    lb.append(
-                        r
-                        if abs(results[f"{p}.Q"][i] / parameters[f"{p}.area"]) > 2.5e-2
-                        else bounds_pipe[0]
-                    )
-                    ub.append(
-                        r
-                        if abs(results[f"{p}.Q"][i] / parameters[f"{p}.area"]) > 2.5e-2
-                        else bounds_pipe[1]
-                    )
-
-                boolean_bounds[f"{p}__flow_direct_var"] = (Timeseries(t, lb), Timeseries(t, ub))
-                try:
-                    r = results[f"{p}__is_disconnected"]
-                    boolean_bounds[f"{p}__is_disconnected"] = (Timeseries(t, r), Timeseries(t, r))
-                except KeyError:
-                    pass
-        priorities_output = solution._priorities_output
-
-    solution = run_optimization_problem_solver(
-        end_scenario_problem_class,
-        solver_class=solver_class,
-        stage=2,
-        total_stages=2,
-        boolean_bounds=boolean_bounds,
-        priorities_output=priorities_output,
-        **kwargs,
-    )
+        # The bounds of the next stage, the bounds of earlier stages are kept unless a policy of
+        # the next stage overrides them.
+        next_bounds = dict(previous.next_bounds) if previous is not None else {}
+        for policy in stages[stage_number].policies:
+            next_bounds.update(policy.bounds(solution, results))
+
+        previous = StageResult(
+            stage=stage_number,
+            objective_value=solution.objective_value,
+            results=dict(results),
+            priorities_output=solution._priorities_output,
+            next_bounds=next_bounds,
+            fingerprint=fingerprint,
+        )
+        if stage_results_folder is not None:
+            save_stage_result(stage_results_folder, previous)
 
     print("Execution time: " + time.strftime("%M:%S", time.gmtime(time.time() - start_time)))
 
@@ -1,3 +1,4 @@
+import collections
 import datetime
 import json
 import logging
@@ -924,6 +925,13 @@ class ScenarioOutput:
         results = self.extract_results()
         parameters = self.parameters(0)
 
+        # The results of merged pipes are written to each of the pipes of the ESDL
+        network_reduction = self.network_reduction
+        if network_reduction is not None:
+            results = collections.ChainMap(
+                network_reduction.expand_results(results, self.alias_relation), results
+            )
+
         _ = energy_system.id  # input energy system id. Kept here as not sure if still needed
         energy_system.id = str(uuid.uuid4())  # output energy system id
         output_energy_system_id = energy_system.id
@@ -937,10 +945,21 @@ class ScenarioOutput:
         else:  # network optimization
             energy_system.name = energy_system.name + "_GrowOptimized"
 
+        # Index the objects by name once, instead of searching the energy system for every name
+        name_to_objects = {}
+        for x in energy_system.eAllContents():
+            if hasattr(x, "name"):
+                name_to_objects.setdefault(x.name, []).append(x)
+
         def _name_to_asset(name):
-            return next(
-                (x for x in energy_system.eAllContents() if hasattr(x, "name") and x.name == name)
-            )
+            # Deleted assets are no longer contained in the energy system
+            return next((x for x in name_to_objects.get(name, []) if x.eContainer() is not None))
+
+        def pipe_segments(pipe):
+            # The pipes of the ESDL that are merged into the pipe of the model
+            if network_reduction is None:
+                return [pipe]
+            return network_reduction.segments(pipe)
 
         if add_kpis:
             self._add_kpis_to_energy_system(energy_system, optimizer_sim)
@@ -1007,24 +1026,26 @@ class ScenarioOutput:
                     assert isinstance(pipe_class, EDRPipeClass)
                     asset_edr = esh_edr.load_from_string(pipe_class.xml_string)
 
-                asset = _name_to_asset(pipe)
-                asset.state = esdl.AssetStateEnum.ENABLED
+                for segment in pipe_segments(pipe):
+                    asset = _name_to_asset(segment)
+                    asset.state = esdl.AssetStateEnum.ENABLED
 
-                try:
-                    asset.costInformation.investmentCosts.value = pipe_class.investment_costs
-                except AttributeError:
-                    pass
-                    # do nothing, in the case that no costs have been specified for the return
-                    # pipe in the mapeditor
-                except UnboundLocalError:
-                    pass
+                    try:
+                        asset.costInformation.investmentCosts.value = pipe_class.investment_costs
+                    except AttributeError:
+                        pass
+                        # do nothing, in the case that no costs have been specified for the return
+                        # pipe in the mapeditor
+                    except UnboundLocalError:
+                        pass
 
-                if not optimizer_sim:
-                    for prop in edr_pipe_properties_to_copy:
-                        setattr(asset, prop, getattr(asset_edr, prop))
+                    if not optimizer_sim:
+                        for prop in edr_pipe_properties_to_copy:
+                            setattr(asset, prop, getattr(asset_edr, prop))
             else:
-                asset = _name_to_asset(pipe)
-                asset.delete(recursive=True)
+                for segment in pipe_segments(pipe):
+                    asset = _name_to_asset(segment)
+                    asset.delete(recursive=True)
 
         # ------------------------------------------------------------------------------------------
         # Important: This code below must be placed after the "Placement" code. Reason: it relies
@@ -1044,7 +1065,6 @@ class ScenarioOutput:
 
         if self.write_result_db_profiles:
             logger.info("Writing asset result profile data to influxDB")
-            results = self.extract_results()
 
             influxdb_conn_settings = ConnectionSettings(
                 host=self.influxdb_host,
@@ -1066,7 +1086,11 @@ class ScenarioOutput:
             for asset_name in [
                 *self.energy_system_components.get("heat_source", []),
                 *self.energy_system_components.get("heat_demand", []),
-                *self.energy_system_components.get("heat_pipe", []),
+                *[
+                    segment
+                    for pipe in self.energy_system_components.get("heat_pipe", [])
+                    for segment in pipe_segments(pipe)
+                ],
                 *self.energy_system_components.get("heat_buffer", []),
                 *self.energy_system_components.get("ates", []),
                 *self.energy_system_components.get("heat_exchanger", []),
@@ -1143,12 +1167,17 @@ class ScenarioOutput:
                         elif asset_name in [*self.energy_system_components.get("pump", [])]:
                             variables_one_hydraulic_system = ["Pump_power"]
                             variables_two_hydraulic_system = ["Pump_power"]
-                    if asset_name in [*self.energy_system_components.get("heat_pipe", [])]:
+                    pipe_name = (
+                        network_reduction.reduced_name(asset_name)
+                        if network_reduction is not None
+                        else asset_name
+                    )
+                    if pipe_name in [*self.energy_system_components.get("heat_pipe", [])]:
                         variables_one_hydraulic_system.append("PostProc.Velocity")
                         variables_two_hydraulic_system.append("PostProc.Velocity")
                         # Velocity at the pipe outlet [m/s]
                         post_processed_velocity = (
-                            results[f"{asset_name}.HeatOut.Q"] / parameters[f"{asset_name}.area"]
+                            results[f"{asset_name}.HeatOut.Q"] / parameters[f"{pipe_name}.area"]
                         )
 
                     # Depending on the port set, different carriers are assigned
@@ -7,12 +7,15 @@ import esdl
 
 from mesido.esdl.esdl_mixin import ESDLMixin
 from mesido.esdl.esdl_parser import ESDLFileParser
+from mesido.esdl.prepared_problem import PreparedProblem
 from mesido.esdl.profile_parser import ProfileReaderFromFile
 from mesido.head_loss_class import HeadLossOption
 from mesido.network_common import NetworkSettings
 from mesido.physics_mixin import PhysicsMixin
 from mesido.workflows.io.write_output import ScenarioOutput
+from mesido.workflows.utils.adapt_profiles import adapt_timeseries_to_time_aggregation
 from mesido.workflows.utils.helpers import main_decorator
+from mesido.workflows.utils.telemetry import TelemetryMixin
 
 import numpy as np
 
@@ -224,6 +227,7 @@ class MultiCommoditySimulator(
     ScenarioOutput,
     _GoalsAndOptions,
     PhysicsMixin,
+    TelemetryMixin,
     LinearizedOrderGoalProgrammingMixin,
     SinglePassGoalProgrammingMixin,
     ESDLMixin,
@@ -263,6 +267,20 @@ class MultiCommoditySimulator(
         self._qpsol = None
         self._priorities_output = []
 
+        # Optional strategy to aggregate the profiles to fewer time steps, e.g. the
+        # AdaptiveTimeStepAggregation, see mesido.workflows.utils.time_aggregation
+        self._time_aggregation = kwargs.get("time_aggregation", None)
+
+    def read(self):
+        """
+        Reads the profiles and, if a time aggregation is set, adapts them to the aggregated time
+        steps.
+        """
+        super().read()
+
+        if self._time_aggregation is not None:
+            adapt_timeseries_to_time_aggregation(self, self._time_aggregation)
+
     def pre(self):
         self._qpsol = CachingQPSol()
 
@@ -693,6 +711,11 @@ def run_sequatially_staged_simulation(
     for quicker run of the optimization/simulation. To ensure a physically sound result the
     variables that affect the outcome of the next stage are constrained by setting bounds, e.g. the
     amount of stored energy in a storage.
+    The stages share a PreparedProblem, such that the ESDL is parsed and the profiles are read
+    only once. A prepared problem can also be passed as the prepared_problem keyword argument, or
+    None to disable the sharing.
+    When a Telemetry object is passed as the telemetry keyword argument, the wall time of every
+    window and the statistics of every priority are recorded in it.
 
     Parameters
     ----------
@@ -751,6 +774,8 @@ def run_sequatially_staged_simulation(
     # benefit and the writing of the results dict will fail.
     assert simulation_window_size >= 2
 
+    kwargs.setdefault("prepared_problem", PreparedProblem())
+
     total_results = None
     # This is an initial value for end_time, will be corrected after the first stage
     end_time = 2 * simulation_window_size
@@ -770,6 +795,7 @@ def run_sequatially_staged_simulation(
         sub_end_time = min(end_time, simulated_window + simulation_window_size)
 
         # max operation for start_index to avoid the overlap function in the first stage
+        window_start_time = time.time()
         solution = run_optimization_problem(
             MultiCommoditySimulatorTimeSequential,
             start_index=max(simulated_window - 1, 0),
@@ -777,6 +803,14 @@ def run_sequatially_staged_simulation(
             storage_initial_state_bounds=storage_initial_state_bounds,
             **kwargs,
         )
+        if kwargs.get("telemetry") is not None:
+            kwargs["telemetry"].record_solution(
+                "window",
+                solution,
+                time.time() - window_start_time,
+                start_index=max(simulated_window - 1, 0),
+                end_index=sub_end_time,
+            )
         if not end_time_confirmed:
             end_time = len(solution._full_time_series)
             end_time_confirmed = True
@@ -818,6 +852,8 @@ def run_sequatially_staged_simulation(
                         storage_initial_state_bounds[f"{asset}.{variable}"] = (lb, ub)
 
     print(time.time() - tic)
+    if kwargs.get("telemetry") is not None:
+        kwargs["telemetry"].record("simulation", wall_time=time.time() - tic)
 
     return OptimisationOverview(total_results, bounds, parameters, aliases)
 
@@ -7,10 +7,10 @@ from mesido.esdl.esdl_mixin import ESDLMixin
 from mesido.head_loss_class import HeadLossOption
 from mesido.techno_economic_mixin import TechnoEconomicMixin
 from mesido.workflows.io.write_output import ScenarioOutput
-from mesido.workflows.utils.adapt_profiles import (
-    adapt_hourly_year_profile_to_day_averaged_with_hourly_peak_day,
-)
+from mesido.workflows.utils.adapt_profiles import adapt_profiles_to_time_aggregation
 from mesido.workflows.utils.helpers import main_decorator
+from mesido.workflows.utils.telemetry import TelemetryMixin
+from mesido.workflows.utils.time_aggregation import PeakDayAggregation
 
 import numpy as np
 
@@ -142,6 +142,7 @@ class NetworkSimulator(
     ScenarioOutput,
     _GoalsAndOptions,
     TechnoEconomicMixin,
+    TelemetryMixin,
     LinearizedOrderGoalProgrammingMixin,
     SinglePassGoalProgrammingMixin,
     ESDLMixin,
@@ -166,6 +167,23 @@ class NetworkSimulator(
         super().__init__(*args, **kwargs)
         self._qpsol = None
 
+        # Optional strategy to aggregate the profiles to fewer time steps, e.g. the
+        # AdaptiveTimeStepAggregation, see mesido.workflows.utils.time_aggregation
+        self._time_aggregation = kwargs.get("time_aggregation", None)
+        self._peak_day_indices = []
+
+    def read(self):
+        """
+        Reads the profiles and, if a time aggregation is set, adapts them to the aggregated time
+        steps.
+        """
+        super().read()
+
+        if self._time_aggregation is not None:
+            self._peak_day_indices, _, _ = adapt_profiles_to_time_aggregation(
+                self, self._time_aggregation
+            )
+
     def pre(self):
         self._qpsol = CachingQPSol()
 
@@ -337,30 +355,26 @@ class NetworkSimulatorHIGHSTestCase(NetworkSimulatorHIGHS):
 
 
 class NetworkSimulatorHIGHSWeeklyTimeStep(NetworkSimulatorHIGHS):
+    """
+    Simulates a year with the profiles averaged over blocks of days, except for the day with the
+    peak demand, unless a different time aggregation is passed.
+    """
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self.__indx_max_peak = None
         self.__day_steps = 5
+        if self._time_aggregation is None:
+            self._time_aggregation = PeakDayAggregation(day_steps=self.__day_steps)
 
     def parameters(self, ensemble_member):
         parameters = super().parameters(ensemble_member)
-        parameters["peak_day_index"] = self.__indx_max_peak
-        parameters["time_step_days"] = self.__day_steps
+        parameters["peak_day_index"] = self._peak_day_indices[0] if self._peak_day_indices else None
+        # The length of the averaged time steps is only fixed with the PeakDayAggregation
+        if isinstance(self._time_aggregation, PeakDayAggregation):
+            parameters["time_step_days"] = self._time_aggregation.day_steps
         return parameters
 
-    def read(self):
-        """
-        Reads the yearly profile with hourly time steps and adapt to a daily averaged profile
-        except for the day with the peak demand.
-        """
-        super().read()
-
-        self.__indx_max_peak, _, _ = adapt_hourly_year_profile_to_day_averaged_with_hourly_peak_day(
-            self, self.__day_steps
-        )
-        logger.info("HeatProblem read")
-
 
 # -------------------------------------------------------------------------------------------------
 @main_decorator
@@ -2,6 +2,9 @@ from __future__ import annotations
 
 import datetime
 import logging
+from typing import Dict, Optional
+
+from mesido.workflows.utils.time_aggregation import PeakDayAggregation, TimeAggregation
 
 import numpy as np
 
@@ -12,6 +15,44 @@ logger = logging.getLogger("WarmingUP-MPC")
 logger.setLevel(logging.INFO)
 
 
+def time_step_start_indices(data_times: np.ndarray, new_times: np.ndarray) -> np.ndarray:
+    """
+    Returns the indices of the input times at which the new (aggregated) time steps start. New
+    times that are not an input time, i.e. the end of the last time step, are skipped.
+
+    The mapping only depends on the time grids, such that it can be computed once and used to
+    average all profiles, see :py:func:`average_over_time_steps`.
+    """
+    data_times = np.asarray(data_times, dtype=float)
+    new_times = np.asarray(new_times, dtype=float)
+    indices = np.minimum(np.searchsorted(data_times, new_times), len(data_times) - 1)
+    indices = indices[data_times[indices] == new_times]
+    assert len(indices) > 0 and indices[0] == 0
+    return indices
+
+
+def average_over_time_steps(values: np.ndarray, start_indices: np.ndarray) -> np.ndarray:
+    """
+    Average the rows of the (number of profiles, number of input times) array over the time steps
+    starting at `start_indices`. The value of a time step is the average of the input values
+    from the start of the previous time step up to its own start, as the value at a time is
+    active over the preceding time step. The value of the first time is not utilized, and is set
+    equal to the value of the second time to avoid artificial zeros.
+
+    Returns an array of shape (number of profiles, number of time steps + 1), the last column is
+    the average over the remaining input values after the start of the last time step.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    sums = np.add.reduceat(values, start_indices, axis=1)
+    counts = np.diff(np.append(start_indices, values.shape[1]))
+    averages = sums / counts
+    return np.concatenate([averages[:, :1], averages], axis=1)
+
+
+def _data_times(problem: object, data) -> np.ndarray:
+    return problem.io.datetimes[0].timestamp() + np.asarray(data.times, dtype=float)
+
+
 def set_data_with_averages_and_peak_day(
     datastore: DataStore,
     variable_name: str,
@@ -25,46 +66,89 @@ def set_data_with_averages_and_peak_day(
         datastore.set_timeseries(
             variable=variable_name,
             datetimes=new_date_times,
-            values=np.asarray([0.0] * len(new_date_times)),
+            values=np.zeros(len(new_date_times)),
             ensemble_member=ensemble_member,
             check_duplicates=True,
         )
         return
 
-    new_data = list()
-    data_timestamps = data.times
-    data_datetimes = [
-        problem.io.datetimes[0] + datetime.timedelta(seconds=s) for s in data_timestamps
-    ]
-    assert new_date_times[0] == data_datetimes[0]
-    data_values = data.values
-
-    values_for_mean = [0.0]
-    for dt, val in zip(data_datetimes, data_values):
-        if dt in new_date_times:
-            new_data.append(np.mean(values_for_mean))
-            values_for_mean = [val]
-        else:
-            values_for_mean.append(val)
-
-    # At this point new_data[0] = 0.0. This value is not utilized. The heat demand value
-    # new_data[1] at new_date_times[1] is active from new_date_times[0] up to new_date_times[1]. To
-    # ensure a no 0.0 heat demand values end up in the optimization, new_data[0] is forced to have
-    # an artificial value below
-    new_data[0] = new_data[1]
-
-    # last datetime is not in input data, so we need to take the mean of the last bit
-    new_data.append(np.mean(values_for_mean))
+    start_indices = time_step_start_indices(
+        _data_times(problem, data), [x.timestamp() for x in new_date_times]
+    )
+    new_data = average_over_time_steps(data.values, start_indices)[0]
 
     datastore.set_timeseries(
         variable=variable_name,
         datetimes=new_date_times,
-        values=np.asarray(new_data),
+        values=new_data,
         ensemble_member=ensemble_member,
         check_duplicates=True,
     )
 
 
+def _set_aggregated_timeseries(
+    problem,
+    new_datastore: DataStore,
+    ensemble_member: int,
+    time_aggregation: TimeAggregation,
+    profiles: Dict[str, Optional[np.ndarray]],
+    data_times: Optional[np.ndarray],
+    total_heat_demand: Optional[np.ndarray],
+    total_cold_demand: Optional[np.ndarray],
+):
+    """
+    Determines the aggregated time steps for the profiles of the ensemble member, and sets the
+    profiles averaged over these time steps in the new datastore. Variables without a profile
+    are set to zero.
+    """
+    parameters = problem.parameters(ensemble_member)
+    io_datetimes = problem.io.datetimes
+
+    variables = [var_name for var_name, values in profiles.items() if values is not None]
+    values = np.array([profiles[var_name] for var_name in variables], dtype=float).reshape(
+        len(variables), len(io_datetimes)
+    )
+
+    # The profiles are scaled, such that all profiles weigh equally in the aggregation
+    scale = np.max(np.abs(values), axis=1, keepdims=True)
+    scaled_values = np.divide(values, scale, out=np.zeros_like(values), where=scale > 0.0)
+
+    aggregation = time_aggregation.aggregate(scaled_values, total_heat_demand, total_cold_demand)
+
+    # The last time step has the same length as the last input time step
+    if len(io_datetimes) > 1:
+        last_time_step = io_datetimes[-1] - io_datetimes[-2]
+    else:
+        last_time_step = datetime.timedelta(hours=1)
+    new_date_times = [io_datetimes[i] for i in aggregation.time_steps]
+    new_date_times.append(io_datetimes[-1] + last_time_step)
+    new_date_times = np.asarray(new_date_times)
+    parameters["times"] = [x.timestamp() for x in new_date_times]
+
+    peak_day_indices = [
+        int(np.searchsorted(aggregation.time_steps, day * 24)) for day in aggregation.peak_days
+    ]
+
+    # The mapping from the input time steps to the new time steps is computed once, and used
+    # to average all profiles at once
+    if variables:
+        start_indices = time_step_start_indices(data_times, parameters["times"])
+        new_values = dict(zip(variables, average_over_time_steps(values, start_indices)))
+    else:
+        new_values = dict()
+
+    for var_name in profiles:
+        new_datastore.set_timeseries(
+            variable=var_name,
+            datetimes=new_date_times,
+            values=new_values.get(var_name, np.zeros(len(new_date_times))),
+            ensemble_member=ensemble_member,
+            check_duplicates=True,
+        )
+
+    return new_date_times, peak_day_indices
+
+
 def adapt_hourly_year_profile_to_day_averaged_with_hourly_peak_day(problem, problem_day_steps: int):
     """
     Adapt yearly porifle with hourly time steps to a common profile (daily averaged profile except
@@ -76,6 +160,27 @@ def adapt_hourly_year_profile_to_day_averaged_with_hourly_peak_day(problem, prob
         - cold_demand_nominal: max cold demand value found for a specific cold demand
     """
 
+    peak_day_indices, heat_demand_nominal, cold_demand_nominal = adapt_profiles_to_time_aggregation(
+        problem, PeakDayAggregation(day_steps=problem_day_steps)
+    )
+
+    return peak_day_indices[0], heat_demand_nominal, cold_demand_nominal
+
+
+def adapt_profiles_to_time_aggregation(problem, time_aggregation: TimeAggregation):
+    """
+    Adapt yearly profile with hourly time steps to the aggregated time steps of the time
+    aggregation strategy, see :py:mod:`mesido.workflows.utils.time_aggregation`. The heat and
+    cold demand, heat source and price profiles are averaged over the hours of every aggregated
+    time step.
+
+    Return the following:
+        - peak_day_indices: the indices of the (hourly) time steps at which the peak days start,
+          the day with the highest peak first
+        - heat_demand_nominal: max demand value found for a specific heating demand
+        - cold_demand_nominal: max cold demand value found for a specific cold demand
+    """
+
     demands = problem.energy_system_components.get("heat_demand", [])
     new_datastore = DataStore(problem)
     new_datastore.reference_datetime = problem.io.datetimes[0]
@@ -83,134 +188,152 @@ def adapt_hourly_year_profile_to_day_averaged_with_hourly_peak_day(problem, prob
     cold_demands = problem.energy_system_components.get("cold_demand", [])
 
     for ensemble_member in range(problem.ensemble_size):
-        parameters = problem.parameters(ensemble_member)
         total_demand = None
         heat_demand_nominal = dict()
+        # The variables to adapt, with their hourly profile or None if they have no profile
+        profiles = dict()
+        data_times = None
 
         for demand in demands:
+            var_name = f"{demand}.target_heat_demand"
+            profiles[var_name] = None
             try:
-                demand_values = problem.get_timeseries(
-                    f"{demand}.target_heat_demand", ensemble_member
-                ).values
+                data = problem.get_timeseries(var_name, ensemble_member)
             except KeyError:
                 continue
+            demand_values = data.values
+            data_times = _data_times(problem, data)
             if total_demand is None:
-                total_demand = demand_values
+                total_demand = demand_values.copy()
             else:
                 total_demand += demand_values
             heat_demand_nominal[f"{demand}.Heat_demand"] = max(demand_values)
             heat_demand_nominal[f"{demand}.Heat_flow"] = max(demand_values)
+            profiles[var_name] = demand_values
 
-        # TODO: the approach of picking one peak day was introduced for a network with a tree
-        #  layout and all big sources situated at the root of the tree. It is not guaranteed
-        #  that an optimal solution is reached in different network topologies.
-        idx_max = int(np.argmax(total_demand))
-        max_day = idx_max // 24
-        nr_of_days = len(total_demand) // 24
-        new_date_times = list()
-        day_steps = problem_day_steps
-
-        problem_indx_max_peak = max_day // day_steps
-        if max_day % day_steps > 0:
-            problem_indx_max_peak += 1.0
-
-        for day in range(0, nr_of_days, day_steps):
-            if day == max_day // day_steps * day_steps:
-                if max_day > day:
-                    new_date_times.append(problem.io.datetimes[day * 24])
-                new_date_times.extend(problem.io.datetimes[max_day * 24 : max_day * 24 + 24])
-                if (day + day_steps - 1) > max_day:
-                    new_date_times.append(problem.io.datetimes[max_day * 24 + 24])
-            else:
-                new_date_times.append(problem.io.datetimes[day * 24])
-        new_date_times.append(problem.io.datetimes[-1] + datetime.timedelta(hours=1))
-
-        new_date_times = np.asarray(new_date_times)
-        parameters["times"] = [x.timestamp() for x in new_date_times]
-
-        for demand in demands:
-            var_name = f"{demand}.target_heat_demand"
-            set_data_with_averages_and_peak_day(
-                datastore=new_datastore,
-                variable_name=var_name,
-                ensemble_member=ensemble_member,
-                new_date_times=new_date_times,
-                problem=problem,
-            )
-        # ------------------------------------------------------------------------------------------
-        # cooling demands
         total_cold_demand = None
         cold_demand_nominal = dict()
 
         for demand in cold_demands:
+            var_name = f"{demand}.target_cold_demand"
+            profiles[var_name] = None
             try:
-                cold_demand_values = problem.get_timeseries(
-                    f"{demand}.target_cold_demand", ensemble_member
-                ).values
+                data = problem.get_timeseries(var_name, ensemble_member)
             except KeyError:
                 continue
+            cold_demand_values = data.values
+            data_times = _data_times(problem, data)
             if total_cold_demand is None:
-                total_cold_demand = cold_demand_values
+                total_cold_demand = cold_demand_values.copy()
             else:
                 total_cold_demand += cold_demand_values
             cold_demand_nominal[f"{demand}.Cold_demand"] = max(cold_demand_values)
             cold_demand_nominal[f"{demand}.Heat_flow"] = max(cold_demand_values)
-
-        # TODO: find the peak cooling day and adapt to hourly
-
-        for demand in cold_demands:
-            var_name = f"{demand}.target_cold_demand"
-            set_data_with_averages_and_peak_day(
-                datastore=new_datastore,
-                variable_name=var_name,
-                ensemble_member=ensemble_member,
-                new_date_times=new_date_times,
-                problem=problem,
-            )
-        # end cooling demands
-        # ------------------------------------------------------------------------------------------
+            profiles[var_name] = cold_demand_values
 
         # TODO: this has not been tested but is required if a production profile is included
         #  in the data
         for source in problem.energy_system_components.get("heat_source", []):
             var_name = f"{source}.maximum_heat_source"
             try:
-                problem.get_timeseries(variable=var_name, ensemble_member=ensemble_member)
+                data = problem.get_timeseries(variable=var_name, ensemble_member=ensemble_member)
             except KeyError:
                 logger.debug(
                     f"Source {source} has no production profile, thus it also will "
                     f"not be adapted to a different time scales."
                 )
                 continue
-
-            set_data_with_averages_and_peak_day(
-                datastore=new_datastore,
-                variable_name=var_name,
-                ensemble_member=ensemble_member,
-                new_date_times=new_date_times,
-                problem=problem,
-            )
+            data_times = _data_times(problem, data)
+            profiles[var_name] = data.values
 
         for carrier_properties in problem.esdl_carriers.values():
             carrier_name = carrier_properties["name"]
             var_name = f"{carrier_name}.price_profile"
+            profiles[var_name] = None
             try:
-                problem.get_timeseries(variable=var_name, ensemble_member=ensemble_member)
+                data = problem.get_timeseries(variable=var_name, ensemble_member=ensemble_member)
             except KeyError:
                 logger.debug(
                     f"Carrier {carrier_name} has no price profile, thus it also will "
                     f"not be adapted to different time scales."
                 )
-            set_data_with_averages_and_peak_day(
-                datastore=new_datastore,
-                variable_name=var_name,
-                ensemble_member=ensemble_member,
-                new_date_times=new_date_times,
-                problem=problem,
-            )
+                continue
+            data_times = _data_times(problem, data)
+            profiles[var_name] = data.values
+
+        new_date_times, peak_day_indices = _set_aggregated_timeseries(
+            problem,
+            new_datastore,
+            ensemble_member,
+            time_aggregation,
+            profiles,
+            data_times,
+            total_demand,
+            total_cold_demand,
+        )
+
+    problem.io = new_datastore
+
+    logger.info(
+        f"Profile data has been adapted to a common format with {len(new_date_times)} time steps"
+    )
+
+    return peak_day_indices, heat_demand_nominal, cold_demand_nominal
+
+
+def adapt_timeseries_to_time_aggregation(problem, time_aggregation: TimeAggregation):
+    """
+    Adapt all time series of the problem, e.g. the demand, production and price profiles of any
+    commodity, to the aggregated time steps of the time aggregation strategy, see
+    :py:mod:`mesido.workflows.utils.time_aggregation`. Unlike
+    :py:func:`adapt_profiles_to_time_aggregation` the input time steps do not have to be hourly.
+
+    The peaks and storage turning points used by the aggregation are those of the total heat and
+    cold demand. Without heat or cold demands, the sum of all (scaled) demand profiles is used.
+
+    Return the following:
+        - peak_day_indices: the indices of the time steps at which the peak days start, the day
+          with the highest peak first
+    """
+
+    new_datastore = DataStore(problem)
+    new_datastore.reference_datetime = problem.io.datetimes[0]
+
+    for ensemble_member in range(problem.ensemble_size):
+        profiles = dict()
+        data_times = None
+        for var_name in problem.io.get_timeseries_names(ensemble_member):
+            data = problem.get_timeseries(var_name, ensemble_member)
+            data_times = _data_times(problem, data)
+            profiles[var_name] = data.values
+
+        def _total(suffix):
+            demands = [v for k, v in profiles.items() if k.endswith(suffix)]
+            if not demands:
+                return None
+            if suffix == "_demand":
+                # Different commodities, so we sum the scaled demands
+                demands = [d / np.max(np.abs(d)) for d in demands if np.max(np.abs(d)) > 0.0]
+            return np.sum(demands, axis=0) if demands else None
+
+        total_heat_demand = _total(".target_heat_demand")
+        total_cold_demand = _total(".target_cold_demand")
+        if total_heat_demand is None and total_cold_demand is None:
+            total_heat_demand = _total("_demand")
+
+        new_date_times, peak_day_indices = _set_aggregated_timeseries(
+            problem,
+            new_datastore,
+            ensemble_member,
+            time_aggregation,
+            profiles,
+            data_times,
+            total_heat_demand,
+            total_cold_demand,
+        )
 
     problem.io = new_datastore
 
-    logger.info("Profile data has been adapted to a common format")
+    logger.info(f"Time series have been adapted to {len(new_date_times)} time steps")
 
-    return problem_indx_max_peak, heat_demand_nominal, cold_demand_nominal
+    return peak_day_indices
@@ -0,0 +1,298 @@
+import logging
+from typing import Any, Dict, Optional
+
+import casadi as ca
+
+from mesido.constraint_profiler import (
+    ConstraintProfiler,
+    OTHER_ASSET_TYPE,
+    _asset_name,
+    _asset_types,
+)
+
+import numpy as np
+
+import pandas as pd
+
+from rtctools.util import run_optimization_problem
+
+DRY_RUN_RETURN_STATUS = "Dry run"
+
+# The origin of the variables of the (pycml) model, i.e. the ones that are not added by a mixin
+MODEL_ORIGIN = "model"
+
+TOTALS = ["continuous", "binary", "integer", "constraints", "nonzeros"]
+
+
+class _DryRunSolver:
+    """
+    Stand-in for the CasADi solver that does not solve the problem but returns the initial guess.
+    """
+
+    def __init__(self, name, solver, nlp, options):
+        pass
+
+    def __call__(self, x0, **kwargs):
+        return {"f": ca.DM(np.nan), "x": x0}
+
+    def stats(self):
+        return {"return_status": DRY_RUN_RETURN_STATUS, "success": False}
+
+
+class DryRunMixin:
+    """
+    Runs pre() and the transcription of the first priority of a problem, but does not solve it
+    and does not run post(). The transcribed problem is kept in dry_run_transcription.
+
+    The options in energy_system_options() and the network settings can be overridden with the
+    dry_run_options keyword argument, e.g. {"neglect_pipe_heat_losses": True,
+    "heat_network_settings.head_loss_option": HeadLossOption.LINEARIZED_N_LINES_EQUALITY}.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.__dry_run_options = kwargs.get("dry_run_options", {})
+        self.dry_run_transcription = None
+
+        super().__init__(*args, **kwargs)
+
+    def energy_system_options(self):
+        options = super().energy_system_options()
+        for name, value in self.__dry_run_options.items():
+            if "." in name:
+                settings, setting = name.split(".", 1)
+                getattr(self, settings)[setting] = value
+            else:
+                options[name] = value
+        return options
+
+    def transcribe(self):
+        transcription = super().transcribe()
+        if self.dry_run_transcription is None:
+            self.dry_run_transcription = transcription
+        return transcription
+
+    def solver_options(self):
+        options = super().solver_options()
+        options["casadi_solver"] = _DryRunSolver
+        return options
+
+    def solver_success(self, solver_stats, log_solver_failure_as_error):
+        if solver_stats.get("return_status") == DRY_RUN_RETURN_STATUS:
+            return False, logging.DEBUG
+        return super().solver_success(solver_stats, log_solver_failure_as_error)
+
+    def priority_completed(self, priority):
+        pass
+
+    def post(self):
+        pass
+
+
+class ModelSizeReport:
+    """
+    The size of the (first priority of the) problem: the number of continuous, binary and integer
+    variables, constraints and nonzeros in the Jacobian of the constraints.
+
+    totals: dict with the totals of the problem.
+    variables: table with the variables per origin (the mixin that adds them or "model") and
+        asset type.
+    constraints: table with the constraints and nonzeros per origin (mixin and builder) and asset
+        type. Constraints that are not built by a constraint builder of a mixin, e.g. the
+        equations of the model and the goals, are in the row with origin "other".
+    options: table with per overridden option the change of the totals, when option variations
+        were given.
+    """
+
+    def __init__(
+        self,
+        totals: Dict[str, int],
+        variables: pd.DataFrame,
+        constraints: pd.DataFrame,
+        options: Optional[pd.DataFrame] = None,
+    ):
+        self.totals = totals
+        self.variables = variables
+        self.constraints = constraints
+        self.options = options
+
+    def by_asset_type(self) -> pd.DataFrame:
+        """
+        Returns a table with the variables, constraints and nonzeros per asset type.
+        """
+        variables = self.variables.groupby("asset_type")[["continuous", "binary", "integer"]].sum()
+        constraints = self.constraints.groupby("asset_type")[["constraints", "nonzeros"]].sum()
+        table = variables.join(constraints, how="outer").fillna(0).astype(int)
+        return table.sort_values("nonzeros", ascending=False)
+
+    def by_origin(self) -> pd.DataFrame:
+        """
+        Returns a table with the variables, constraints and nonzeros per originating mixin.
+        """
+        variables = self.variables.groupby("origin")[["continuous", "binary", "integer"]].sum()
+        constraints = self.constraints.assign(
+            origin=self.constraints["origin"].str.split(".").str[0]
+        )
+        constraints = constraints.groupby("origin")[["constraints", "nonzeros"]].sum()
+        table = variables.join(constraints, how="outer").fillna(0).astype(int)
+        return table.sort_values("nonzeros", ascending=False)
+
+    def format(self) -> str:
+        """
+        Returns the report as text.
+        """
+        lines = ["Model size: " + ", ".join(f"{k} {v}" for k, v in self.totals.items()), ""]
+        lines.append("Per asset type:")
+        lines.append(self.by_asset_type().to_string())
+        lines.append("")
+        lines.append("Per origin:")
+        lines.append(self.by_origin().to_string())
+        if self.options is not None:
+            lines.append("")
+            lines.append("Change per option:")
+            lines.append(self.options.to_string(index=False))
+        return "\n".join(lines)
+
+
+def _variable_origins(problem) -> Dict[str, str]:
+    """
+    Returns per variable the class that adds it to the problem. As every path_variables and
+    extra_variables property extends the variables of the classes after it in the MRO, a variable
+    is added by the last class in the MRO that returns it.
+    """
+    origins = {}
+    for cls in type(problem).__mro__:
+        for attribute in ["path_variables", "extra_variables"]:
+            prop = vars(cls).get(attribute)
+            if not isinstance(prop, property):
+                continue
+            for variable in prop.fget(problem):
+                origins[variable.name()] = cls.__name__
+    return origins
+
+
+def _model_size(problem, profiler: ConstraintProfiler) -> ModelSizeReport:
+    discrete, lbx, ubx, lbg, ubg, x0, nlp = problem.dry_run_transcription
+    discrete = np.array(discrete, dtype=bool)
+    lbx = np.array(lbx, dtype=float).ravel()
+    ubx = np.array(ubx, dtype=float).ravel()
+    binary = discrete & (lbx >= 0.0) & (ubx <= 1.0)
+
+    origins = _variable_origins(problem)
+    asset_types = _asset_types(problem)
+    indices = problem._CollocatedIntegratedOptimizationProblem__indices_as_lists[0]
+    rows = {}
+    for variable, variable_indices in indices.items():
+        asset = _asset_name(variable)
+        key = (origins.get(variable, MODEL_ORIGIN), asset_types.get(asset, OTHER_ASSET_TYPE))
+        counts = rows.setdefault(key, np.zeros(3, dtype=int))
+        is_binary = binary[variable_indices]
+        is_discrete = discrete[variable_indices]
+        counts += [np.sum(~is_discrete), np.sum(is_binary), np.sum(is_discrete & ~is_binary)]
+    variables = pd.DataFrame(
+        [(*key, *counts) for key, counts in rows.items()],
+        columns=["origin", "asset_type", "continuous", "binary", "integer"],
+    )
+
+    n_constraints = int(nlp["g"].size1())
+    n_nonzeros = int(ca.jacobian_sparsity(nlp["g"], nlp["x"]).nnz())
+    constraints = profiler.asset_type_report()
+    constraints = pd.DataFrame(
+        {
+            "origin": constraints["mixin"] + "." + constraints["builder"],
+            "asset_type": constraints["asset_type"],
+            "constraints": constraints["constraints"],
+            "nonzeros": constraints["nonzeros"],
+        }
+    )
+    other = pd.DataFrame(
+        [
+            {
+                "origin": OTHER_ASSET_TYPE,
+                "asset_type": OTHER_ASSET_TYPE,
+                "constraints": max(n_constraints - constraints["constraints"].sum(), 0),
+                "nonzeros": max(n_nonzeros - constraints["nonzeros"].sum(), 0),
+            }
+        ]
+    )
+    constraints = pd.concat([constraints, other], ignore_index=True)
+
+    totals = {
+        "continuous": int(np.sum(~discrete)),
+        "binary": int(np.sum(binary)),
+        "integer": int(np.sum(discrete & ~binary)),
+        "constraints": n_constraints,
+        "nonzeros": n_nonzeros,
+    }
+    return ModelSizeReport(totals, variables, constraints)
+
+
+def model_size_report(
+    problem_class,
+    solver_class=None,
+    option_variations: Optional[Dict[str, Any]] = None,
+    **kwargs,
+) -> ModelSizeReport:
+    """
+    Builds the problem without solving it and reports its size, per asset type and per
+    originating mixin. The problem is transcribed for the first priority, the goals of the later
+    priorities are not included.
+
+    The contribution of options in energy_system_options() or the network settings is estimated
+    by building the problem again for every option in option_variations with the option
+    overridden, e.g.:
+
+    report = model_size_report(
+        EndScenarioSizingStaged,
+        option_variations={
+            "neglect_pipe_heat_losses": True,
+            "heat_network_settings.head_loss_option": HeadLossOption.LINEARIZED_N_LINES_EQUALITY,
+        },
+        **kwargs,
+    )
+    print(report.format())
+
+    Parameters
+    ----------
+    problem_class : The problem class.
+    solver_class : The solver and its settings to be used for the problem.
+    option_variations : Dict with per option (or "<network settings>.<setting>") the value that is
+        compared with the value of the problem class.
+    kwargs : The keyword arguments of the problem, as for run_optimization_problem.
+
+    Returns
+    -------
+    The ModelSizeReport of the problem.
+    """
+
+    # The dry run mixin comes first, such that it also overrides the options of the solver class
+    bases = (DryRunMixin, problem_class)
+    if solver_class is not None and not issubclass(problem_class, solver_class):
+        bases = (DryRunMixin, solver_class, problem_class)
+    dry_run_problem_class = type(problem_class.__name__, bases, {})
+
+    def build(dry_run_options):
+        profiler = ConstraintProfiler()
+        problem = run_optimization_problem(
+            dry_run_problem_class,
+            constraint_profiler=profiler,
+            dry_run_options=dry_run_options,
+            **kwargs,
+        )
+        return _model_size(problem, profiler)
+
+    report = build({})
+
+    if option_variations:
+        rows = []
+        for name, value in option_variations.items():
+            option_report = build({name: value})
+            rows.append(
+                {
+                    "option": name,
+                    "value": getattr(value, "name", value),
+                    **{k: option_report.totals[k] - report.totals[k] for k in TOTALS},
+                }
+            )
+        report.options = pd.DataFrame(rows, columns=["option", "value", *TOTALS])
+
+    return report
@@ -0,0 +1,304 @@
+import hashlib
+import logging
+import pickle
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from mesido import __version__
+
+import numpy as np
+
+from rtctools.optimization.timeseries import Timeseries
+
+logger = logging.getLogger("mesido")
+
+# Increase when the way the stage results are stored changes, such that results stored by an
+# older version are no longer used.
+STAGE_RESULT_FORMAT_VERSION = 1
+
+
+class StagePolicy:
+    """
+    Base class of the bound-tightening policies of a staged sizing. A policy derives bounds for a
+    stage from the solution of the previous stage, e.g. to only allow pipe classes close to the
+    ones that were selected before.
+    """
+
+    def bounds(self, solution, results: Dict[str, np.ndarray]) -> Dict[str, Tuple[Any, Any]]:
+        """
+        Returns the bounds for the next stage.
+
+        :param solution: The solved problem of the previous stage.
+        :param results: The results of the previous stage.
+
+        :returns: A dict with the bounds of the variables that are tightened.
+        """
+        raise NotImplementedError
+
+
+class PipeClassPolicy(StagePolicy):
+    """
+    The pipe class of every optional pipe is limited to the class that was selected in the
+    previous stage and the next sizes_up larger classes. A removed pipe (first pipe class) stays
+    removed.
+
+    :param sizes_up: The number of larger pipe classes that are allowed.
+    """
+
+    def __init__(self, sizes_up: int = 1):
+        self.sizes_up = sizes_up
+
+    def bounds(self, solution, results):
+        bounds = {}
+        for pipe_classes in solution.get_pipe_class_map().values():
+            sizes_up_left = 0
+            first_pipe_class = True
+            for var_name in pipe_classes.values():
+                v = results[var_name][0]
+                if first_pipe_class and abs(v) == 1.0:
+                    bounds[var_name] = (abs(v), abs(v))
+                    sizes_up_left = self.sizes_up
+                elif abs(v) == 1.0:
+                    bounds[var_name] = (0.0, abs(v))
+                    sizes_up_left = self.sizes_up
+                elif sizes_up_left > 0:
+                    bounds[var_name] = (0.0, 1.0)
+                    sizes_up_left -= 1
+                else:
+                    bounds[var_name] = (abs(v), abs(v))
+                first_pipe_class = False
+        return bounds
+
+
+class AggregationCountPolicy(StagePolicy):
+    """
+    The aggregation count of the heat sources and heat buffers gets a lower bound equal to the
+    (rounded) aggregation count of the previous stage. A ValueError is raised when this lower
+    bound exceeds the upper bound of the aggregation count.
+    """
+
+    def bounds(self, solution, results):
+        bounds = {}
+        problem_bounds = solution.bounds()
+        for asset in [
+            *solution.energy_system_components.get("heat_source", []),
+            *solution.energy_system_components.get("heat_buffer", []),
+        ]:
+            var_name = f"{asset}_aggregation_count"
+            round_lb = round(results[var_name][0])
+            ub = problem_bounds[var_name][1]
+            if round_lb >= 1 and (round_lb <= ub):
+                bounds[var_name] = (round_lb, ub)
+            elif round_lb > ub:
+                raise ValueError(
+                    f"{var_name}: The lower bound value {round_lb} > the upper bound {ub} value"
+                )
+        return bounds
+
+
+class FlowDirectionPolicy(StagePolicy):
+    """
+    The flow direction of the hot pipes is fixed at the time steps where the velocity in the
+    previous stage exceeds velocity_threshold, as is the disconnection of these pipes.
+
+    :param velocity_threshold: The velocity [m/s] above which the flow direction is fixed. The
+        default roughly represents the velocity at which a flow can compensate 4km of heat losses
+        in a pipe.
+    """
+
+    def __init__(self, velocity_threshold: float = 2.5e-2):
+        self.velocity_threshold = velocity_threshold
+
+    def bounds(self, solution, results):
+        bounds = {}
+        t = solution.times()
+        parameters = solution.parameters(0)
+        problem_bounds = solution.bounds()
+        for p in solution.energy_system_components.get("heat_pipe", []):
+            if p in solution.hot_pipes and parameters[f"{p}.area"] > 0.0:
+                bounds_pipe = problem_bounds[f"{p}__flow_direct_var"]
+                r = results[f"{p}__flow_direct_var"]
+                fixed = (
+                    np.abs(results[f"{p}.Q"] / parameters[f"{p}.area"]) > self.velocity_threshold
+                )
+                lb = np.where(fixed, r, bounds_pipe[0])
+                ub = np.where(fixed, r, bounds_pipe[1])
+                bounds[f"{p}__flow_direct_var"] = (Timeseries(t, lb), Timeseries(t, ub))
+                try:
+                    r = results[f"{p}__is_disconnected"]
+                    bounds[f"{p}__is_disconnected"] = (Timeseries(t, r), Timeseries(t, r))
+                except KeyError:
+                    pass
+        return bounds
+
+
+class Stage:
+    """
+    A stage of a staged sizing.
+
+    :param problem_class: The problem class of the stage, by default the problem class that is
+        passed to the staged sizing. The class must be a SettingsStaged class.
+    :param neglect_heat_losses: Whether the heat losses of the pipes are neglected in this stage.
+    :param policies: The policies that tighten the bounds of this stage based on the solution of
+        the previous stage. The bounds of earlier stages are kept unless a policy overrides them.
+    """
+
+    def __init__(
+        self,
+        problem_class: Optional[type] = None,
+        neglect_heat_losses: bool = False,
+        policies: Sequence[StagePolicy] = (),
+    ):
+        self.problem_class = problem_class
+        self.neglect_heat_losses = neglect_heat_losses
+        self.policies = list(policies)
+
+
+def default_stages() -> List[Stage]:
+    """
+    The default two stages: first without heat losses, then with heat losses where only the
+    selected pipe classes and one size up are allowed and the clear flow directions are fixed.
+    """
+    return [
+        Stage(neglect_heat_losses=True),
+        Stage(policies=[PipeClassPolicy(), AggregationCountPolicy(), FlowDirectionPolicy()]),
+    ]
+
+
+class StageResult(NamedTuple):
+    """
+    The part of the solution of a stage that is passed on to the next stage, and that is
+    persisted such that a staged sizing can be resumed after a failure in a later stage.
+
+    stage: the (1-based) number of the stage.
+    objective_value: the objective value of the stage.
+    results: the results of the stage, which are used as MIP start of the next stage.
+    priorities_output: the statistics per priority of this and the earlier stages.
+    next_bounds: the bounds of the next stage, derived with the policies of the next stage.
+    fingerprint: the hash of what determines the result (see stage_fingerprint), a persisted
+        result is only used by a run with the same fingerprint.
+    """
+
+    stage: int
+    objective_value: float
+    results: Dict[str, np.ndarray]
+    priorities_output: List[Tuple]
+    next_bounds: Dict[str, Tuple[Any, Any]]
+    fingerprint: Optional[str] = None
+
+
+def _describe_class(cls: Optional[type]) -> Optional[str]:
+    return f"{cls.__module__}.{cls.__qualname__}" if cls is not None else None
+
+
+def _describe_stage(stage: Stage) -> str:
+    policies = [
+        f"{_describe_class(type(policy))}{sorted(vars(policy).items())}"
+        for policy in stage.policies
+    ]
+    return (
+        f"problem_class={_describe_class(stage.problem_class)},"
+        f"neglect_heat_losses={stage.neglect_heat_losses},policies={policies}"
+    )
+
+
+def _describe_value(value: Any) -> str:
+    """
+    Returns a description of a value that does not depend on the process, e.g. of a time
+    aggregation strategy its class and attributes. A ValueError is raised for values that cannot
+    be described, e.g. functions or objects without attributes.
+    """
+    if value is None or isinstance(value, (bool, int, float, str, bytes, Path)):
+        return repr(value)
+    if isinstance(value, type):
+        return _describe_class(value)
+    if isinstance(value, (np.ndarray, np.generic)):
+        return repr(value.tolist())
+    if isinstance(value, (list, tuple)):
+        return f"[{','.join(_describe_value(v) for v in value)}]"
+    if isinstance(value, (set, frozenset)):
+        return f"{{{','.join(sorted(_describe_value(v) for v in value))}}}"
+    if isinstance(value, dict):
+        items = sorted(f"{_describe_value(k)}:{_describe_value(v)}" for k, v in value.items())
+        return f"{{{','.join(items)}}}"
+    if not callable(value) and hasattr(value, "__dict__") and vars(value):
+        return f"{_describe_class(type(value))}{_describe_value(vars(value))}"
+    raise ValueError(f"Cannot describe {value!r} in the fingerprint of a stage")
+
+
+def stage_fingerprint(
+    stages: Sequence[Stage],
+    stage: int,
+    problem_class: type,
+    solver_class: Optional[type] = None,
+    esdl_content: Optional[Union[str, bytes]] = None,
+    **kwargs,
+) -> str:
+    """
+    Returns the hash of what determines the result of a stage: the content of the ESDL, the
+    problem and solver class, the stages up to and including the stage after it (of which the
+    policies derive the bounds that are passed on), any additional attributes in kwargs, and the
+    mesido version. A ValueError is raised when an attribute in kwargs cannot be described, see
+    _describe_value.
+
+    :param stages: The stages of the staged sizing.
+    :param stage: The (1-based) number of the stage.
+    :param problem_class: The problem class that is passed to the staged sizing.
+    :param solver_class: The solver class that is passed to the staged sizing.
+    :param esdl_content: The content of the ESDL, or None if it is not known.
+    """
+    if isinstance(esdl_content, str):
+        esdl_content = esdl_content.encode("utf-8")
+    items = [
+        f"version={STAGE_RESULT_FORMAT_VERSION}",
+        f"mesido={__version__}",
+        f"esdl={hashlib.sha256(esdl_content).hexdigest() if esdl_content is not None else None}",
+        f"problem_class={_describe_class(problem_class)}",
+        f"solver_class={_describe_class(solver_class)}",
+        f"stage={stage}",
+        f"total_stages={len(stages)}",
+    ]
+    for number, s in enumerate(stages[: stage + 1], start=1):
+        items.append(f"stage_{number}={_describe_stage(s)}")
+    for name in sorted(kwargs):
+        items.append(f"{name}={_describe_value(kwargs[name])}")
+    return hashlib.sha256(";".join(items).encode("utf-8")).hexdigest()
+
+
+def stage_result_path(stage_results_folder: Union[str, Path], stage: int) -> Path:
+    """
+    Returns the path of the file in which the result of a stage is persisted.
+    """
+    return Path(stage_results_folder) / f"stage_{stage}.pickle"
+
+
+def save_stage_result(stage_results_folder: Union[str, Path], stage_result: StageResult) -> None:
+    path = stage_result_path(stage_results_folder, stage_result.stage)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(stage_result, f)
+
+
+def load_stage_result(
+    stage_results_folder: Union[str, Path], stage: int, fingerprint: Optional[str] = None
+) -> Optional[StageResult]:
+    """
+    Returns the persisted result of a stage, or None if the stage has not been persisted. When a
+    fingerprint is given, a persisted result with another fingerprint (e.g. of another ESDL or
+    other stages) is ignored as well.
+    """
+    path = stage_result_path(stage_results_folder, stage)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            stage_result = pickle.load(f)
+    except Exception:
+        logger.warning(f"Could not read the persisted result of stage {stage} from {path}")
+        return None
+    if fingerprint is not None and stage_result.fingerprint != fingerprint:
+        logger.info(
+            f"The persisted result of stage {stage} in {path} is of another run and is not used"
+        )
+        return None
+    return stage_result
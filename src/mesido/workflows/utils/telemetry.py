@@ -0,0 +1,276 @@
+import json
+import math
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from mesido import __version__
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# The numeric fields of the records that are exported as Prometheus gauges, with their help text
+PROMETHEUS_METRICS = {
+    "wall_time": ("seconds", "Wall time"),
+    "build_time": ("seconds", "Time spent on building (transcribing) the problem"),
+    "solve_time": ("seconds", "Time spent in the solver"),
+    "objective_value": ("", "Objective value"),
+    "mip_gap": ("", "Relative MIP gap reported by the solver"),
+    "node_count": ("", "Number of branch and bound nodes reported by the solver"),
+    "n_variables": ("", "Number of variables"),
+    "n_discrete_variables": ("", "Number of discrete variables"),
+    "n_constraints": ("", "Number of constraints"),
+    "peak_rss": ("bytes", "Peak resident set size of the process"),
+    "success": ("", "1 if the solver succeeded"),
+}
+
+# Keys under which the solvers report the MIP gap and the number of nodes in their solver stats
+_MIP_GAP_STATS = ["mip_gap", "gap", "MIPGap"]
+_NODE_COUNT_STATS = ["mip_node_count", "node_count", "NodeCount", "nodes"]
+
+
+def peak_rss() -> Optional[int]:
+    """
+    Returns the peak resident set size of the current process in bytes, or None if it is not
+    available on this platform.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return int(max_rss) if sys.platform == "darwin" else int(max_rss) * 1024
+
+
+def _first_stat(solver_stats: Dict[str, Any], keys: List[str]) -> Optional[float]:
+    for key in keys:
+        value = solver_stats.get(key)
+        if value is not None:
+            return float(value)
+    return None
+
+
+def _metric_name(event: str, field: str) -> str:
+    unit = PROMETHEUS_METRICS[field][0]
+    return f"mesido_{event}_{field}_{unit}" if unit else f"mesido_{event}_{field}"
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: Any) -> str:
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class Telemetry:
+    """
+    Collects performance records of optimization runs: per priority the wall, build and solve
+    time, the problem size and the solver statistics, and per stage (or simulation window) the
+    wall time. Every record also contains the peak RSS of the process at the time of recording,
+    the mesido version and the labels.
+
+    A telemetry object is passed to a problem with the telemetry keyword argument, the workflows
+    pass it on to all their stages, e.g.:
+
+    telemetry = Telemetry(path="telemetry.jsonl", labels={"network": "my_network"})
+    run_end_scenario_sizing(EndScenarioSizingStaged, telemetry=telemetry, **kwargs)
+    telemetry.write_prometheus("telemetry.prom")
+
+    :param path: Optional JSON Lines file to which every record is appended when it is recorded.
+    :param labels: Labels that are added to every record, e.g. the name of the network.
+    """
+
+    def __init__(
+        self, path: Optional[Union[str, Path]] = None, labels: Optional[Dict[str, str]] = None
+    ):
+        self.path = Path(path) if path is not None else None
+        self.labels = dict(labels or {})
+        self.records: List[Dict[str, Any]] = []
+        self._n_problems = 0
+
+    def add_problem(self) -> int:
+        """
+        Returns the index of a new problem that records in this telemetry, which distinguishes the
+        records of e.g. the stages of a staged optimization.
+        """
+        self._n_problems += 1
+        return self._n_problems - 1
+
+    def record(self, event: str, **fields) -> Dict[str, Any]:
+        """
+        Adds a record of the event with the given fields.
+
+        :param event: The type of the record, e.g. "priority" or "stage".
+
+        :returns: The record.
+        """
+        record = {
+            "event": event,
+            "timestamp": time.time(),
+            "mesido_version": __version__,
+            **self.labels,
+            **fields,
+            "peak_rss": peak_rss(),
+        }
+        self.records.append(record)
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        return record
+
+    def record_solution(self, event: str, solution, wall_time: float, **fields) -> Dict[str, Any]:
+        """
+        Adds a record of a solved problem, e.g. a stage of a staged optimization.
+
+        :param event: The type of the record, e.g. "stage" or "window".
+        :param solution: The solved problem.
+        :param wall_time: The wall time of creating and solving the problem.
+
+        :returns: The record.
+        """
+        success, _ = solution.solver_success(solution.solver_stats, False)
+        return self.record(
+            event,
+            problem=type(solution).__name__,
+            problem_index=getattr(solution, "_telemetry_problem_index", None),
+            wall_time=wall_time,
+            success=success,
+            objective_value=solution.objective_value,
+            **fields,
+        )
+
+    def write_jsonl(self, path: Union[str, Path]) -> None:
+        """
+        Writes all records to a JSON Lines file.
+        """
+        with open(path, "w") as f:
+            for record in self.records:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def to_prometheus(self) -> str:
+        """
+        Returns the records in the Prometheus text exposition format. Every numeric field becomes
+        a gauge named mesido_<event>_<field>, the other fields of the record are used as labels.
+        """
+        samples: Dict[tuple, List[str]] = {}
+        for record in self.records:
+            labels = ",".join(
+                f'{k}="{_escape_label_value(v)}"'
+                for k, v in record.items()
+                if k not in PROMETHEUS_METRICS
+                and k not in ("event", "timestamp")
+                and v is not None
+                and not isinstance(v, (dict, list))
+            )
+            for field in PROMETHEUS_METRICS:
+                value = record.get(field)
+                if value is None:
+                    continue
+                samples.setdefault((record["event"], field), []).append(
+                    f"{_metric_name(record['event'], field)}{{{labels}}} {_format_value(value)}"
+                )
+
+        lines = []
+        for (event, field), metric_samples in samples.items():
+            name = _metric_name(event, field)
+            lines.append(f"# HELP {name} {PROMETHEUS_METRICS[field][1]}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(metric_samples)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Union[str, Path]) -> None:
+        """
+        Writes the records to a file in the Prometheus text exposition format, e.g. for the
+        textfile collector of the node exporter.
+        """
+        with open(path, "w") as f:
+            f.write(self.to_prometheus())
+
+
+class TelemetryMixin:
+    """
+    Records the telemetry of every priority of a (goal programming) problem when a Telemetry
+    object is passed with the telemetry keyword argument: the wall time of the priority, the time
+    spent on building the problem and in the solver, the number of (discrete) variables and
+    constraints, and the MIP gap and node count when the solver reports them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._telemetry: Optional[Telemetry] = kwargs.get("telemetry")
+        self._telemetry_problem_index = (
+            self._telemetry.add_problem() if self._telemetry is not None else None
+        )
+        self.__telemetry_priority = None
+        self.__telemetry_timer = None
+        self.__telemetry_build_time = 0.0
+        self.__telemetry_size = {}
+
+    def transcribe(self):
+        if self._telemetry is None:
+            return super().transcribe()
+
+        timer = time.time()
+        discrete, lbx, ubx, lbg, ubg, x0, nlp = super().transcribe()
+        self.__telemetry_build_time += time.time() - timer
+        self.__telemetry_size = {
+            "n_variables": int(nlp["x"].size1()),
+            "n_discrete_variables": int(sum(discrete)),
+            "n_constraints": int(nlp["g"].size1()),
+        }
+        return discrete, lbx, ubx, lbg, ubg, x0, nlp
+
+    def priority_started(self, priority):
+        super().priority_started(priority)
+
+        self.__telemetry_priority = priority
+        self.__telemetry_timer = time.time()
+        self.__telemetry_build_time = 0.0
+
+    def priority_completed(self, priority):
+        super().priority_completed(priority)
+
+        self.__record_priority(True)
+
+    def post(self):
+        # A failed priority does not get to priority_completed()
+        if self.__telemetry_priority is not None:
+            self.__record_priority(False)
+
+        super().post()
+
+    def __record_priority(self, success):
+        if self._telemetry is None or self.__telemetry_priority is None:
+            return
+
+        wall_time = time.time() - self.__telemetry_timer
+        solver_stats = self.solver_stats or {}
+        solve_time = _first_stat(solver_stats, ["t_wall_total", "t_wall_solver"])
+        if solve_time is None:
+            solve_time = wall_time - self.__telemetry_build_time
+
+        self._telemetry.record(
+            "priority",
+            problem=type(self).__name__,
+            problem_index=self._telemetry_problem_index,
+            stage=getattr(self, "_stage", None),
+            priority=self.__telemetry_priority,
+            wall_time=wall_time,
+            build_time=self.__telemetry_build_time,
+            solve_time=solve_time,
+            success=success,
+            return_status=solver_stats.get("return_status"),
+            objective_value=self.objective_value,
+            mip_gap=_first_stat(solver_stats, _MIP_GAP_STATS),
+            node_count=_first_stat(solver_stats, _NODE_COUNT_STATS),
+            **self.__telemetry_size,
+        )
+        self.__telemetry_priority = None
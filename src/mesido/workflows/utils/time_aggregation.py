@@ -0,0 +1,453 @@
+import heapq
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+
+class TimeAggregationResult(NamedTuple):
+    """
+    The aggregated time grid.
+
+    time_steps: the indices of the hourly input time steps at which the aggregated time steps
+        start, in chronological order and starting at 0.
+    peak_days: the days that are kept with hourly time steps because of their peak demand, the
+        day with the highest peak first.
+    """
+
+    time_steps: np.ndarray
+    peak_days: List[int]
+
+
+class TimeAggregation:
+    """
+    Base class of the strategies to reduce a yearly profile with hourly time steps to fewer,
+    variable-length time steps.
+
+    The aggregated time steps are always chronological: every input hour belongs to exactly one
+    aggregated time step and the profiles are averaged over the hours of every time step. As a
+    result storage states remain linked from one time step to the next and the length of the time
+    steps, i.e. the weight of every time step, enters the energy balances of storage assets and
+    the operational costs of the financial constraints through the times of the problem.
+
+    The days with the highest peak in the total heat demand (and optionally in the total cold
+    demand) are kept with hourly time steps, such that the assets are sized for the peak.
+
+    :param n_peak_days: The number of days with the highest heat demand peak that are preserved
+        with hourly time steps.
+    :param n_peak_cold_days: The number of days with the highest cold demand peak that are
+        preserved with hourly time steps.
+    """
+
+    def __init__(self, n_peak_days: int = 1, n_peak_cold_days: int = 0):
+        self.n_peak_days = n_peak_days
+        self.n_peak_cold_days = n_peak_cold_days
+
+    @staticmethod
+    def _peak_days(total_demand: Optional[np.ndarray], n_days: int, n_peak_days: int) -> List[int]:
+        if total_demand is None or n_peak_days <= 0 or n_days == 0:
+            return []
+        daily_peaks = np.max(np.reshape(total_demand[: n_days * 24], (n_days, 24)), axis=1)
+        # The day of the very first maximum comes first, also when several days have equal peaks
+        order = np.argsort(-daily_peaks, kind="stable")
+        return [int(d) for d in order[:n_peak_days]]
+
+    def peak_days(
+        self,
+        total_heat_demand: Optional[np.ndarray],
+        total_cold_demand: Optional[np.ndarray] = None,
+    ) -> List[int]:
+        if total_heat_demand is None and total_cold_demand is None:
+            return []
+        n_hours = len(total_heat_demand if total_heat_demand is not None else total_cold_demand)
+        n_days = n_hours // 24
+
+        peak_days = self._peak_days(total_heat_demand, n_days, self.n_peak_days)
+        for day in self._peak_days(total_cold_demand, n_days, self.n_peak_cold_days):
+            if day not in peak_days:
+                peak_days.append(day)
+        return peak_days
+
+    def time_steps(
+        self,
+        profiles: np.ndarray,
+        peak_days: List[int],
+        total_demand: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Returns the (sorted) indices of the input hours at which the aggregated time steps start.
+
+        :param profiles: Array of shape (number of profiles, number of hours) with the profiles,
+            each scaled to the range [-1, 1].
+        :param peak_days: The days that must be kept with hourly time steps.
+        :param total_demand: The total heat and cold demand.
+        """
+        raise NotImplementedError
+
+    def aggregate(
+        self,
+        profiles: np.ndarray,
+        total_heat_demand: Optional[np.ndarray],
+        total_cold_demand: Optional[np.ndarray] = None,
+    ) -> TimeAggregationResult:
+        profiles = np.atleast_2d(np.asarray(profiles, dtype=float))
+        peak_days = self.peak_days(total_heat_demand, total_cold_demand)
+        total_demand = None
+        for demand in (total_heat_demand, total_cold_demand):
+            if demand is not None:
+                total_demand = demand if total_demand is None else total_demand + demand
+        time_steps = np.asarray(self.time_steps(profiles, peak_days, total_demand), dtype=int)
+        assert time_steps[0] == 0 and np.all(np.diff(time_steps) > 0)
+        return TimeAggregationResult(time_steps, peak_days)
+
+    @staticmethod
+    def _peak_day_hours(peak_days: List[int], n_hours: int) -> np.ndarray:
+        """
+        The hourly time steps of the peak days, and the start of the time step after every peak
+        day.
+        """
+        hours = set()
+        for day in peak_days:
+            hours.update(range(day * 24, day * 24 + 24))
+            if day * 24 + 24 < n_hours:
+                hours.add(day * 24 + 24)
+        return np.array(sorted(hours), dtype=int)
+
+
+class PeakDayAggregation(TimeAggregation):
+    """
+    Averages the days in fixed blocks of `day_steps` days, except for the peak days which keep
+    their hourly time steps. With a single peak day this is the original approach of the grow
+    workflow, which was introduced for a network with a tree layout and all big sources situated
+    at the root of the tree.
+    """
+
+    def __init__(self, day_steps: int = 5, n_peak_days: int = 1, n_peak_cold_days: int = 0):
+        super().__init__(n_peak_days, n_peak_cold_days)
+        self.day_steps = day_steps
+
+    def time_steps(
+        self,
+        profiles: np.ndarray,
+        peak_days: List[int],
+        total_demand: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        n_hours = profiles.shape[1]
+        n_days = n_hours // 24
+        block_starts = np.arange(0, n_days, self.day_steps) * 24
+        return np.union1d(block_starts, self._peak_day_hours(peak_days, n_hours))
+
+
+class RepresentativeDaysAggregation(TimeAggregation):
+    """
+    Clusters the days of the year on their (scaled) profiles with k-medoids or k-means. The
+    representative day of every cluster, i.e. the medoid or the day closest to the centroid, and
+    the peak days keep their hourly time steps. Consecutive other days of the same cluster are
+    averaged into a single time step of at most `max_block_days` days.
+
+    Compared to fixed blocks of days, the daily pattern of every type of day is resolved and days
+    with different profiles are not averaged together.
+
+    :param n_representative_days: The number of clusters.
+    :param method: "kmedoids" or "kmeans".
+    :param max_block_days: The maximum number of days averaged into a single time step.
+    :param seed: The seed of the initialization of the clustering.
+    """
+
+    def __init__(
+        self,
+        n_representative_days: int = 8,
+        method: str = "kmedoids",
+        max_block_days: int = 7,
+        n_peak_days: int = 1,
+        n_peak_cold_days: int = 0,
+        seed: int = 0,
+    ):
+        super().__init__(n_peak_days, n_peak_cold_days)
+        if method not in {"kmedoids", "kmeans"}:
+            raise ValueError(f"Unknown clustering method {method}, use 'kmedoids' or 'kmeans'")
+        self.n_representative_days = n_representative_days
+        self.method = method
+        self.max_block_days = max_block_days
+        self.seed = seed
+
+    @staticmethod
+    def _squared_distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        d = np.sum(a**2, axis=1)[:, None] + np.sum(b**2, axis=1)[None, :] - 2.0 * np.matmul(a, b.T)
+        return np.maximum(d, 0.0)
+
+    def _initial_centers(self, features: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """
+        k-means++ seeding, returns the indices of the initial centers.
+        """
+        n_days = len(features)
+        centers = [int(rng.integers(n_days))]
+        min_distances = self._squared_distances(features, features[centers])[:, 0]
+        for _ in range(1, self.n_representative_days):
+            total = np.sum(min_distances)
+            if total <= 0.0:
+                # All remaining days are equal to a center
+                remaining = np.setdiff1d(np.arange(n_days), centers)
+                centers.append(int(remaining[0]))
+            else:
+                centers.append(int(rng.choice(n_days, p=min_distances / total)))
+            min_distances = np.minimum(
+                min_distances, self._squared_distances(features, features[centers[-1:]])[:, 0]
+            )
+        return np.array(centers)
+
+    def _kmedoids(self, features: np.ndarray, rng: np.random.Generator, max_iter: int = 100):
+        distances = self._squared_distances(features, features)
+        medoids = self._initial_centers(features, rng)
+        for _ in range(max_iter):
+            labels = np.argmin(distances[:, medoids], axis=1)
+            new_medoids = medoids.copy()
+            for k in range(len(medoids)):
+                members = np.flatnonzero(labels == k)
+                if len(members) == 0:
+                    continue
+                costs = np.sum(distances[np.ix_(members, members)], axis=1)
+                new_medoids[k] = members[np.argmin(costs)]
+            if np.array_equal(new_medoids, medoids):
+                break
+            medoids = new_medoids
+        labels = np.argmin(distances[:, medoids], axis=1)
+        return labels, medoids
+
+    def _kmeans(self, features: np.ndarray, rng: np.random.Generator, max_iter: int = 100):
+        centroids = features[self._initial_centers(features, rng)]
+        labels = None
+        for _ in range(max_iter):
+            new_labels = np.argmin(self._squared_distances(features, centroids), axis=1)
+            if labels is not None and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            for k in range(len(centroids)):
+                members = labels == k
+                if np.any(members):
+                    centroids[k] = np.mean(features[members], axis=0)
+        distances = self._squared_distances(features, centroids)
+        representatives = []
+        for k in range(len(centroids)):
+            members = np.flatnonzero(labels == k)
+            if len(members) > 0:
+                representatives.append(members[np.argmin(distances[members, k])])
+        return labels, np.array(representatives, dtype=int)
+
+    def cluster_days(self, profiles: np.ndarray):
+        """
+        Returns the cluster label of every day and the representative days of the clusters.
+        """
+        n_profiles, n_hours = profiles.shape
+        n_days = n_hours // 24
+        # One row per day with the hourly values of all profiles
+        features = np.reshape(
+            np.transpose(
+                np.reshape(profiles[:, : n_days * 24], (n_profiles, n_days, 24)), (1, 0, 2)
+            ),
+            (n_days, n_profiles * 24),
+        )
+        if self.n_representative_days >= n_days:
+            return np.arange(n_days), np.arange(n_days)
+
+        rng = np.random.default_rng(self.seed)
+        if self.method == "kmedoids":
+            return self._kmedoids(features, rng)
+        else:
+            return self._kmeans(features, rng)
+
+    def time_steps(
+        self,
+        profiles: np.ndarray,
+        peak_days: List[int],
+        total_demand: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        n_hours = profiles.shape[1]
+        n_days = n_hours // 24
+        labels, representative_days = self.cluster_days(profiles)
+        hourly_days = {int(d) for d in representative_days} | set(peak_days)
+
+        time_steps = []
+        block_label = None
+        block_length = 0
+        for day in range(n_days):
+            if day in hourly_days:
+                time_steps.extend(range(day * 24, day * 24 + 24))
+                block_label = None
+            elif labels[day] != block_label or block_length >= self.max_block_days:
+                time_steps.append(day * 24)
+                block_label = labels[day]
+                block_length = 1
+            else:
+                block_length += 1
+        # Remaining hours of an incomplete day are averaged with the last time step
+        return np.array(time_steps, dtype=int)
+
+
+class SegmentedAggregation(TimeAggregation):
+    """
+    Merges adjacent hours into variable-length time steps until `n_time_steps` time steps remain.
+    Every merge is the one with the smallest increase in the (duration weighted) squared deviation
+    of the profiles from the time step averages, such that periods with little variation are
+    aggregated into long time steps while fast changes keep short time steps. The hours of the
+    peak days are never merged.
+
+    :param n_time_steps: The number of aggregated time steps, including the hourly time steps of
+        the peak days.
+    """
+
+    def __init__(self, n_time_steps: int = 300, n_peak_days: int = 1, n_peak_cold_days: int = 0):
+        super().__init__(n_peak_days, n_peak_cold_days)
+        self.n_time_steps = n_time_steps
+
+    def time_steps(
+        self,
+        profiles: np.ndarray,
+        peak_days: List[int],
+        total_demand: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        n_hours = profiles.shape[1]
+
+        # The segments are identified by their first hour, and form a doubly linked list
+        means = np.array(profiles.T, dtype=float)
+        sizes = np.ones(n_hours)
+        next_ = np.arange(1, n_hours + 1)
+        prev = np.arange(-1, n_hours - 1)
+        versions = np.zeros(n_hours, dtype=int)
+        locked = np.zeros(n_hours, dtype=bool)
+        for day in peak_days:
+            locked[day * 24 : day * 24 + 24] = True
+
+        def cost(i, j):
+            return sizes[i] * sizes[j] / (sizes[i] + sizes[j]) * np.sum((means[i] - means[j]) ** 2)
+
+        heap = [
+            (cost(i, i + 1), i, 0, 0)
+            for i in range(n_hours - 1)
+            if not locked[i] and not locked[i + 1]
+        ]
+        heapq.heapify(heap)
+
+        n_segments = n_hours
+        while n_segments > self.n_time_steps and heap:
+            _, i, version_i, version_j = heapq.heappop(heap)
+            j = next_[i]
+            # Skip merges of segments that no longer exist or have changed since
+            if j >= n_hours or versions[i] != version_i or versions[j] != version_j:
+                continue
+            if sizes[i] < 0 or sizes[j] < 0:
+                continue
+
+            size = sizes[i] + sizes[j]
+            means[i] = (sizes[i] * means[i] + sizes[j] * means[j]) / size
+            sizes[i] = size
+            sizes[j] = -1.0
+            next_[i] = next_[j]
+            if next_[j] < n_hours:
+                prev[next_[j]] = i
+            versions[i] += 1
+            n_segments -= 1
+
+            k = prev[i]
+            if k >= 0 and not locked[k]:
+                heapq.heappush(heap, (cost(k, i), k, versions[k], versions[i]))
+            k = next_[i]
+            if k < n_hours and not locked[k]:
+                heapq.heappush(heap, (cost(i, k), i, versions[i], versions[k]))
+
+        return np.flatnonzero(sizes > 0)
+
+
+class AdaptiveTimeStepAggregation(TimeAggregation):
+    """
+    Merges consecutive time steps as long as every (scaled) profile, i.e. the demands, production
+    caps and carrier prices, stays within `tolerance` over the merged time step. Where the
+    profiles change fast, e.g. at ramps, the time steps remain short, while smooth parts of the
+    profiles are covered by few long time steps.
+
+    Fine resolution is also kept around the peak of the total demand: the `peak_refinement` input
+    time steps on both sides of the peak are not merged. Furthermore, the time steps are split at
+    the storage turning points, where the total demand, smoothed over `smoothing_steps` input time
+    steps, crosses its average. Seasonal storage typically switches between charging and
+    discharging at these points.
+
+    This strategy works on the input time steps and does not require hourly input, by default no
+    peak days are preserved.
+
+    :param tolerance: The maximum range of every scaled profile within a time step.
+    :param max_steps_per_time_step: The maximum number of input time steps that are merged into a
+        single time step, None for no limit.
+    :param peak_refinement: The number of input time steps on both sides of the peak that are not
+        merged.
+    :param smoothing_steps: The width of the moving average used to find the storage turning
+        points, 0 to not split the time steps at turning points.
+    """
+
+    def __init__(
+        self,
+        tolerance: float = 0.1,
+        max_steps_per_time_step: Optional[int] = None,
+        peak_refinement: int = 12,
+        smoothing_steps: int = 168,
+        n_peak_days: int = 0,
+        n_peak_cold_days: int = 0,
+    ):
+        super().__init__(n_peak_days, n_peak_cold_days)
+        self.tolerance = tolerance
+        self.max_steps_per_time_step = max_steps_per_time_step
+        self.peak_refinement = peak_refinement
+        self.smoothing_steps = smoothing_steps
+
+    def turning_points(self, total_demand: np.ndarray) -> np.ndarray:
+        """
+        Returns the indices at which the smoothed total demand crosses its average.
+        """
+        window = min(self.smoothing_steps, len(total_demand))
+        if window <= 0:
+            return np.array([], dtype=int)
+        padded = np.pad(total_demand, (window // 2, window - 1 - window // 2), mode="edge")
+        smoothed = np.convolve(padded, np.full(window, 1.0 / window), mode="valid")
+        above = smoothed > np.mean(total_demand)
+        return np.flatnonzero(above[1:] != above[:-1]) + 1
+
+    def time_steps(
+        self,
+        profiles: np.ndarray,
+        peak_days: List[int],
+        total_demand: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        n_steps = profiles.shape[1]
+
+        # Input time steps that are not merged with any other
+        fixed = np.zeros(n_steps, dtype=bool)
+        for day in peak_days:
+            fixed[day * 24 : day * 24 + 24] = True
+        # Input time steps that start a new time step
+        starts = np.zeros(n_steps, dtype=bool)
+        starts[0] = True
+
+        if total_demand is not None and len(total_demand) == n_steps:
+            peak = int(np.argmax(total_demand))
+            fixed[max(peak - self.peak_refinement, 0) : peak + self.peak_refinement + 1] = True
+            starts[self.turning_points(total_demand)] = True
+
+        starts |= fixed
+        starts[1:] |= fixed[:-1]
+
+        max_length = self.max_steps_per_time_step or n_steps
+        time_steps = []
+        low = high = None
+        length = 0
+        for t in range(n_steps):
+            values = profiles[:, t]
+            if not starts[t] and length < max_length:
+                new_low = np.minimum(low, values)
+                new_high = np.maximum(high, values)
+                if np.all(new_high - new_low <= self.tolerance):
+                    low, high = new_low, new_high
+                    length += 1
+                    continue
+            time_steps.append(t)
+            low, high = values, values
+            length = 1
+
+        return np.array(time_steps, dtype=int)
@@ -0,0 +1,81 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from mesido.workflows.batch_runner import SUMMARY_FILE_NAME, main, read_manifest, run_batch
+
+import numpy as np
+
+import pandas as pd
+
+
+class TestBatchRunner(TestCase):
+    def test_batch_runner(self):
+        """
+        Run a batch of scenarios from a manifest in two worker processes.
+
+        Checks:
+        - the scenarios that solve succeed and their optimized ESDL is written in their own output
+          folder
+        - a scenario with a too large timeout is terminated and a failing scenario is reported as
+          failed, without stopping the other scenarios
+        - the summary table contains the objective values, the priority statistics and the KPIs
+        """
+        import models.test_case_small_network_ates_buffer_optional_assets.src.run_ates as run_ates
+
+        base_folder = Path(run_ates.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as folder:
+            manifest = {
+                "max_workers": 2,
+                "total_threads": 2,
+                "defaults": {
+                    "esdl_file": str(
+                        base_folder
+                        / "model"
+                        / "test_case_small_network_with_ates_with_buffer_all_optional.esdl"
+                    ),
+                    "input_timeseries_file": str(base_folder / "input" / "Warmte_test.csv"),
+                },
+                "scenarios": [
+                    {"name": "staged"},
+                    {"name": "gap", "solver_options": {"mip_rel_gap": 0.05}},
+                    {"name": "timeout", "timeout": 1.0},
+                    {"name": "missing_profiles", "input_timeseries_file": "missing.csv"},
+                ],
+            }
+            manifest_path = Path(folder) / "manifest.json"
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f)
+
+            scenarios, settings = read_manifest(manifest_path)
+            self.assertEqual(
+                [s.name for s in scenarios], [s["name"] for s in manifest["scenarios"]]
+            )
+            self.assertEqual(scenarios[1].solver_options, {"mip_rel_gap": 0.05})
+            self.assertEqual(scenarios[3].input_timeseries_file, Path(folder) / "missing.csv")
+
+            main([str(manifest_path), "--output-folder", str(Path(folder) / "output")])
+
+            summary = pd.read_csv(Path(folder) / "output" / SUMMARY_FILE_NAME)
+            self.assertEqual(list(summary["status"]), ["success", "success", "timeout", "failed"])
+            for name in ["staged", "gap"]:
+                self.assertTrue(
+                    (
+                        Path(folder)
+                        / "output"
+                        / name
+                        / "test_case_small_network_with_ates_with_buffer_all_optional_GrowOptimized"
+                        ".esdl"
+                    ).exists()
+                )
+            # Both stages have two priorities
+            self.assertIn("solve_4_objective_value", summary.columns)
+            np.testing.assert_allclose(
+                summary["solve_4_objective_value"][0], summary["objective_value"][0]
+            )
+            self.assertTrue(any(c.startswith("High level cost breakdown") for c in summary.columns))
+
+        with self.assertRaises(ValueError):
+            run_batch(scenarios[:1] * 2, output_folder=folder)
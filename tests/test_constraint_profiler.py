@@ -0,0 +1,125 @@
+from pathlib import Path
+from unittest import TestCase
+
+from mesido.constraint_profiler import ConstraintProfiler
+from mesido.esdl.esdl_parser import ESDLFileParser
+from mesido.esdl.profile_parser import ProfileReaderFromFile
+from mesido.workflows import EndScenarioSizingStaged
+
+import numpy as np
+
+from rtctools.util import run_optimization_problem
+
+
+class TestConstraintProfiler(TestCase):
+    def test_constraint_profiler(self):
+        """
+        Profile the constraint builders of the end scenario sizing of a small network.
+
+        Checks:
+        - the constraint builders of the mixins and the head loss class are reported, ranked by
+          time, and builders that are called by other builders are not reported separately
+        - the constraints and nonzeros per asset type add up to the ones per builder and the
+          reported constraints are part of the constraints of the problem
+        - the profiling does not change the solution
+        """
+        import models.test_case_small_network_ates_buffer_optional_assets.src.run_ates as run_ates
+
+        base_folder = Path(run_ates.__file__).resolve().parent.parent
+        kwargs = dict(
+            base_folder=base_folder,
+            esdl_file_name="test_case_small_network_with_ates_with_buffer_all_optional.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="Warmte_test.csv",
+            stage=1,
+            total_stages=1,
+        )
+
+        profiler = ConstraintProfiler()
+        solution = run_optimization_problem(
+            EndScenarioSizingStaged, constraint_profiler=profiler, **kwargs
+        )
+        solution_reference = run_optimization_problem(EndScenarioSizingStaged, **kwargs)
+
+        report = profiler.report()
+        builders = set(report["mixin"] + "." + report["builder"])
+        for builder in [
+            "HeatPhysicsMixin.flow_direction_path_constraints",
+            "HeatPhysicsMixin.heat_loss_path_constraints",
+            "AssetSizingMixin.pipe_topology_constraints",
+            "AssetSizingMixin.optional_asset_path_constraints",
+            "FinancialMixin.variable_operational_cost_constraints",
+            "_hn_head_loss_class._pipe_hydraulic_power_path_constraints",
+        ]:
+            self.assertIn(builder, builders)
+        self.assertNotIn("AssetSizingMixin.add_optional_asset_path_constraints", builders)
+        self.assertTrue(np.all(np.diff(report["time"]) <= 0.0))
+        np.testing.assert_allclose(report["time_share"].sum(), 1.0)
+
+        n_times = len(solution.times())
+        flow_direction = report[report["builder"] == "flow_direction_path_constraints"]
+        self.assertEqual(flow_direction["constraints"].iloc[0] % n_times, 0)
+        self.assertGreater(
+            flow_direction["nonzeros"].iloc[0], flow_direction["constraints"].iloc[0]
+        )
+
+        asset_type_report = profiler.asset_type_report()
+        self.assertIn("heat_pipe", set(asset_type_report["asset_type"]))
+        self.assertEqual(asset_type_report["constraints"].sum(), report["constraints"].sum())
+        self.assertEqual(asset_type_report["nonzeros"].sum(), report["nonzeros"].sum())
+        self.assertLessEqual(
+            report["constraints"].sum(), solution.transcribed_problem["nlp"]["g"].size1()
+        )
+
+        self.assertIn("flow_direction_path_constraints", profiler.format_report(top=None))
+
+        np.testing.assert_allclose(solution.objective_value, solution_reference.objective_value)
+
+    def test_constraint_profiler_heat_and_gas(self):
+        """
+        Profile the constraint builders of a network with a heat and a gas network, of which both
+        head loss classes build the same constraint builders.
+
+        Checks:
+        - the head loss builders of the heat and gas network are reported separately
+        - the head loss constraints of each network are attributed to the pipes of that network
+        - the constraints of all builders are part of the constraints of the problem
+        """
+        import models.source_pipe_sink.src.double_pipe_heat as example
+        from models.source_pipe_sink.src.double_pipe_heat import SourcePipeSink
+
+        base_folder = Path(example.__file__).resolve().parent.parent
+
+        profiler = ConstraintProfiler()
+        solution = run_optimization_problem(
+            SourcePipeSink,
+            base_folder=base_folder,
+            esdl_file_name="sourcesink_withgasboiler.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="timeseries_import.csv",
+            constraint_profiler=profiler,
+        )
+
+        report = profiler.report().set_index(["mixin", "builder"])
+        heat = report.loc[("_hn_head_loss_class", "_pipe_head_loss_path_constraints")]
+        gas = report.loc[("_gn_head_loss_class", "_pipe_head_loss_path_constraints")]
+        self.assertGreater(heat["constraints"], 0)
+        self.assertGreater(gas["constraints"], 0)
+
+        asset_type_report = profiler.asset_type_report()
+        builder = asset_type_report["builder"] == "_pipe_head_loss_path_constraints"
+        for mixin, asset_type in [
+            ("_hn_head_loss_class", "heat_pipe"),
+            ("_gn_head_loss_class", "gas_pipe"),
+        ]:
+            rows = asset_type_report[builder & (asset_type_report["mixin"] == mixin)]
+            self.assertEqual(set(rows["asset_type"]), {asset_type})
+            reported = report.loc[(mixin, "_pipe_head_loss_path_constraints")]
+            self.assertEqual(rows["constraints"].sum(), reported["constraints"])
+            self.assertEqual(rows["nonzeros"].sum(), reported["nonzeros"])
+
+        self.assertLessEqual(
+            report["constraints"].sum(), solution.transcribed_problem["nlp"]["g"].size1()
+        )
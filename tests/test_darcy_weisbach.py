@@ -0,0 +1,184 @@
+import tempfile
+from unittest import TestCase
+
+import mesido._darcy_weisbach as darcy_weisbach
+from mesido._pipe_linearization_cache import PipeLinearizationCache
+from mesido.network_common import NetworkSettings
+
+import numpy as np
+
+
+class TestDarcyWeisbach(TestCase):
+    def test_array_equal_to_scalar(self):
+        """
+        Check that the vectorized friction factor and head loss give the same results as the
+        scalar functions for laminar, transition and turbulent flow, for the different network
+        types.
+        """
+        velocities = np.array([0.0, 1.0e-4, 0.005, 0.02, 0.1, 1.0, 2.5])
+        diameters = np.array([0.05, 0.3, 1.2])
+
+        for network_type, pressure in [
+            (NetworkSettings.NETWORK_TYPE_HEAT, 0.0),
+            (NetworkSettings.NETWORK_TYPE_GAS, 8.0e5),
+            (NetworkSettings.NETWORK_TYPE_HYDROGEN, 0.0),
+        ]:
+            ff_array = darcy_weisbach.friction_factor_array(
+                velocities[np.newaxis, :],
+                diameters[:, np.newaxis],
+                2.0e-4,
+                60.0,
+                network_type=network_type,
+                pressure=pressure,
+            )
+            dh_array = darcy_weisbach.head_loss_array(
+                velocities[np.newaxis, :],
+                diameters[:, np.newaxis],
+                100.0,
+                2.0e-4,
+                60.0,
+                network_type=network_type,
+                pressure=pressure,
+            )
+            self.assertEqual(ff_array.shape, (len(diameters), len(velocities)))
+
+            for i, diameter in enumerate(diameters):
+                for j, velocity in enumerate(velocities):
+                    ff = darcy_weisbach.friction_factor(
+                        velocity,
+                        diameter,
+                        2.0e-4,
+                        60.0,
+                        network_type=network_type,
+                        pressure=pressure,
+                    )
+                    dh = darcy_weisbach.head_loss(
+                        velocity,
+                        diameter,
+                        100.0,
+                        2.0e-4,
+                        60.0,
+                        network_type=network_type,
+                        pressure=pressure,
+                    )
+                    self.assertIsInstance(ff, float)
+                    self.assertIsInstance(dh, float)
+                    np.testing.assert_allclose(ff_array[i, j], ff, rtol=1.0e-12)
+                    np.testing.assert_allclose(dh_array[i, j], dh, rtol=1.0e-12)
+
+    def test_zero_velocity_and_diameter(self):
+        """
+        Check that no flow, or a pipe without diameter, results in zero friction and head loss.
+        """
+        np.testing.assert_array_equal(
+            darcy_weisbach.head_loss_array([0.0, 1.0], [0.3, 0.0], 100.0, 2.0e-4, 60.0),
+            [0.0, 0.0],
+        )
+
+    def test_linear_fit_is_conservative(self):
+        """
+        Check that the linear lines of the head loss fit go through the Darcy-Weisbach curve at
+        the breakpoints and lie above it in between.
+        """
+        diameter = 0.3
+        area = np.pi * diameter**2 / 4.0
+        a, b = darcy_weisbach.get_linear_pipe_dh_vs_q_fit(
+            diameter, 100.0, 2.0e-4, 60.0, n_lines=5, v_max=2.5
+        )
+        self.assertEqual(len(a), 5)
+
+        v_points = np.linspace(0.0, 2.5, 6)
+        dh_points = darcy_weisbach.head_loss_array(v_points, diameter, 100.0, 2.0e-4, 60.0)
+        np.testing.assert_allclose(a * v_points[1:] * area + b, dh_points[1:])
+
+        v_mid = 0.5 * (v_points[1:] + v_points[:-1])
+        dh_mid = darcy_weisbach.head_loss_array(v_mid, diameter, 100.0, 2.0e-4, 60.0)
+        np.testing.assert_array_less(dh_mid, a * v_mid * area + b)
+
+    def test_adaptive_linearization(self):
+        """
+        Check that the adaptive placement of the breakpoints meets the maximum relative error with
+        less lines than the equally spaced linearization, for both the head loss and the hydraulic
+        power.
+        """
+        diameter = 0.3
+        area = np.pi * diameter**2 / 4.0
+        v = np.linspace(0.0, 2.5, 5001)
+        dh = darcy_weisbach.head_loss_array(v, diameter, 100.0, 2.0e-4, 60.0)
+
+        for max_relative_error in [0.005, 0.02]:
+            a, b = darcy_weisbach.get_linear_pipe_dh_vs_q_fit(
+                diameter,
+                100.0,
+                2.0e-4,
+                60.0,
+                n_lines=20,
+                v_max=2.5,
+                max_relative_error=max_relative_error,
+            )
+            self.assertLess(len(a), 20)
+            dh_linear = np.amax(a * (v * area)[:, np.newaxis] + b, axis=1)
+            np.testing.assert_array_less(dh - 1.0e-9, dh_linear)
+            np.testing.assert_array_less(dh_linear - dh, max_relative_error * dh[-1])
+
+            a, b = darcy_weisbach.get_linear_pipe_power_hydraulic_vs_q_fit(
+                988.0,
+                diameter,
+                100.0,
+                2.0e-4,
+                60.0,
+                n_lines=20,
+                v_max=2.5,
+                max_relative_error=max_relative_error,
+            )
+            self.assertLess(len(a), 20)
+
+        # When the maximum relative error cannot be met, n_lines equally spaced lines are used
+        a, b = darcy_weisbach.get_linear_pipe_dh_vs_q_fit(
+            diameter, 100.0, 2.0e-4, 60.0, n_lines=2, v_max=2.5, max_relative_error=0.001
+        )
+        np.testing.assert_array_equal(
+            a,
+            darcy_weisbach.get_linear_pipe_dh_vs_q_fit(
+                diameter, 100.0, 2.0e-4, 60.0, n_lines=2, v_max=2.5
+            )[0],
+        )
+
+
+class TestPipeLinearizationCache(TestCase):
+    def test_cached_equal_to_computed(self):
+        """
+        Check that the cached linearization coefficients are equal to the computed ones, both when
+        taken from memory and when taken from disk, and that different inputs do not share
+        coefficients.
+        """
+        expected = darcy_weisbach.get_linear_pipe_dh_vs_q_fit(
+            0.3, 100.0, 2.0e-4, 60.0, n_lines=5, v_max=2.5
+        )
+
+        with tempfile.TemporaryDirectory() as cache_folder:
+            cache = PipeLinearizationCache()
+            for _ in range(2):
+                a, b = cache.get_linear_pipe_dh_vs_q_fit(
+                    0.3, 100.0, 2.0e-4, 60.0, n_lines=5, v_max=2.5, cache_folder=cache_folder
+                )
+                np.testing.assert_array_equal(a, expected[0])
+                np.testing.assert_array_equal(b, expected[1])
+            self.assertEqual(cache.misses, 1)
+            self.assertEqual(cache.hits, 1)
+
+            # A new cache, e.g. in a next run, reads the coefficients from disk
+            cache = PipeLinearizationCache()
+            a, b = cache.get_linear_pipe_dh_vs_q_fit(
+                0.3, 100.0, 2.0e-4, 60.0, n_lines=5, v_max=2.5, cache_folder=cache_folder
+            )
+            np.testing.assert_array_equal(a, expected[0])
+            np.testing.assert_array_equal(b, expected[1])
+            self.assertEqual(cache.disk_hits, 1)
+            self.assertEqual(cache.misses, 0)
+
+            a, _ = cache.get_linear_pipe_dh_vs_q_fit(
+                0.3, 100.0, 2.0e-4, 60.0, n_lines=4, v_max=2.5, cache_folder=cache_folder
+            )
+            self.assertEqual(len(a), 4)
+            self.assertEqual(cache.misses, 1)
@@ -0,0 +1,66 @@
+import json
+from unittest import TestCase
+
+from mesido.esdl.asset_to_component_base import _AssetToComponentBase
+from mesido.esdl.edr_pipe_catalogue import EDRPipeCatalogue, EDR_PIPES_JSON
+from mesido.esdl.edr_pipe_class import EDRGasPipeClass, EDRPipeClass
+
+
+class TestEDRPipeCatalogue(TestCase):
+    def test_catalogue_equal_to_json(self):
+        """
+        Check that the indexed catalogue gives the same pipe properties as the EDR json file,
+        that the xml strings are only loaded when requested and that the catalogue is only
+        created once.
+        """
+        with open(EDR_PIPES_JSON, "r") as f:
+            edr_pipes = json.load(f)
+
+        catalogue = EDRPipeCatalogue()
+        self.assertEqual(len(catalogue), len(edr_pipes))
+        self.assertIsNone(catalogue._xml_strings)
+
+        for name, edr_pipe in edr_pipes.items():
+            self.assertIn(name, catalogue)
+            self.assertEqual(catalogue.inner_diameter(name), edr_pipe["inner_diameter"])
+            self.assertEqual(catalogue.u_values(name), (edr_pipe["u_1"], edr_pipe["u_2"]))
+            self.assertEqual(catalogue.investment_cost(name), edr_pipe["investment_costs"])
+            self.assertEqual(
+                catalogue.insulation_thicknesses(name), edr_pipe["insulation_thicknesses"]
+            )
+            self.assertEqual(
+                catalogue.conductivities_insulation(name), edr_pipe["conductivies_insulation"]
+            )
+
+        name = next(iter(edr_pipes))
+        self.assertEqual(catalogue.xml_string(name), edr_pipes[name]["xml_string"])
+        self.assertIsNotNone(catalogue._xml_strings)
+
+        self.assertIs(EDRPipeCatalogue.instance(), EDRPipeCatalogue.instance())
+
+    def test_edr_pipe_class(self):
+        """
+        Check that the EDR pipe classes get their properties, including the xml string, from the
+        catalogue.
+        """
+        with open(EDR_PIPES_JSON, "r") as f:
+            edr_pipes = json.load(f)
+
+        for name, edr_class_name in _AssetToComponentBase.STEEL_S1_PIPE_EDR_ASSETS.items():
+            edr_pipe = edr_pipes[edr_class_name]
+
+            pipe_class = EDRPipeClass.from_edr_class(name, edr_class_name, 2.5)
+            self.assertEqual(pipe_class.inner_diameter, edr_pipe["inner_diameter"])
+            self.assertEqual(pipe_class.u_values, (edr_pipe["u_1"], edr_pipe["u_2"]))
+            self.assertEqual(pipe_class.investment_costs, edr_pipe["investment_costs"])
+            self.assertEqual(pipe_class.xml_string, edr_pipe["xml_string"])
+
+            gas_pipe_class = EDRGasPipeClass.from_edr_class(name, edr_class_name, 2.5)
+            self.assertEqual(gas_pipe_class.inner_diameter, edr_pipe["inner_diameter"])
+            self.assertEqual(gas_pipe_class.investment_costs, edr_pipe["investment_costs"])
+            self.assertEqual(gas_pipe_class.xml_string, edr_pipe["xml_string"])
+
+            # Pipe classes are used as dictionary keys in the sizing, and should remain hashable
+            self.assertEqual(
+                hash(pipe_class), hash(EDRPipeClass.from_edr_class(name, edr_class_name, 2.5))
+            )
@@ -1,8 +1,13 @@
+import hashlib
+import logging
+import tempfile
 from pathlib import Path
 from unittest import TestCase
+from unittest.mock import patch
 
 import mesido._darcy_weisbach as darcy_weisbach
 from mesido.esdl.esdl_parser import ESDLFileParser
+from mesido.esdl.prepared_problem import PreparedProblem
 from mesido.esdl.profile_parser import ProfileReaderFromFile
 from mesido.workflows import (
     EndScenarioSizing,
@@ -10,7 +15,22 @@ from mesido.workflows import (
     EndScenarioSizingStaged,
     run_end_scenario_sizing,
 )
-from mesido.workflows.grow_workflow import EndScenarioSizingHeadLossStaged
+from mesido.workflows import grow_workflow
+from mesido.workflows.grow_workflow import (
+    EndScenarioSizingHeadLossStaged,
+    SolverGurobi,
+    SolverHIGHS,
+)
+from mesido.workflows.utils.model_size import model_size_report
+from mesido.workflows.utils.staging import (
+    AggregationCountPolicy,
+    FlowDirectionPolicy,
+    PipeClassPolicy,
+    Stage,
+    load_stage_result,
+    stage_fingerprint,
+)
+from mesido.workflows.utils.time_aggregation import PeakDayAggregation
 
 import numpy as np
 
@@ -120,6 +140,7 @@ class TestEndScenarioSizing(TestCase):
         - That buffer tank is only used on peak day
         - demand matching
         - Check if TCO goal included the desired cost components.
+        - The stage 1 solution is not passed as MIP start to stage 2 with HiGHS
 
         - Compare objective value of staged approach wit non-staged approach
 
@@ -197,6 +218,10 @@ class TestEndScenarioSizing(TestCase):
 
         np.testing.assert_allclose(obj / 1.0e6, solution_staged.objective_value)
 
+        # HiGHS does not use a MIP start, so the stage 1 solution is not passed to stage 2
+        self.assertIsNone(solution_staged._mip_start)
+        self.assertIsNone(solution_staged._mip_start_statistics)
+
         # comparing results of staged and unstaged problem definition. For larger systems there
         # might be a difference in the value but that would either be a difference within the
         # MIPgap (thus checking best bound objective is still smaller or equal than objective of
@@ -293,6 +318,274 @@ class TestEndScenarioSizing(TestCase):
                 if i < peak_day_indx or i > (peak_day_indx + 23):
                     np.testing.assert_allclose(heat_buffer[i], 0.0, atol=1.0e-6)
 
+    def test_end_scenario_sizing_prepared_problem(self):
+        """
+        Check that the stages of the staged sizing share a prepared problem.
+
+        Checks:
+        - the ESDL is parsed and the profiles are read only once
+        - the second stage reuses the ESDL assets and the topology of the first stage
+        - the result equals that of the stages without a prepared problem
+        """
+        import models.test_case_small_network_ates_buffer_optional_assets.src.run_ates as run_ates
+
+        base_folder = Path(run_ates.__file__).resolve().parent.parent
+        kwargs = dict(
+            base_folder=base_folder,
+            esdl_file_name="test_case_small_network_with_ates_with_buffer_all_optional.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="Warmte_test.csv",
+        )
+
+        prepared_problem = PreparedProblem()
+        with patch.object(
+            ESDLFileParser, "read_esdl", autospec=True, side_effect=ESDLFileParser.read_esdl
+        ) as read_esdl, patch.object(
+            ProfileReaderFromFile,
+            "_load_profiles_from_source",
+            autospec=True,
+            side_effect=ProfileReaderFromFile._load_profiles_from_source,
+        ) as load_profiles:
+            solution = run_end_scenario_sizing(
+                EndScenarioSizingStaged, prepared_problem=prepared_problem, **kwargs
+            )
+        self.assertEqual(read_esdl.call_count, 1)
+        self.assertEqual(load_profiles.call_count, 1)
+        self.assertIs(solution.esdl_assets, prepared_problem.esdl_assets)
+        self.assertIs(
+            solution.energy_system_topology, prepared_problem.topology(solution.pycml_model())
+        )
+
+        solution_not_prepared = run_end_scenario_sizing(
+            EndScenarioSizingStaged, prepared_problem=None, **kwargs
+        )
+        np.testing.assert_allclose(solution.objective_value, solution_not_prepared.objective_value)
+        results = solution.extract_results()
+        results_not_prepared = solution_not_prepared.extract_results()
+        for pipe_classes in solution.get_pipe_class_map().values():
+            for pipe_class_var in pipe_classes.values():
+                np.testing.assert_allclose(
+                    results[pipe_class_var], results_not_prepared[pipe_class_var]
+                )
+
+    def test_end_scenario_sizing_mip_start(self):
+        """
+        Check the MIP start of the second stage with a solver that uses the initial guess as MIP
+        start. HiGHS is used as solver, which ignores the initial guess, such that this test does
+        not need Gurobi or CPLEX.
+
+        Checks:
+        - the stage 1 solution is passed to stage 2
+        - only the initial guess of the first priority is checked, the later priorities start
+          from the solution of the previous priority
+        - the initial guess is also checked when the first priority fails
+        """
+        import models.test_case_small_network_ates_buffer_optional_assets.src.run_ates as run_ates
+
+        class SolverWithMIPStart(SolverHIGHS):
+            _solver_uses_mip_start = True
+
+        base_folder = Path(run_ates.__file__).resolve().parent.parent
+        solution = run_end_scenario_sizing(
+            EndScenarioSizingStaged,
+            solver_class=SolverWithMIPStart,
+            base_folder=base_folder,
+            esdl_file_name="test_case_small_network_with_ates_with_buffer_all_optional.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="Warmte_test.csv",
+        )
+
+        for source in solution.energy_system_components.get("heat_source", []):
+            self.assertIn(f"{source}.Heat_source", solution._mip_start)
+        priority, feasible, max_violation = solution._mip_start_statistics
+        self.assertEqual(priority, 1)
+        self.assertEqual(feasible, max_violation <= solution._mip_start_feasibility_tolerance)
+
+        class FailingSolverWithMIPStart(SolverWithMIPStart):
+            def solver_success(self, solver_stats, log_solver_failure_as_error):
+                if self._stage == 2:
+                    return False, logging.INFO
+                return super().solver_success(solver_stats, log_solver_failure_as_error)
+
+        solution = run_end_scenario_sizing(
+            EndScenarioSizingStaged,
+            solver_class=FailingSolverWithMIPStart,
+            base_folder=base_folder,
+            esdl_file_name="test_case_small_network_with_ates_with_buffer_all_optional.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="Warmte_test.csv",
+        )
+        self.assertEqual(solution._mip_start_statistics[0], 1)
+
+    def test_end_scenario_sizing_stages(self):
+        """
+        Check a staged sizing with three stages: without heat losses, with heat losses and fixed
+        flow directions and finally with head losses and fixed pipe classes.
+
+        Checks:
+        - demand matching
+        - the pipe classes of the last stage are fixed to those of the second stage
+        - the results of the first two stages are persisted and a resumed run only solves the
+          last stage
+        - the persisted results are only used by a run with the same stages, input timeseries and
+          problem options
+        """
+        import models.test_case_small_network_ates_buffer_optional_assets.src.run_ates as run_ates
+
+        base_folder = Path(run_ates.__file__).resolve().parent.parent
+        kwargs = dict(
+            base_folder=base_folder,
+            esdl_file_name="test_case_small_network_with_ates_with_buffer_all_optional.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="Warmte_test.csv",
+        )
+        stages = [
+            Stage(neglect_heat_losses=True),
+            Stage(policies=[PipeClassPolicy(), AggregationCountPolicy(), FlowDirectionPolicy()]),
+            Stage(
+                problem_class=EndScenarioSizingHeadLossStaged,
+                policies=[PipeClassPolicy(sizes_up=0), AggregationCountPolicy()],
+            ),
+        ]
+
+        with tempfile.TemporaryDirectory() as stage_results_folder:
+            solution = run_end_scenario_sizing(
+                EndScenarioSizingStaged,
+                stages=stages,
+                stage_results_folder=stage_results_folder,
+                **kwargs,
+            )
+            results = solution.extract_results()
+
+            self.assertIsInstance(solution, EndScenarioSizingHeadLossStaged)
+            self.assertEqual(solution._stage, 3)
+            demand_matching_test(solution, results)
+
+            stage_2 = load_stage_result(stage_results_folder, 2)
+            self.assertEqual(stage_2.stage, 2)
+            for pipe_classes in solution.get_pipe_class_map().values():
+                for pipe_class_var in pipe_classes.values():
+                    np.testing.assert_allclose(
+                        results[pipe_class_var], stage_2.results[pipe_class_var], atol=1.0e-6
+                    )
+
+            with patch.object(
+                grow_workflow,
+                "run_optimization_problem_solver",
+                side_effect=grow_workflow.run_optimization_problem_solver,
+            ) as run_stage:
+                solution_resumed = run_end_scenario_sizing(
+                    EndScenarioSizingStaged,
+                    stages=stages,
+                    stage_results_folder=stage_results_folder,
+                    **kwargs,
+                )
+            self.assertEqual(run_stage.call_count, 1)
+            self.assertEqual(run_stage.call_args.kwargs["stage"], 3)
+            np.testing.assert_allclose(
+                solution_resumed.objective_value, solution.objective_value, rtol=1.0e-6
+            )
+
+            # A persisted result of another run, here with other policies for the last stage,
+            # is not used
+            other_stages = [*stages[:2], Stage(policies=[PipeClassPolicy(sizes_up=1)])]
+            esdl_content = (base_folder / "model" / kwargs["esdl_file_name"]).read_bytes()
+            for stage_number in [1, 2]:
+                fingerprint = stage_fingerprint(
+                    stages, stage_number, EndScenarioSizingStaged, esdl_content=esdl_content
+                )
+                other_fingerprint = stage_fingerprint(
+                    other_stages, stage_number, EndScenarioSizingStaged, esdl_content=esdl_content
+                )
+                self.assertEqual(fingerprint == other_fingerprint, stage_number == 1)
+            self.assertIsNotNone(load_stage_result(stage_results_folder, 2, stage_2.fingerprint))
+            self.assertIsNone(load_stage_result(stage_results_folder, 2, other_fingerprint))
+
+            # The fingerprint covers the content of the input timeseries and the problem options,
+            # e.g. the time aggregation, and options that cannot be described are refused
+            fingerprint_kwargs = grow_workflow._stage_fingerprint_kwargs(kwargs)
+            self.assertEqual(
+                stage_fingerprint(
+                    stages, 2, EndScenarioSizingStaged, use_mip_start=None, **fingerprint_kwargs
+                ),
+                stage_2.fingerprint,
+            )
+            self.assertEqual(
+                fingerprint_kwargs["input_timeseries"],
+                hashlib.sha256(
+                    (base_folder / "input" / kwargs["input_timeseries_file"]).read_bytes()
+                ).hexdigest(),
+            )
+            other_kwargs = grow_workflow._stage_fingerprint_kwargs(
+                {**kwargs, "time_aggregation": PeakDayAggregation(day_steps=10)}
+            )
+            self.assertNotEqual(
+                stage_fingerprint(stages, 2, EndScenarioSizingStaged, **other_kwargs),
+                stage_fingerprint(stages, 2, EndScenarioSizingStaged, **fingerprint_kwargs),
+            )
+            with self.assertRaises(ValueError):
+                stage_fingerprint(stages, 2, EndScenarioSizingStaged, time_aggregation=object())
+
+    def test_end_scenario_sizing_dry_run(self):
+        """
+        Check the dry run of the staged sizing, which only builds the problems of the stages and
+        reports their size.
+
+        Checks:
+        - a report for every stage, of which the second stage (with heat losses) has more
+          constraints
+        - the variables, constraints and nonzeros per asset type and per origin add up to the
+          totals
+        - the change of the size for an option variation
+        - the dry run does not solve the problems, also not with another solver class
+        """
+        import models.test_case_small_network_ates_buffer_optional_assets.src.run_ates as run_ates
+
+        base_folder = Path(run_ates.__file__).resolve().parent.parent
+        kwargs = dict(
+            base_folder=base_folder,
+            esdl_file_name="test_case_small_network_with_ates_with_buffer_all_optional.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="Warmte_test.csv",
+        )
+
+        with patch.object(grow_workflow.ScenarioOutput, "_write_updated_esdl") as write_esdl:
+            reports = run_end_scenario_sizing(EndScenarioSizingStaged, dry_run=True, **kwargs)
+        write_esdl.assert_not_called()
+
+        self.assertEqual(len(reports), 2)
+        self.assertGreater(reports[1].totals["constraints"], reports[0].totals["constraints"])
+        for report in reports:
+            for table in [report.by_asset_type(), report.by_origin()]:
+                for column, total in report.totals.items():
+                    self.assertEqual(table[column].sum(), total)
+            self.assertGreater(report.totals["binary"], 0)
+            self.assertIn("heat_pipe", report.by_asset_type().index)
+            self.assertIn("HeatPhysicsMixin", report.by_origin().index)
+            self.assertIn("Per asset type", report.format())
+
+        report = model_size_report(
+            EndScenarioSizingStaged,
+            solver_class=SolverGurobi,
+            option_variations={"neglect_pipe_heat_losses": False},
+            stage=1,
+            total_stages=2,
+            neglect_heat_losses=True,
+            **kwargs,
+        )
+        self.assertEqual(report.totals, reports[0].totals)
+        option = report.options.iloc[0]
+        self.assertEqual(option["option"], "neglect_pipe_heat_losses")
+        self.assertEqual(
+            option["constraints"],
+            reports[1].totals["constraints"] - reports[0].totals["constraints"],
+        )
+
     def test_end_scenario_sizing_head_loss(self):
         """
         Test is EndScenarioSizingHeadLoss class is behaving as expected. E.g. should behave
@@ -1,7 +1,12 @@
+import shutil
+import tempfile
 import unittest
 from pathlib import Path
 
+import esdl
+
 from mesido.esdl.esdl_parser import ESDLFileParser, ESDLStringParser
+from mesido.esdl.esdl_snapshot import ESDLSnapshotCache
 from mesido.esdl.profile_parser import ProfileReaderFromFile
 
 import numpy as np
@@ -47,6 +52,127 @@ class TestESDLParsing(unittest.TestCase):
         # are exactly the same object
         np.testing.assert_equal(results_from_file_as_dict, results_from_string_as_dict)
 
+    def test_connectivity_index(self):
+        """
+        This test checks that the connectivity index of the parsed ESDL gives the asset of a
+        port, the ports and assets connected to an asset and the index of the connections on the
+        ports of a node, as found by walking the ESDL ports.
+        """
+        import models.unit_cases.case_1a.src.run_1a as run_1a
+
+        base_folder = Path(run_1a.__file__).resolve().parent.parent
+
+        esdl_parser = ESDLFileParser(esdl_path=base_folder / "model" / "1a.esdl")
+        esdl_parser.read_esdl()
+        assets = esdl_parser.get_assets()
+        index = esdl_parser.get_connectivity_index()
+
+        for asset in assets.values():
+            self.assertIs(index.asset(asset.id), asset)
+            self.assertIs(index.asset_by_name(asset.name), asset)
+            connected_ports = []
+            for port in [*asset.in_ports, *asset.out_ports]:
+                self.assertIs(index.port(port.id), port)
+                self.assertIs(index.port_asset(port), asset)
+                self.assertEqual(index.connected_ports(port.id), list(port.connectedTo))
+                connected_ports.extend(port.connectedTo)
+            connections = index.connections(asset.id)
+            self.assertEqual([c.connected_port for c in connections], connected_ports)
+            for c in connections:
+                self.assertEqual(c.connected_asset.id, c.connected_port.energyasset.id)
+
+        joint = index.asset_by_name("Joint_9580_ret")
+        self.assertEqual(
+            [a.name for a in index.neighbours(joint.id)],
+            ["Pipe_e6c6", "Pipe_275a", "Pipe_5871", "Pipe_b5ba"],
+        )
+        self.assertEqual(len(index.neighbours(joint.id, asset_type="Pipe")), 4)
+        self.assertEqual(len(index.connections(joint.id, commodity=esdl.HeatCommodity)), 4)
+        self.assertEqual(index.connections(joint.id, commodity=esdl.ElectricityCommodity), [])
+        self.assertEqual(index.neighbours(joint.id, asset_type="HeatingDemand"), [])
+        for i, c in enumerate(index.connections(joint.id)):
+            self.assertEqual(index.connection_index(joint.id, c.connected_port), i + 1)
+        with self.assertRaises(KeyError):
+            index.connection_index(joint.id, index.asset_by_name("HeatingDemand_2ab9").in_ports[0])
+
+    def test_esdl_snapshot(self):
+        """
+        This test checks that the energy system restored from an ESDL snapshot gives the same
+        assets, carriers and connections as the parsed ESDL, that the snapshot is rebuilt when
+        the ESDL changes, and that the results of a problem are the same with a snapshot.
+        """
+        import models.unit_cases_electricity.electrolyzer.src.example as example
+        from models.unit_cases_electricity.electrolyzer.src.example import MILPProblemInequality
+
+        base_folder = Path(example.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            esdl_path = Path(tmp_dir) / "h2.esdl"
+            shutil.copy(base_folder / "model" / "h2.esdl", esdl_path)
+            snapshot_cache = ESDLSnapshotCache(tmp_dir)
+
+            def parse():
+                esdl_parser = ESDLFileParser(esdl_path=esdl_path)
+                esdl_parser.snapshot_cache = snapshot_cache
+                esdl_parser.read_esdl()
+                return esdl_parser
+
+            parsed = parse()
+            restored = parse()
+            self.assertEqual((snapshot_cache.hits, snapshot_cache.misses), (1, 1))
+            self.assertTrue((Path(tmp_dir) / "h2.esdl.snapshot").exists())
+
+            self.assertEqual(restored.get_carrier_properties(), parsed.get_carrier_properties())
+            parsed_assets = parsed.get_assets()
+            restored_assets = restored.get_assets()
+            self.assertEqual(list(restored_assets), list(parsed_assets))
+            parsed_index = parsed.get_connectivity_index()
+            restored_index = restored.get_connectivity_index()
+            for asset_id, asset in parsed_assets.items():
+                restored_asset = restored_assets[asset_id]
+                self.assertEqual(restored_asset.name, asset.name)
+                self.assertEqual(restored_asset.asset_type, asset.asset_type)
+                for name, value in asset.attributes.items():
+                    if isinstance(value, (str, int, float)):
+                        self.assertEqual(restored_asset.attributes[name], value)
+                self.assertEqual(
+                    [
+                        (c.port.id, c.connected_port.id)
+                        for c in restored_index.connections(asset_id)
+                    ],
+                    [(c.port.id, c.connected_port.id) for c in parsed_index.connections(asset_id)],
+                )
+            restored_esh = restored.get_esh()
+            for asset_id in parsed_assets:
+                self.assertIs(
+                    restored_esh.get_by_id(asset_id),
+                    restored_assets[asset_id].attributes["port"][0].energyasset,
+                )
+
+            # A changed ESDL rebuilds the snapshot
+            esdl_path.write_text(esdl_path.read_text().replace('name="', 'name="x', 1))
+            parse()
+            self.assertEqual((snapshot_cache.hits, snapshot_cache.misses), (1, 2))
+            shutil.copy(base_folder / "model" / "h2.esdl", esdl_path)
+            parse()
+            self.assertEqual((snapshot_cache.hits, snapshot_cache.misses), (1, 3))
+
+            # The problem restores the energy system from the snapshot of the ESDL
+            kwargs = dict(
+                base_folder=base_folder,
+                esdl_file_name="h2.esdl",
+                esdl_parser=ESDLFileParser,
+                profile_reader=ProfileReaderFromFile,
+                input_timeseries_file="timeseries.csv",
+            )
+            solution = run_optimization_problem(MILPProblemInequality, **kwargs)
+            solution_from_snapshot = run_optimization_problem(
+                MILPProblemInequality, esdl_snapshot_folder=tmp_dir, **kwargs
+            )
+            np.testing.assert_equal(
+                dict(solution.extract_results()), dict(solution_from_snapshot.extract_results())
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
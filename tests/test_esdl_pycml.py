@@ -1,11 +1,15 @@
+import tempfile
 from pathlib import Path
 from unittest import TestCase
+from unittest.mock import patch
 
 from mesido.esdl.esdl_parser import ESDLFileParser
 from mesido.esdl.profile_parser import ProfileReaderFromFile
 
 import numpy as np
 
+from pymoca.backends.casadi.model import Model as _Model
+
 from rtctools.util import run_optimization_problem
 
 
@@ -44,6 +48,58 @@ class TestESDL(TestCase):
             case_esdl.extract_results()["demand.Heat_demand"],
         )
 
+    def test_model_cache(self):
+        """
+        Check that the simplified pycml model of an ESDL is stored in the model cache, and that a
+        problem of the same ESDL and model options reads it from the cache.
+
+        Checks:
+        - the second problem does not simplify the model and has the same solution
+        - the problem with other model options does not use the cached model
+        """
+        import models.test_case_small_network_ates_buffer_optional_assets.src.run_ates as run_ates
+        from mesido.workflows import EndScenarioSizingStaged
+
+        class EndScenarioSizingOtherVelocity(EndScenarioSizingStaged):
+            def energy_system_options(self):
+                options = super().energy_system_options()
+                options["estimated_velocity"] = 0.5 * options["estimated_velocity"]
+                return options
+
+        base_folder = Path(run_ates.__file__).resolve().parent.parent
+        with tempfile.TemporaryDirectory() as model_cache_folder:
+            kwargs = dict(
+                base_folder=base_folder,
+                esdl_file_name="test_case_small_network_with_ates_with_buffer_all_optional.esdl",
+                esdl_parser=ESDLFileParser,
+                profile_reader=ProfileReaderFromFile,
+                input_timeseries_file="Warmte_test.csv",
+                stage=1,
+                total_stages=1,
+                model_cache_folder=model_cache_folder,
+            )
+
+            solution = run_optimization_problem(EndScenarioSizingStaged, **kwargs)
+            self.assertEqual(len(list(Path(model_cache_folder).iterdir())), 1)
+
+            with patch.object(_Model, "simplify", side_effect=AssertionError):
+                solution_cached = run_optimization_problem(EndScenarioSizingStaged, **kwargs)
+
+            np.testing.assert_allclose(solution.objective_value, solution_cached.objective_value)
+            self.assertEqual(
+                solution.alias_relation.canonical_variables,
+                solution_cached.alias_relation.canonical_variables,
+            )
+            self.assertEqual(solution.bounds().keys(), solution_cached.bounds().keys())
+
+            problem = EndScenarioSizingOtherVelocity(
+                model_folder=base_folder / "model",
+                input_folder=base_folder / "input",
+                **{k: v for k, v in kwargs.items() if k != "base_folder"},
+            )
+            self.assertEqual(len(list(Path(model_cache_folder).iterdir())), 2)
+            self.assertNotEqual(problem.pycml_model_cache_key(), solution.pycml_model_cache_key())
+
     # def test_basic_source_and_demand_qth(self):
     #     import models.basic_source_and_demand.src.qth_comparison as qth_comparison
     #     from models.basic_source_and_demand.src.qth_comparison import QTHPython, QTHESDL
@@ -0,0 +1,55 @@
+from unittest import TestCase
+
+import CoolProp as cP
+
+from mesido.fluid_properties import FLUID_HYDROGEN, FLUID_WATER, FluidPropertyService
+
+import numpy as np
+
+
+class TestFluidProperties(TestCase):
+    def test_memoized_equal_to_coolprop(self):
+        """
+        Check that the memoized fluid properties are equal to the direct CoolProp values, and that
+        CoolProp is only called once for every distinct lookup.
+        """
+        service = FluidPropertyService()
+
+        for _ in range(3):
+            for temperature in [293.15, 343.15]:
+                self.assertEqual(
+                    service.density(temperature, 0.5e6, FLUID_WATER),
+                    cP.CoolProp.PropsSI("D", "T", temperature, "P", 0.5e6, FLUID_WATER),
+                )
+
+        self.assertEqual(service.coolprop_calls, 2)
+        self.assertEqual(service.cache_hits, 4)
+
+    def test_grid_interpolation(self):
+        """
+        Check that lookups within an interpolation grid are close to the CoolProp values, exact on
+        the grid points, and that lookups outside of the grid fall back to CoolProp.
+        """
+        service = FluidPropertyService()
+        temperatures = 273.15 + np.arange(0.0, 105.0, 5.0)
+        pressures = np.array([1.0, 5.0, 10.0]) * 1.0e5
+        service.add_grid(FLUID_HYDROGEN, temperatures, pressures, outputs=("D", "V"))
+        n_calls = service.coolprop_calls
+
+        self.assertEqual(
+            service.density(temperatures[3], pressures[1], FLUID_HYDROGEN),
+            cP.CoolProp.PropsSI("D", "T", temperatures[3], "P", pressures[1], FLUID_HYDROGEN),
+        )
+        np.testing.assert_allclose(
+            service.kinematic_viscosity(300.0, 7.0e5, FLUID_HYDROGEN),
+            cP.CoolProp.PropsSI("V", "T", 300.0, "P", 7.0e5, FLUID_HYDROGEN)
+            / cP.CoolProp.PropsSI("D", "T", 300.0, "P", 7.0e5, FLUID_HYDROGEN),
+            rtol=1.0e-3,
+        )
+        self.assertEqual(service.coolprop_calls, n_calls)
+
+        self.assertEqual(
+            service.density(400.0, 7.0e5, FLUID_HYDROGEN),
+            cP.CoolProp.PropsSI("D", "T", 400.0, "P", 7.0e5, FLUID_HYDROGEN),
+        )
+        self.assertEqual(service.coolprop_calls, n_calls + 1)
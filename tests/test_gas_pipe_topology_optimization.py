@@ -64,6 +64,74 @@ class TestGasNetwork(TestCase):
         np.testing.assert_allclose(results["GasProducer_c92e.GasOut.Q"], 0.0, atol=1e-10)
         np.testing.assert_array_less(0.0, results["GasProducer_17aa.GasOut.Q"])
 
+    def test_gas_pipe_top_adaptive_head_loss(self):
+        """
+        This test checks the topology optimization of gas pipes with the piece-wise linear
+        equality head loss and adaptively placed breakpoints, for which the number of lines can
+        differ per pipe class.
+
+        Checks:
+        1. Demand is matched
+        2. The number of line segments of every optional pipe is based on the pipe class with the
+           most lines
+        3. Only one linear line segment is active for the pipes that remain in place
+
+        """
+        import models.gas_pipe_topology.src.example as example
+        from models.gas_pipe_topology.src.example import HeatProblem
+
+        base_folder = Path(example.__file__).resolve().parent.parent
+
+        class GasNetworkProblem(HeatProblem):
+            def energy_system_options(self):
+                options = super().energy_system_options()
+                self.gas_network_settings["head_loss_option"] = (
+                    HeadLossOption.LINEARIZED_N_LINES_EQUALITY
+                )
+                self.gas_network_settings["n_linearization_lines"] = 5
+                self.gas_network_settings["linearization_max_relative_error"] = 0.05
+                self.gas_network_settings["minimize_head_losses"] = False
+                return options
+
+        solution = run_esdl_mesido_optimization(
+            GasNetworkProblem,
+            base_folder=base_folder,
+            esdl_file_name="2a_gas.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="timeseries.csv",
+        )
+
+        results = solution.extract_results()
+        parameters = solution.parameters(0)
+
+        for demand in solution.energy_system_components.get("gas_demand", []):
+            target = solution.get_timeseries(f"{demand}.target_gas_demand").values
+            np.testing.assert_allclose(target, results[f"{demand}.Gas_demand_mass_flow"])
+
+        head_loss_class = solution._gn_head_loss_class
+        for pipe, pipe_classes in solution._gas_pipe_topo_pipe_class_map.items():
+            n_lines = [
+                len(
+                    head_loss_class._hn_pipe_linear_head_loss_coefficients(
+                        pipe,
+                        solution,
+                        solution.energy_system_options(),
+                        solution.gas_network_settings,
+                        parameters,
+                        pipe_class=pc,
+                    )[0]
+                )
+                for pc in pipe_classes
+                if pc.inner_diameter > 0.0
+            ]
+            line_segments = solution._gas_pipe_linear_line_segment_map[pipe]
+            self.assertEqual(len(line_segments), 2 * max(n_lines))
+
+            if results[f"{pipe}__gn_diameter"] > 0.0:
+                active_segments = sum(results[var_name] for var_name in line_segments.values())
+                np.testing.assert_allclose(active_segments, 1.0)
+
 
 if __name__ == "__main__":
     import time
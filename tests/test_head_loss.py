@@ -622,6 +622,79 @@ class TestHeadLoss(TestCase):
                         0.0,
                     )
 
+    def test_gas_network_adaptive_head_loss(self):
+        """
+        Gas network: Test the head loss approximation with adaptively placed breakpoints.
+
+        Checks:
+        - that less linear line segments than the maximum are created for the pipe
+        - that only one linear line segment is active for the head loss linearization
+        - that the approximated head loss is conservative, but within the maximum relative error
+        of the Darcy-Weisbach head loss
+        """
+
+        import models.unit_cases_gas.source_sink.src.run_source_sink as example
+        from models.unit_cases_gas.source_sink.src.run_source_sink import GasProblem
+
+        base_folder = Path(example.__file__).resolve().parent.parent
+
+        max_relative_error = 0.05
+
+        class TestSourceSink(GasProblem):
+            def energy_system_options(self):
+                options = super().energy_system_options()
+
+                self.gas_network_settings["head_loss_option"] = (
+                    HeadLossOption.LINEARIZED_N_LINES_EQUALITY
+                )
+                self.gas_network_settings["n_linearization_lines"] = 10
+                self.gas_network_settings["linearization_max_relative_error"] = max_relative_error
+                self.gas_network_settings["minimize_head_losses"] = True
+                self.gas_network_settings["minimum_velocity"] = 0.0
+
+                return options
+
+        solution = run_esdl_mesido_optimization(
+            TestSourceSink,
+            base_folder=base_folder,
+            esdl_file_name="source_sink.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="timeseries.csv",
+        )
+        results = solution.extract_results()
+        parameters = solution.parameters(0)
+
+        pipe = "Pipe_4abc"
+        line_segments = solution._gas_pipe_linear_line_segment_map[pipe]
+        self.assertLess(len(line_segments), 2 * 10)
+
+        active_segments = sum(results[var_name] for var_name in line_segments.values())
+        np.testing.assert_allclose(active_segments, 1.0)
+
+        dw_head_loss = darcy_weisbach.head_loss_array(
+            np.abs(results[f"{pipe}.Q"]) / parameters[f"{pipe}.area"],
+            parameters[f"{pipe}.diameter"],
+            parameters[f"{pipe}.length"],
+            solution.energy_system_options()["wall_roughness"],
+            20.0,
+            network_type=NetworkSettings.NETWORK_TYPE_GAS,
+            pressure=parameters[f"{pipe}.pressure"],
+        )
+        dw_head_loss_max = darcy_weisbach.head_loss(
+            solution.gas_network_settings["maximum_velocity"],
+            parameters[f"{pipe}.diameter"],
+            parameters[f"{pipe}.length"],
+            solution.energy_system_options()["wall_roughness"],
+            20.0,
+            network_type=NetworkSettings.NETWORK_TYPE_GAS,
+            pressure=parameters[f"{pipe}.pressure"],
+        )
+        np.testing.assert_array_less(dw_head_loss - 1.0e-6, -results[f"{pipe}.dH"])
+        np.testing.assert_array_less(
+            -results[f"{pipe}.dH"], dw_head_loss + max_relative_error * dw_head_loss_max + 1.0e-6
+        )
+
     def test_gas_network_pipe_split_head_loss(self):
         """
         Gas network: Test the head loss approximation for a parallel pipe network.
@@ -1,6 +1,10 @@
 from unittest import TestCase
 
-from mesido._heat_loss_u_values_pipe import heat_loss_u_values_pipe
+from mesido._heat_loss_u_values_pipe import (
+    heat_loss_u_values_pipe,
+    heat_loss_u_values_pipe_array,
+    pipe_u_values,
+)
 
 import numpy as np
 
@@ -67,3 +71,95 @@ class TestHeatLossUValues(TestCase):
             heat_loss_u_values_pipe(0.15, [0.05, 0.05], [0.033, 0.033]),
             heat_loss_u_values_pipe(0.15, 0.1, 0.033),
         )
+
+    def test_array_equal_to_scalar(self):
+        """
+        Check that the vectorized u values are equal to the u values of the individual pipes, also
+        when the pipes have a different number of insulation layers and different soil properties.
+        """
+        inner_diameters = [0.15, 0.3, 0.5]
+        insulation_thicknesses = [[0.075], [0.05, 0.025], [0.04, 0.03, 0.02]]
+        conductivities_insulation = [[0.033], [0.033, 0.25], [0.027, 0.033, 0.4]]
+        depths = np.array([1.0, 1.2, 0.8])
+
+        for neighbour in [True, False]:
+            u_1, u_2 = heat_loss_u_values_pipe_array(
+                inner_diameters,
+                insulation_thicknesses,
+                conductivities_insulation,
+                depth=depths,
+                pipe_distance=[np.nan, 1.0, np.nan],
+                neighbour=neighbour,
+            )
+            for i in range(len(inner_diameters)):
+                np.testing.assert_allclose(
+                    (u_1[i], u_2[i]),
+                    heat_loss_u_values_pipe(
+                        inner_diameters[i],
+                        insulation_thicknesses[i],
+                        conductivities_insulation[i],
+                        depth=depths[i],
+                        pipe_distance=1.0 if i == 1 else None,
+                        neighbour=neighbour,
+                    ),
+                    rtol=1.0e-14,
+                )
+
+        # A single layer per pipe, and the default insulation thickness
+        np.testing.assert_allclose(
+            heat_loss_u_values_pipe_array(inner_diameters, [0.075, 0.15, 0.25], 0.033),
+            heat_loss_u_values_pipe_array(inner_diameters),
+        )
+
+    def test_pipe_u_values(self):
+        """
+        Check that the u values computed from the parameters of many pipes at once are equal to
+        the u values of the individual pipes, where NaN parameters get the default value.
+        """
+
+        class Problem:
+            def has_related_pipe(self, pipe):
+                return pipe != "pipe_3"
+
+        parameters = {}
+        pipes = {
+            "pipe_1": dict(
+                diameter=0.15, insulation_thickness=0.075, conductivity_insulation=0.033
+            ),
+            "pipe_2": dict(
+                diameter=0.3,
+                insulation_thickness=[0.05, 0.025],
+                conductivity_insulation=[0.033, 0.25],
+                depth=1.2,
+                pipe_pair_distance=1.0,
+            ),
+            "pipe_3": dict(diameter=0.5, conductivity_subsoil=1.8),
+        }
+        for pipe, values in pipes.items():
+            for name in [
+                "diameter",
+                "insulation_thickness",
+                "conductivity_insulation",
+                "conductivity_subsoil",
+                "depth",
+                "pipe_pair_distance",
+            ]:
+                parameters[f"{pipe}.{name}"] = values.get(name, np.nan)
+
+        u_values = pipe_u_values(Problem(), parameters, pipes.keys())
+
+        np.testing.assert_allclose(
+            u_values["pipe_1"], heat_loss_u_values_pipe(0.15, 0.075, 0.033), rtol=1.0e-14
+        )
+        np.testing.assert_allclose(
+            u_values["pipe_2"],
+            heat_loss_u_values_pipe(
+                0.3, [0.05, 0.025], [0.033, 0.25], depth=1.2, pipe_distance=1.0
+            ),
+            rtol=1.0e-14,
+        )
+        np.testing.assert_allclose(
+            u_values["pipe_3"],
+            heat_loss_u_values_pipe(0.5, conductivity_subsoil=1.8, neighbour=False),
+            rtol=1.0e-14,
+        )
@@ -1,3 +1,5 @@
+import json
+import tempfile
 from pathlib import Path
 from unittest import TestCase
 
@@ -11,6 +13,7 @@ from mesido.workflows.multicommodity_simulator_workflow import (
     MultiCommoditySimulatorNoLosses,
     run_sequatially_staged_simulation,
 )
+from mesido.workflows.utils.telemetry import Telemetry
 
 import numpy as np
 
@@ -676,6 +679,62 @@ class TestMultiCommoditySimulator(TestCase):
             results_unstaged_bounded_win["Battery_4688.Stored_electricity"][-1],
         )
 
+    def test_multi_commodity_simulator_sequential_staged_telemetry(self):
+        """
+        Test the telemetry that is recorded for the sequential staged simulation.
+
+        Checks:
+        - that a record is written for every priority of every window, with the build and solve
+          time and the problem size
+        - that a record is written for every window and for the whole simulation
+        - that the JSON Lines file and the Prometheus text contain the records
+        """
+        import models.emerge.src.example as example
+
+        base_folder = Path(example.__file__).resolve().parent.parent
+
+        with tempfile.TemporaryDirectory() as folder:
+            telemetry_path = Path(folder) / "telemetry.jsonl"
+            telemetry = Telemetry(path=telemetry_path, labels={"network": "emerge"})
+            run_sequatially_staged_simulation(
+                multi_commodity_simulator_class=MultiCommoditySimulatorNoLosses,
+                simulation_window_size=20,
+                base_folder=base_folder,
+                esdl_file_name="emerge_battery_priorities.esdl",
+                esdl_parser=ESDLFileParser,
+                profile_reader=ProfileReaderFromFile,
+                input_timeseries_file="timeseries_short.csv",
+                telemetry=telemetry,
+            )
+
+            with open(telemetry_path) as f:
+                records = [json.loads(line) for line in f]
+
+        self.assertEqual(len(records), len(telemetry.records))
+        windows = [r for r in records if r["event"] == "window"]
+        priorities = [r for r in records if r["event"] == "priority"]
+        self.assertGreater(len(windows), 1)
+        self.assertEqual(records[-1]["event"], "simulation")
+        self.assertEqual(len(priorities) % len(windows), 0)
+        for record in priorities:
+            self.assertTrue(record["success"])
+            self.assertEqual(record["network"], "emerge")
+            self.assertGreater(record["n_variables"], 0)
+            self.assertGreater(record["n_constraints"], 0)
+            self.assertGreaterEqual(record["wall_time"], record["build_time"])
+            self.assertIsNotNone(record["solve_time"])
+            self.assertGreater(record["peak_rss"], 0)
+        np.testing.assert_array_less(
+            sum(r["wall_time"] for r in priorities), records[-1]["wall_time"]
+        )
+
+        prometheus = telemetry.to_prometheus()
+        self.assertIn("# TYPE mesido_priority_wall_time_seconds gauge", prometheus)
+        self.assertEqual(prometheus.count("mesido_window_wall_time_seconds{"), len(windows))
+        self.assertIn('network="emerge"', prometheus)
+        series = [line.rsplit(" ", 1)[0] for line in prometheus.splitlines() if line[0] != "#"]
+        self.assertEqual(len(series), len(set(series)))
+
 
 if __name__ == "__main__":
     import time
@@ -0,0 +1,189 @@
+from pathlib import Path
+from unittest import TestCase
+
+import esdl
+
+from mesido.esdl.esdl_parser import ESDLFileParser
+from mesido.esdl.network_reduction import reduce_network
+from mesido.esdl.profile_parser import ProfileReaderFromFile
+from mesido.util import run_esdl_mesido_optimization
+from mesido.workflows import EndScenarioSizing
+
+import numpy as np
+
+from rtctools.util import run_optimization_problem
+
+from utils_tests import demand_matching_test, energy_conservation_test
+
+
+class TestNetworkReduction(TestCase):
+    def test_network_reduction(self):
+        """
+        This test checks the reduction of a network in which the pipe between the source and the
+        demand is split in four pipes, with joints in between. A variant of the network has an
+        optional dead-end pipe to one of the joints.
+
+        Checks:
+        - That the dead-end pipes are removed and the pipes in series between the joints are
+          merged, while the pipes to the source and demand are kept
+        - That an enabled dead-end pipe with costs is kept
+        - That the results of the reduced network are equal to those of the unreduced network
+        - That the results of the merged pipes are mapped back to the pipes of the ESDL
+        - That the merged pipes are updated in the output ESDL
+        """
+        import models.source_pipe_sink.src.double_pipe_heat as double_pipe_heat
+        from models.source_pipe_sink.src.double_pipe_heat import SourcePipeSink
+
+        base_folder = Path(double_pipe_heat.__file__).resolve().parent.parent
+
+        esdl_parser = ESDLFileParser(
+            esdl_path=base_folder / "model" / "sourcesink_series_pipes_dead_end.esdl"
+        )
+        esdl_parser.read_esdl()
+        assets = esdl_parser.get_assets()
+        reduction = reduce_network(assets, esdl_parser.get_connectivity_index())
+
+        self.assertEqual(
+            reduction.merged_pipes,
+            {"Pipe2": ["Pipe2", "Pipe3"], "Pipe2_ret": ["Pipe3_ret", "Pipe2_ret"]},
+        )
+        self.assertEqual(reduction.collapsed_nodes, {"Joint2": "Pipe2", "Joint2_ret": "Pipe2_ret"})
+        self.assertEqual(sorted(reduction.pruned_assets), ["Pipe_stub", "Pipe_stub_ret"])
+        self.assertEqual(len(reduction.assets), len(assets) - 6)
+        self.assertEqual(reduction.reduced_name("Pipe3"), "Pipe2")
+        self.assertEqual(reduction.reduced_name("Pipe1"), "Pipe1")
+        self.assertIsNone(reduction.reduced_name("Pipe_stub"))
+        merged_pipe = reduction.connectivity_index.asset_by_name("Pipe2")
+        self.assertEqual(merged_pipe.attributes["length"], 600.0)
+        self.assertEqual(
+            [a.name for a in reduction.connectivity_index.neighbours(merged_pipe.id)],
+            ["Joint1", "Joint3"],
+        )
+        self.assertEqual(len(reduction.connectivity_index.connections(merged_pipe.id)), 2)
+        # The original assets are not modified
+        self.assertEqual(
+            next(a for a in assets.values() if a.name == "Pipe2").attributes["length"], 300.0
+        )
+
+        # An enabled dead-end pipe is placed with its costs, so it is kept with its return pipe
+        for asset in assets.values():
+            if asset.name in ["Pipe_stub", "Pipe_stub_ret"]:
+                asset.attributes["state"] = esdl.AssetStateEnum.ENABLED
+        enabled_reduction = reduce_network(assets, esdl_parser.get_connectivity_index())
+        self.assertEqual(enabled_reduction.pruned_assets, [])
+        self.assertEqual(enabled_reduction.merged_pipes, {})
+        self.assertEqual(len(enabled_reduction.assets), len(assets))
+
+        kwargs = dict(
+            base_folder=base_folder,
+            esdl_file_name="sourcesink_series_pipes.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="timeseries_import.csv",
+        )
+        solution = run_esdl_mesido_optimization(SourcePipeSink, network_reduction=False, **kwargs)
+        reduced_solution = run_esdl_mesido_optimization(
+            SourcePipeSink, network_reduction=True, **kwargs
+        )
+        # The network with the dead end cannot be modelled without the reduction, as a joint needs
+        # at least two connections. As the dead-end pipes are optional, its results are equal to
+        # those of the network without the dead end.
+        dead_end_solution = run_esdl_mesido_optimization(
+            SourcePipeSink,
+            network_reduction=True,
+            **{**kwargs, "esdl_file_name": "sourcesink_series_pipes_dead_end.esdl"},
+        )
+        results = solution.extract_results()
+
+        self.assertIsNone(solution.network_reduction)
+        self.assertEqual(
+            sorted(solution.energy_system_components["heat_pipe"]),
+            [f"Pipe{i}{suffix}" for i in range(1, 5) for suffix in ["", "_ret"]],
+        )
+        for s in [reduced_solution, dead_end_solution]:
+            s_results = s.extract_results()
+            self.assertEqual(
+                sorted(s.energy_system_components["heat_pipe"]),
+                ["Pipe1", "Pipe1_ret", "Pipe2", "Pipe2_ret", "Pipe4", "Pipe4_ret"],
+            )
+            np.testing.assert_allclose(s.objective_value, solution.objective_value)
+            for variable in ["source.Heat_source", "demand.Heat_demand", "Pipe4.HeatOut.Heat"]:
+                np.testing.assert_allclose(s_results[variable], results[variable])
+            demand_matching_test(s, s_results)
+            energy_conservation_test(s, s_results)
+
+        dead_end_results = dead_end_solution.extract_results()
+
+        # The pipes of the ESDL have the flow of the merged pipe, and the heat losses by length
+        expanded = dead_end_solution.network_reduction.expand_results(
+            dead_end_results, dead_end_solution.alias_relation
+        )
+        for pipe in ["Pipe2", "Pipe3"]:
+            np.testing.assert_allclose(expanded[f"{pipe}.Q"], dead_end_results["Pipe2.Q"])
+        np.testing.assert_allclose(
+            expanded["Pipe2.HeatIn.Heat"], dead_end_results["Pipe2.HeatIn.Heat"]
+        )
+        np.testing.assert_allclose(expanded["Pipe2.HeatOut.Heat"], expanded["Pipe3.HeatIn.Heat"])
+        np.testing.assert_allclose(
+            expanded["Pipe3.HeatOut.Heat"], dead_end_results["Pipe2.HeatOut.Heat"]
+        )
+        heat_loss = dead_end_results["Pipe2.HeatIn.Heat"] - dead_end_results["Pipe2.HeatOut.Heat"]
+        np.testing.assert_allclose(
+            expanded["Pipe2.HeatIn.Heat"] - expanded["Pipe2.HeatOut.Heat"], heat_loss / 2.0
+        )
+        np.testing.assert_allclose(
+            expanded["Pipe2__investment_cost"] + expanded["Pipe3__investment_cost"],
+            dead_end_results["Pipe2__investment_cost"],
+        )
+
+        # All pipes of the ESDL of a merged pipe with flow are enabled in the output ESDL
+        energy_system = dead_end_solution._ESDLMixin__energy_system_handler.energy_system
+        pipes = {x.name: x for x in energy_system.eAllContents() if isinstance(x, esdl.Pipe)}
+        for pipe in ["Pipe3", "Pipe3_ret"]:
+            pipes[pipe].state = esdl.AssetStateEnum.DISABLED
+        dead_end_solution._write_updated_esdl(energy_system, optimizer_sim=True, add_kpis=False)
+        for pipe in ["Pipe2", "Pipe3", "Pipe2_ret", "Pipe3_ret"]:
+            self.assertEqual(pipes[pipe].state, esdl.AssetStateEnum.ENABLED)
+        self.assertIsNotNone(pipes["Pipe_stub"].eContainer())
+
+    def test_network_reduction_end_scenario_sizing(self):
+        """
+        This test checks that the reduction of a network does not change the optimal costs of the
+        end scenario sizing, for the network of test_network_reduction().
+
+        Checks:
+        - That the TCO (the objective) is equal to that of the unreduced network
+        - That the investment, installation and operational costs of all the assets together are
+          equal to those of the unreduced network
+        """
+        import models.source_pipe_sink.src.double_pipe_heat as double_pipe_heat
+
+        base_folder = Path(double_pipe_heat.__file__).resolve().parent.parent
+
+        kwargs = dict(
+            base_folder=base_folder,
+            esdl_file_name="sourcesink_series_pipes.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="timeseries_import.csv",
+        )
+        solution = run_optimization_problem(EndScenarioSizing, network_reduction=False, **kwargs)
+        reduced_solution = run_optimization_problem(
+            EndScenarioSizing, network_reduction=True, **kwargs
+        )
+        self.assertIsNotNone(reduced_solution.network_reduction)
+
+        np.testing.assert_allclose(
+            reduced_solution.objective_value, solution.objective_value, rtol=1.0e-6
+        )
+        for cost_map in [
+            "_asset_investment_cost_map",
+            "_asset_installation_cost_map",
+            "_asset_fixed_operational_cost_map",
+            "_asset_variable_operational_cost_map",
+        ]:
+            costs = []
+            for s in [solution, reduced_solution]:
+                results = s.extract_results()
+                costs.append(sum(results[v][0] for v in getattr(s, cost_map).values()))
+            np.testing.assert_allclose(costs[1], costs[0], rtol=1.0e-6, atol=1.0e-6)
@@ -1,11 +1,21 @@
 import datetime
+import json
+import re
+import tempfile
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from types import SimpleNamespace
 from typing import Optional
+from urllib.parse import parse_qs, urlparse
 
 import esdl
 
+from mesido.esdl._influxdb_profile_fetching import influxdb_connection_pool
 from mesido.esdl.esdl_parser import ESDLFileParser
+from mesido.esdl.profile_cache import PROFILE_FILE_SUFFIX, ProfileCache
 from mesido.esdl.profile_parser import InfluxDBProfileReader, ProfileReaderFromFile
 from mesido.workflows import EndScenarioSizingStaged
 
@@ -13,6 +23,9 @@ import numpy as np
 
 import pandas as pd
 
+from rtctools._internal.alias_tools import AliasRelation
+from rtctools.data.storage import DataStore
+
 from utils_test_scaling import create_log_list_scaling
 
 
@@ -247,6 +260,301 @@ class TestProfileLoading(unittest.TestCase):
             expected_array, problem.get_timeseries("Hydrogen.price_profile").values
         )
 
+    def test_loading_from_table_formats(self):
+        """
+        This test loads profiles with the supported date time formats from CSV files, and from
+        Parquet and Feather files if pyarrow is installed.
+
+        Checks:
+        1. The date times are parsed in UTC for every format
+        2. The profiles of assets (without spaces in the column name) and carriers are loaded for
+        every ensemble member, and other columns are ignored
+        """
+        times = pd.date_range("2019-01-01 00:00", periods=48, freq="H")
+        data = pd.DataFrame(
+            {
+                "DateTime": times,
+                "HeatingDemand1": np.arange(48.0),
+                "Heat": np.full(48, 0.5),
+                "Unused": np.ones(48),
+            }
+        )
+        energy_system_components = {"heat_demand": {"Heating Demand1"}, "heat_source": {"Source"}}
+        carrier_properties = {"1": {"name": "Heat"}}
+
+        tables = {
+            f"{i}.csv": data.assign(DateTime=times.strftime(f))
+            for i, f in enumerate(["%Y-%m-%d %H:%M:%SZ", "%Y-%m-%dT%H:%M:%S", "%d-%m-%Y %H:%M"])
+        }
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            tables["data.parquet"] = data
+            tables["data.feather"] = data
+
+        with tempfile.TemporaryDirectory() as folder:
+            for file_name, table in tables.items():
+                file_path = Path(folder) / file_name
+                if file_path.suffix == ".csv":
+                    table.to_csv(file_path, index=False)
+                elif file_path.suffix == ".parquet":
+                    table.to_parquet(file_path)
+                else:
+                    table.to_feather(file_path)
+
+                reader = ProfileReaderFromFile(None, file_path)
+                reader._load_profiles_from_source(
+                    energy_system_components, {}, carrier_properties, ensemble_size=2
+                )
+
+                self.assertEqual(
+                    reader._reference_datetimes, times.tz_localize("UTC").to_pydatetime().tolist()
+                )
+                self.assertEqual(reader._reference_datetimes[0].tzinfo, datetime.timezone.utc)
+                for ensemble_member in range(2):
+                    profiles = reader._profiles[ensemble_member]
+                    self.assertEqual(
+                        set(profiles), {"Heating Demand1.target_heat_demand", "Heat.price_profile"}
+                    )
+                    np.testing.assert_array_equal(
+                        profiles["Heating Demand1.target_heat_demand"], np.arange(48.0)
+                    )
+                    np.testing.assert_array_equal(profiles["Heat.price_profile"], 0.5)
+
+    def test_shared_profiles_across_ensemble_members(self):
+        """
+        This test reads profiles for multiple ensemble members into a DataStore.
+
+        Checks:
+        1. Identical profiles are stored once, also when they are used by multiple assets
+        2. The ensemble members get the same read-only array in the DataStore
+        3. Writing to a returned array raises a ValueError, such that the other assets and
+           ensemble members keep the original values
+        """
+        times = pd.date_range("2019-01-01 00:00", periods=24, freq="H")
+        data = pd.DataFrame(
+            {
+                "DateTime": times.strftime("%Y-%m-%d %H:%M:%S"),
+                "Demand1": np.arange(24.0),
+                "Demand2": np.arange(24.0),
+                "Demand3": np.ones(24),
+            }
+        )
+        demands = ["Demand1", "Demand2", "Demand3", "Demand4"]
+        esdl_asset_id_to_name_map = {f"id_{d}": d for d in demands}
+        esdl_assets = {f"id_{d}": SimpleNamespace(attributes={"power": 1.0}) for d in demands}
+
+        with tempfile.TemporaryDirectory() as folder:
+            file_path = Path(folder) / "profiles.csv"
+            data.to_csv(file_path, index=False)
+
+            io = DataStore(SimpleNamespace(alias_relation=AliasRelation()))
+            reader = ProfileReaderFromFile(None, file_path)
+            reader.read_profiles(
+                io,
+                {"heat_demand": demands},
+                esdl_asset_id_to_name_map,
+                esdl_assets,
+                {},
+                ensemble_size=3,
+            )
+
+        # Demand1 and Demand2, and the default profile of Demand4 and the profile of Demand3
+        self.assertEqual(len(reader._shared_profiles), 2)
+
+        for demand in demands:
+            values = io.get_timeseries(f"{demand}.target_heat_demand", 0)[1]
+            self.assertFalse(values.flags.writeable)
+            for ensemble_member in range(1, 3):
+                self.assertIs(
+                    io.get_timeseries(f"{demand}.target_heat_demand", ensemble_member)[1], values
+                )
+        self.assertIs(
+            io.get_timeseries("Demand1.target_heat_demand")[1],
+            io.get_timeseries("Demand2.target_heat_demand")[1],
+        )
+        np.testing.assert_array_equal(
+            io.get_timeseries("Demand4.target_heat_demand")[1], np.ones(24)
+        )
+
+        # Writing to a shared profile is refused, so the other assets keep the original values
+        values = io.get_timeseries("Demand1.target_heat_demand")[1]
+        with self.assertRaises(ValueError):
+            values[0] = 100.0
+        for demand in ["Demand1", "Demand2"]:
+            for ensemble_member in range(3):
+                np.testing.assert_array_equal(
+                    io.get_timeseries(f"{demand}.target_heat_demand", ensemble_member)[1],
+                    np.arange(24.0),
+                )
+
+
+class _StandInInfluxDBHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the InfluxDB 1.x http query api, which returns hourly profile values for
+    every field that is queried. It keeps track of the queries and of the maximum number of
+    queries that were handled at the same time.
+    """
+
+    lock = threading.Lock()
+    queries = []
+    n_active = 0
+    max_active = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):  # noqa: N802
+        query = parse_qs(urlparse(self.path).query)["q"][0]
+
+        cls = type(self)
+        with cls.lock:
+            cls.queries.append(query)
+            cls.n_active += 1
+            cls.max_active = max(cls.max_active, cls.n_active)
+
+        if query == "SHOW DATABASES":
+            series = [{"name": "databases", "columns": ["name"], "values": [["energy_profiles"]]}]
+        else:
+            # Give the other requests the time to arrive
+            time.sleep(0.1)
+            field, measurement, start, end = re.match(
+                r'SELECT "(.+)" FROM "(.+)" WHERE \(time >= \'(.+)\' AND time <= \'(.+)\'\)', query
+            ).groups()
+            times = pd.date_range(start, end, freq="H")
+            factor = float(re.search(r"\d+", field).group())
+            values = [
+                [t.strftime("%Y-%m-%dT%H:%M:%SZ"), factor * (i + 1)] for i, t in enumerate(times)
+            ]
+            series = [{"name": measurement, "columns": ["time", field], "values": values}]
+
+        with cls.lock:
+            cls.n_active -= 1
+
+        body = json.dumps({"results": [{"statement_id": 0, "series": series}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestInfluxDBProfileFetching(unittest.TestCase):
+    def setUp(self):
+        """
+        Start a local stand-in of an InfluxDB server, and load an ESDL of which the InfluxDB
+        profiles are read from that server.
+        """
+        import models.unit_cases.case_1a.src.run_1a as run_1a
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInInfluxDBHandler)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(influxdb_connection_pool.clear)
+
+        _StandInInfluxDBHandler.queries = []
+        _StandInInfluxDBHandler.max_active = 0
+
+        esdl_path = (
+            Path(run_1a.__file__).resolve().parent.parent / "model" / "1a_with_influx_profiles.esdl"
+        )
+        self.energy_system = esdl.esdl_handler.EnergySystemHandler().load_file(str(esdl_path))
+        self.influxdb_profiles = [
+            x for x in self.energy_system.eAllContents() if isinstance(x, esdl.InfluxDBProfile)
+        ]
+        for profile in self.influxdb_profiles:
+            profile.host = "127.0.0.1"
+            profile.port = server.server_address[1]
+
+    def test_concurrent_fetching(self):
+        """
+        This test reads the InfluxDB profiles of an ESDL from a local stand-in of an InfluxDB
+        server.
+
+        Checks:
+        1. The profiles of the assets and the carrier are read, converted to Watt and multiplied
+        2. Profiles with the same attributes are only read once
+        3. The profiles are read concurrently, with at most max_concurrent_requests at a time
+        4. The connections are reused for a next read
+        """
+        energy_system = self.energy_system
+        influxdb_profiles = self.influxdb_profiles
+
+        # Two demands with the same profile
+        influxdb_profiles[1].field = influxdb_profiles[0].field
+        unique_fields = {p.field for p in influxdb_profiles}
+
+        class Reader(InfluxDBProfileReader):
+            max_concurrent_requests = 2
+
+        for i in range(2):
+            _StandInInfluxDBHandler.queries = []
+            _StandInInfluxDBHandler.max_active = 0
+
+            reader = Reader(energy_system, None)
+            reader._load_profiles_from_source({}, {}, {}, ensemble_size=2)
+
+            select_queries = [q for q in _StandInInfluxDBHandler.queries if q.startswith("SELECT")]
+            self.assertEqual(len(select_queries), len(unique_fields))
+            self.assertEqual(_StandInInfluxDBHandler.max_active, 2)
+            if i == 0:
+                self.assertLessEqual(len(_StandInInfluxDBHandler.queries), len(unique_fields) + 2)
+            else:
+                self.assertEqual(len(select_queries), len(_StandInInfluxDBHandler.queries))
+
+        self.assertEqual(len(reader._reference_datetimes), 49)
+        self.assertEqual(reader._reference_datetimes.tzinfo, datetime.timezone.utc)
+        self.assertEqual(len(reader._profiles[1]), len(influxdb_profiles))
+        for profile in influxdb_profiles:
+            container = profile.eContainer()
+            expected = float(profile.field[6]) * profile.multiplier * np.arange(1.0, 50.0)
+            if isinstance(container, esdl.Port):
+                # The demand profiles are in MWh, which are converted to J
+                name = container.energyasset.name + ".target_heat_demand"
+                expected *= 3.6e9
+            else:
+                name = container.name + ".price_profile"
+            np.testing.assert_allclose(reader._profiles[0][name], expected)
+            self.assertIs(reader._profiles[0][name], reader._profiles[1][name])
+
+    def test_profile_cache(self):
+        """
+        This test reads the InfluxDB profiles of an ESDL twice with a profile cache.
+
+        Checks:
+        1. The second read does not query the database and gives the same profiles
+        2. The least recently used profiles are removed when the cache exceeds its size
+        """
+        with tempfile.TemporaryDirectory() as cache_folder:
+            profiles = []
+            for _ in range(2):
+                _StandInInfluxDBHandler.queries = []
+
+                reader = InfluxDBProfileReader(self.energy_system, None)
+                reader.profile_cache = ProfileCache(cache_folder)
+                reader._load_profiles_from_source({}, {}, {}, ensemble_size=1)
+                profiles.append(reader._profiles[0])
+
+            self.assertEqual(reader.profile_cache.hits, len(self.influxdb_profiles))
+            self.assertEqual(reader.profile_cache.misses, 0)
+            self.assertFalse(any(q.startswith("SELECT") for q in _StandInInfluxDBHandler.queries))
+            self.assertEqual(profiles[0].keys(), profiles[1].keys())
+            for name, profile in profiles[0].items():
+                np.testing.assert_array_equal(profile, profiles[1][name])
+
+            # A cache that can only hold a single profile
+            cache_file = next(Path(cache_folder).iterdir())
+            cache = ProfileCache(cache_folder, max_size_bytes=cache_file.stat().st_size)
+            cache.write("most_recent", cache.read(cache_file.name[: -len(PROFILE_FILE_SUFFIX)]))
+            self.assertEqual(
+                [p.name for p in Path(cache_folder).iterdir()],
+                ["most_recent" + PROFILE_FILE_SUFFIX],
+            )
+
 
 if __name__ == "__main__":
     # unittest.main()
@@ -1,5 +1,7 @@
 from unittest import TestCase
 
+import casadi as ca
+
 from mesido.pycml import Model, Variable
 
 import numpy as np
@@ -104,3 +106,54 @@ class TestPyCML(TestCase):
             _var_min_max_nominal(b_flat.variables["storage.V"]),
             dict(min=10.0, nominal=0, max=np.inf),
         )
+
+    def test_connect_array_ports(self):
+        """
+        Check the equations of connected ports of an array, e.g. the ports of a node, and of
+        operations on variables.
+
+        Checks:
+        - every element of the array has its own named variables
+        - connecting two ports adds an equation per port variable, which is the difference of the
+          two variable symbols (such that pymoca detects them as aliases)
+        - operations with variables as operands give expressions of their symbols
+        """
+
+        class Port(Model):
+            def __init__(self, name, **modifiers):
+                super().__init__(name, **modifiers)
+
+                self.add_variable(Variable, "Q")
+                self.add_variable(Variable, "H")
+
+        class Node(Model):
+            def __init__(self, name, **modifiers):
+                super().__init__(name, **modifiers)
+
+                self.n = 3
+                self.add_variable(Port, "Conn", self.n)
+
+        class Network(Model):
+            def __init__(self):
+                super().__init__(None)
+
+                self.add_variable(Node, "a")
+                self.add_variable(Node, "b", n=2)
+                self.connect(self.a.Conn[3], self.b.Conn[2])
+
+        flat = Network().flatten()
+
+        self.assertEqual(
+            sorted(k for k in flat.variables if k.startswith("a.")),
+            sorted(f"a.Conn[{i}].{v}" for i in range(1, 4) for v in ["Q", "H"]),
+        )
+        self.assertEqual(len(flat.equations), 2)
+        for equation, variable in zip(flat.equations, ["Q", "H"]):
+            self.assertTrue(equation.is_op(ca.OP_SUB))
+            self.assertEqual(equation.dep(0).name(), f"a.Conn[3].{variable}")
+            self.assertEqual(equation.dep(1).name(), f"b.Conn[2].{variable}")
+
+        x, y = flat.variables["a.Conn[1].Q"], flat.variables["a.Conn[2].Q"]
+        self.assertTrue(ca.is_equal(2.0 * x - y, 2.0 * x.symbol - y.symbol, 10))
+        self.assertTrue(ca.is_equal(-x, -x.symbol, 10))
+        self.assertEqual({x: 1, y: 2}[y], 2)
@@ -0,0 +1,262 @@
+from pathlib import Path
+from unittest import TestCase
+
+from mesido.esdl.esdl_parser import ESDLFileParser
+from mesido.esdl.profile_parser import ProfileReaderFromFile
+from mesido.workflows import EndScenarioSizingStaged
+from mesido.workflows.multicommodity_simulator_workflow import MultiCommoditySimulatorNoLosses
+from mesido.workflows.utils.adapt_profiles import (
+    average_over_time_steps,
+    time_step_start_indices,
+)
+from mesido.workflows.utils.time_aggregation import (
+    AdaptiveTimeStepAggregation,
+    PeakDayAggregation,
+    RepresentativeDaysAggregation,
+    SegmentedAggregation,
+)
+
+import numpy as np
+
+from rtctools.util import run_optimization_problem
+
+from utils_tests import demand_matching_test
+
+
+class TestTimeAggregation(TestCase):
+    def setUp(self):
+        # A year with a seasonal and a daily pattern, and a weekly pattern in the second profile
+        hours = np.arange(8760)
+        rng = np.random.default_rng(5)
+        heat_demand = (
+            1.0
+            + np.cos(2.0 * np.pi * hours / 8760)
+            + 0.3 * np.sin(2.0 * np.pi * hours / 24)
+            + 0.05 * rng.random(8760)
+        )
+        heat_demand[40 * 24 + 8] = 3.0
+        heat_demand[300 * 24 + 17] = 2.9
+        price = 0.5 + 0.5 * (hours // 24 % 7 >= 5)
+        self.total_heat_demand = heat_demand
+        self.profiles = np.vstack([heat_demand / np.max(heat_demand), price])
+
+    def _check_time_steps(self, time_steps, peak_days):
+        self.assertEqual(time_steps[0], 0)
+        self.assertTrue(np.all(np.diff(time_steps) > 0))
+        self.assertLess(time_steps[-1], 8760)
+        # The peak days keep their hourly time steps
+        for day in peak_days:
+            np.testing.assert_array_equal(
+                np.searchsorted(time_steps, np.arange(day * 24, day * 24 + 25))
+                - np.searchsorted(time_steps, day * 24),
+                np.arange(25),
+            )
+
+    def test_peak_day_aggregation(self):
+        """
+        The default aggregation averages blocks of 5 days, except for the peak day (day 40) which
+        is kept hourly.
+        """
+        result = PeakDayAggregation(day_steps=5).aggregate(self.profiles, self.total_heat_demand)
+
+        self.assertEqual(result.peak_days, [40])
+        expected = np.sort(
+            np.concatenate([np.arange(0, 365, 5) * 24, np.arange(40 * 24, 41 * 24 + 1)])
+        )
+        np.testing.assert_array_equal(result.time_steps, np.unique(expected))
+        self._check_time_steps(result.time_steps, result.peak_days)
+
+        # Multiple preserved peak days
+        result = PeakDayAggregation(day_steps=5, n_peak_days=2).aggregate(
+            self.profiles, self.total_heat_demand
+        )
+        self.assertEqual(result.peak_days, [40, 300])
+        self._check_time_steps(result.time_steps, result.peak_days)
+
+    def test_representative_days_aggregation(self):
+        """
+        The representative days and the peak day are kept hourly, the other days are averaged in
+        blocks of consecutive days of the same cluster.
+        """
+        for method in ["kmedoids", "kmeans"]:
+            aggregation = RepresentativeDaysAggregation(
+                n_representative_days=6, method=method, max_block_days=7
+            )
+            labels, representative_days = aggregation.cluster_days(self.profiles)
+            self.assertEqual(len(representative_days), 6)
+            np.testing.assert_array_equal(labels[representative_days], np.arange(6))
+
+            result = aggregation.aggregate(self.profiles, self.total_heat_demand)
+            self._check_time_steps(result.time_steps, result.peak_days)
+            for day in representative_days:
+                self._check_time_steps(result.time_steps, [day])
+            # Weekend and weekdays have a different price, so they are never averaged together
+            day_steps = result.time_steps[result.time_steps % 24 == 0] // 24
+            block_lengths = np.diff(np.append(day_steps, 365))
+            self.assertLessEqual(np.max(block_lengths), 7)
+            self.assertLess(len(result.time_steps), 400)
+
+        with self.assertRaises(ValueError):
+            RepresentativeDaysAggregation(method="kmode")
+
+    def test_segmented_aggregation(self):
+        """
+        Adjacent hours are merged into the requested number of variable-length time steps, the
+        hours of the peak days are not merged.
+        """
+        result = SegmentedAggregation(n_time_steps=250, n_peak_days=2).aggregate(
+            self.profiles, self.total_heat_demand
+        )
+        self.assertEqual(len(result.time_steps), 250)
+        self.assertEqual(result.peak_days, [40, 300])
+        self._check_time_steps(result.time_steps, result.peak_days)
+
+        # Time steps do not span a change in the price
+        price_changes = np.flatnonzero(np.diff(self.profiles[1])) + 1
+        self.assertTrue(np.all(np.isin(price_changes, result.time_steps)))
+
+    def test_adaptive_time_step_aggregation(self):
+        """
+        Smooth parts of the profiles are merged into long time steps, the steps around ramps and
+        the peak keep their resolution and time steps are split at the storage turning points.
+        """
+        steps = np.arange(2000)
+        demand = 0.5 + 0.4 * np.sin(2.0 * np.pi * steps / 2000)
+        # A ramp in the production cap
+        production = np.where(steps < 500, 0.2, 1.0)
+        production[500:510] = np.linspace(0.2, 1.0, 10)
+        profiles = np.vstack([demand, production])
+
+        aggregation = AdaptiveTimeStepAggregation(tolerance=0.05, peak_refinement=3)
+        result = aggregation.aggregate(profiles, demand)
+        time_steps = result.time_steps
+
+        self.assertEqual(result.peak_days, [])
+        self.assertLess(len(time_steps), 150)
+        self._check_time_steps(time_steps, [])
+
+        # Every profile stays within the tolerance over every time step
+        for start, end in zip(time_steps, np.append(time_steps[1:], len(steps))):
+            self.assertTrue(np.all(np.ptp(profiles[:, start:end], axis=1) <= 0.05))
+
+        # The ramp is resolved with the original time steps
+        np.testing.assert_array_equal(
+            np.intersect1d(time_steps, np.arange(500, 510)), steps[500:510]
+        )
+
+        # The steps around the peak are not merged
+        peak = int(np.argmax(demand))
+        np.testing.assert_array_equal(
+            np.intersect1d(time_steps, np.arange(peak - 3, peak + 5)), steps[peak - 3 : peak + 5]
+        )
+
+        # The time steps are split where the smoothed demand crosses its average
+        turning_points = aggregation.turning_points(demand)
+        self.assertEqual(len(turning_points), 1)
+        self.assertAlmostEqual(turning_points[0], 1000, delta=2)
+        self.assertIn(turning_points[0], time_steps)
+
+        # A limit on the length of the time steps
+        result = AdaptiveTimeStepAggregation(tolerance=0.05, max_steps_per_time_step=10).aggregate(
+            profiles, demand
+        )
+        self.assertLessEqual(np.max(np.diff(np.append(result.time_steps, len(steps)))), 10)
+
+    def test_average_over_time_steps(self):
+        """
+        The value of a time step is the average over the preceding time step, the first value
+        equals the second and the last value is the average over the remainder of the profile.
+        """
+        data_times = 3600.0 * np.arange(8)
+        new_times = 3600.0 * np.array([0, 2, 3, 6, 8])
+        start_indices = time_step_start_indices(data_times, new_times)
+        np.testing.assert_array_equal(start_indices, [0, 2, 3, 6])
+
+        values = np.array([np.arange(8.0), np.ones(8)])
+        np.testing.assert_allclose(
+            average_over_time_steps(values, start_indices),
+            [[0.5, 0.5, 2.0, 4.0, 6.5], [1.0, 1.0, 1.0, 1.0, 1.0]],
+        )
+
+    def test_end_scenario_sizing_with_segmented_aggregation(self):
+        """
+        Sizing over a full year with variable-length time steps. The hourly demand profiles are
+        averaged over the time steps, the heat buffer is only used on the (hourly) peak day and
+        the ATES is cyclic over the aggregated year.
+        """
+        import models.test_case_small_network_ates_buffer_optional_assets.src.run_ates as run_ates
+
+        base_folder = Path(run_ates.__file__).resolve().parent.parent
+
+        solution = run_optimization_problem(
+            EndScenarioSizingStaged,
+            base_folder=base_folder,
+            esdl_file_name="test_case_small_network_with_ates_with_buffer_all_optional.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="Warmte_test.csv",
+            time_aggregation=SegmentedAggregation(n_time_steps=150),
+        )
+        results = solution.extract_results()
+
+        self.assertEqual(len(solution.times()), 151)
+        demand_matching_test(solution, results)
+
+        for a in solution.energy_system_components.get("ates", []):
+            stored_heat = results[f"{a}.Stored_heat"]
+            self.assertGreaterEqual(stored_heat[-1] - stored_heat[0], -1.0)
+
+        # The time steps have no fixed length in days
+        self.assertNotIn("time_step_days", solution.parameters(0))
+
+        peak_day_indx = solution.parameters(0)["peak_day_index"]
+        np.testing.assert_array_equal(
+            np.diff(solution.times()[peak_day_indx : peak_day_indx + 25]), 3600.0
+        )
+        for b in solution.energy_system_components.get("heat_buffer", []):
+            heat_buffer = results[f"{b}.Heat_buffer"]
+            for i in range(len(solution.times())):
+                if i < peak_day_indx or i > (peak_day_indx + 23):
+                    np.testing.assert_allclose(heat_buffer[i], 0.0, atol=1.0e-6)
+
+    def test_multi_commodity_simulator_with_adaptive_time_steps(self):
+        """
+        The simulator opts into adaptive time steps, the wind park production cap and the
+        carrier prices are averaged over the merged time steps and the simulation follows the
+        averaged production cap.
+        """
+        import models.emerge.src.example as example
+
+        base_folder = Path(example.__file__).resolve().parent.parent
+
+        solution = run_optimization_problem(
+            MultiCommoditySimulatorNoLosses,
+            base_folder=base_folder,
+            esdl_file_name="emerge_priorities_withoutstorage.esdl",
+            esdl_parser=ESDLFileParser,
+            profile_reader=ProfileReaderFromFile,
+            input_timeseries_file="timeseries_short.csv",
+            time_aggregation=AdaptiveTimeStepAggregation(tolerance=0.2, smoothing_steps=0),
+        )
+        results = solution.extract_results()
+
+        input_profile = np.genfromtxt(
+            base_folder / "input" / "timeseries_short.csv", delimiter=",", skip_header=1
+        )[:, 1]
+        times = solution.times()
+        self.assertLess(len(times), len(input_profile) / 2)
+
+        hours = (times / 3600.0).astype(int)
+        target = solution.get_timeseries("WindPark_9074.maximum_electricity_source").values
+        for i in range(1, len(times)):
+            np.testing.assert_allclose(
+                target[i], np.mean(input_profile[hours[i - 1] : hours[i]]), rtol=1.0e-9
+            )
+
+        # The production cap is not limiting, see test_multi_commodity_simulator_emerge
+        np.testing.assert_allclose(
+            results["WindPark_9074.Electricity_source"],
+            np.minimum(target, 2.1e9),
+            atol=1.0e-3,
+            rtol=1.0e-6,
+        )